@@ -0,0 +1,165 @@
+"""
+Content-addressed asset store for study-material images.
+
+`study_material_gen` used to embed every retrieved image as a base64 data URI
+inside `display_markdown`, which made `user_store/<user_id>.json` grow to tens
+of MB and slowed down every `load_user_state` call. The asset store writes each
+image once to disk, keyed by the sha256 of its bytes, and rewrites the markdown
+to reference the file by URL instead. Images are downscaled and re-encoded
+by image_normalize before they are stored.
+
+Layout:
+    ASSET_ROOT/
+        ab/
+            ab12...ef.png      # sha256 of the decoded image bytes + extension
+
+Usage:
+    from asset_store import get_asset_store
+
+    store = get_asset_store()
+    display_markdown = store.externalize_markdown(markdown_with_base64)
+    images_b64 = store.images_in_markdown(display_markdown)   # for VLM calls
+
+The rewritten markdown uses `<img ... loading='lazy'>` tags pointing at the
+Gradio file route, so the browser only fetches images when they scroll into
+view. The asset root must be passed to `launch(allowed_paths=[...])`.
+"""
+
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from errors import ImageProcessingError
+from image_normalize import normalize_image
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ASSET_ROOT = os.environ.get("AGENTICTA_ASSET_DIR", "/workspace/mnt/assets")
+# Gradio 4.x serves files under "/file=", Gradio 5.x under "/gradio_api/file="
+GRADIO_FILE_ROUTE = os.environ.get("GRADIO_FILE_ROUTE", "/gradio_api/file=")
+
+_EXTENSIONS = {"png": "png", "jpeg": "jpg", "jpg": "jpg", "gif": "gif", "webp": "webp", "bmp": "bmp"}
+
+# <img src='data:image/png;base64,...'/>  and  ![alt](data:image/png;base64,...)
+_HTML_DATA_URI = re.compile(
+    r'<img\s+[^>]*?src=["\']data:image/([A-Za-z0-9.+-]+);base64,([A-Za-z0-9+/=\s]+)["\'][^>]*?/?>'
+)
+_MD_DATA_URI = re.compile(r'!\[([^\]]*)\]\(data:image/([A-Za-z0-9.+-]+);base64,([A-Za-z0-9+/=\s]+)\)')
+# Any reference produced by this store, regardless of route prefix or root location
+_ASSET_REF = re.compile(r'([0-9a-f]{2})/([0-9a-f]{64})\.([a-z]{3,4})')
+
+
+class AssetStore:
+    """Deduplicating, content-addressed image store rooted at a directory."""
+
+    def __init__(self, root: str = ASSET_ROOT, url_prefix: str = GRADIO_FILE_ROUTE):
+        self.root = Path(root)
+        self.url_prefix = url_prefix
+
+    def path_for(self, digest: str, ext: str) -> Path:
+        """Return the on-disk path of an asset (it may not exist yet)."""
+        return self.root / digest[:2] / f"{digest}.{ext}"
+
+    def put_bytes(self, data: bytes, fmt: str = "png") -> Path:
+        """Store raw image bytes and return their path. Identical bytes are written once."""
+        ext = _EXTENSIONS.get(fmt.lower(), "png")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest, ext)
+        if path.exists():
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file in the same directory and rename, so concurrent
+        # writers of the same image never expose a half-written file
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return path
+
+    def put_image(self, data: bytes, fmt: str = "png") -> Path:
+        """Normalise an image (see image_normalize) and store it; bytes that cannot be decoded are stored as is."""
+        try:
+            image = normalize_image(data)
+        except ImageProcessingError as e:
+            logger.warning("Storing image without normalisation: %s", e)
+            return self.put_bytes(data, fmt)
+        return self.put_bytes(image.data, image.format)
+
+    def put_base64(self, b64: str, fmt: str = "png") -> Optional[Path]:
+        """Decode, normalise and store a base64 image. Returns None if the payload is not valid base64."""
+        try:
+            data = base64.b64decode("".join(b64.split()), validate=True)
+        except (binascii.Error, ValueError):
+            logger.warning("Skipping invalid base64 image payload (%d chars)", len(b64))
+            return None
+        return self.put_image(data, fmt)
+
+    def url_for(self, path: Path) -> str:
+        """URL under which Gradio serves an asset path."""
+        return f"{self.url_prefix}{path}"
+
+    def image_tag(self, path: Path, alt: str = "") -> str:
+        """Lazy-loaded, centered <img> tag for an asset path."""
+        return f"<p align='center'><img src='{self.url_for(path)}' alt='{alt}' loading='lazy'/></p>"
+
+    def externalize_markdown(self, markdown_str: str) -> str:
+        """Replace inline base64 images in markdown/HTML with lazy-loaded asset references."""
+        if not markdown_str or "base64," not in markdown_str:
+            return markdown_str
+
+        def _html(match):
+            path = self.put_base64(match.group(2), match.group(1))
+            return self.image_tag(path) if path else match.group(0)
+
+        def _md(match):
+            path = self.put_base64(match.group(3), match.group(2))
+            return self.image_tag(path, match.group(1)) if path else match.group(0)
+
+        markdown_str = _HTML_DATA_URI.sub(_html, markdown_str)
+        return _MD_DATA_URI.sub(_md, markdown_str)
+
+    def asset_paths_in_markdown(self, markdown_str: str) -> List[Path]:
+        """Paths of all assets referenced from markdown, in order of appearance."""
+        if not markdown_str:
+            return []
+        paths, seen = [], set()
+        for prefix, digest, ext in _ASSET_REF.findall(markdown_str):
+            if digest.startswith(prefix) and digest not in seen:
+                seen.add(digest)
+                paths.append(self.path_for(digest, ext))
+        return paths
+
+    def load_base64(self, path: Path) -> Optional[str]:
+        """Read an asset back as a base64 string, or None if it is missing."""
+        try:
+            return base64.b64encode(Path(path).read_bytes()).decode("ascii")
+        except FileNotFoundError:
+            logger.warning("Asset %s referenced in markdown is missing", path)
+            return None
+
+    def images_in_markdown(self, markdown_str: str) -> List[str]:
+        """Base64 payloads of every referenced asset, for callers that need image bytes (VLM)."""
+        images = [self.load_base64(p) for p in self.asset_paths_in_markdown(markdown_str)]
+        return [img for img in images if img]
+
+
+_asset_store_cache: Dict[str, AssetStore] = {}
+
+
+def get_asset_store(root: str = ASSET_ROOT) -> AssetStore:
+    """Return a shared AssetStore for the given root directory."""
+    if root not in _asset_store_cache:
+        _asset_store_cache[root] = AssetStore(root)
+    return _asset_store_cache[root]
@@ -0,0 +1,182 @@
+"""
+Async management of the NeMo Retriever collections behind the upload flow.
+
+`handle_file_upload` used to chain `asyncio.run(...)` calls for delete, list,
+create and upload. Each call started a fresh event loop and HTTP session, and
+none of them could run inside Gradio's own loop. `CollectionManager` is used
+from async handlers directly:
+
+    - one aiohttp session is shared by all calls on the same event loop, including
+      the document uploads and ingestion status polls
+    - the list of existing collections is cached for COLLECTION_CACHE_TTL seconds
+    - `ensure_collection` is idempotent and serialized per collection name, so two
+      concurrent uploads for one user create the collection once
+    - `prepare_and_upload` hashes the files against the ingestion manifest while
+      the collection is being created, then uploads only what is missing
+
+Usage:
+    from collection_manager import get_collection_manager
+
+    manager = get_collection_manager()
+    summary = await manager.prepare_and_upload("babe", pdf_paths, on_progress=report)
+"""
+
+import asyncio
+import os
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+import aiohttp
+from colorama import Fore
+
+import nemo_retriever_client_utils as client
+from errors import RAGConnectionError, RAGError
+from ingestion_manifest import IngestionManifest, file_hashes
+
+COLLECTION_CACHE_TTL = float(os.environ.get("COLLECTION_CACHE_TTL", "300"))
+
+# Optional metadata schema of every user collection
+DEFAULT_METADATA_SCHEMA = [
+    {
+        "name": "source_ref",
+        "type": "string",
+        "description": "Reference name to the source pdf document"
+    }
+]
+
+
+class CollectionManager:
+    """Cached, idempotent collection operations against the ingestor server."""
+
+    def __init__(self, base_url: Optional[str] = None, cache_ttl: float = COLLECTION_CACHE_TTL):
+        self.base_url = base_url or client.BASE_URL
+        self.cache_ttl = cache_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop = None
+        self._known: Optional[Set[str]] = None
+        self._fetched_at = 0.0
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            # A session is bound to the loop it was created on
+            self._session = aiohttp.ClientSession()
+            self._session_loop = loop
+            self._locks = {}
+        return self._session
+
+    def _lock(self, name: str) -> asyncio.Lock:
+        self._get_session()
+        return self._locks.setdefault(name, asyncio.Lock())
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def invalidate(self):
+        """Forget the cached collection list."""
+        self._known = None
+
+    async def list_collections(self, refresh: bool = False) -> Set[str]:
+        """Names of the existing collections, from cache unless stale or `refresh`."""
+        if not refresh and self._known is not None and time.monotonic() - self._fetched_at < self.cache_ttl:
+            return set(self._known)
+        url = f"{self.base_url}/v1/collections"
+        try:
+            async with self._get_session().get(url) as response:
+                body = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise RAGConnectionError(f"Cannot list collections: {e}", server_url=url) from e
+        self._known = {c["collection_name"] for c in (body or {}).get("collections", []) if c.get("collection_name")}
+        self._fetched_at = time.monotonic()
+        return set(self._known)
+
+    async def ensure_collection(self, name: str, metadata_schema: Optional[List[dict]] = None,
+                                embedding_dimension: int = 2048) -> bool:
+        """Create `name` unless it already exists.
+
+        Returns:
+            True if the collection was created by this call
+        """
+        if name in await self.list_collections():
+            return False
+        async with self._lock(name):
+            # Another task may have created it while we waited for the lock
+            if name in await self.list_collections(refresh=True):
+                return False
+            url = f"{self.base_url}/v1/collection"
+            data = {
+                "collection_name": name,
+                "embedding_dimension": embedding_dimension,
+                "metadata_schema": DEFAULT_METADATA_SCHEMA if metadata_schema is None else metadata_schema,
+            }
+            try:
+                async with self._get_session().post(url, json=data) as response:
+                    status = response.status
+                    body = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise RAGConnectionError(f"Cannot create collection {name}: {e}", server_url=url) from e
+            if status >= 400 and "already exists" not in body.lower():
+                raise RAGError(f"Creating collection {name} failed with HTTP {status}: {body}")
+            print(Fore.YELLOW + f"created collection {name}", Fore.RESET)
+            self._known.add(name)
+            # A new collection starts empty, whatever an older manifest of the same name says
+            IngestionManifest.for_collection(name).clear()
+            return True
+
+    async def delete_collections(self, names: List[str]):
+        """Delete collections and forget their ingested documents."""
+        url = f"{self.base_url}/v1/collections"
+        try:
+            async with self._get_session().delete(url, json=names) as response:
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise RAGConnectionError(f"Cannot delete collections {names}: {e}", server_url=url) from e
+        if self._known is not None:
+            self._known.difference_update(names)
+        for name in names:
+            IngestionManifest.for_collection(name).clear()
+
+    async def prepare_and_upload(
+        self,
+        collection: str,
+        files_path_ls: List[str],
+        start_fresh: bool = False,
+        metadata_schema: Optional[List[dict]] = None,
+        custom_metadata: Optional[List[dict]] = None,
+        on_progress: Optional[Callable[[float, str], None]] = None,
+    ) -> dict:
+        """Make sure the collection exists and ingest the files it does not have yet.
+
+        Hashing the files for the manifest runs in a worker thread while the
+        collection is listed and created.
+
+        Returns:
+            The summary of `nemo_retriever_client_utils.upload_files_to_nemo_retriever`
+        """
+        if start_fresh:
+            await self.delete_collections([collection, "metadata_schema", "meta"])
+        manifest = IngestionManifest.for_collection(collection)
+        _, hashes = await asyncio.gather(
+            self.ensure_collection(collection, metadata_schema),
+            asyncio.to_thread(file_hashes, files_path_ls),
+        )
+        # Plan after ensure_collection, which clears the manifest of a new collection
+        plan = manifest.plan(files_path_ls, hashes=hashes)
+        return await client.upload_files_to_nemo_retriever(
+            files_path_ls, collection, custom_metadata or [], on_progress=on_progress, manifest=manifest, plan=plan,
+            session=self._get_session(),
+        )
+
+
+_collection_manager: Optional[CollectionManager] = None
+
+
+def get_collection_manager() -> CollectionManager:
+    """Process-wide collection manager."""
+    global _collection_manager
+    if _collection_manager is None:
+        _collection_manager = CollectionManager()
+    return _collection_manager
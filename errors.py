@@ -53,6 +53,14 @@ class RAGSearchError(RAGError):
     pass
 
 
+class RAGIngestionError(RAGError):
+    """Raised when document ingestion fails or does not finish in time."""
+    def __init__(self, message, task_id=None, failed_documents=None):
+        self.task_id = task_id
+        self.failed_documents = failed_documents or []
+        super().__init__(message)
+
+
 class DocumentProcessingError(AgenticTAError):
     """Raised when PDF processing fails."""
     def __init__(self, message, pdf_path=None, page_number=None):
@@ -61,6 +69,13 @@ class DocumentProcessingError(AgenticTAError):
         super().__init__(message)
 
 
+class ImageProcessingError(AgenticTAError):
+    """Raised when an image cannot be decoded or re-encoded."""
+    def __init__(self, message, source_format=None):
+        self.source_format = source_format
+        super().__init__(message)
+
+
 class CurriculumGenerationError(AgenticTAError):
     """Raised when curriculum generation fails."""
     pass
@@ -73,6 +88,20 @@ class UserStateError(AgenticTAError):
         super().__init__(message)
 
 
+class UserStateConflictError(UserStateError):
+    """Raised when an optimistic user state update keeps losing to concurrent writers."""
+    def __init__(self, message, user_id=None, attempts=None):
+        self.attempts = attempts
+        super().__init__(message, user_id=user_id)
+
+
+class UserStatePatchError(UserStateError):
+    """Raised when a JSON Patch cannot be applied to a stored user state."""
+    def __init__(self, message, user_id=None, path=None):
+        self.path = path
+        super().__init__(message, user_id=user_id)
+
+
 class ConfigurationError(AgenticTAError):
     """Raised when configuration is invalid or missing."""
     pass
@@ -103,6 +132,11 @@ USER_FRIENDLY_MESSAGES = {
         "• The PDF contains readable text (not just images)\n"
         "• The file size is under 50MB"
     ),
+    UserStateConflictError: (
+        "🔁 Your Progress Changed While Saving\n"
+        "Another action updated your progress at the same time. Please try again.\n\n"
+        "Technical details: {error}"
+    ),
     CurriculumGenerationError: (
         "❌ Curriculum Generation Failed\n"
         "We couldn't generate the curriculum from your PDFs.\n\n"
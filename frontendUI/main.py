@@ -10,10 +10,12 @@ from study_buddy_ui import (
 )
 from quiz_ui import init_quiz, record_answer, next_question, previous_question, submit_quiz
 from calendar_assistant import create_event_with_ai
+from asset_store import ASSET_ROOT
+from job_queue import get_job_queue
 from colorama import Fore
 import os, sys, json
 
-def check_and_init_quiz(completed_topics, username):
+def check_and_init_quiz(completed_topics, username, quiz_session_id):
     """Check if quiz should be unlocked and initialize it if so"""
     import gradio as gr
     
@@ -32,15 +34,15 @@ def check_and_init_quiz(completed_topics, username):
     # If quiz is now unlocked (visible), initialize it
     if is_quiz_unlocked and username:
         try:
-            quiz_init_outputs = init_quiz(username)
-            return (lock_msg_update, quiz_col_update) + quiz_init_outputs
+            quiz_session_id, *quiz_init_outputs = init_quiz(username, quiz_session_id)
+            return (lock_msg_update, quiz_col_update, quiz_session_id, *quiz_init_outputs)
         except Exception as e:
             print(Fore.RED + f"Error initializing quiz: {e}", Fore.RESET)
             # Return empty/default values if initialization fails
-            return (lock_msg_update, quiz_col_update, "", "", gr.Radio(choices=[]), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False))
+            return (lock_msg_update, quiz_col_update, quiz_session_id, "", "", gr.Radio(choices=[]), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False))
     else:
         # Quiz is still locked, return default empty values
-        return (lock_msg_update, quiz_col_update, "", "", gr.Radio(choices=[]), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False))
+        return (lock_msg_update, quiz_col_update, quiz_session_id, "", "", gr.Radio(choices=[]), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False))
 import yaml
 
 # Custom CSS
@@ -470,29 +472,29 @@ def create_app():
             
             # Chat functionality with calendar component updates
             def send_message_with_calendar(msg_text, history, pref, user):
-                """Wrapper that handles chat and calendar UI updates"""
-                # Call the original send_message which now returns calendar data
-                new_msg, new_history, cal_file, cal_status, cal_preview = send_message(msg_text, history, pref, user)
-                
-                # If calendar event was created, update sidebar components
-                if cal_file and cal_status:
-                    print(f"Updating calendar UI with file: {cal_file}")
-                    return (
+                """Wrapper that streams chat updates and handles calendar UI updates"""
+                # send_message yields partial replies, then the final one with calendar data
+                for new_msg, new_history, cal_file, cal_status, cal_preview in send_message(msg_text, history, pref, user):
+                    # If calendar event was created, update sidebar components
+                    if cal_file and cal_status:
+                        print(f"Updating calendar UI with file: {cal_file}")
+                        yield (
+                            new_msg,
+                            new_history,
+                            gr.Markdown(value=cal_status, visible=True),
+                            gr.File(value=cal_file, visible=True),
+                            gr.Textbox(value=cal_preview if cal_preview else "", visible=True if cal_preview else False)
+                        )
+                        continue
+                    
+                    # Default: no calendar update
+                    yield (
                         new_msg,
                         new_history,
-                        gr.Markdown(value=cal_status, visible=True),
-                        gr.File(value=cal_file, visible=True),
-                        gr.Textbox(value=cal_preview if cal_preview else "", visible=True if cal_preview else False)
+                        gr.Markdown(visible=False),
+                        gr.File(visible=False),
+                        gr.Textbox(visible=False)
                     )
-                
-                # Default: no calendar update
-                return (
-                    new_msg,
-                    new_history,
-                    gr.Markdown(visible=False),
-                    gr.File(visible=False),
-                    gr.Textbox(visible=False)
-                )
             
             msg.submit(
                 send_message_with_calendar,
@@ -539,11 +541,12 @@ def create_app():
             # Quiz content (hidden when locked)
             quiz_content_col = gr.Column(visible=False)
             with quiz_content_col:
-                # State tracking
+                # State tracking; the quiz itself is kept server-side under this session id
+                quiz_session_state = gr.State("")
                 progress = gr.Textbox(label="Progress", interactive=False)
                 question_display = gr.Textbox(label="Question", interactive=False)
                 choices = gr.Radio(choices=[], label="Choices", interactive=True)
-                choices.change(record_answer, inputs=choices, outputs=[])
+                choices.change(record_answer, inputs=[choices, quiz_session_state], outputs=[])
                 
                 with gr.Row():
                     prev_btn = gr.Button("Previous", visible=False)
@@ -553,9 +556,9 @@ def create_app():
                 result_display = gr.Textbox(label="Results", interactive=False, visible=False)
                 
                 # Event handlers for Quiz tab
-                next_btn.click(next_question, None, [progress, question_display, choices, prev_btn, next_btn, submit_btn_quiz])
-                prev_btn.click(previous_question, None, [progress, question_display, choices, prev_btn, next_btn, submit_btn_quiz])
-                submit_btn_quiz.click(submit_quiz, None, [result_display, result_display, progress, question_display, choices, submit_btn_quiz])
+                next_btn.click(next_question, quiz_session_state, [progress, question_display, choices, prev_btn, next_btn, submit_btn_quiz])
+                prev_btn.click(previous_question, quiz_session_state, [progress, question_display, choices, prev_btn, next_btn, submit_btn_quiz])
+                submit_btn_quiz.click(submit_quiz, quiz_session_state, [result_display, result_display, progress, question_display, choices, submit_btn_quiz])
                 
                 # Initialize quiz when user accesses the quiz tab (after curriculum is generated)
                 # Removed demo.load to avoid initialization errors for first-time users
@@ -679,8 +682,8 @@ def create_app():
         # Update Quiz tab visibility when completed_topics changes and initialize quiz if unlocked
         completed_topics_state.change(
             check_and_init_quiz,
-            inputs=[completed_topics_state, username_state],
-            outputs=[quiz_lock_message, quiz_content_col, progress, question_display, choices, prev_btn, next_btn, submit_btn_quiz]
+            inputs=[completed_topics_state, username_state, quiz_session_state],
+            outputs=[quiz_lock_message, quiz_content_col, quiz_session_state, progress, question_display, choices, prev_btn, next_btn, submit_btn_quiz]
         )
     
     demo.css = CUSTOM_CSS
@@ -689,10 +692,14 @@ def create_app():
 
 if __name__ == "__main__":
     app = create_app()
+    # Pick up curriculum/chapter builds that were interrupted by the last shutdown
+    get_job_queue().start()
     app.launch(
         server_name="0.0.0.0",  # Allow access from outside the container
         server_port=7860,
         share=False,
-        show_error=True
+        show_error=True,
+        # serve study-material images written by asset_store
+        allowed_paths=[ASSET_ROOT]
     )
 
@@ -13,9 +13,13 @@ import os
 import random
 from colorama import Fore
 from utils import get_question, get_answer, get_citation_as_explain, get_choices
-from standalone_quizes_gen import get_quiz, quiz_output_parser
+from quiz_fanout import generate_quizzes
+from quiz_bank import get_banked_quizzes
 from nodes import init_user_storage,user_exists,load_user_state,save_user_state, _save_store, _load_store
 from nodes import update_and_save_user_state, move_to_next_chapter, update_subtopic_status,add_quiz_to_subtopic, build_next_chapter, run_for_first_time_user
+from user_store import set_default_save_to
+from session_store import SessionStore
+from dataclasses import dataclass
 import asyncio
 from states import Chapter, StudyPlan, Curriculum, User, GlobalState, Status, SubTopic, printmd
 import yaml
@@ -25,29 +29,37 @@ f=open("/workspace/docker-compose.yml","r")
 yaml_f=yaml.safe_load(f)
 global mnt_folder
 mnt_folder=yaml_f["services"]["agenticta"]["volumes"][-1].split(":")[-1]
-# Global variables to track state
-current_question = 0
-user_answers = []
-quiz_data = []
-df = None
+# handlers that only know the username resolve their storage under mnt_folder
+set_default_save_to(mnt_folder)
+# Idle seconds before a quiz in progress is forgotten
+QUIZ_SESSION_TTL = float(os.environ.get("QUIZ_SESSION_TTL", "3600"))
+# Quiz progress per browser session; the gr.State of the quiz tab holds only the session id
+_quiz_sessions = SessionStore(ttl=QUIZ_SESSION_TTL)
+_SESSION_EXPIRED = "Quiz session expired, complete a sub-topic or reload the page to start again"
 
 
+@dataclass
+class QuizSession:
+    """One user's pass through a quiz."""
+    questions: list
+    answers: list
+    current: int = 0
+
 
 def load_quiz_data(mnt_folder=mnt_folder, username=None, save_to=None):
-    """Load quiz data from CSV files"""
-    global quiz_data
+    """Load the user's quiz questions, formatted for the quiz tab"""
     store_path, user_store_dir = init_user_storage(save_to, username)
     u=load_user_state(username)
     active_chapter = u["curriculum"][0]["active_chapter"]
-    quizzes_d_ls = active_chapter.sub_topics[0].quizzes 
-    if quizzes_d_ls: 
-        quiz_data=quizzes_d_ls
-    else:
+    # The quiz bank fills every sub-topic's quizzes in the background
+    quizzes_d_ls = [q for st in active_chapter.sub_topics for q in (st.quizzes or [])]
+    if not quizzes_d_ls:
+        quizzes_d_ls = get_banked_quizzes(username, 0)
+    if not quizzes_d_ls:
         title=active_chapter.name
         summary=active_chapter.sub_topics[0].sub_topic
         text_chunk=active_chapter.sub_topics[0].study_material
-        quizes_ls= get_quiz(title, summary, text_chunk, "")
-        quizzes_d_ls=quiz_output_parser(quizes_ls)
+        quizzes_d_ls=generate_quizzes(title, summary, text_chunk)
     try :
         
         quiz_data = []
@@ -69,22 +81,39 @@ def load_quiz_data(mnt_folder=mnt_folder, username=None, save_to=None):
                 "explanation": "The capital of France is Paris."
             }
         quiz_data = [item]
+    return quiz_data
 
 
-def init_quiz(username):
-    """Initialize quiz state"""
-    global current_question, user_answers
+def init_quiz(username, session_id=None):
+    """Start a quiz for this browser session; returns the session id followed by the question outputs"""
     # Use global mnt_folder as save_to
     save_to = mnt_folder
-    load_quiz_data(mnt_folder=mnt_folder, username=username, save_to=save_to)
-    current_question = 0
-    user_answers = [None] * len(quiz_data)
-    return update_question()
+    quiz_data = load_quiz_data(mnt_folder=mnt_folder, username=username, save_to=save_to)
+    session = QuizSession(questions=quiz_data, answers=[None] * len(quiz_data))
+    _quiz_sessions.pop(session_id)
+    session_id = _quiz_sessions.create(session)
+    return (session_id,) + update_question(session)
+
+
+def _expired_outputs():
+    import gradio as gr
+    return (
+        _SESSION_EXPIRED,
+        "",
+        gr.update(choices=[], value=None),
+        gr.update(visible=False),
+        gr.update(visible=False),
+        gr.update(visible=False)
+    )
 
 
-def update_question():
+def update_question(session):
     """Update the displayed question"""
     import gradio as gr
+    if session is None:
+        return _expired_outputs()
+    current_question = session.current
+    quiz_data = session.questions
     question_data = quiz_data[current_question]
     progress = f"Question {current_question + 1} of {len(quiz_data)}"
     
@@ -96,42 +125,51 @@ def update_question():
     return (
         progress,
         question_data["question"],
-        gr.update(choices=question_data["choices"], value=user_answers[current_question]),
+        gr.update(choices=question_data["choices"], value=session.answers[current_question]),
         gr.update(visible=show_prev),
         gr.update(visible=show_next),
         gr.update(visible=show_submit)
     )
 
 
-def record_answer(answer):
+def record_answer(answer, session_id=None):
     """Record user's answer"""
+    session = _quiz_sessions.get(session_id)
+    if session is None:
+        return
     print(Fore.BLUE + "recorded user answer =", answer, Fore.RESET)
-    user_answers[current_question] = answer
+    session.answers[session.current] = answer
 
 
-def next_question():
+def next_question(session_id=None):
     """Move to next question"""
-    global current_question
-    current_question += 1
-    return update_question()
+    session = _quiz_sessions.get(session_id)
+    if session is not None:
+        session.current = min(session.current + 1, len(session.questions) - 1)
+    return update_question(session)
 
 
-def previous_question():
+def previous_question(session_id=None):
     """Move to previous question"""
-    global current_question
-    current_question -= 1
-    return update_question()
+    session = _quiz_sessions.get(session_id)
+    if session is not None:
+        session.current = max(session.current - 1, 0)
+    return update_question(session)
 
 
-def submit_quiz():
+def submit_quiz(session_id=None):
     """Submit quiz and calculate results"""
     import gradio as gr
+    session = _quiz_sessions.get(session_id)
+    if session is None:
+        return (gr.update(visible=True), _SESSION_EXPIRED) + _expired_outputs()[:4]
+    quiz_data = session.questions
     correct_count = 0
     results = []
     
-    for i, (question_data, user_answer) in enumerate(zip(quiz_data, user_answers)):
+    for i, (question_data, user_answer) in enumerate(zip(quiz_data, session.answers)):
         correct_answer = question_data["answer"]
-        is_correct = True if correct_answer in user_answer else False
+        is_correct = True if user_answer is not None and correct_answer in user_answer else False
         if is_correct:
             correct_count += 1
             
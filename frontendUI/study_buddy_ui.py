@@ -18,14 +18,21 @@ import shutil
 import yaml
 import os
 from colorama import Fore
-from nemo_retriever_client_utils import delete_collections,fetch_collections, create_collection, upload_files_to_nemo_retriever, get_documents,fetch_rag_context
-from nodes import init_user_storage,user_exists,load_user_state,save_user_state, _save_store, _load_store
-from nodes import update_and_save_user_state, move_to_next_chapter, update_subtopic_status,add_quiz_to_subtopic, build_next_chapter, run_for_first_time_user
+from nemo_retriever_client_utils import get_documents,fetch_rag_context
+from collection_manager import get_collection_manager
+from errors import RAGError
+from nodes import init_user_storage,user_exists,load_user_state,save_user_state, _save_store, _load_store, load_active_chapter_info
+from nodes import update_and_save_user_state, move_to_next_chapter, update_subtopic_status, set_subtopic_status, add_quiz_to_subtopic, build_next_chapter, run_for_first_time_user
+from nodes import submit_curriculum_job, submit_next_chapter_job
+from job_queue import get_job_queue, ACTIVE_STATES
+from user_store import set_default_save_to
 from standalone_study_buddy_response import study_buddy_response, query_routing, inference_call
-from tool_youtube import fetch_most_relevant_youtube_video
+from standalone_study_buddy_response import STUDY_BUDDY_ROUTING, stream_study_buddy_response, stream_routed_study_buddy_response
+from intent_classifier import classify_locally
+from youtube_search_service import fetch_most_relevant_youtube_video_async
 from calendar_assistant import create_event_with_ai
 import asyncio
-from states import Chapter, StudyPlan, Curriculum, User, GlobalState, Status, SubTopic, printmd
+from states import Chapter, StudyPlan, Curriculum, User, GlobalState, Status, SubTopic, printmd, chapter_summary
 from agent_memory import get_memory_ops
 from langchain_nvidia_ai_endpoints import ChatNVIDIA
 from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings
@@ -44,11 +51,17 @@ from colorama import Fore
 from enum import Enum
 from typing import Optional
 from pydantic import BaseModel, Field
-from standalone_quizes_gen import get_quiz, quiz_output_parser
+from quiz_fanout import generate_quizzes
+from quiz_bank import get_banked_quizzes
+from prompt_budget import get_prompt_budget
+from material_index import get_material_index
+from keyed_executor import KeyedExecutor
 f=open("/workspace/docker-compose.yml","r")
 yaml_f=yaml.safe_load(f)
 global mnt_folder
 mnt_folder=yaml_f["services"]["agenticta"]["volumes"][-1].split(":")[-1]
+# handlers that only know the username resolve their storage under mnt_folder
+set_default_save_to(mnt_folder)
 
 start_fresh=False
 
@@ -136,6 +149,33 @@ def get_curriculum_from_user_state(username:str):
         traceback.print_exc()
         return []
 
+# Seconds a handler follows a background build before handing the UI back; the build keeps running
+JOB_WAIT_SECONDS = float(os.environ.get("AGENTICTA_JOB_WAIT_SECONDS", "120"))
+# Seconds between job status polls
+JOB_POLL_INTERVAL = float(os.environ.get("AGENTICTA_JOB_POLL_INTERVAL", "1.0"))
+# Threads processing chat memory for all users; each user's turns still run in order
+MEMORY_WORKERS = int(os.environ.get("AGENTICTA_MEMORY_WORKERS", "4"))
+# Turns of one user waiting for memory processing; older turns are dropped beyond this
+MEMORY_MAX_PENDING = int(os.environ.get("AGENTICTA_MEMORY_MAX_PENDING", "3"))
+
+
+def _follow_job(job_id, timeout=JOB_WAIT_SECONDS, poll_interval=JOB_POLL_INTERVAL):
+    """Yield a background job's state on every poll until it finishes or `timeout` seconds pass."""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = get_job_queue().get(job_id)
+        yield job
+        if job is None or job["status"] not in ACTIVE_STATES or time.monotonic() >= deadline:
+            return
+        time.sleep(poll_interval)
+
+
+def _build_status_outputs(status_markdown):
+    """generate_curriculum outputs that only show a status message in the study material panel."""
+    return ([gr.update()] + [gr.update() for _ in range(20)]
+            + [gr.Accordion(visible=True), gr.Markdown(value=status_markdown), gr.update(), gr.update(), gr.update()])
+
+
 def generate_curriculum(file_obj, validation_msg , username , preference, study_buddy_name="Ollie",progress=gr.Progress()):
     """Generate curriculum from uploaded PDF or use sample data"""
     global mnt_folder  
@@ -157,9 +197,13 @@ def generate_curriculum(file_obj, validation_msg , username , preference, study_
     user_exist_flag=user_exists(username)
     print(Fore.LIGHTBLUE_EX + f"user_exist_flag={user_exist_flag} for username={username}" , Fore.RESET)
     print(Fore.LIGHTBLUE_EX + f"store_path={store_path} for user_store_dir={user_store_dir}" , Fore.RESET)
-    if user_exist_flag :    
+    # A build in progress registers the user before the curriculum exists
+    existing_state = load_user_state(username) if user_exist_flag else None
+    last_build = get_job_queue().latest(username, "curriculum")
+    building = last_build is not None and last_build["status"] in ACTIVE_STATES
+    if existing_state and existing_state.get("curriculum") and not building:
         print("return user detected , loading existing state...", Fore.RESET)    
-        u=load_user_state(username)
+        u=existing_state
         study_plan =u["curriculum"][0]["study_plan"]
         print(type(study_plan), study_plan)
         # Load full chapter structure with subtopics
@@ -175,7 +219,23 @@ def generate_curriculum(file_obj, validation_msg , username , preference, study_
                     chapters_ls.append(chapter_name)
     else: 
         print(Fore.LIGHTYELLOW_EX + "New user detected, running first time setup..." , Fore.RESET)       
-        global_state: GlobalState = asyncio.run(run_for_first_time_user(u, pdf_loc, save_to, preference, store_path, user_store_dir))
+        # Build on the job queue: progress is checkpointed, and an interrupted build resumes on resubmit/restart
+        # The handler only follows the build for JOB_WAIT_SECONDS; it keeps running in the background
+        job_id = submit_curriculum_job(u, pdf_loc, save_to, preference)
+        job = None
+        for job in _follow_job(job_id):
+            if job is None:
+                break
+            desc = job["message"] or "Building curriculum..."
+            progress(job["progress"], desc=desc)
+            yield _build_status_outputs(f"⏳ **Building your curriculum ({job['progress']:.0%})** – {desc}")
+        if job is None or job["status"] == "failed":
+            raise gr.Error(f"Curriculum generation failed: {job['error'] if job else 'job not found'}. Click Generate again to resume.")
+        if job["status"] != "succeeded":
+            yield _build_status_outputs(
+                f"⏳ **Still building your curriculum ({job['progress']:.0%}).** This continues in the background; "
+                "click Generate again in a few minutes to pick it up.")
+            return
         u=load_user_state(username)
         study_plan =u["curriculum"][0]["study_plan"]
         print(type(study_plan), study_plan)
@@ -199,7 +259,8 @@ def generate_curriculum(file_obj, validation_msg , username , preference, study_
             outputs.append(gr.Button(visible=False))
         outputs.append([])  # Empty unlocked topics
         outputs.append([])  # Empty expanded topics
-        return outputs
+        yield outputs
+        return
     
     # Get active chapter from user state for display purposes
     active_chapter = u["curriculum"][0]["active_chapter"]
@@ -403,10 +464,10 @@ def generate_curriculum(file_obj, validation_msg , username , preference, study_
     outputs.append(list(unlocked_topics))
     outputs.append(list(expanded_topics_set))  # All topics with subtopics are expanded
     outputs.append([])  # No topics completed initially
-    return outputs
+    yield outputs
 
 
-def handle_file_upload(files, username, progress=gr.Progress()):
+async def handle_file_upload(files, username, progress=gr.Progress()):
     """Handle file upload and validate"""
     if files is None or len(files) == 0:
         return ""
@@ -418,84 +479,30 @@ def handle_file_upload(files, username, progress=gr.Progress()):
     user_name_folder=os.path.join(mnt_folder,username)
     os.makedirs(pdf_dir, exist_ok=True)
     os.makedirs(user_name_folder, exist_ok=True)
-    new_ls=[shutil.copy(f, pdf_dir) for f in files]
-    # Call create collection method
+    new_ls = await asyncio.to_thread(lambda: [shutil.copy(f, pdf_dir) for f in files])
     print(Fore.YELLOW + "new_ls=\n", new_ls, Fore.RESET)
-    
-    processed_files = os.path.join(mnt_folder,f"{username}_files.txt")
-    my_file = Path(processed_files)
-    exist_processed_files_flag=my_file.is_file()
-    if exist_processed_files_flag:
-        f=open(processed_files,"r+")
-        processed_files_ls= f.readlines()
-        processed_files_ls=[f for f in processed_files_ls if f.endswith(".pdf")]
-        print(Fore.CYAN + " !! skip already processed files  =\n", processed_files_ls)
-        new_files_ls = [ os.path.join(pdf_dir, f) for f in files if f not in processed_files_ls]
-        print("+ = new added files =\n ", new_files_ls, "append to processed files", Fore.RESET)
-        _=[f.write(file) for file in new_files_ls] # python will convert \n to os.linesep
-        f.close()
-    else:
-        f=open(processed_files,"w")
-        _=[f.write(f'{os.path.join(pdf_dir,pdf_file)}\n') for pdf_file in os.listdir(pdf_dir) if pdf_file.endswith(".pdf")] # python will convert \n to os.linesep
-        new_files_ls=[os.path.join(pdf_dir,pdf_file) for pdf_file in os.listdir(pdf_dir) if pdf_file.endswith(".pdf")] # python will convert \n to os.linesep
-        print(Fore.CYAN+" >> newl yadded files =\n ", new_files_ls, "append to processed files")
-        f.close()
-    
-    
-    # [Optional]: Define schema for metadata fields
-    metadata_schema = [    
-        {
-            "name": "source_ref",
-            "type": "string",
-            "description": "Reference name to the source pdf document"
-        }
-    ]
-    if start_fresh :
-        asyncio.run(delete_collections([username,"metadata_schema","meta"]))        
-        time.sleep(10)  # Make loading visible
-    output_collection = asyncio.run(fetch_collections())
-    print(type(output_collection), output_collection)
-    if isinstance(output_collection, str):
-        output_collection = json.loads(output_collection)        
-        output_collection_ls = [c["collection_name"] for c in output_collection["collections"] if c["collection_name"]==username]
-        #print(Fore.YELLOW + f"output_collection_ls for user {username} =", output_collection_ls , Fore.RESET)
-        if len(output_collection_ls) > 0:
-            print(Fore.YELLOW + f"Collection for user {username} already exists." , Fore.RESET)
-        #delete_output=asyncio.run(delete_user_nemo_collection([username]))
-        #print(Fore.YELLOW + f"Deleted existing collection for user {username}: {delete_output}" , Fore.RESET)
-        else:
-            print(Fore.YELLOW + f"creating new collection with collectio name = {username}" , Fore.RESET)
-            # Call create collection method
-            asyncio.run(create_collection(
-                collection_name=username,
-                metadata_schema=metadata_schema # Optional argument, can be commented if metadata is not to be inserted
-            ))
-            time.sleep(10)
-    if len(new_files_ls)>0:
-        nemo_retriever_files_upload_output = asyncio.run(upload_files_to_nemo_retriever(new_files_ls , username,[]))
-    else:
-        print("already processed these files, skipping ... ")
-    time.sleep(20)
+
+    def _ingestion_progress(fraction, desc):
+        progress(0.1 + 0.8 * fraction, desc=f"📚 {desc}")
+
+    # Creates the user's collection if needed, then (re-)ingests only documents
+    # whose content is not in the collection yet
+    progress(0, desc=f"📤 Uploading {len(new_ls)} files...")
+    try:
+        nemo_retriever_files_upload_output = await get_collection_manager().prepare_and_upload(
+            username, new_ls, start_fresh=start_fresh, on_progress=_ingestion_progress)
+    except RAGError as e:
+        print(Fore.RED + f"Ingestion failed for user {username}: {e}", Fore.RESET)
+        raise gr.Error(f"Document ingestion failed: {e}")
     print(Fore.BLUE + "Copied files to pdf_dir =", '\n'.join(new_ls), Fore.RESET)
     print(Fore.BLUE + "\n nemo_retriever_files_upload_output =", nemo_retriever_files_upload_output, Fore.RESET)
-    progress(0, desc="📤 Uploading files...")
-    time.sleep(0.8)  # Make loading visible
-    
-    progress(0.2, desc="📋 Validating file count...")
-    time.sleep(0.6)
-    
-    progress(0.4, desc="📏 Checking file sizes...")
-    time.sleep(0.6)
-    
-    progress(0.6, desc="📄 Verifying PDF format...")
-    time.sleep(0.6)
-    
-    progress(0.8, desc="🔍 Checking page counts...")
+
+    progress(0.9, desc="🔍 Validating files...")
     is_valid, message = validate_pdf_files(files)
-    time.sleep(0.5)
-    
-    progress(1.0, desc="✅ Validation complete!")
-    time.sleep(0.3)
+    failed = nemo_retriever_files_upload_output.get("failed") or []
+    if failed:
+        message = (message + "\n" if message else "") + f"⚠️ Could not ingest {len(failed)} file(s), they will be retried on the next upload: {', '.join(failed)}"
+    progress(1.0, desc="✅ Upload complete!")
     
     return message
 
@@ -635,122 +642,47 @@ def mark_topic_complete(checkbox_value, checkbox_index, unlocked_topics, expande
                         if subtopic_name in subtopic_text or subtopic_text in subtopic_name:
                             print(Fore.GREEN + f"Found matching subtopic at index {idx}", Fore.RESET)
                             
-                            # Check if quiz already exists
+                            # Quizzes normally come from the background quiz bank
                             existing_quizzes = subtopic.get("quizzes") if isinstance(subtopic, dict) else getattr(subtopic, 'quizzes', None)
-                            
-                            if existing_quizzes and isinstance(existing_quizzes, list) and len(existing_quizzes) > 0:
-                                # Check if quizzes is a valid list with dict items
-                                if isinstance(existing_quizzes[0], dict):
-                                    print(Fore.CYAN + f"✓ Quiz already exists for this subtopic ({len(existing_quizzes)} questions), skipping generation", Fore.RESET)
-                                    # Use existing quiz data
-                                    generated_quiz_data = existing_quizzes
-                                    generated_subtopic_name = subtopic_name
-                                    
-                                    # Update subtopic status to COMPLETED (checkbox was marked)
-                                    if isinstance(subtopic, dict):
-                                        subtopic["status"] = Status.COMPLETED.value
-                                    else:
-                                        subtopic.status = Status.COMPLETED
-                                    
-                                    # Also update status and quizzes in study_plan to keep both locations in sync
-                                    if "study_plan" in u["curriculum"][0]:
-                                        study_plan = u["curriculum"][0]["study_plan"]
-                                        # Get active chapter number (handle both dict and object)
-                                        if isinstance(active_chapter, dict):
-                                            active_chapter_num = active_chapter.get("number", -1)
-                                        else:
-                                            active_chapter_num = active_chapter.number
-                                        
-                                        if isinstance(study_plan, dict) and "study_plan" in study_plan:
-                                            chapters = study_plan["study_plan"]
-                                            for chapter in chapters:
-                                                if isinstance(chapter, dict) and chapter.get("number") == active_chapter_num:
-                                                    if "sub_topics" in chapter and idx < len(chapter["sub_topics"]):
-                                                        chapter["sub_topics"][idx]["status"] = Status.COMPLETED.value
-                                                        chapter["sub_topics"][idx]["quizzes"] = existing_quizzes
-                                                    break
-                                        elif hasattr(study_plan, 'study_plan'):
-                                            # Handle BaseModel StudyPlan
-                                            chapters = study_plan.study_plan
-                                            for chapter in chapters:
-                                                if hasattr(chapter, 'number') and chapter.number == active_chapter_num:
-                                                    if hasattr(chapter, 'sub_topics') and idx < len(chapter.sub_topics):
-                                                        chapter.sub_topics[idx].status = Status.COMPLETED
-                                                        chapter.sub_topics[idx].quizzes = existing_quizzes
-                                                    break
-                                    
-                                    # Save the updated status and quizzes
-                                    save_user_state(username, u)
-                                    print(Fore.GREEN + f"✓ Status=COMPLETED and quizzes saved for existing quiz subtopic '{subtopic_name}'", Fore.RESET)
-                                    break
-                            
-                            # Generate quiz if it doesn't exist
-                            print(Fore.YELLOW + f"No existing quiz found, generating new quiz...", Fore.RESET)
-                            
-                            # Get subtopic properties (handle both dict and object)
-                            if isinstance(active_chapter, dict):
-                                title = active_chapter.get("name", "")
-                            else:
-                                title = active_chapter.name
-                            
-                            if isinstance(subtopic, dict):
-                                summary = subtopic.get("sub_topic", "")
-                                text_chunk = subtopic.get("study_material", "")
+                            if existing_quizzes and isinstance(existing_quizzes, list) and isinstance(existing_quizzes[0], dict):
+                                print(Fore.CYAN + f"✓ Quiz already exists for this subtopic ({len(existing_quizzes)} questions), skipping generation", Fore.RESET)
+                                quizzes_d_ls = existing_quizzes
                             else:
-                                summary = subtopic.sub_topic
-                                text_chunk = subtopic.study_material
-                            
-                            print(Fore.YELLOW + f"Generating quiz with title='{title}', summary='{summary[:50]}...'", Fore.RESET)
-                            
-                            quizes_ls = get_quiz(title, summary, text_chunk, "")
-                            print(type(quizes_ls), quizes_ls)
-                            quizzes_d_ls = quiz_output_parser(quizes_ls)
-                            
-                            print(Fore.GREEN + f"Generated {len(quizzes_d_ls)} quizzes", Fore.RESET)
-                            
-                            # Store the generated quiz data for immediate UI use
-                            generated_quiz_data = quizzes_d_ls
-                            generated_subtopic_name = subtopic_name
+                                # The quiz bank may still be generating this chapter's quizzes
+                                quizzes_d_ls = get_banked_quizzes(username, idx)
                             
-                            # Update the subtopic with the quiz 
-                            if isinstance(subtopic, dict):
-                                subtopic["quizzes"] = quizzes_d_ls
-                                
-                            else:
-                                subtopic.quizzes = quizzes_d_ls
+                            if not quizzes_d_ls:
+                                print(Fore.YELLOW + f"No existing quiz found, generating new quiz...", Fore.RESET)
                                 
-                            
-                            # Also update status and quizzes in study_plan to keep both locations in sync
-                            if "study_plan" in u["curriculum"][0]:
-                                study_plan = u["curriculum"][0]["study_plan"]
-                                # Get active chapter number (handle both dict and object)
+                                # Get subtopic properties (handle both dict and object)
                                 if isinstance(active_chapter, dict):
-                                    active_chapter_num = active_chapter.get("number", -1)
+                                    title = active_chapter.get("name", "")
+                                else:
+                                    title = active_chapter.name
+                                
+                                if isinstance(subtopic, dict):
+                                    summary = subtopic.get("sub_topic", "")
+                                    text_chunk = subtopic.get("study_material", "")
                                 else:
-                                    active_chapter_num = active_chapter.number
+                                    summary = subtopic.sub_topic
+                                    text_chunk = subtopic.study_material
+                                
+                                print(Fore.YELLOW + f"Generating quiz with title='{title}', summary='{summary[:50]}...'", Fore.RESET)
                                 
-                                if isinstance(study_plan, dict) and "study_plan" in study_plan:
-                                    chapters = study_plan["study_plan"]
-                                    for chapter in chapters:
-                                        if isinstance(chapter, dict) and chapter.get("number") == active_chapter_num:
-                                            if "sub_topics" in chapter and idx < len(chapter["sub_topics"]):
-                                                chapter["sub_topics"][idx]["status"] = Status.COMPLETED.value
-                                                chapter["sub_topics"][idx]["quizzes"] = quizzes_d_ls
-                                            break
-                                elif hasattr(study_plan, 'study_plan'):
-                                    # Handle BaseModel StudyPlan
-                                    chapters = study_plan.study_plan
-                                    for chapter in chapters:
-                                        if hasattr(chapter, 'number') and chapter.number == active_chapter_num:
-                                            if hasattr(chapter, 'sub_topics') and idx < len(chapter.sub_topics):
-                                                chapter.sub_topics[idx].status = Status.COMPLETED
-                                                chapter.sub_topics[idx].quizzes = quizzes_d_ls
-                                            break
+                                quizzes_d_ls = generate_quizzes(title, summary, text_chunk)
+                                print(Fore.GREEN + f"Generated {len(quizzes_d_ls)} quizzes", Fore.RESET)
                             
-                            # Save the user state with updated quizzes AND status back to json file
-                            save_user_state(username, u)
-                            print(Fore.GREEN + f"✓ Quiz generated, status=COMPLETED, and study_plan updated for subtopic '{subtopic_name}'", Fore.RESET)
-                            print(Fore.CYAN + f"✓ Quiz data stored in memory for immediate UI display", Fore.RESET)
+                            # Store the quiz data for immediate UI use
+                            generated_quiz_data = quizzes_d_ls
+                            generated_subtopic_name = subtopic_name
+                            
+                            # Mark the subtopic COMPLETED and keep its quizzes in both the active
+                            # chapter and the study plan, applied to the latest state so quizzes
+                            # banked in the background meanwhile are not overwritten
+                            active_chapter_num = active_chapter.get("number", -1) if isinstance(active_chapter, dict) else active_chapter.number
+                            asyncio.run(set_subtopic_status(
+                                username, save_to, active_chapter_num, idx, Status.COMPLETED, quizzes_d_ls))
+                            print(Fore.GREEN + f"✓ Status=COMPLETED and quizzes saved for subtopic '{subtopic_name}'", Fore.RESET)
                             break
                     else:
                         print(Fore.RED + f"Warning: Could not find matching subtopic for '{subtopic_name}'", Fore.RESET)
@@ -802,39 +734,10 @@ def mark_topic_complete(checkbox_value, checkbox_index, unlocked_topics, expande
                             if subtopic_name in subtopic_text or subtopic_text in subtopic_name:
                                 print(Fore.GREEN + f"Found matching subtopic at index {idx} to unmark", Fore.RESET)
                                 
-                                # Update the subtopic status back to NA or STARTED
-                                if isinstance(subtopic, dict):
-                                    subtopic["status"] = Status.NA.value
-                                else:
-                                    subtopic.status = Status.NA
-                                
-                                # Also update status in study_plan to keep both locations in sync
-                                if "study_plan" in u["curriculum"][0]:
-                                    study_plan = u["curriculum"][0]["study_plan"]
-                                    # Get active chapter number (handle both dict and object)
-                                    if isinstance(active_chapter, dict):
-                                        active_chapter_num = active_chapter.get("number", -1)
-                                    else:
-                                        active_chapter_num = active_chapter.number
-                                    
-                                    if isinstance(study_plan, dict) and "study_plan" in study_plan:
-                                        chapters = study_plan["study_plan"]
-                                        for chapter in chapters:
-                                            if isinstance(chapter, dict) and chapter.get("number") == active_chapter_num:
-                                                if "sub_topics" in chapter and idx < len(chapter["sub_topics"]):
-                                                    chapter["sub_topics"][idx]["status"] = Status.NA.value
-                                                break
-                                    elif hasattr(study_plan, 'study_plan'):
-                                        # Handle BaseModel StudyPlan
-                                        chapters = study_plan.study_plan
-                                        for chapter in chapters:
-                                            if hasattr(chapter, 'number') and chapter.number == active_chapter_num:
-                                                if hasattr(chapter, 'sub_topics') and idx < len(chapter.sub_topics):
-                                                    chapter.sub_topics[idx].status = Status.NA
-                                                break
-                                
-                                # Save the updated status
-                                save_user_state(username, u)
+                                # Set status NA in the active chapter and the study plan, applied
+                                # to the latest state so concurrent writes are not overwritten
+                                active_chapter_num = active_chapter.get("number", -1) if isinstance(active_chapter, dict) else active_chapter.number
+                                asyncio.run(set_subtopic_status(username, save_to, active_chapter_num, idx, Status.NA))
                                 print(Fore.GREEN + f"✓ Status=NA saved for unmarked subtopic '{subtopic_name}'", Fore.RESET)
                                 break
                 except Exception as e:
@@ -875,7 +778,8 @@ def mark_topic_complete(checkbox_value, checkbox_index, unlocked_topics, expande
     if checkbox_value and topic_name.startswith("  ↳ ") and generated_quiz_data:
         print(Fore.CYAN + f"Using generated quiz data from memory for UI display", Fore.RESET)
         try:
-            quiz_list = generated_quiz_data
+            # The quiz tab has 10 question slots; quizzes stored before QUIZ_MAX_QUESTIONS may be longer
+            quiz_list = generated_quiz_data[:10]
             print(Fore.GREEN + f"Loading {len(quiz_list)} quizzes for display", Fore.RESET)
             
             # Create quiz UI components
@@ -950,11 +854,50 @@ def mark_topic_complete(checkbox_value, checkbox_index, unlocked_topics, expande
              gr.Button(visible=False, interactive=False)])  # next_chapter_btn (not used)
 
 
+def _next_chapter_status_outputs(status_markdown, unlocked_topics, expanded_topics, completed_topics):
+    """go_to_next_chapter outputs that only show a status message and keep Next Chapter clickable."""
+    return ([gr.update() for _ in range(10)] + [gr.update() for _ in range(10)] +
+            [gr.Accordion(visible=True), gr.Markdown(value=status_markdown), unlocked_topics, expanded_topics,
+             completed_topics, gr.update(), gr.Button(visible=True, interactive=True)])
+
+
 def go_to_next_chapter(unlocked_topics, expanded_topics, completed_topics, username):
+    """Follow the next-chapter build queued by check_answers, then show the new chapter.
+    
+    The build is followed for at most JOB_WAIT_SECONDS; if it is still running
+    the user is asked to click Next Chapter again later.
+    """
+    build = get_job_queue().latest(username, "next_chapter")
+    if build is not None and build["status"] == "failed":
+        # Resumes from the build's checkpoint
+        params = build["params"]
+        print(Fore.YELLOW + f"Next chapter build failed ({build['error']}), resubmitting", Fore.RESET)
+        build = get_job_queue().get(submit_next_chapter_job(username, params["save_to"], params["from_chapter"]))
+    if build is not None and build["status"] in ACTIVE_STATES:
+        for build in _follow_job(build["id"]):
+            if build is None:
+                break
+            desc = build["message"] or "Building the next chapter..."
+            yield _next_chapter_status_outputs(f"⏳ **Building the next chapter ({build['progress']:.0%})** – {desc}",
+                                               unlocked_topics, expanded_topics, completed_topics)
+        if build is not None and build["status"] in ACTIVE_STATES:
+            yield _next_chapter_status_outputs(
+                f"⏳ **Still building the next chapter ({build['progress']:.0%}).** This continues in the background; "
+                "click Next Chapter again in a few minutes.", unlocked_topics, expanded_topics, completed_topics)
+            return
+        if build is not None and build["status"] == "failed":
+            yield _next_chapter_status_outputs(
+                f"❌ **Building the next chapter failed:** {build['error']}. Click Next Chapter to retry.",
+                unlocked_topics, expanded_topics, completed_topics)
+            return
+    yield _load_next_chapter(unlocked_topics, expanded_topics, completed_topics, username)
+
+
+def _load_next_chapter(unlocked_topics, expanded_topics, completed_topics, username):
     """Load and display the next chapter after user passes the quiz.
     
     This function:
-    1. Reloads the user state (which was updated by move_to_next_chapter in check_answers)
+    1. Reloads the user state (which was updated by the next-chapter job queued in check_answers)
     2. Extracts the new active chapter and its subtopics
     3. Updates the curriculum UI to show the new chapter
     4. Resets quiz components
@@ -1147,7 +1090,7 @@ def check_answers(chapter_name, total_questions, unlocked_topics, expanded_topic
                 # Check if this subtopic matches the chapter_name
                 if chapter_name in subtopic_text or subtopic_text in chapter_name:
                     if hasattr(subtopic, 'quizzes') and subtopic.quizzes:
-                        quiz_questions = subtopic.quizzes
+                        quiz_questions = subtopic.quizzes[:10]  # one per quiz slot, as shown
                         print(Fore.GREEN + f"Loaded {len(quiz_questions)} quizzes for grading", Fore.RESET)
                         break
     except Exception as e:
@@ -1214,8 +1157,10 @@ def check_answers(chapter_name, total_questions, unlocked_topics, expanded_topic
         
         ## if pass and there are more chapters, then generate & build the next chapter
         if has_next_chapter:
-            new_user_state = asyncio.run(move_to_next_chapter(username, save_to))
-            print(Fore.LIGHTGREEN_EX + f"✓ Moving to next chapter..." + Fore.RESET)
+            active_info = chapter_summary(curriculum_data.get("active_chapter"))
+            # Built in the background; go_to_next_chapter follows the job when Next Chapter is clicked
+            job_id = submit_next_chapter_job(username, save_to, active_info["number"])
+            print(Fore.LIGHTGREEN_EX + f"✓ Building next chapter in the background (job {job_id})..." + Fore.RESET)
         else:
             print(Fore.GREEN + "🎉 Congratulations! All chapters and subtopics have been completed!" + Fore.RESET)
         
@@ -1266,10 +1211,157 @@ def check_answers(chapter_name, total_questions, unlocked_topics, expanded_topic
 # Note: go_to_next_chapter removed - users now manually check boxes to mark completion
 
 
+def _study_buddy_context(user_state, active_chapter, next_chapter, buddy_pref, memory_context, history_summary):
+    """Keyword arguments of study_buddy_response for the user's current sub-topic, without user_input.
+
+    Returns None if there is no active chapter.
+    """
+    if not active_chapter:
+        return None
+    user_preference = user_state.get("study_buddy_preference", buddy_pref if buddy_pref else "friendly and supportive")
+    chapter_name = active_chapter.get("name", "Unknown Chapter") if isinstance(active_chapter, dict) else active_chapter.name
+    sub_topics = active_chapter.get("sub_topics", []) if isinstance(active_chapter, dict) else active_chapter.sub_topics
+    
+    # Check if user has completed all chapters
+    if next_chapter is None:
+        study_buddy_name = user_state.get("study_buddy_name", "Study Buddy")
+        
+        # Get last subtopic details for context
+        if sub_topics and len(sub_topics) > 0:
+            last_subtopic = sub_topics[-1]
+            sub_topic = last_subtopic.get("sub_topic", "Unknown") if isinstance(last_subtopic, dict) else last_subtopic.sub_topic
+            
+            # Plain text and image manifest precomputed from display_markdown (contains images)
+            material_index = get_material_index(last_subtopic)
+            study_material = material_index["text"] or "No material available."
+            
+            list_of_quizzes = last_subtopic.get("quizzes", []) if isinstance(last_subtopic, dict) else last_subtopic.quizzes
+        else:
+            sub_topic = "General"
+            study_material = "All curriculum completed."
+            list_of_quizzes = []
+            material_index = None
+        
+        # Completion instructions and memory are their own prompt section, so fitting
+        # the material to its budget never trims them
+        completion_context = f"""🎉 CURRICULUM COMPLETED! 🎉
+
+You have successfully finished all chapters and subtopics in your study plan! This is an outstanding achievement.
+
+The user has completed their entire curriculum. While answering their question, acknowledge their completion and provide helpful, encouraging responses. You can help them review any topics, clarify concepts, or discuss what they've learned. The study material above is from the last completed subtopic, for reference.
+
+Last completed chapter: {chapter_name}
+Last completed subtopic: {sub_topic}
+
+{memory_context}
+
+{history_summary}"""
+        
+        return dict(
+            chapter_name=f"✅ All Chapters Completed",
+            sub_topic=f"Review & Discussion",
+            study_material=study_material,
+            list_of_quizzes=list_of_quizzes,
+            study_buddy_name=study_buddy_name,
+            user_preference=user_preference,
+            material_index=material_index,
+            context=completion_context.strip()
+        )
+    
+    if not sub_topics or len(sub_topics) == 0:
+        sub_topic = "General"
+        study_material = "No study material available yet."
+        list_of_quizzes = []
+        material_index = None
+    else:
+        # Get first subtopic details (could be extended to track current active subtopic)
+        first_subtopic = sub_topics[0]
+        sub_topic = first_subtopic.get("sub_topic", "Unknown") if isinstance(first_subtopic, dict) else first_subtopic.sub_topic
+        
+        # Plain text and image manifest precomputed from display_markdown (contains images)
+        material_index = get_material_index(first_subtopic)
+        study_material = material_index["text"] or "No material available."
+        
+        list_of_quizzes = first_subtopic.get("quizzes", []) if isinstance(first_subtopic, dict) else first_subtopic.quizzes
+    
+    # Memory context goes in its own prompt section, already fitted to the memory budget
+    context = ""
+    if memory_context:
+        context = f"""{memory_context}
+
+{history_summary}""".strip()
+    
+    return dict(
+        chapter_name=chapter_name,
+        sub_topic=sub_topic,
+        study_material=study_material,
+        list_of_quizzes=list_of_quizzes,
+        study_buddy_name="Study Buddy",
+        user_preference=user_preference,
+        material_index=material_index,
+        context=context
+    )
+
+
+# Memory processing runs after the reply is shown, in order per user and in parallel across users
+_memory_executor = KeyedExecutor(max_workers=MEMORY_WORKERS, max_pending=MEMORY_MAX_PENDING, name="chat-memory")
+
+
+def _iterate_async(agen):
+    """Iterate an async generator from a sync Gradio handler, on a private event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(agen.aclose())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+
+def _process_memory(memory_ops, message, bot_response, username, chapter_name):
+    """Run a chat turn through the memory system (fact extraction, routing, summaries)."""
+    try:
+        memory_result = asyncio.run(
+            memory_ops.process_message(
+                message=message,
+                bot_response=bot_response,
+                context={
+                    "username": username,
+                    "chapter": chapter_name,
+                }
+            )
+        )
+        print(Fore.GREEN + f"✓ Memory processed: {memory_result['turns']} turns, {len(memory_result['memory_items'])} items saved", Fore.RESET)
+        print(Fore.CYAN + f"  Memory operation: {memory_result['mem_ops']}", Fore.RESET)
+        if memory_result['recalled_memories']:
+            print(Fore.MAGENTA + f"  Recalled {len(memory_result['recalled_memories'])} relevant memories", Fore.RESET)
+    except Exception as e:
+        error_msg = str(e)
+        if "429" in error_msg or "Too Many Requests" in error_msg:
+            print(Fore.YELLOW + f"⚠️  Rate limit encountered during memory processing. Memory will be saved on next message.", Fore.RESET)
+        else:
+            print(Fore.RED + f"Error processing memory: {e}", Fore.RESET)
+            import traceback
+            traceback.print_exc()
+
+
 def send_message(message, history, buddy_pref, username):
-    """Handle chat messages with study buddy using AI-powered responses with memory"""
+    """Handle chat messages with study buddy using AI-powered responses with memory.
+
+    A generator: yields (message box, history, calendar file, calendar status,
+    calendar preview) with the user's message first, then the study buddy's
+    answer as it streams in.
+    """
     if not message.strip():
-        return "", history, None, None, None
+        yield "", history, None, None, None
+        return
+    
+    user_turn = {"role": "user", "content": message}
+    yield "", history + [user_turn], None, None, None
     
     # Initialize calendar data (will be populated if calendar route is taken)
     calendar_file_path = None
@@ -1292,28 +1384,15 @@ def send_message(message, history, buddy_pref, username):
     sub_topic_for_routing = None
     
     try:
-        user_state = load_user_state(username)
-        if user_state and "curriculum" in user_state and len(user_state["curriculum"]) > 0:
-            # Extract context from user state
-            curriculum = user_state["curriculum"][0]
-            active_chapter = curriculum.get("active_chapter")
+        # Only chapter metadata is needed here; this reads the curriculum index, not the chapter shards
+        active_chapter_info = load_active_chapter_info(username)
+        if active_chapter_info:
+            chapter_name_for_routing = active_chapter_info.get("name") or "Unknown Chapter"
             
-            if active_chapter:
-                # Get chapter name
-                if isinstance(active_chapter, dict):
-                    chapter_name_for_routing = active_chapter.get("name", "Unknown Chapter")
-                    sub_topics = active_chapter.get("sub_topics", [])
-                else:
-                    chapter_name_for_routing = active_chapter.name if hasattr(active_chapter, 'name') else "Unknown Chapter"
-                    sub_topics = active_chapter.sub_topics if hasattr(active_chapter, 'sub_topics') else []
-                
-                # Get first subtopic (or could track current active subtopic)
-                if sub_topics and len(sub_topics) > 0:
-                    first_subtopic = sub_topics[0]
-                    if isinstance(first_subtopic, dict):
-                        sub_topic_for_routing = first_subtopic.get("sub_topic", "Unknown Sub-topic")
-                    else:
-                        sub_topic_for_routing = first_subtopic.sub_topic if hasattr(first_subtopic, 'sub_topic') else "Unknown Sub-topic"
+            # Get first subtopic (or could track current active subtopic)
+            sub_topics = active_chapter_info.get("sub_topics") or []
+            if sub_topics:
+                sub_topic_for_routing = sub_topics[0] or "Unknown Sub-topic"
     except Exception as e:
         print(Fore.YELLOW + f"⚠️  Failed to load study context for routing: {e}" + Fore.RESET)
     
@@ -1324,20 +1403,37 @@ def send_message(message, history, buddy_pref, username):
             role = msg.get("role", "user")
             content = msg.get("content", "")
             chat_history_str += f"{role}: {content}\n"
+    chat_history_str = get_prompt_budget().fit_history(chat_history_str)
     
-    # Route the query to determine intent with chapter context
-    try:
-        print(Fore.CYAN + f"🔀 Routing query: '{message[:50]}...'" + Fore.RESET)
-        route_classification = query_routing(
-            message, 
-            chat_history_str,
-            chapter_name=chapter_name_for_routing,
-            sub_topic=sub_topic_for_routing
-        ).strip().lower()
-        print(Fore.CYAN + f"✓ Query classified as: {route_classification}" + Fore.RESET)
-    except Exception as e:
-        print(Fore.YELLOW + f"⚠️  Routing failed: {e}. Defaulting to study_material." + Fore.RESET)
-        route_classification = "study_material"
+    def _route_separately():
+        # Route the query to determine intent with chapter context
+        try:
+            print(Fore.CYAN + f"🔀 Routing query: '{message[:50]}...'" + Fore.RESET)
+            route_classification = query_routing(
+                message, 
+                chat_history_str,
+                chapter_name=chapter_name_for_routing,
+                sub_topic=sub_topic_for_routing,
+                local=False
+            ).strip().lower()
+            print(Fore.CYAN + f"✓ Query classified as: {route_classification}" + Fore.RESET)
+        except Exception as e:
+            print(Fore.YELLOW + f"⚠️  Routing failed: {e}. Defaulting to study_material." + Fore.RESET)
+            route_classification = "study_material"
+        return route_classification
+    
+    # A confident local classification needs no LLM routing at all; otherwise, in
+    # combined mode the study buddy call below classifies and answers in one pass
+    local_prediction = classify_locally(message, chapter_name_for_routing, sub_topic_for_routing)
+    if local_prediction.intent is not None:
+        route_classification = local_prediction.intent
+        print(Fore.CYAN + f"✓ Query classified locally ({local_prediction.source}, {local_prediction.confidence:.2f}): {route_classification}" + Fore.RESET)
+    elif STUDY_BUDDY_ROUTING == "combined":
+        route_classification = None
+    else:
+        route_classification = _route_separately()
+    routed_answer = None
+    active_chapter = None
     
     # Load user state to get current context
     try:
@@ -1356,8 +1452,8 @@ def send_message(message, history, buddy_pref, username):
             history_summary = ""
             if memory_ops:
                 try:
-                    memory_context = memory_ops.get_memory_context(message)
-                    history_summary = memory_ops.get_history_summary()
+                    memory_context, history_summary = get_prompt_budget().fit_memory(
+                        memory_ops.get_memory_context(message), memory_ops.get_history_summary())
                     if memory_context:
                         print(Fore.MAGENTA + f"✓ Added memory context to prompt", Fore.RESET)
                     if history_summary:
@@ -1365,8 +1461,30 @@ def send_message(message, history, buddy_pref, username):
                 except Exception as e:
                     print(Fore.YELLOW + f"Error getting memory context: {e}", Fore.RESET)
             
+            study_context = _study_buddy_context(user_state, active_chapter, next_chapter, buddy_pref, memory_context, history_summary)
+            if route_classification is None:
+                if study_context is None:
+                    route_classification = _route_separately()
+                else:
+                    try:
+                        routed_answer = ""
+                        for route_classification, delta in _iterate_async(stream_routed_study_buddy_response(
+                                **study_context, user_input=message, chat_history=chat_history_str)):
+                            if route_classification in ("supplement", "book_calendar"):
+                                # The tool handlers below answer these
+                                break
+                            routed_answer += delta
+                            yield "", history + [user_turn, {"role": "assistant", "content": routed_answer}], None, None, None
+                    except Exception as e:
+                        print(Fore.YELLOW + f"⚠️  Single-pass routing failed: {e}. Routing separately." + Fore.RESET)
+                        routed_answer = None
+                        route_classification = _route_separately()
+            
             # ============= ROUTE BASED ON CLASSIFICATION =================
-            if "chitchat" in route_classification:
+            if "chitchat" in route_classification and routed_answer:
+                # The single-pass call already answered the chitchat
+                bot_response = routed_answer
+            elif "chitchat" in route_classification:
                 # Handle chitchat queries with simple, friendly response
                 print(Fore.CYAN + "📢 Using chitchat handler..." + Fore.RESET)
                 
@@ -1448,9 +1566,11 @@ Essential keywords:"""
                 
                 # Search YouTube with clean keywords
                 print(Fore.YELLOW + f"🔍 Searching YouTube for keywords: '{search_query}'" + Fore.RESET)
+                searching = f"🔍 Searching YouTube for *{search_query}*…"
+                yield "", history + [user_turn, {"role": "assistant", "content": searching}], None, None, None
                 top_video = None
                 try:
-                    top_video = fetch_most_relevant_youtube_video(search_query, search_limit=15)
+                    top_video = asyncio.run(fetch_most_relevant_youtube_video_async(search_query, search_limit=15))
                     if top_video:
                         print(Fore.GREEN + f"✓ Found video: {top_video['title']}" + Fore.RESET)
                         print(Fore.GREEN + f"  URL: {top_video['url']}" + Fore.RESET)
@@ -1545,161 +1665,38 @@ You can try using the **"📅 Quick Calendar Event"** section in the left sideba
                 # Handle study material queries with full context (existing implementation)
                 print(Fore.CYAN + "📚 Using study material handler..." + Fore.RESET)
             
-            # Check if user has completed all chapters
-            if next_chapter is None and active_chapter and "study_material" in route_classification:
-                # User has completed all chapters!
-                user_preference = user_state.get("study_buddy_preference", buddy_pref if buddy_pref else "friendly and supportive")
-                study_buddy_name = user_state.get("study_buddy_name", "Study Buddy")
-                
-                # Get the last chapter details for context
-                chapter_name = active_chapter.get("name", "Unknown Chapter") if isinstance(active_chapter, dict) else active_chapter.name
-                sub_topics = active_chapter.get("sub_topics", []) if isinstance(active_chapter, dict) else active_chapter.sub_topics
-                
-                # Get last subtopic details for context
-                if sub_topics and len(sub_topics) > 0:
-                    last_subtopic = sub_topics[-1]
-                    sub_topic = last_subtopic.get("sub_topic", "Unknown") if isinstance(last_subtopic, dict) else last_subtopic.sub_topic
-                    
-                    # Try to get display_markdown first (contains images), fallback to study_material
-                    if isinstance(last_subtopic, dict):
-                        study_material = last_subtopic.get("display_markdown") or last_subtopic.get("study_material", "No material available.")
-                    else:
-                        study_material = getattr(last_subtopic, 'display_markdown', None) or getattr(last_subtopic, 'study_material', "No material available.")
-                    
-                    list_of_quizzes = last_subtopic.get("quizzes", []) if isinstance(last_subtopic, dict) else last_subtopic.quizzes
-                else:
-                    sub_topic = "General"
-                    study_material = "All curriculum completed."
-                    list_of_quizzes = []
-                
-                # Create a special study material context indicating completion
-                completion_context = f"""🎉 CURRICULUM COMPLETED! 🎉
-
-You have successfully finished all chapters and subtopics in your study plan! This is an outstanding achievement.
-
-The user has completed their entire curriculum. While answering their question, acknowledge their completion and provide helpful, encouraging responses. You can help them review any topics, clarify concepts, or discuss what they've learned.
-
-Last completed chapter: {chapter_name}
-Last completed subtopic: {sub_topic}
-
-Previous study material for reference:
-{study_material}
-
-{memory_context}
-
-{history_summary}"""
-                
-                # Call study buddy with completion context
-                bot_response = study_buddy_response(
-                    chapter_name=f"✅ All Chapters Completed",
-                    sub_topic=f"Review & Discussion",
-                    study_material=completion_context,
-                    list_of_quizzes=list_of_quizzes,
-                    user_input=message,
-                    study_buddy_name=study_buddy_name,
-                    user_preference=user_preference
-                )
-                
-            elif not active_chapter and "study_material" in route_classification:
+            if not active_chapter and "study_material" in route_classification:
                 bot_response = "Please select a chapter to start studying first!"
             elif "study_material" in route_classification:
-                # Get chapter details
-                chapter_name = active_chapter.get("name", "Unknown Chapter") if isinstance(active_chapter, dict) else active_chapter.name
-                
-                # Get first subtopic (or could be modified to track current subtopic)
-                sub_topics = active_chapter.get("sub_topics", []) if isinstance(active_chapter, dict) else active_chapter.sub_topics
-                
-                if not sub_topics or len(sub_topics) == 0:
-                    sub_topic = "General"
-                    study_material = "No study material available yet."
-                    list_of_quizzes = []
+                if routed_answer:
+                    bot_response = routed_answer
                 else:
-                    # Get first subtopic details (could be extended to track current active subtopic)
-                    first_subtopic = sub_topics[0]
-                    sub_topic = first_subtopic.get("sub_topic", "Unknown") if isinstance(first_subtopic, dict) else first_subtopic.sub_topic
-                    
-                    # Try to get display_markdown first (contains images), fallback to study_material
-                    if isinstance(first_subtopic, dict):
-                        study_material = first_subtopic.get("display_markdown") or first_subtopic.get("study_material", "No material available.")
-                    else:
-                        study_material = getattr(first_subtopic, 'display_markdown', None) or getattr(first_subtopic, 'study_material', "No material available.")
-                    
-                    list_of_quizzes = first_subtopic.get("quizzes", []) if isinstance(first_subtopic, dict) else first_subtopic.quizzes
-                
-                # Get study buddy preference
-                user_preference = user_state.get("study_buddy_preference", buddy_pref if buddy_pref else "friendly and supportive")
-                
-                # Enhance study material with memory context
-                enhanced_study_material = study_material
-                if memory_context:
-                    enhanced_study_material = f"""{study_material}
-
----
-{memory_context}
-
-{history_summary}"""
-                
-                # Call the study buddy response function with enhanced context
-                bot_response = study_buddy_response(
-                    chapter_name=chapter_name,
-                    sub_topic=sub_topic,
-                    study_material=enhanced_study_material,
-                    list_of_quizzes=list_of_quizzes,
-                    user_input=message,
-                    study_buddy_name="Study Buddy",
-                    user_preference=user_preference
-                )
+                    # Stream the study buddy response with enhanced context
+                    bot_response = ""
+                    for delta in _iterate_async(stream_study_buddy_response(**study_context, user_input=message)):
+                        bot_response += delta
+                        yield "", history + [user_turn, {"role": "assistant", "content": bot_response}], None, None, None
         
-        # Process message through memory system (with LLM-based fact extraction & routing)
-        if memory_ops:
-            try:
-                # Process message and response through memory asynchronously
-                # This will:
-                # 1. Extract facts using LLM (with rate limiting)
-                # 2. Route to appropriate memory operation (search_memory or no_operation)
-                # 3. Save memories to JSON file
-                # 4. Summarize conversation every 3 turns
-                
-                # Get chapter name - active_chapter could be Chapter object or dict
-                chapter_name_for_memory = None
-                if active_chapter:
-                    if isinstance(active_chapter, dict):
-                        chapter_name_for_memory = active_chapter.get("name")
-                    else:
-                        chapter_name_for_memory = active_chapter.name if hasattr(active_chapter, 'name') else None
-                
-                memory_result = asyncio.run(
-                    memory_ops.process_message(
-                        message=message,
-                        bot_response=bot_response,
-                        context={
-                            "username": username,
-                            "chapter": chapter_name_for_memory,
-                        }
-                    )
-                )
-                print(Fore.GREEN + f"✓ Memory processed: {memory_result['turns']} turns, {len(memory_result['memory_items'])} items saved", Fore.RESET)
-                print(Fore.CYAN + f"  Memory operation: {memory_result['mem_ops']}", Fore.RESET)
-                if memory_result['recalled_memories']:
-                    print(Fore.MAGENTA + f"  Recalled {len(memory_result['recalled_memories'])} relevant memories", Fore.RESET)
-            except Exception as e:
-                error_msg = str(e)
-                if "429" in error_msg or "Too Many Requests" in error_msg:
-                    print(Fore.YELLOW + f"⚠️  Rate limit encountered during memory processing. Memory will be saved on next message.", Fore.RESET)
-                else:
-                    print(Fore.RED + f"Error processing memory: {e}", Fore.RESET)
-                    import traceback
-                    traceback.print_exc()
-                
     except Exception as e:
         print(Fore.RED + f"Error in send_message: {e}", Fore.RESET)
         import traceback
         traceback.print_exc()
         bot_response = "I encountered an error while processing your message. Please try again."
     
-    history.append({"role": "user", "content": message})
+    # Process message through memory system (with LLM-based fact extraction & routing)
+    # in the background, so the next message is not held up by it
+    if memory_ops:
+        chapter_name_for_memory = None
+        if active_chapter:
+            if isinstance(active_chapter, dict):
+                chapter_name_for_memory = active_chapter.get("name")
+            else:
+                chapter_name_for_memory = active_chapter.name if hasattr(active_chapter, 'name') else None
+        _memory_executor.submit(username, _process_memory, memory_ops, message, bot_response, username, chapter_name_for_memory)
+    
+    history.append(user_turn)
     history.append({"role": "assistant", "content": bot_response})
-    return "", history, calendar_file_path, calendar_status_msg, calendar_preview_text
+    yield "", history, calendar_file_path, calendar_status_msg, calendar_preview_text
 
 
 def submit_feedback(feedback_text):
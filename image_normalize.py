@@ -0,0 +1,188 @@
+"""
+Image normalisation shared by the VLM and display paths.
+
+Base64 images from RAG citations were forwarded to the VLM at their original
+resolution, always labelled `image/jpeg` even when they were PNG, and stored
+for display unchanged. `normalize_image` is the single stage both paths now
+go through:
+
+    1. detect the real format from the file signature
+    2. downscale so the longest side is at most IMAGE_MAX_SIDE
+    3. re-encode as IMAGE_FORMAT ("webp" or "jpeg") at IMAGE_QUALITY
+
+Results are cached by the sha256 of the source bytes and the settings, so a
+citation image that is described by the VLM and stored for display is only
+decoded and encoded once. Animated GIFs, and images that are already small
+enough and would only grow when re-encoded, are passed through unchanged.
+
+Usage:
+    from image_normalize import normalize_image
+
+    image = normalize_image(raw_bytes)
+    image.data_url()                          # for a VLM image_url part
+    get_asset_store().put_bytes(image.data, image.format)
+"""
+
+import base64
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from errors import ImageProcessingError
+
+# Longest side of a normalised image, in pixels
+IMAGE_MAX_SIDE = int(os.environ.get("IMAGE_MAX_SIDE", "1024"))
+# Output format: "webp" or "jpeg"
+IMAGE_FORMAT = os.environ.get("IMAGE_FORMAT", "webp").lower()
+# Encoder quality, 1-100
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", "80"))
+# Normalised images kept in memory
+IMAGE_CACHE_SIZE = int(os.environ.get("IMAGE_CACHE_SIZE", "256"))
+
+MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "bmp": "image/bmp",
+}
+
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+)
+
+_cache: "OrderedDict[Tuple[str, int, str, int], NormalizedImage]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def detect_format(data: bytes) -> Optional[str]:
+    """Image format from the file signature ("png", "jpeg", "gif", "webp", "bmp"), or None."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    for signature, fmt in _SIGNATURES:
+        if data.startswith(signature):
+            return fmt
+    return None
+
+
+def detect_base64_format(b64: str) -> Optional[str]:
+    """detect_format for a base64 string; only its first bytes are decoded."""
+    head = "".join(b64[:64].split())
+    try:
+        return detect_format(base64.b64decode(head[:len(head) // 4 * 4]))
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class NormalizedImage:
+    data: bytes
+    format: str
+    width: int
+    height: int
+    source_format: Optional[str]
+
+    @property
+    def mime(self) -> str:
+        return MIME_TYPES.get(self.format, "application/octet-stream")
+
+    @property
+    def base64(self) -> str:
+        return base64.b64encode(self.data).decode("ascii")
+
+    def data_url(self) -> str:
+        return f"data:{self.mime};base64,{self.base64}"
+
+
+def _encode(image, fmt: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "jpeg":
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    else:
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def _normalize(data: bytes, max_side: int, fmt: str, quality: int) -> NormalizedImage:
+    from PIL import Image, UnidentifiedImageError
+
+    source_format = detect_format(data)
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        raise ImageProcessingError(f"Cannot decode image: {e}", source_format=source_format) from e
+
+    width, height = image.size
+    if getattr(image, "is_animated", False):
+        return NormalizedImage(data, source_format or "gif", width, height, source_format)
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if fmt == "jpeg" and has_alpha:
+        # JPEG has no alpha channel; flatten onto white like a page would show it
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    if max(width, height) > max_side:
+        image.thumbnail((max_side, max_side))
+    elif source_format in ("png", "jpeg", "webp") and len(data) <= max_side * max_side // 8:
+        # Small images are not worth a lossy round trip
+        return NormalizedImage(data, source_format, width, height, source_format)
+
+    try:
+        encoded = _encode(image, fmt, quality)
+    except (OSError, ValueError) as e:
+        raise ImageProcessingError(f"Cannot encode image as {fmt}: {e}", source_format=source_format) from e
+    if len(encoded) >= len(data) and image.size == (width, height) and source_format in MIME_TYPES:
+        return NormalizedImage(data, source_format, width, height, source_format)
+    return NormalizedImage(encoded, fmt, image.size[0], image.size[1], source_format)
+
+
+def normalize_image(data: bytes, max_side: Optional[int] = None, fmt: Optional[str] = None,
+                    quality: Optional[int] = None) -> NormalizedImage:
+    """Downscale and re-encode an image, cached by the hash of its bytes and the settings.
+
+    Args:
+        data: Image bytes in any format Pillow reads
+        max_side: Longest side in pixels (default IMAGE_MAX_SIDE); images are never upscaled
+        fmt: "webp" or "jpeg" (default IMAGE_FORMAT)
+        quality: Encoder quality (default IMAGE_QUALITY)
+
+    Raises:
+        ImageProcessingError: If the bytes are not a decodable image
+    """
+    max_side = max_side or IMAGE_MAX_SIDE
+    fmt = "jpeg" if (fmt or IMAGE_FORMAT) in ("jpg", "jpeg") else "webp"
+    quality = quality or IMAGE_QUALITY
+    key = (hashlib.sha256(data).hexdigest(), max_side, fmt, quality)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    result = _normalize(data, max_side, fmt, quality)
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > IMAGE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def normalize_base64(b64: str, **kwargs) -> NormalizedImage:
+    """normalize_image for a base64 string."""
+    try:
+        data = base64.b64decode("".join(b64.split()), validate=True)
+    except ValueError as e:
+        raise ImageProcessingError(f"Invalid base64 image payload: {e}") from e
+    return normalize_image(data, **kwargs)
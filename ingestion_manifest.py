@@ -0,0 +1,164 @@
+"""
+Content-hash manifest of the documents ingested into a NeMo Retriever collection.
+
+The upload flow used to decide what was "already processed" by comparing temp
+file paths against `<username>_files.txt`, which never matched, so every upload
+re-embedded the same PDFs. The manifest records the sha256 of each ingested
+document instead, and survives restarts because it lives next to the user data.
+
+Layout:
+    save_to/
+    └── ingestion/
+        └── <collection>.json    # {"collection": ..., "documents": {name: {sha256, size, ingested_at}}}
+
+Documents are keyed by file name, because that is how the ingestor identifies
+them. A file whose name and hash are already recorded is skipped, a known name
+with a new hash is re-ingested (PATCH), and a new name whose bytes are already
+in the collection under another name is skipped as a duplicate.
+
+Usage:
+    from ingestion_manifest import IngestionManifest
+
+    manifest = IngestionManifest.for_collection("babe")
+    plan = manifest.plan(["/workspace/mnt/pdfs/babe/ch1.pdf"])
+    ...  # POST plan.new, PATCH plan.changed
+    manifest.record(plan.new + plan.changed, plan.hashes)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import user_store
+from states import atomic_write_bytes
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+_manifest_locks: Dict[Path, threading.Lock] = {}
+_manifest_locks_lock = threading.Lock()
+
+
+def file_sha256(path: str) -> str:
+    """Hash a file in chunks so large PDFs are never read into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_hashes(paths: List[str]) -> Dict[str, str]:
+    """sha256 of each file by file name; the first path wins for repeated names."""
+    hashes: Dict[str, str] = {}
+    for path in paths:
+        name = os.path.basename(path)
+        if name not in hashes:
+            hashes[name] = file_sha256(path)
+    return hashes
+
+
+@dataclass
+class IngestionPlan:
+    """What to do with each file of an upload request."""
+
+    new: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    hashes: Dict[str, str] = field(default_factory=dict)
+
+
+class IngestionManifest:
+    """Ingested-document manifest of one collection, persisted as JSON."""
+
+    def __init__(self, path: str, collection: str):
+        self.path = Path(path)
+        self.collection = collection
+        with _manifest_locks_lock:
+            self._lock = _manifest_locks.setdefault(self.path, threading.Lock())
+
+    @classmethod
+    def for_collection(cls, collection: str, save_to: Optional[str] = None) -> "IngestionManifest":
+        """Manifest for a collection under `save_to` (default: user_store.DEFAULT_SAVE_TO)."""
+        root = Path(save_to if save_to is not None else user_store.DEFAULT_SAVE_TO)
+        return cls(root / "ingestion" / f"{collection}.json", collection)
+
+    def documents(self) -> Dict[str, dict]:
+        """Recorded documents by file name; empty if nothing was ingested yet."""
+        try:
+            with open(self.path, "rb") as f:
+                return json.loads(f.read()).get("documents", {})
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, AttributeError):
+            # A corrupt manifest only costs a re-ingest, never a lost document
+            return {}
+
+    def plan(self, paths: List[str], hashes: Optional[Dict[str, str]] = None) -> IngestionPlan:
+        """Split `paths` into new, changed and unchanged documents by content hash.
+
+        `hashes` (see `file_hashes`) skips hashing files whose digest is already known.
+        """
+        hashes = hashes or {}
+        documents = self.documents()
+        known_hashes = {entry.get("sha256") for entry in documents.values()}
+        result = IngestionPlan()
+        for path in paths:
+            name = os.path.basename(path)
+            if name in result.hashes:
+                result.unchanged.append(path)
+                continue
+            digest = result.hashes[name] = hashes.get(name) or file_sha256(path)
+            entry = documents.get(name)
+            if entry is not None and entry.get("sha256") == digest:
+                result.unchanged.append(path)
+            elif entry is not None:
+                result.changed.append(path)
+            elif digest in known_hashes:
+                result.unchanged.append(path)
+            else:
+                known_hashes.add(digest)
+                result.new.append(path)
+        return result
+
+    def record(self, paths: List[str], hashes: Optional[Dict[str, str]] = None):
+        """Mark `paths` as ingested with their current content hash and persist the manifest."""
+        if not paths:
+            return
+        hashes = hashes or {}
+        with self._lock:
+            documents = self.documents()
+            now = time.time()
+            for path in paths:
+                name = os.path.basename(path)
+                documents[name] = {
+                    "sha256": hashes.get(name) or file_sha256(path),
+                    "size": os.path.getsize(path),
+                    "ingested_at": now,
+                }
+            self._write(documents)
+
+    def forget(self, names: List[str]):
+        """Drop documents from the manifest, e.g. after they were deleted from the collection."""
+        with self._lock:
+            documents = self.documents()
+            for name in names:
+                documents.pop(os.path.basename(name), None)
+            self._write(documents)
+
+    def clear(self):
+        """Forget every document, e.g. after the collection was deleted or recreated."""
+        with self._lock:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _write(self, documents: Dict[str, dict]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"collection": self.collection, "documents": documents}
+        atomic_write_bytes(str(self.path), json.dumps(payload, indent=2).encode("utf-8"))
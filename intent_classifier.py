@@ -0,0 +1,296 @@
+"""
+Local intent classification for study buddy chat messages.
+
+`query_routing` sends a long few-shot prompt to a 49B model for every message
+just to pick one of four words. Most messages are easy: "find me a video"
+is a supplement request, "schedule a session tomorrow at 3pm" is a calendar
+booking. The classifiers here answer those locally and abstain when unsure,
+so only ambiguous messages pay for the LLM call:
+
+    KeywordIntentClassifier   - the explicit keyword rules of the routing prompt
+    EmbeddingIntentClassifier - nearest intent centroid, trained on the prompt's examples
+    LocalIntentClassifier     - keyword rules first, then embeddings, with a confidence threshold
+
+Usage:
+    from intent_classifier import classify_locally
+
+    prediction = classify_locally("show me a clip about mitosis")
+    if prediction.intent is None:
+        ...  # not confident, ask the LLM
+
+Select the classifier with INTENT_CLASSIFIER ("local", "keyword" or "off"),
+or install your own with `set_intent_classifier`.
+"""
+
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from colorama import Fore
+
+# Intents a chat message is routed to
+ROUTES = ("chitchat", "supplement", "book_calendar", "study_material")
+
+# "local", "keyword" or "off"
+INTENT_CLASSIFIER = os.environ.get("INTENT_CLASSIFIER", "local").lower()
+# Predictions below this confidence are left to the LLM
+INTENT_CONFIDENCE_THRESHOLD = float(os.environ.get("INTENT_CONFIDENCE_THRESHOLD", "0.6"))
+# self_refine.Embedder model of the embedding classifier ("miniLM", "bge-small", "openai")
+INTENT_EMBED_MODEL = os.environ.get("INTENT_EMBED_MODEL", "miniLM")
+
+# Training examples, taken from the few-shot examples of the routing prompt
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "chitchat": [
+        "tell me a joke",
+        "what is my name",
+        "what is the weather today",
+        "how are you doing",
+        "what do you think about politics",
+    ],
+    "supplement": [
+        "can you find a YouTube video about this topic",
+        "show me a video on how to cook Kung Pao Chicken",
+        "are there any helpful videos online about this",
+        "find me a tutorial video on this subject",
+        "recommend some YouTube videos or tutorials",
+        "I want to watch a video about this",
+        "can you give me a link to learn more",
+        "show me a clip explaining this concept",
+    ],
+    "book_calendar": [
+        "reserve 15-16 on Friday for me to study for this topic",
+        "schedule a study session tomorrow at 3pm for 2 hours",
+        "book time on Monday morning to review this chapter",
+        "set up a calendar event for the exam next week",
+        "remind me to study this on Wednesday at 5pm",
+        "block out Tuesday afternoon for practice problems",
+        "add a study session for this topic next Monday",
+        "create an event for the final exam on December 15th",
+    ],
+    "study_material": [
+        "explain this concept to me",
+        "what does this mean in the study material",
+        "help me understand this quiz question",
+        "can you clarify this topic",
+        "tell me more about the current chapter",
+        "what are the key points of this subtopic",
+        "I don't understand this part of the material",
+        "I want to learn about this topic",
+    ],
+}
+
+# The routing prompt only allows 'supplement' when a video, YouTube, tutorial or link is
+# explicitly asked for. These nouns also appear in study questions ("how are URLs resolved
+# by DNS?", "is there a link between diet and diabetes?"), so only a request verb shortly
+# before a video, YouTube or tutorial ("find me a video", "recommend a tutorial") decides;
+# links, URLs, clips and "is there / any ..." only hint
+_SUPPLEMENT_MEDIA = r"videos?|youtube|tutorials?"
+_SUPPLEMENT_NOUNS = _SUPPLEMENT_MEDIA + r"|urls?|clips?|links?"
+_SUPPLEMENT_REQUEST = re.compile(
+    r"\b(?:find|show|recommend|suggest|send|share|give|search|look(?:ing)? (?:for|up)|watch)\b"
+    r"(?:\W+\w+){0,4}?\W+(?:" + _SUPPLEMENT_MEDIA + r")\b",
+    re.IGNORECASE)
+_SUPPLEMENT_HINTS = re.compile(r"\b(?:" + _SUPPLEMENT_NOUNS + r"|watch)\b", re.IGNORECASE)
+# 'book_calendar' needs a scheduling verb acting on a session, event, reminder or time slot,
+# and a day or time somewhere in the message; "show me how to add fractions by tomorrow",
+# "remind me what ATP stands for" and "what is a reinforcement schedule" are study questions
+_DAYS = (r"today|tonight|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|sunday|"
+         r"morning|afternoon|evening")
+_CLOCK = r"\d{1,2}(?::\d{2})?\s*(?:am|pm)|\d{1,2}\s*[-:]\s*\d{1,2}"
+_CALENDAR_VERBS = re.compile(
+    r"\b(schedule|reschedule|reserve|book|block(?: out)?|set up|add|create|plan|put|remind me)\b", re.IGNORECASE)
+_CALENDAR_REQUEST = re.compile(
+    r"\b(?:schedule|reschedule|reserve|book|block(?: out)?|set up|add|create|plan|put)\b"
+    r"(?:(?:\W+\w+){0,3}?\W+(?:sessions?|events?|reminders?|meetings?|appointments?|slots?|time|"
+    r"minutes?|hours?|calendar|review|exam)\b|\W+(?:next\s+)?(?:" + _DAYS + r"|" + _CLOCK + r")\b)"
+    r"|\bremind me to\b",
+    re.IGNORECASE)
+_TIME_TERMS = re.compile(
+    r"\b(" + _DAYS + r"|next week|"
+    r"january|february|march|april|june|july|august|september|october|november|december|"
+    r"\d{1,2}(?:st|nd|rd|th)|" + _CLOCK + r")\b",
+    re.IGNORECASE)
+# Naming the chapter or sub-topic only decides 'study_material' together with a study cue;
+# "tell me a joke about Sweden" in a chapter on Sweden is still chitchat
+_STUDY_CUES = re.compile(
+    r"\b(explain|clarify|understand|confus\w*|summar\w*|define|definition|describe|walk me through|"
+    r"what (?:is|are|does|do)|how (?:does|do|is|are)|why|difference|key points|examples?)\b",
+    re.IGNORECASE)
+_WORD = re.compile(r"\w+")
+
+Embed = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+@dataclass
+class IntentPrediction:
+    """Result of a classifier; `intent` is None when the classifier abstains."""
+    intent: Optional[str]
+    confidence: float
+    source: str
+
+
+class IntentClassifier:
+    """Base class: map a chat message to one of ROUTES, or abstain."""
+
+    def predict(self, query: str, chapter_name: Optional[str] = None,
+                sub_topic: Optional[str] = None) -> IntentPrediction:
+        raise NotImplementedError
+
+
+class KeywordIntentClassifier(IntentClassifier):
+    """The explicit rules of the routing prompt.
+
+    - asking for a video / YouTube / tutorial means 'supplement'
+    - scheduling a session, event, reminder or time slot for a day or time
+      means 'book_calendar'
+    - a study question about the current chapter or sub-topic means 'study_material'
+
+    Links, URLs and clips, "is there / any ..." questions, scheduling verbs
+    without a session or time, and naming the chapter without a study cue
+    only hint at an intent (confidence 0.5), so the LLM decides.
+    """
+
+    def predict(self, query, chapter_name=None, sub_topic=None):
+        text = query or ""
+        if _SUPPLEMENT_REQUEST.search(text):
+            return IntentPrediction("supplement", 1.0, "keyword")
+        if _CALENDAR_REQUEST.search(text) and _TIME_TERMS.search(text):
+            return IntentPrediction("book_calendar", 1.0, "keyword")
+        words = set(_WORD.findall(text.lower()))
+        for context in (chapter_name, sub_topic):
+            context_words = {w for w in _WORD.findall((context or "").lower()) if len(w) > 3}
+            if context_words and len(words & context_words) / len(context_words) >= 0.5:
+                return IntentPrediction("study_material", 0.9 if _STUDY_CUES.search(text) else 0.5, "keyword")
+        if _SUPPLEMENT_HINTS.search(text):
+            return IntentPrediction("supplement", 0.5, "keyword")
+        if _CALENDAR_VERBS.search(text) or re.search(r"\bcalendar\b", text, re.IGNORECASE):
+            return IntentPrediction("book_calendar", 0.5, "keyword")
+        return IntentPrediction(None, 0.0, "keyword")
+
+
+class EmbeddingIntentClassifier(IntentClassifier):
+    """Nearest-centroid classifier over sentence embeddings of labelled examples.
+
+    Confidence is the margin between the cosine similarity to the winning
+    centroid and to the runner-up, scaled by `margin_scale` and capped at 1,
+    so it says how clearly the query belongs to one intent.
+    """
+
+    def __init__(self, embed: Embed, examples: Optional[Dict[str, List[str]]] = None,
+                 margin_scale: float = 10.0):
+        self.embed = embed
+        self.margin_scale = margin_scale
+        examples = examples or INTENT_EXAMPLES
+        self.intents = list(examples)
+        centroids = []
+        for intent in self.intents:
+            vectors = _normalize(np.asarray(embed(examples[intent]), dtype=float))
+            centroids.append(vectors.mean(axis=0))
+        self.centroids = _normalize(np.vstack(centroids))
+
+    def predict(self, query, chapter_name=None, sub_topic=None):
+        if not query or not query.strip():
+            return IntentPrediction(None, 0.0, "embedding")
+        vector = _normalize(np.asarray(self.embed([query]), dtype=float))[0]
+        scores = self.centroids @ vector
+        order = np.argsort(scores)[::-1]
+        margin = float(scores[order[0]] - scores[order[1]]) if len(order) > 1 else 1.0
+        return IntentPrediction(self.intents[order[0]], min(1.0, margin * self.margin_scale), "embedding")
+
+
+class LocalIntentClassifier(IntentClassifier):
+    """Keyword rules, then the embedding classifier; abstains below `threshold`."""
+
+    def __init__(self, embedding: Optional[EmbeddingIntentClassifier] = None,
+                 keyword: Optional[KeywordIntentClassifier] = None,
+                 threshold: float = INTENT_CONFIDENCE_THRESHOLD):
+        self.keyword = keyword or KeywordIntentClassifier()
+        self.embedding = embedding
+        self.threshold = threshold
+
+    def predict(self, query, chapter_name=None, sub_topic=None):
+        best = self.keyword.predict(query, chapter_name, sub_topic)
+        if best.confidence < self.threshold and self.embedding is not None:
+            embedded = self.embedding.predict(query, chapter_name, sub_topic)
+            if embedded.confidence > best.confidence:
+                best = embedded
+        if best.intent is None or best.confidence < self.threshold:
+            return IntentPrediction(None, best.confidence, best.source)
+        return best
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def normalize_route(text: Optional[str], default: str = "study_material") -> str:
+    """Map free LLM output ("Classification: Supplement.") to one of ROUTES."""
+    lowered = (text or "").lower()
+    positions = [(lowered.find(route), route) for route in ROUTES if route in lowered]
+    if positions:
+        return min(positions)[1]
+    if "calendar" in lowered:
+        return "book_calendar"
+    return default
+
+
+def _default_embedding_classifier() -> Optional[EmbeddingIntentClassifier]:
+    try:
+        from self_refine.embedder import Embedder
+        embedder = Embedder(INTENT_EMBED_MODEL)
+        return EmbeddingIntentClassifier(embedder.embed_batch)
+    except (ImportError, RuntimeError) as e:
+        print(Fore.YELLOW + f"No embedding model for intent classification ({e}), using keyword rules only", Fore.RESET)
+        return None
+
+
+def _build_classifier(name: str) -> Optional[IntentClassifier]:
+    if name == "off":
+        return None
+    if name == "keyword":
+        return LocalIntentClassifier(embedding=None)
+    return LocalIntentClassifier(embedding=_default_embedding_classifier())
+
+
+_classifier: Optional[IntentClassifier] = None
+_classifier_ready = False
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier() -> Optional[IntentClassifier]:
+    """The process-wide classifier selected by INTENT_CLASSIFIER; None when disabled."""
+    global _classifier, _classifier_ready
+    if not _classifier_ready:
+        with _classifier_lock:
+            if not _classifier_ready:
+                start = time.perf_counter()
+                _classifier = _build_classifier(INTENT_CLASSIFIER)
+                _classifier_ready = True
+                print(Fore.CYAN + f"Intent classifier '{INTENT_CLASSIFIER}' ready in {time.perf_counter() - start:.2f}s", Fore.RESET)
+    return _classifier
+
+
+def set_intent_classifier(classifier: Optional[IntentClassifier]) -> None:
+    """Install a custom classifier (or None to always ask the LLM)."""
+    global _classifier, _classifier_ready
+    with _classifier_lock:
+        _classifier = classifier
+        _classifier_ready = True
+
+
+def classify_locally(query: str, chapter_name: Optional[str] = None,
+                     sub_topic: Optional[str] = None) -> IntentPrediction:
+    """Predict with the configured classifier; abstains if none is configured or it fails."""
+    classifier = get_intent_classifier()
+    if classifier is None:
+        return IntentPrediction(None, 0.0, "off")
+    try:
+        return classifier.predict(query, chapter_name, sub_topic)
+    except Exception as e:
+        print(Fore.YELLOW + f"Local intent classification failed: {e}", Fore.RESET)
+        return IntentPrediction(None, 0.0, "error")
@@ -0,0 +1,345 @@
+"""
+Local job queue for long-running builds (curriculum, next chapter).
+
+Building a curriculum from several PDFs takes many minutes. Running it with
+`asyncio.run(...)` inside a Gradio request ties up that worker for the whole
+build, and a crash or restart throws all finished work away. The job queue
+runs builds on an asyncio worker pool in a background thread and keeps every
+job in a SQLite table, together with its progress and a checkpoint dict that
+the handler updates as it goes.
+
+Job lifecycle:
+    queued -> running -> succeeded
+                      -> failed      (submitting the same job again resumes it)
+
+Jobs that were queued or running when the process stopped are picked up again
+on start and resume from their last checkpoint.
+
+Usage:
+    from job_queue import get_job_queue, register_job_handler
+
+    async def build(job):
+        done = job.checkpoint.setdefault("done", [])
+        for step in job.params["steps"]:
+            if step in done:
+                continue
+            ...
+            done.append(step)
+            await job.report(len(done) / len(job.params["steps"]), f"finished {step}")
+        return {"steps": len(done)}
+
+    register_job_handler("build", build)
+
+    queue = get_job_queue()
+    job_id = queue.submit("build", "babe", {"steps": ["a", "b"]})
+    job = queue.wait(job_id, on_progress=lambda j: print(j["progress"], j["message"]))
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from colorama import Fore
+
+import user_store
+
+JOB_WORKERS = int(os.environ.get("AGENTICTA_JOB_WORKERS", "2"))
+# A job that keeps taking the process down is not restarted forever
+JOB_MAX_ATTEMPTS = int(os.environ.get("AGENTICTA_JOB_MAX_ATTEMPTS", "3"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    checkpoint TEXT NOT NULL DEFAULT '{}',
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_user ON jobs (user_id, kind, created_at);
+"""
+
+JobHandler = Callable[["Job"], Awaitable[Any]]
+_job_handlers: Dict[str, JobHandler] = {}
+
+
+def register_job_handler(kind: str, handler: JobHandler):
+    """Register the coroutine function that runs jobs of the given kind."""
+    _job_handlers[kind] = handler
+
+
+@dataclass
+class Job:
+    """A running job as seen by its handler.
+
+    Handlers keep whatever they need to resume in `checkpoint` (JSON-safe
+    values only) and call `report` after each unit of work; the checkpoint
+    is persisted together with the progress.
+    """
+
+    id: str
+    kind: str
+    user_id: str
+    params: dict
+    checkpoint: dict
+    attempts: int
+    _queue: "JobQueue" = field(repr=False)
+
+    async def report(self, progress: float, message: str = ""):
+        """Persist progress (0..1), a status message and the current checkpoint."""
+        self._queue._update(
+            self.id,
+            progress=max(0.0, min(1.0, float(progress))),
+            message=message,
+            checkpoint=json.dumps(self.checkpoint, default=str),
+        )
+
+
+class JobQueue:
+    """SQLite-backed job table with an asyncio worker pool in a background thread."""
+
+    def __init__(self, db_path: str, workers: int = JOB_WORKERS):
+        self.db_path = Path(db_path)
+        self.workers = workers
+        self._db_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        # Ids queued or running in this process, so a job is never run twice at once
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._init_db()
+
+    # -- storage --------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db_lock, closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _execute(self, sql: str, args: tuple = ()) -> List[sqlite3.Row]:
+        with self._db_lock, closing(self._connect()) as conn:
+            with conn:
+                return conn.execute(sql, args).fetchall()
+
+    def _update(self, job_id: str, **columns):
+        columns["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in columns)
+        self._execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*columns.values(), job_id))
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["checkpoint"] = json.loads(job["checkpoint"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    # -- public API -----------------------------------------------------
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Current state of a job (status, progress, message, result, error, ...)."""
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._to_dict(rows[0]) if rows else None
+
+    def latest(self, user_id: str, kind: str) -> Optional[dict]:
+        """Most recent job of a kind for a user, for status polling from the UI."""
+        rows = self._execute(
+            "SELECT * FROM jobs WHERE user_id = ? AND kind = ? ORDER BY created_at DESC LIMIT 1",
+            (user_id, kind),
+        )
+        return self._to_dict(rows[0]) if rows else None
+
+    def submit(self, kind: str, user_id: str, params: Optional[dict] = None) -> str:
+        """Queue a job and return its id.
+
+        If the user already has an unfinished job of this kind with the same
+        params, that job's id is returned instead. A failed one is requeued
+        and resumes from its checkpoint.
+        """
+        if kind not in _job_handlers:
+            raise ValueError(f"No job handler registered for {kind!r}")
+        params_json = json.dumps(params or {}, sort_keys=True, default=str)
+        now = time.time()
+        enqueue = True
+        with self._db_lock, closing(self._connect()) as conn:
+            with conn:
+                row = conn.execute(
+                    "SELECT id, status FROM jobs WHERE user_id = ? AND kind = ? AND params = ? "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (user_id, kind, params_json),
+                ).fetchone()
+                if row is None or row["status"] == SUCCEEDED:
+                    job_id = uuid.uuid4().hex
+                    conn.execute(
+                        "INSERT INTO jobs (id, kind, user_id, params, status, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, kind, user_id, params_json, QUEUED, now, now),
+                    )
+                elif row["status"] == FAILED:
+                    job_id = row["id"]
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, error = NULL, attempts = 0, updated_at = ? WHERE id = ?",
+                        (QUEUED, now, job_id),
+                    )
+                    print(Fore.CYAN + f"Resuming failed {kind} job {job_id} for {user_id} from its checkpoint", Fore.RESET)
+                else:
+                    job_id = row["id"]
+                    # Already in a worker queue (or picked up again on start)
+                    enqueue = False
+        self.start()
+        if enqueue:
+            self._enqueue(job_id)
+        return job_id
+
+    def wait(self, job_id: str, timeout: Optional[float] = None, poll_interval: float = 1.0,
+             on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """Block until the job finishes (or `timeout` seconds pass) and return its state.
+
+        `on_progress` is called with the job state on every poll, e.g. to
+        drive a progress bar.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                raise KeyError(f"Unknown job {job_id}")
+            if on_progress is not None:
+                on_progress(job)
+            if job["status"] not in ACTIVE_STATES:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+    # -- workers --------------------------------------------------------
+
+    def start(self) -> "JobQueue":
+        """Start the worker pool and requeue jobs left unfinished by a previous process."""
+        with self._start_lock:
+            if self._thread is not None:
+                return self
+            started = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(started,), name="job-queue", daemon=True)
+            self._thread.start()
+            started.wait()
+        for row in self._execute("SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", ACTIVE_STATES):
+            self._enqueue(row["id"])
+        return self
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the worker pool. Running jobs stay `running` and resume on the next start."""
+        with self._start_lock:
+            if self._thread is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run_loop(self, started: threading.Event):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        for _ in range(self.workers):
+            loop.create_task(self._worker())
+        started.set()
+        try:
+            loop.run_forever()
+        finally:
+            for task in asyncio.all_tasks(loop):
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*asyncio.all_tasks(loop), return_exceptions=True))
+            loop.close()
+
+    def _enqueue(self, job_id: str):
+        with self._pending_lock:
+            if job_id in self._pending:
+                return
+            self._pending.add(job_id)
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                print(Fore.RED + f"Job queue error while running {job_id}: {e}", Fore.RESET)
+            finally:
+                with self._pending_lock:
+                    self._pending.discard(job_id)
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str):
+        row = self.get(job_id)
+        if row is None or row["status"] not in ACTIVE_STATES:
+            return
+        handler = _job_handlers.get(row["kind"])
+        if handler is None:
+            self._update(job_id, status=FAILED, error=f"No job handler registered for {row['kind']!r}")
+            return
+        if row["attempts"] >= JOB_MAX_ATTEMPTS:
+            self._update(job_id, status=FAILED, error=f"Gave up after {row['attempts']} interrupted attempts")
+            return
+
+        attempts = row["attempts"] + 1
+        self._update(job_id, status=RUNNING, attempts=attempts)
+        job = Job(row["id"], row["kind"], row["user_id"], row["params"], row["checkpoint"], attempts, self)
+        print(Fore.CYAN + f"Running {job.kind} job {job.id} for {job.user_id} (attempt {attempts})", Fore.RESET)
+        try:
+            result = await handler(job)
+        except Exception as e:
+            print(Fore.RED + f"{job.kind} job {job.id} for {job.user_id} failed: {e}", Fore.RESET)
+            self._update(job_id, status=FAILED, error=f"{type(e).__name__}: {e}",
+                         checkpoint=json.dumps(job.checkpoint, default=str))
+            return
+        self._update(job_id, status=SUCCEEDED, progress=1.0, result=json.dumps(result, default=str),
+                     checkpoint=json.dumps(job.checkpoint, default=str))
+        print(Fore.GREEN + f"{job.kind} job {job.id} for {job.user_id} finished", Fore.RESET)
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue(db_path: Optional[str] = None) -> JobQueue:
+    """Return the process-wide job queue, creating it on first use.
+
+    The job table lives at AGENTICTA_JOB_DB, or `jobs.sqlite3` under the
+    default save_to root (see user_store.set_default_save_to).
+    """
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            db_path = db_path or os.environ.get("AGENTICTA_JOB_DB") or os.path.join(user_store.DEFAULT_SAVE_TO, "jobs.sqlite3")
+            _job_queue = JobQueue(db_path)
+        return _job_queue
@@ -0,0 +1,153 @@
+"""
+Tolerant incremental parser for JSON arrays of objects in LLM output.
+
+Quiz generation asks the model for a JSON array inside `<output_json>` tags.
+Long generations are often cut off by max_tokens or followed by stray notes,
+and `json.loads` on the whole block then fails and throws every question away.
+This parser walks the text character by character, tracking string/escape
+state and nesting depth, and hands out each top-level object of the array as
+soon as its closing brace arrives. A truncated tail only loses the object that
+was being written.
+
+It can be fed a complete response or the chunks of a stream:
+
+    from json_stream_parser import JSONArrayStreamParser, salvage_json_array
+
+    items = salvage_json_array(response_text, start_marker="<output_json>")
+
+    parser = JSONArrayStreamParser(start_marker="<output_json>")
+    async for chunk in llm.stream(...):
+        for item in parser.feed(chunk):
+            ...
+    parser.close()
+    print(parser.truncated)
+"""
+
+import json
+import re
+from typing import Any, List, Optional
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _loads_tolerant(text: str) -> Optional[Any]:
+    """json.loads with a retry that drops trailing commas; None if the text is not JSON."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_TRAILING_COMMA.sub(r"\1", text))
+    except json.JSONDecodeError:
+        return None
+
+
+class JSONArrayStreamParser:
+    """Yield the complete objects of the first JSON array after `start_marker`.
+
+    Anything before the array (analysis text, code fences) and after its closing
+    bracket (notes, closing tags) is ignored. Objects that are complete but not
+    valid JSON are counted in `skipped` and dropped.
+    """
+
+    def __init__(self, start_marker: Optional[str] = None):
+        self.start_marker = start_marker
+        self.items: List[Any] = []
+        self.skipped = 0
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._item_start = -1
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def truncated(self) -> bool:
+        """True if the input ended before the array was closed."""
+        return not self.done
+
+    def feed(self, text: str) -> List[Any]:
+        """Consume the next chunk of text and return the objects it completed."""
+        if self.done or not text:
+            return []
+        self._buffer += text
+        new_items: List[Any] = []
+
+        if not self._in_array and not self._seek_array():
+            return new_items
+
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer):
+            ch = buffer[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0 and ch == "{":
+                    self._item_start = pos
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    if ch == "]":
+                        self.done = True
+                        pos += 1
+                        break
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and self._item_start >= 0:
+                        item = _loads_tolerant(buffer[self._item_start:pos + 1])
+                        if item is None:
+                            self.skipped += 1
+                        else:
+                            self.items.append(item)
+                            new_items.append(item)
+                        self._item_start = -1
+            pos += 1
+
+        # Drop consumed text so a long stream does not keep growing the buffer
+        keep_from = self._item_start if self._item_start >= 0 else pos
+        self._buffer = buffer[keep_from:]
+        self._pos = pos - keep_from
+        if self._item_start >= 0:
+            self._item_start = 0
+        return new_items
+
+    def close(self) -> List[Any]:
+        """Finish parsing and return every object found."""
+        if not self._in_array and self.start_marker is not None and not self.done:
+            # No marker at all: accept a bare array, as produced in JSON-schema mode
+            self.start_marker = None
+            buffer, self._buffer, self._pos = self._buffer, "", 0
+            self.feed(buffer)
+        return self.items
+
+    def _seek_array(self) -> bool:
+        search_from = 0
+        if self.start_marker is not None:
+            marker_at = self._buffer.find(self.start_marker)
+            if marker_at < 0:
+                return False
+            search_from = marker_at + len(self.start_marker)
+        array_at = self._buffer.find("[", search_from)
+        if array_at < 0:
+            return False
+        self._in_array = True
+        self._buffer = self._buffer[array_at + 1:]
+        self._pos = 0
+        return True
+
+
+def salvage_json_array(text: str, start_marker: Optional[str] = None) -> List[Any]:
+    """Parse every complete object of the first JSON array in `text`, even if it is truncated."""
+    parser = JSONArrayStreamParser(start_marker=start_marker)
+    parser.feed(text)
+    return parser.close()
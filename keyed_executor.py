@@ -0,0 +1,93 @@
+"""
+Thread pool that runs the tasks of one key in order and different keys in parallel.
+
+Chat memory processing used to go through a single worker thread shared by
+every user, so one user's turns stayed in order, but under concurrent chat
+everyone queued behind everyone else and memory writes fell further and
+further behind. `KeyedExecutor` keeps the per-key ordering on a bounded pool:
+
+    - at most one task per key runs at a time, in submission order
+    - different keys run concurrently on up to `max_workers` threads
+    - after each task the key goes to the back of the pool's queue, so a busy
+      key does not hold a thread while other keys wait
+    - a key keeps at most `max_pending` waiting tasks; when it has more, the
+      oldest waiting task is dropped
+
+Usage:
+    from keyed_executor import KeyedExecutor
+
+    executor = KeyedExecutor(max_workers=4, max_pending=3, name="chat-memory")
+    executor.submit("babe", process_turn, message, reply)
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Set, Tuple
+
+from colorama import Fore
+
+_Task = Tuple[Callable[..., Any], tuple, dict]
+
+
+class KeyedExecutor:
+    """Bounded thread pool with per-key ordering and a per-key backlog limit."""
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 3, name: str = "keyed"):
+        self.max_pending = max(1, max_pending)
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix=name)
+        self._pending: Dict[Hashable, Deque[_Task]] = {}
+        # Keys with a task running or scheduled on the pool
+        self._scheduled: Set[Hashable] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.dropped = 0
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> None:
+        """Queue fn(*args, **kwargs) behind the earlier tasks of `key`."""
+        dropped = False
+        with self._lock:
+            queue = self._pending.setdefault(key, deque())
+            queue.append((fn, args, kwargs))
+            if len(queue) > self.max_pending:
+                queue.popleft()
+                self.dropped += 1
+                dropped = True
+            if key not in self._scheduled:
+                self._scheduled.add(key)
+                self._executor.submit(self._run_next, key)
+        if dropped:
+            print(Fore.YELLOW + f"{self.name}: more than {self.max_pending} tasks waiting for {key}, dropped the oldest", Fore.RESET)
+
+    def pending(self, key: Hashable) -> int:
+        """Number of tasks of `key` waiting to run."""
+        with self._lock:
+            return len(self._pending.get(key, ()))
+
+    def _run_next(self, key: Hashable) -> None:
+        with self._lock:
+            queue = self._pending.get(key)
+            if not queue:
+                self._pending.pop(key, None)
+                self._scheduled.discard(key)
+                return
+            fn, args, kwargs = queue.popleft()
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            print(Fore.RED + f"{self.name}: task for {key} failed: {e}", Fore.RESET)
+        finally:
+            with self._lock:
+                if self._pending.get(key) and not self._closed:
+                    self._executor.submit(self._run_next, key)
+                else:
+                    self._pending.pop(key, None)
+                    self._scheduled.discard(key)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop running tasks; waiting ones are discarded. With `wait`, wait for running tasks."""
+        with self._lock:
+            self._closed = True
+            self._pending.clear()
+        self._executor.shutdown(wait=wait)
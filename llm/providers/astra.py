@@ -1,5 +1,6 @@
 """NVIDIA ASTRA deployment provider."""
 
+import json
 import aiohttp
 from typing import AsyncIterator, List, Dict
 from .base import LLMProvider
@@ -69,10 +70,42 @@ class AstraProvider(LLMProvider):
     ) -> AsyncIterator[str]:
         """Stream completion chunks from ASTRA.
         
-        Note: ASTRA may not support streaming. Falls back to non-streaming.
+        Reads the OpenAI-style server-sent events of a `"stream": true` request.
+        Deployments that ignore the flag and answer with a single JSON body are
+        yielded as one chunk.
         """
-        # ASTRA doesn't support streaming in the current implementation
-        # Fall back to complete response
-        result = await self.call(messages, max_tokens, temperature, **kwargs)
-        yield result
-
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True
+        }
+        
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    self.endpoint,
+                    headers=self.headers,
+                    json=payload
+                ) as resp:
+                    resp.raise_for_status()
+                    if "text/event-stream" not in resp.headers.get("Content-Type", ""):
+                        data = await resp.json(content_type=None)
+                        yield data["choices"][0]["message"]["content"]
+                        return
+                    async for raw_line in resp.content:
+                        line = raw_line.decode("utf-8").strip()
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        choices = json.loads(data).get("choices") or []
+                        content = (choices[0].get("delta") or {}).get("content") if choices else None
+                        if content:
+                            yield content
+        except aiohttp.ClientError as e:
+            raise RuntimeError(f"ASTRA API streaming failed: {str(e)}") from e
+        except (KeyError, IndexError, json.JSONDecodeError) as e:
+            raise RuntimeError(f"ASTRA API stream parsing failed: {str(e)}") from e
@@ -0,0 +1,177 @@
+"""
+Derived, precomputed views of a sub-topic's study material.
+
+Every chat turn used to run `detect_images_in_markdown` and
+`extract_text_from_markdown` over the sub-topic's `display_markdown`: several
+regex passes over material that could hold megabytes of base64. The material
+does not change after the sub-topic is created, so the derived artifacts are
+computed once, stored on the SubTopic as `material_index`, and read by the
+chat path instead:
+
+    text       - the material as plain text: images become "[image: alt]",
+                 HTML tags are removed
+    images     - image manifest, one entry per image in order of appearance:
+                 {"sha256", "path", "bytes", "offset", "caption"}; `path` is
+                 the asset store file, `offset` is the position of the image
+                 in `text`, `caption` its alt text and surrounding text
+    paragraphs - [start, end] character spans of the paragraphs of `text`
+
+Usage:
+    from material_index import build_material_index, get_material_index
+
+    sub_topic.material_index = build_material_index(display_markdown)
+    index = get_material_index(sub_topic)     # built on the fly for older states
+    images = load_index_images(select_relevant_images(index, user_input, k=4))
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from asset_store import get_asset_store
+from prompt_budget import bm25_scores
+
+# Bump when the layout of the index changes; older indexes are rebuilt on read
+MATERIAL_INDEX_VERSION = 2
+# Characters of text before and after an image that go into its caption
+CAPTION_CONTEXT_CHARS = 200
+
+# Indexes built on the fly for sub-topics saved without one
+_LEGACY_CACHE_SIZE = 64
+
+_BASE64_IMAGE = re.compile(
+    r'<img\s+[^>]*?src=["\']data:image/([A-Za-z0-9.+-]+);base64,([A-Za-z0-9+/=\s]+)["\'][^>]*?/?>'
+    r'|!\[([^\]]*)\]\(data:image/([A-Za-z0-9.+-]+);base64,([A-Za-z0-9+/=\s]+)\)'
+)
+_ASSET_IMAGE = re.compile(r'<img\s+[^>]*?src=["\'][^"\']*?([0-9a-f]{2})/([0-9a-f]{64})\.([a-z]{3,4})["\'][^>]*?/?>')
+_ALT = re.compile(r'alt=["\']([^"\']*)["\']')
+_BREAK_TAG = re.compile(r'<br\s*/?>')
+_TAG = re.compile(r'<[^>]+>')
+_PARAGRAPH = re.compile(r'\S(?:.*?\S)?(?=\n\s*\n|\s*\Z)', re.DOTALL)
+
+_legacy_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+
+def _placeholder(alt: str) -> str:
+    return f"[image: {alt}]" if alt else "[image]"
+
+
+def build_material_index(markdown: Optional[str]) -> Dict[str, Any]:
+    """Scan study material once and return its text, image manifest and paragraph spans.
+
+    Inline base64 images are written to the asset store so that every manifest
+    entry points at a file.
+    """
+    markdown = markdown or ""
+    store = get_asset_store()
+    images: List[Dict[str, Any]] = []
+    alts: List[str] = []
+    pieces: List[str] = []
+    length = 0
+    position = 0
+
+    def _emit(text: str):
+        nonlocal length
+        text = _TAG.sub("", _BREAK_TAG.sub("\n", text))
+        pieces.append(text)
+        length += len(text)
+
+    def _image(path: Optional[Path], alt: str):
+        if path is not None and path.exists():
+            images.append({
+                "sha256": path.stem,
+                "path": str(path),
+                "bytes": path.stat().st_size,
+                "offset": length,
+            })
+            alts.append(alt)
+        _emit(_placeholder(alt))
+
+    matches = sorted(list(_BASE64_IMAGE.finditer(markdown)) + list(_ASSET_IMAGE.finditer(markdown)),
+                     key=lambda m: m.start())
+    for match in matches:
+        if match.start() < position:
+            continue
+        _emit(markdown[position:match.start()])
+        if match.re is _ASSET_IMAGE:
+            prefix, digest, ext = match.groups()
+            alt = _ALT.search(match.group(0))
+            path = store.path_for(digest, ext) if digest.startswith(prefix) else None
+            _image(path, alt.group(1) if alt else "")
+        elif match.group(1) is not None:
+            _image(store.put_base64(match.group(2), match.group(1)), "")
+        else:
+            _image(store.put_base64(match.group(5), match.group(4)), match.group(3))
+        position = match.end()
+    _emit(markdown[position:])
+
+    text = "".join(pieces)
+    stripped = text.strip()
+    lead = len(text) - len(text.lstrip())
+    for image, alt in zip(images, alts):
+        image["offset"] = max(0, image["offset"] - lead)
+        before = stripped[max(0, image["offset"] - CAPTION_CONTEXT_CHARS):image["offset"]]
+        after = stripped[image["offset"]:image["offset"] + CAPTION_CONTEXT_CHARS]
+        image["caption"] = " ".join(" ".join([alt, before, after]).split())
+    return {
+        "version": MATERIAL_INDEX_VERSION,
+        "text": stripped,
+        "images": images,
+        "paragraphs": [[m.start(), m.end()] for m in _PARAGRAPH.finditer(stripped)],
+    }
+
+
+def _field(sub_topic: Any, name: str) -> Any:
+    if isinstance(sub_topic, dict):
+        return sub_topic.get(name)
+    return getattr(sub_topic, name, None)
+
+
+def get_material_index(sub_topic: Any) -> Dict[str, Any]:
+    """The stored material index of a SubTopic (object or dict).
+
+    Sub-topics saved before indexes existed are indexed on first use and kept
+    in a small in-process cache, keyed by a hash of the material.
+    """
+    index = _field(sub_topic, "material_index")
+    if isinstance(index, dict) and index.get("version") == MATERIAL_INDEX_VERSION:
+        return index
+
+    markdown = _field(sub_topic, "display_markdown") or _field(sub_topic, "study_material") or ""
+    key = hashlib.sha1(markdown.encode("utf-8", "surrogatepass")).hexdigest()
+    if key in _legacy_cache:
+        _legacy_cache.move_to_end(key)
+        return _legacy_cache[key]
+    index = build_material_index(markdown)
+    _legacy_cache[key] = index
+    while len(_legacy_cache) > _LEGACY_CACHE_SIZE:
+        _legacy_cache.popitem(last=False)
+    return index
+
+
+def select_relevant_images(index: Optional[Dict[str, Any]], query: str, k: int) -> List[Dict[str, Any]]:
+    """The `k` manifest entries whose captions are most similar to the query (BM25), in document order.
+
+    Ties, e.g. a query sharing no word with any caption, go to earlier images.
+    """
+    images = list((index or {}).get("images", []))
+    if len(images) <= k:
+        return images
+    scores = bm25_scores(query, [image.get("caption", "") for image in images])
+    ranked = sorted(range(len(images)), key=lambda i: (-scores[i], i))[:max(0, k)]
+    return [images[i] for i in sorted(ranked)]
+
+
+def load_index_images(index_or_images: Any) -> List[str]:
+    """Base64 payloads of the images of a material index or a list of its manifest entries.
+
+    Missing files are skipped.
+    """
+    if not index_or_images:
+        return []
+    entries = index_or_images.get("images", []) if isinstance(index_or_images, dict) else index_or_images
+    store = get_asset_store()
+    images = [store.load_base64(Path(image["path"])) for image in entries]
+    return [image for image in images if image]
@@ -1,10 +1,17 @@
 import aiohttp
+import asyncio
+import contextlib
 import os 
 import json
 import re
 import base64
 import random
-from typing import List
+from typing import Callable, List, Optional
+
+from colorama import Fore
+
+from errors import RAGConnectionError, RAGIngestionError
+from ingestion_manifest import IngestionManifest, IngestionPlan
 
 IPADDRESS = "rag-server" if os.environ.get("AI_WORKBENCH", "false") == "true" else "localhost" #Replace this with the correct IP address
 RAG_SERVER_PORT = "8081"
@@ -15,6 +22,29 @@ IPADDRESS = "ingestor-server" if os.environ.get("AI_WORKBENCH", "false") == "tru
 INGESTOR_SERVER_PORT = "8082"
 BASE_URL = f"http://{IPADDRESS}:{INGESTOR_SERVER_PORT}"  # Replace with your server URL
 
+# Ingestion status polling: first poll after INGESTION_POLL_INTERVAL seconds, backing off
+# to INGESTION_MAX_POLL_INTERVAL; give up after INGESTION_TIMEOUT seconds
+INGESTION_POLL_INTERVAL = float(os.environ.get("INGESTION_POLL_INTERVAL", "1.0"))
+INGESTION_MAX_POLL_INTERVAL = float(os.environ.get("INGESTION_MAX_POLL_INTERVAL", "5.0"))
+INGESTION_TIMEOUT = float(os.environ.get("INGESTION_TIMEOUT", "900"))
+
+# Batched uploads: files per request, bytes per request, requests in flight, attempts per request
+UPLOAD_BATCH_SIZE = int(os.environ.get("UPLOAD_BATCH_SIZE", "4"))
+UPLOAD_MAX_BATCH_BYTES = int(os.environ.get("UPLOAD_MAX_BATCH_BYTES", str(64 * 1024 * 1024)))
+UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", "2"))
+UPLOAD_MAX_RETRIES = int(os.environ.get("UPLOAD_MAX_RETRIES", "3"))
+UPLOAD_RETRY_BACKOFF = float(os.environ.get("UPLOAD_RETRY_BACKOFF", "1.0"))
+
+@contextlib.asynccontextmanager
+async def _client_session(session: Optional[aiohttp.ClientSession] = None, **kwargs):
+    """Use the caller's session if given, otherwise open one for the duration of the call."""
+    if session is not None:
+        yield session
+        return
+    async with aiohttp.ClientSession(**kwargs) as own_session:
+        yield own_session
+
+
 async def delete_collections(collection_names: List[str] = ""):
     url = f"{BASE_URL}/v1/collections"
     async with aiohttp.ClientSession() as session:
@@ -23,6 +53,10 @@ async def delete_collections(collection_names: List[str] = ""):
                 await print_response(response)
         except aiohttp.ClientError as e:
             print(f"Error: {e}")
+            return
+    # The documents are gone with the collection, so they must be ingested again
+    for name in collection_names:
+        IngestionManifest.for_collection(name).clear()
 
 
 async def create_collection(
@@ -45,6 +79,8 @@ async def create_collection(
                 await print_response(response)
         except aiohttp.ClientError as e:
             return 500, {"error": str(e)}
+    # A new collection starts empty, whatever an older manifest of the same name says
+    IngestionManifest.for_collection(collection_name).clear()
 
 
 # [Optional]: Define schema for metadata fields
@@ -56,12 +92,10 @@ metadata_schema = [
     }
 ]
 
-async def upload_documents(collection_name: str = "", files_path_ls:list[str] = [], custom_metadata: list[dict] = []):
-    
-    print("Uploading files:", files_path_ls , "\n to collection:", collection_name , "\n in nemo retriever...   ")
-    data = {
+def _documents_request(collection_name: str, custom_metadata: list[dict], blocking: bool) -> dict:
+    return {
         "collection_name": collection_name,
-        "blocking": False, # If True, upload is blocking; else async. Status API not needed when blocking
+        "blocking": blocking, # If True, upload is blocking; else async. Status API not needed when blocking
         "split_options": {
             "chunk_size": 512,
             "chunk_overlap": 150
@@ -70,22 +104,157 @@ async def upload_documents(collection_name: str = "", files_path_ls:list[str] =
         "generate_summary": True # Set to True to optionally generate summaries for all documents after ingestion
     }
 
-    form_data = aiohttp.FormData()
-    for file_path in files_path_ls:
-        form_data.add_field("documents", open(file_path, "rb"), filename=os.path.basename(file_path), content_type="application/pdf")
 
-    form_data.add_field("data", json.dumps(data), content_type="application/json")
+async def _send_documents(session, collection_name: str, files_path_ls: List[str], custom_metadata: list[dict] = [],
+                          blocking: bool = False, reingest: bool = False) -> dict:
+    """Send one multipart documents request and return the parsed response.
 
+    aiohttp streams file payloads from disk in small chunks, so memory stays
+    bounded by the request buffers rather than the PDF sizes. Handles are opened
+    only for this request and always closed, whether the request succeeds or not.
+
+    Raises:
+        RAGConnectionError: Transport errors and 429/5xx responses, worth retrying
+        RAGIngestionError: The ingestor rejected the request (other 4xx)
+    """
+    url = f"{BASE_URL}/v1/documents"
+    data = _documents_request(collection_name, custom_metadata, blocking)
+    with contextlib.ExitStack() as files:
+        form_data = aiohttp.FormData()
+        for file_path in files_path_ls:
+            form_data.add_field("documents", files.enter_context(open(file_path, "rb")), filename=os.path.basename(file_path), content_type="application/pdf")
+        form_data.add_field("data", json.dumps(data), content_type="application/json")
+
+        send = session.patch if reingest else session.post
+        try:
+            async with send(url, data=form_data) as response:
+                try:
+                    body = await response.json(content_type=None)
+                except (aiohttp.ContentTypeError, json.JSONDecodeError):
+                    body = {"message": await response.text()}
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise RAGConnectionError(f"Upload of {len(files_path_ls)} documents failed: {e}", server_url=url) from e
+    if status == 429 or status >= 500:
+        raise RAGConnectionError(f"Ingestor returned HTTP {status}: {body}", server_url=url)
+    if status >= 400:
+        raise RAGIngestionError(f"Ingestor rejected upload with HTTP {status}: {body}",
+                                failed_documents=[os.path.basename(p) for p in files_path_ls])
+    return body
+
+
+async def upload_documents(collection_name: str = "", files_path_ls:list[str] = [], custom_metadata: list[dict] = [], blocking: bool = False, reingest: bool = False):
+    """Upload PDFs to a collection in one request and return the ingestor response as a dict.
+
+    With blocking=False (default) the response carries a `task_id` that can be
+    passed to `wait_for_ingestion`; with blocking=True the ingestor only answers
+    once ingestion is done. reingest=True sends a PATCH, which replaces documents
+    of the same name instead of adding them. Returns {} if the request failed.
+    Use `upload_documents_batched` for more than a handful of files.
+    """
+    print("Uploading files:", files_path_ls , "\n to collection:", collection_name , "\n in nemo retriever...   ")
     async with aiohttp.ClientSession() as session:
         try:
-            async with session.post(f"{BASE_URL}/v1/documents", data=form_data) as response: # Replace with session.patch for reingesting
-                await print_response(response)
-        except aiohttp.ClientError as e:
+            output = await _send_documents(session, collection_name, files_path_ls, custom_metadata, blocking, reingest)
+        except (RAGConnectionError, RAGIngestionError) as e:
             print(f"Error: {e}")
+            return {}
+    print(json.dumps(output, indent=2))
+    return output
+
+
+def batch_files(files_path_ls: List[str], batch_size: int = None, max_batch_bytes: int = None) -> List[List[str]]:
+    """Group files into upload batches of at most `batch_size` files and `max_batch_bytes` bytes.
+
+    A single file larger than `max_batch_bytes` gets a batch of its own.
+    """
+    batch_size = max(1, batch_size or UPLOAD_BATCH_SIZE)
+    max_batch_bytes = max_batch_bytes or UPLOAD_MAX_BATCH_BYTES
+    batches, current, current_bytes = [], [], 0
+    for path in files_path_ls:
+        size = os.path.getsize(path)
+        if current and (len(current) >= batch_size or current_bytes + size > max_batch_bytes):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(path)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _send_with_retries(session, collection_name: str, files_path_ls: List[str], custom_metadata: list[dict],
+                             reingest: bool, max_retries: int) -> dict:
+    for attempt in range(1, max_retries + 1):
+        try:
+            return await _send_documents(session, collection_name, files_path_ls, custom_metadata, reingest=reingest)
+        except RAGConnectionError as e:
+            if attempt == max_retries:
+                raise
+            delay = UPLOAD_RETRY_BACKOFF * 2 ** (attempt - 1)
+            print(Fore.YELLOW + f"Upload attempt {attempt}/{max_retries} of {[os.path.basename(p) for p in files_path_ls]} failed, retrying in {delay:.1f}s: {e}", Fore.RESET)
+            await asyncio.sleep(delay)
+
+
+async def upload_documents_batched(
+    collection_name: str,
+    files_path_ls: List[str],
+    custom_metadata: list[dict] = [],
+    reingest: bool = False,
+    batch_size: int = None,
+    max_batch_bytes: int = None,
+    concurrency: int = None,
+    max_retries: int = None,
+    session: Optional[aiohttp.ClientSession] = None,
+) -> tuple:
+    """Upload files in bounded batches with at most `concurrency` requests in flight.
+
+    Each batch is retried with exponential backoff on transport errors and
+    429/5xx responses. If a batch still fails, its files are retried one by one,
+    so a single bad or oversized PDF does not sink the rest of its batch. Only
+    the files of in-flight requests are open at any time.
+
+    Requests go through `session` if given, otherwise through a session opened
+    for this upload.
+
+    Returns:
+        ([(batch paths, ingestor response), ...], [paths that could not be uploaded])
+    """
+    concurrency = max(1, concurrency or UPLOAD_CONCURRENCY)
+    max_retries = max(1, max_retries or UPLOAD_MAX_RETRIES)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def _metadata(batch):
+        names = {os.path.basename(p) for p in batch}
+        return [m for m in custom_metadata if m.get("filename") in names]
+
+    async def _upload(batch):
+        async with semaphore:
+            print("Uploading files:", batch, "\n to collection:", collection_name, "\n in nemo retriever...   ")
+            return await _send_with_retries(session, collection_name, batch, _metadata(batch), reingest, max_retries)
+
+    async def _upload_batch(batch):
+        try:
+            return [(batch, await _upload(batch))], []
+        except (RAGConnectionError, RAGIngestionError) as e:
+            if len(batch) == 1:
+                print(Fore.RED + f"Giving up on {os.path.basename(batch[0])}: {e}", Fore.RESET)
+                return [], batch
+            print(Fore.YELLOW + f"Batch upload failed, retrying its {len(batch)} files one by one: {e}", Fore.RESET)
+        results = await asyncio.gather(*(_upload_batch([path]) for path in batch))
+        return [r for ok, _ in results for r in ok], [p for _, failed in results for p in failed]
 
-async def fetch_collections():
+    # The semaphore bounds requests in flight; a session of our own is sized to match
+    connector = None if session is not None else aiohttp.TCPConnector(limit=concurrency)
+    async with _client_session(session, connector=connector) as session:
+        results = await asyncio.gather(*(_upload_batch(batch) for batch in batch_files(files_path_ls, batch_size, max_batch_bytes)))
+    uploaded = [r for ok, _ in results for r in ok]
+    failed = [p for _, failed_paths in results for p in failed_paths]
+    return uploaded, failed
+
+async def fetch_collections(session: Optional[aiohttp.ClientSession] = None):
     url = f"{BASE_URL}/v1/collections"
-    async with aiohttp.ClientSession() as session:
+    async with _client_session(session) as session:
         try:
             async with session.get(url) as response:
                 output = await print_response(response)
@@ -99,13 +268,188 @@ async def fetch_collections():
 
 
 
-async def upload_files_to_nemo_retriever(files_path_ls : str , username: str , CUSTOM_METADATA: list[dict] = []): 
-        # Filepaths
-    
-    # [Optional]: Add filename specific custom metadata
+async def upload_files_to_nemo_retriever(
+    files_path_ls: List[str],
+    username: str,
+    CUSTOM_METADATA: list[dict] = [],
+    on_progress: Optional[Callable[[float, str], None]] = None,
+    manifest: Optional[IngestionManifest] = None,
+    plan: Optional[IngestionPlan] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+) -> dict:
+    """Ingest only the documents the user's collection does not have yet.
 
-    output=await upload_documents(username, files_path_ls, CUSTOM_METADATA)
-    return output
+    Files are compared with the collection's ingestion manifest by content hash:
+    identical documents are skipped, new ones are POSTed, and documents whose
+    bytes changed since they were ingested are re-ingested with a PATCH. Each
+    request is tracked until the ingestor finishes it, and only successfully
+    ingested documents are recorded in the manifest. Uploads go through
+    `upload_documents_batched`. Pass `plan` if the files were already planned
+    against `manifest`, and `session` to send the uploads and status polls
+    through an existing session.
+
+    A batch that fails to upload or ingest does not abort the others: its files
+    are listed under "failed" and left out of the manifest, so the next upload
+    retries them.
+
+    Raises:
+        RAGIngestionError: If no document could be ingested
+
+    Returns:
+        {"uploaded": [...], "reingested": [...], "skipped": [...], "failed": [...]} file names
+    """
+    manifest = manifest or IngestionManifest.for_collection(username)
+    plan = plan or manifest.plan(files_path_ls)
+    summary = {"uploaded": [], "reingested": [], "skipped": [os.path.basename(p) for p in plan.unchanged], "failed": []}
+    if summary["skipped"]:
+        print(Fore.CYAN + f"Skipping documents already in collection {username}: {summary['skipped']}", Fore.RESET)
+
+    total = max(len(plan.new) + len(plan.changed), 1)
+    fractions = {}
+
+    def _report(message):
+        if on_progress is not None:
+            on_progress(sum(f * size for f, size in fractions.values()) / total, message)
+
+    async def _track(batch, response):
+        names = [os.path.basename(p) for p in batch]
+        task_id = response.get("task_id")
+        if not task_id:
+            return names, []
+
+        def _batch_progress(fraction, message):
+            fractions[task_id] = (fraction, len(batch))
+            _report(message)
+
+        status = await wait_for_ingestion(task_id, batch, on_progress=_batch_progress, session=session)
+        _, ingested, failed = ingestion_progress(status, names)
+        return (ingested, failed) if ingested or failed else (names, [])
+
+    for paths, reingest, key in ((plan.new, False, "uploaded"), (plan.changed, True, "reingested")):
+        if not paths:
+            continue
+        uploaded, upload_failed = await upload_documents_batched(username, paths, CUSTOM_METADATA, reingest=reingest,
+                                                                 session=session)
+        summary["failed"].extend(os.path.basename(p) for p in upload_failed)
+        # Batches are ingested in parallel on the server, so track them concurrently
+        outcomes = await asyncio.gather(*(_track(batch, response) for batch, response in uploaded), return_exceptions=True)
+        for (batch, _), outcome in zip(uploaded, outcomes):
+            if isinstance(outcome, BaseException):
+                # Other batches may already be ingested; report this one as failed and keep going
+                print(Fore.RED + f"Ingestion of {[os.path.basename(p) for p in batch]} failed: {outcome}", Fore.RESET)
+                summary["failed"].extend(os.path.basename(p) for p in batch)
+                continue
+            ingested, failed = outcome
+            manifest.record([p for p in batch if os.path.basename(p) in ingested], plan.hashes)
+            summary[key].extend(ingested)
+            summary["failed"].extend(failed)
+    if summary["failed"] and not (summary["uploaded"] or summary["reingested"]):
+        raise RAGIngestionError(f"No document could be ingested: {', '.join(summary['failed'])}",
+                                failed_documents=summary["failed"])
+    if on_progress is not None:
+        on_progress(1.0, f"Ingested {len(summary['uploaded']) + len(summary['reingested'])} files, skipped {len(summary['skipped'])} unchanged")
+    return summary
+
+
+async def fetch_ingestion_status(task_id: str, session: Optional[aiohttp.ClientSession] = None) -> dict:
+    """Fetch the state of a non-blocking ingestion task from the ingestor server."""
+    url = f"{BASE_URL}/v1/status"
+    async with _client_session(session) as session:
+        try:
+            async with session.get(url, params={"task_id": task_id}) as response:
+                return await response.json(content_type=None)
+        except aiohttp.ClientError as e:
+            raise RAGConnectionError(f"Cannot fetch ingestion status for task {task_id}: {e}", server_url=url) from e
+
+
+def _document_name(entry) -> str:
+    if isinstance(entry, dict):
+        entry = entry.get("document_name") or entry.get("document_id") or entry.get("source_id") or ""
+    return os.path.basename(str(entry))
+
+
+def ingestion_progress(status: dict, files: List[str]) -> tuple:
+    """Work out which of `files` an ingestion status payload reports as done.
+
+    Understands the final `result.documents` / `result.failed_documents` lists
+    as well as the intermediate `nv_ingest_status` counters reported while the
+    task is still pending.
+
+    Returns:
+        (fraction done, names of ingested files, names of failed files)
+    """
+    total = max(len(files), 1)
+    result = status.get("result") or {}
+    ingested = {_document_name(d) for d in result.get("documents") or []}
+    failed = {_document_name(d) for d in result.get("failed_documents") or []}
+    done = len(ingested | failed)
+
+    nv_status = status.get("nv_ingest_status") or {}
+    per_document = nv_status.get("document_wise_status") or {}
+    for name, doc_status in per_document.items():
+        if str(doc_status).lower() in ("completed", "finished", "success"):
+            ingested.add(_document_name(name))
+    done = max(done, len(ingested | failed), int(nv_status.get("extraction_completed") or 0))
+    return min(done / total, 1.0), sorted(ingested), sorted(failed)
+
+
+async def wait_for_ingestion(
+    task_id: str,
+    files: List[str],
+    on_progress: Optional[Callable[[float, str], None]] = None,
+    timeout: float = None,
+    poll_interval: float = None,
+    session: Optional[aiohttp.ClientSession] = None,
+) -> dict:
+    """Poll an ingestion task until the ingestor reports it finished.
+
+    Returns as soon as the task reaches FINISHED, so uploads take exactly as long
+    as ingestion does. `on_progress(fraction, message)` is called after every poll
+    with the share of `files` that has been processed.
+
+    Raises:
+        RAGIngestionError: If the task fails, every document failed, or it does
+            not finish within `timeout` seconds
+    """
+    timeout = INGESTION_TIMEOUT if timeout is None else timeout
+    delay = INGESTION_POLL_INTERVAL if poll_interval is None else poll_interval
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    names = [os.path.basename(f) for f in files]
+
+    while True:
+        try:
+            status = await fetch_ingestion_status(task_id, session=session)
+        except RAGConnectionError as e:
+            # The ingestor may be briefly busy while it works; keep polling until the deadline
+            print(Fore.YELLOW + f"ingestion status poll failed, retrying: {e}", Fore.RESET)
+            status = {}
+        state = str(status.get("state", "")).upper()
+        fraction, ingested, failed = ingestion_progress(status, names)
+        if state == "FINISHED":
+            fraction = 1.0
+        if on_progress is not None:
+            pending = [n for n in names if n not in ingested and n not in failed]
+            message = f"Ingested {len(ingested)}/{len(names)} files" + (f", processing {pending[0]}" if pending and state != "FINISHED" else "")
+            on_progress(fraction, message)
+
+        if state == "FINISHED":
+            if failed and not ingested:
+                raise RAGIngestionError(f"All documents failed to ingest: {', '.join(failed)}",
+                                        task_id=task_id, failed_documents=failed)
+            if failed:
+                print(Fore.YELLOW + f"Some documents failed to ingest: {failed}", Fore.RESET)
+            return status
+        if state == "FAILED":
+            message = (status.get("result") or {}).get("message") or status.get("message") or "unknown error"
+            raise RAGIngestionError(f"Ingestion task {task_id} failed: {message}",
+                                    task_id=task_id, failed_documents=failed)
+
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise RAGIngestionError(f"Ingestion task {task_id} did not finish within {timeout:.0f}s", task_id=task_id)
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 1.5, INGESTION_MAX_POLL_INTERVAL)
 
 
 async def print_response(response):
@@ -119,20 +463,20 @@ async def print_response(response):
         output="error"
     return output
 
-async def fetch_health_status():
+async def fetch_health_status(session: Optional[aiohttp.ClientSession] = None):
     """Fetch health status asynchronously."""
     url = f"{RAG_BASE_URL}/v1/health"
     print("Fetching RAG server health status with url = ", url)
     params = {"check_dependencies": "True"} # Check health of dependencies as well
-    async with aiohttp.ClientSession() as session:
+    async with _client_session(session) as session:
         async with session.get(url, params=params) as response:
             await print_response(response)
 
 # Run the async function
 #await fetch_health_status()
 ## helpful function to quickly get documents
-async def document_search(payload, url):
-    async with aiohttp.ClientSession() as session:
+async def document_search(payload, url, session: Optional[aiohttp.ClientSession] = None):
+    async with _client_session(session) as session:
         try:
             async with session.post(url=url, json=payload) as response:
                 output = await print_response(response)
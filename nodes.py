@@ -11,19 +11,32 @@ function that will initialize per-user storage paths, check for an existing user
 (in a local JSON store), create/populate state objects for first-time users, 
 and return the final GlobalState instance.
 
-Per-User Storage Structure:
+Per-User Storage Structure (see user_store.UserStore):
     save_to/
     └── user_id/
-        ├── global_state.json      # GlobalState for this user
+        ├── global_state.json      # Index: user id -> user file, GlobalState without the user copy
         └── user_store/             # Per-user storage files
-            └── user_id.json        # User profile with Curriculum > StudyPlan > Chapter > SubTopic
+            ├── user_id.json        # User profile + curriculum index (chapter metadata, shard ids)
+            └── chapters/           # One shard per Chapter (with SubTopics), named by content hash
 
 Example:
     /workspace/mnt/
     └── babe/
         ├── global_state.json
         └── user_store/
-            └── babe.json
+            ├── babe.json
+            └── chapters/
+                ├── 3f9a...c1.json
+                └── 7b02...e4.json
+
+    Loaded states carry a LazyStudyPlan that reads chapter shards on first
+    access, and load_active_chapter_info answers "which chapter is active"
+    from the index alone. Single-file states from older versions load as
+    before and are rewritten in the sharded layout on their next save.
+
+    Storage functions take an optional `store: UserStore`. When it is omitted the
+    handle is resolved per request from the user id, so concurrent sessions for
+    different users never share paths.
 
 User State Update Functions:
     This module provides several functions to load, update, and save user states:
@@ -43,17 +56,39 @@ User State Update Functions:
        
     4. add_quiz_to_subtopic(user_id, save_to, subtopic_number, quiz)
        - Adds a quiz to a specific subtopic
+       
+    5. patch_active_chapter(user_id, save_to, ops)
+       - Applies JSON Patch operations to the active chapter's shard only
+       - Used by 3. and 4., so flipping a status or appending a quiz rewrites
+         one chapter file and the index instead of the whole user state
+
+Concurrency and durability:
+    - Every state file is written atomically (temp file + fsync + rename), so a
+      crash mid-write leaves the previous version intact.
+    - Writers of one user hold that user's lock (UserStore.lock: thread lock +
+      flock on {save_to}/{user_id}/.lock); other users are never blocked.
+    - update_and_save_user_state is optimistic: each User carries a
+      `state_version` counter, the update callback runs without any lock, and
+      the result is only committed if nobody else committed in the meantime.
+      Otherwise the callback is re-run on the fresh state (up to
+      USER_STATE_MAX_RETRIES times) before UserStateConflictError is raised.
+
+Background builds:
+    Curriculum and next-chapter builds run on the local job queue
+    (job_queue.py) via submit_curriculum_job / submit_next_chapter_job. The
+    builders checkpoint the chapter outline and every finished sub-topic into
+    the job, so a build interrupted by a crash or restart resumes where it
+    stopped instead of starting over. Both jobs then queue a quiz bank build
+    (quiz_bank.py) that generates every sub-topic's quizzes of the new active
+    chapter in the background.
 
 Troubleshooting:
-    If you encounter JSON parsing errors when loading user state:
-    1. The saved state file may be corrupted or from an older version
-    2. Delete the user directory: rm -rf {save_to}/{user_id}/
-    3. Re-run run_for_first_time_user to recreate the state
+    If you encounter JSON parsing errors when loading user state, the file was
+    most likely edited or copied by hand (the app itself never leaves partial
+    files behind). Move just that file aside and re-run run_for_first_time_user:
     
     Example:
-        # If getting JSON errors for user 'babe'
-        rm -rf /workspace/mnt/babe/
-        # Then re-run the initialization
+        mv /workspace/mnt/babe/user_store/babe.json /workspace/mnt/babe/user_store/babe.json.corrupt
        
 Usage Examples:
     # Move to next chapter (async)
@@ -98,17 +133,27 @@ import pandas as pd
 from dataclasses import asdict, dataclass
 from colorama import Fore
 from states import Chapter, StudyPlan, Curriculum, User, GlobalState, Status, SubTopic
-from states import save_user_to_file, load_user_from_file
+from states import save_user_to_file, load_user_from_file, atomic_write_bytes
+from states import chapter_summary, load_active_chapter_summary, read_sharded_index, patch_sharded_chapter
 from states import convert_to_json_safe
 from chapter_gen_from_file_names import chapter_gen_from_pdfs, parse_output_from_chapters
 from extract_sub_chapters import parallel_extract_pdf_page_and_text, post_process_extract_sub_chapters
 from study_material_gen_agent import study_material_gen
+from asset_store import get_asset_store
+from material_index import build_material_index
+from user_store import UserStore, resolve_user_store
+from errors import UserStateConflictError, UserStatePatchError
+from job_queue import Job, get_job_queue, register_job_handler
 import asyncio
+import atexit
 import concurrent
+import copy
+import threading
+
+
+# Async callback of long builds, awaited with (progress 0..1, message); Job.report fits it
+ProgressCallback = typing.Callable[[float, str], typing.Awaitable[None]]
 
-# Local simple storage for users (JSON file) - will be initialized per user
-STORE_PATH = None
-USER_STORE_DIR = None
 
 def init_user_storage(save_to: str, user_id: str):
     """Initialize per-user storage paths based on save_to and user_id.
@@ -120,21 +165,15 @@ def init_user_storage(save_to: str, user_id: str):
     This creates a directory structure like:
         save_to/user_id/global_state.json
         save_to/user_id/user_store/
-    """
-    global STORE_PATH, USER_STORE_DIR
     
-    # Create per-user base directory
-    user_base_dir = Path(save_to) / user_id
-    user_base_dir.mkdir(parents=True, exist_ok=True)
+    The user's UserStore is registered so later calls that only pass the
+    user id resolve to the same paths. Nothing process-global is mutated.
     
-    # Store path for global state JSON
-    STORE_PATH = user_base_dir / "global_state.json"
-    
-    # Directory for per-user storage files
-    USER_STORE_DIR = user_base_dir / "user_store"
-    USER_STORE_DIR.mkdir(parents=True, exist_ok=True)
-    
-    return STORE_PATH, USER_STORE_DIR
+    Returns:
+        (store_path, user_store_dir) of the user's UserStore
+    """
+    store = UserStore.open(save_to, user_id)
+    return store.store_path, store.user_store_dir
 
 # global placeholders populated by `call_helper_clients_for_user`
 # ensure these exist at module import time so other async functions can reference them
@@ -143,13 +182,13 @@ quiz_gen_tasks_ls: list[str] = []
 pdf_files: list[str] = []
 quiz_csv_locations: list[str] = []
 
-def _store_file_path() -> Path:
+def _store_file_path(store_path: Path) -> Path:
     """Return a safe file path for the central store.
 
-    If `STORE_PATH` is a directory (e.g., mistakenly created as one), use
+    If `store_path` is a directory (e.g., mistakenly created as one), use
     a file named `store.json` inside it. Ensure parent directories exist.
     """
-    p = STORE_PATH
+    p = Path(store_path)
     if p.exists() and p.is_dir():
         filep = p / "store.json"
         filep.parent.mkdir(parents=True, exist_ok=True)
@@ -159,8 +198,8 @@ def _store_file_path() -> Path:
     return p
 
 
-def _load_store() -> dict:
-    filep = _store_file_path()
+def _load_store(store_path: Path) -> dict:
+    filep = _store_file_path(store_path)
     if filep.exists():
         try:
             return json.loads(filep.read_text(encoding="utf-8"))
@@ -169,28 +208,57 @@ def _load_store() -> dict:
     return {}
 
 
-def _save_store(data: dict):
-    filep = _store_file_path()
+def _save_store(data: dict, store_path: Path):
+    filep = _store_file_path(store_path)
     # ensure the stored data is JSON-serializable (convert Pydantic models, Enums, etc.)
     try:
         safe_data = convert_to_json_safe(data)
     except Exception:
         # fallback: attempt to write raw data (this will raise if not serializable)
         safe_data = data
-    filep.write_text(json.dumps(safe_data, indent=2, ensure_ascii=False), encoding="utf-8")
+    atomic_write_bytes(str(filep), json.dumps(safe_data, indent=2, ensure_ascii=False).encode("utf-8"))
 
 
-def user_exists(user_id: str) -> bool:
+def _is_legacy_user_entry(entry) -> bool:
+    """Older central stores embedded the full user state instead of a file reference."""
+    return isinstance(entry, dict) and "user_file" not in entry and "user_id" in entry
+
+
+def _register_user(user_id: str, store: UserStore):
+    """Record the user in the central index, rewriting it only when the entry changes.
+
+    The index holds ids and relative paths, never user state; the per-user
+    file is the only full copy. Writing an entry also drops any legacy
+    embedded state for that user.
+    """
+    entry = {"user_file": str(store.user_file.relative_to(store.base_dir))}
+    with store.lock():
+        index = _load_store(store.store_path)
+        users = index.setdefault("users", {})
+        if users.get(user_id) == entry:
+            return
+        users[user_id] = entry
+        # Legacy GlobalStates also carried a full copy of the user; drop it while rewriting
+        for gstate in index.get("global_states", {}).values():
+            if isinstance(gstate, dict):
+                gstate.pop("user", None)
+        _save_store(index, store.store_path)
+    print(f"Registered user {user_id} in central index {store.store_path}")
+
+
+def user_exists(user_id: str, store: typing.Optional[UserStore] = None) -> bool:
+    store = store or resolve_user_store(user_id)
 
     # First check per-user file store (created via save_user_to_file)
-    user_file = USER_STORE_DIR / f"{user_id}.json"
-    if user_file.exists():
+    if store.user_file.exists():
         return True
-    store = _load_store()
-    return user_id in store.get("users", {})
+    # An index entry without its file is not a usable user; only a legacy
+    # entry that still embeds the state can be recovered
+    central = _load_store(store.store_path)
+    return _is_legacy_user_entry(central.get("users", {}).get(user_id))
 
 
-def create_user_minimal(user: User) -> User:
+def create_user_minimal(user: User, store: typing.Optional[UserStore] = None) -> User:
     # Accept either a mapping-like User or a Pydantic/Typed object
     if isinstance(user, dict):
         uid = user.get("user_id")
@@ -211,18 +279,19 @@ def create_user_minimal(user: User) -> User:
         "curriculum": None,
     }
 
+    store = store or resolve_user_store(uid)
+
     # Save per-user file
-    save_user_to_file(minimal, str(USER_STORE_DIR / f"{uid}.json"))
+    with store.lock():
+        save_user_to_file(minimal, str(store.user_file), shard_dir=str(store.chapters_dir))
+        _invalidate_cached_user_state(store.user_file)
 
-    # Also register in central store for quick lookups
-    store = _load_store()
-    users = store.setdefault("users", {})
-    users[uid] = minimal
-    _save_store(store)
+    # Also register in central index for quick lookups
+    _register_user(uid, store)
     return minimal
 
 
-def save_user_state(user_id: str, user_obj: User):
+def save_user_state(user_id: str, user_obj: User, store: typing.Optional[UserStore] = None):
     """Save user state to disk with proper serialization of Pydantic models.
     
     This function mirrors save_user_to_file from states.py by:
@@ -233,26 +302,34 @@ def save_user_state(user_id: str, user_obj: User):
     Args:
         user_id: The user identifier
         user_obj: User TypedDict that may contain Pydantic models (Chapter, StudyPlan, etc.)
+        store: Storage handle; resolved from user_id when omitted
     
     Storage locations:
-        - Per-user file: {USER_STORE_DIR}/{user_id}.json (primary storage)
-        - Central store: {STORE_PATH} (convenience index)
-    """
-    # Persist per-user JSON using states.save_user_to_file for Pydantic-aware serialization
-    user_file_path = str(USER_STORE_DIR / f"{user_id}.json")
-    save_user_to_file(user_obj, user_file_path)
-    print(f"Saved user state to {user_file_path}")
+        - Per-user file: {store.user_store_dir}/{user_id}.json (primary storage, only full copy)
+        - Central index: {store.store_path} (user id -> file path, rewritten only on change)
     
-    # Keep central store in sync as a convenience index
-    # Convert to JSON-safe format for central storage
-    store = _load_store()
-    users = store.setdefault("users", {})
-    users[user_id] = convert_to_json_safe(user_obj)
-    _save_store(store)
-    print(f"Updated central store index for user {user_id}")
+    This is an unconditional (last-writer-wins) save that still bumps
+    `state_version`, so in-flight optimistic updates notice it and retry.
+    """
+    store = store or resolve_user_store(user_id)
+    with store.lock():
+        if isinstance(user_obj, dict):
+            user_obj["state_version"] = _current_state_version(user_id, store) + 1
+        _write_user_state(user_id, user_obj, store)
+        # Saved state is now the freshest copy; keep the cache in step with disk
+        _cache_user_state(store, user_id, user_obj, dirty=False)
+
+
+def _write_user_state(user_id: str, user_obj: User, store: UserStore):
+    """Write a user state to its per-user file and make sure the central index points at it."""
+    with store.lock():
+        # Persist the curriculum index and chapter shards with Pydantic-aware serialization
+        save_user_to_file(user_obj, str(store.user_file), shard_dir=str(store.chapters_dir))
+        print(f"Saved user state to {store.user_file}")
+        _register_user(user_id, store)
 
 
-def load_user_state(user_id: str) -> User:
+def load_user_state(user_id: str, store: typing.Optional[UserStore] = None) -> User:
     """Load user state from disk and reconstruct Python classes.
     
     This function mirrors load_user_from_file from states.py by:
@@ -265,6 +342,7 @@ def load_user_state(user_id: str) -> User:
     
     Args:
         user_id: The user identifier
+        store: Storage handle; resolved from user_id when omitted
         
     Returns:
         User TypedDict with properly reconstructed Pydantic models and Enums
@@ -276,8 +354,17 @@ def load_user_state(user_id: str) -> User:
         If the per-user file doesn't exist, falls back to central store.
         The fallback also properly reconstructs objects using load_user_from_file
         to ensure type consistency.
+
+        Reconstructed states are cached in-process and revalidated against the
+        file's mtime and size, so repeated loads skip JSON parsing and model
+        reconstruction. Callers always receive their own copy.
     """
-    user_file = USER_STORE_DIR / f"{user_id}.json"
+    store = store or resolve_user_store(user_id)
+    user_file = store.user_file
+    
+    cached = _get_cached_user_state(user_file)
+    if cached is not None:
+        return cached
     
     # Primary path: Load from per-user file with proper reconstruction
     if user_file.exists():
@@ -286,40 +373,66 @@ def load_user_state(user_id: str) -> User:
             user_state = load_user_from_file(str(user_file))
             print(f"Successfully loaded and reconstructed user state for {user_id}")
             _verify_reconstruction(user_state, user_id)
+            _cache_user_state(store, user_id, user_state, dirty=False)
             return user_state
         except json.JSONDecodeError as e:
             print(f"ERROR: JSON decode error loading user state from {user_file}: {e}")
-            print(f"The file may be corrupted. Consider deleting the user directory:")
-            print(f"  rm -rf {USER_STORE_DIR.parent}")
+            print(f"The file was probably modified outside the app. Move it aside:")
+            print(f"  mv {user_file} {user_file}.corrupt")
             print(f"Then re-run initialization for user '{user_id}'")
             raise
         except Exception as e:
             print(f"ERROR: Unexpected error loading user state: {e}")
             raise
     
-    # Fallback path: Load from central store and reconstruct
+    # Fallback path: Load legacy embedded state from central store and reconstruct
     print(f"Per-user file not found for {user_id}, checking central store...")
-    central_data = _load_store().get("users", {}).get(user_id)
+    central_data = _load_store(store.store_path).get("users", {}).get(user_id)
     
-    if central_data:
+    if _is_legacy_user_entry(central_data):
         # Save to per-user file for next time, then reload with proper reconstruction
         print(f"Found user {user_id} in central store, migrating to per-user file...")
-        temp_file = USER_STORE_DIR / f"{user_id}_temp.json"
-        save_user_to_file(central_data, str(temp_file))
+        temp_file = store.user_store_dir / f"{user_id}_temp.json"
+        save_user_to_file(central_data, str(temp_file), shard_dir=str(store.chapters_dir))
         
         # Now load back with proper reconstruction
         reconstructed = load_user_from_file(str(temp_file))
         
         # Replace temp file with permanent file
         temp_file.replace(user_file)
+        # The per-user file is now the only full copy; shrink the index entry
+        _register_user(user_id, store)
         print(f"Migrated and reconstructed user state for {user_id}")
         _verify_reconstruction(reconstructed, user_id)
+        _cache_user_state(store, user_id, reconstructed, dirty=False)
         return reconstructed
     
     print(f"WARNING: User {user_id} not found in any storage location")
     return None
 
 
+def load_active_chapter_info(user_id: str, store: typing.Optional[UserStore] = None) -> typing.Optional[dict]:
+    """Number, name, status and sub-topic names of the user's active chapter.
+
+    Meant for handlers that only need chapter metadata (e.g. query routing):
+    it is answered from the cached state or from the curriculum index file,
+    without reading any chapter shard.
+
+    Returns:
+        dict with keys number, name, status, sub_topics (list of names), or
+        None if the user or an active chapter does not exist
+    """
+    store = store or resolve_user_store(user_id)
+    with _user_state_cache_lock:
+        entry = _user_state_cache.get(store.user_file)
+        if entry is not None and (entry.dirty or entry.file_version == _file_version(store.user_file)):
+            curricula = entry.state.get("curriculum") if isinstance(entry.state, dict) else None
+            return chapter_summary(curricula[0].get("active_chapter")) if curricula else None
+    if not store.user_file.exists():
+        return None
+    return load_active_chapter_summary(str(store.user_file))
+
+
 def _verify_reconstruction(user_state: User, user_id: str):
     """Verify that loaded user state has properly reconstructed Python classes.
     
@@ -366,9 +479,152 @@ def _verify_reconstruction(user_state: User, user_id: str):
         print(f"  Note: Verification check encountered: {e}")
 
 
+# In-process cache of reconstructed user states, keyed by per-user file path.
+# Clean entries are revalidated against (mtime_ns, size) of the file on every
+# read; dirty entries hold updates that have not been flushed to disk yet and
+# always win over the file until `flush_user_states` writes them out.
+# Lock order: UserStore.lock() first, then _user_state_cache_lock.
+USER_STATE_FLUSH_DELAY = float(os.environ.get("USER_STATE_FLUSH_DELAY", "2.0"))
+USER_STATE_MAX_RETRIES = int(os.environ.get("USER_STATE_MAX_RETRIES", "5"))
+
+
+@dataclass
+class _CachedUserState:
+    user_id: str
+    state: User
+    store: UserStore
+    # (mtime_ns, size) of the per-user file when this entry was last in sync with disk
+    file_version: typing.Optional[typing.Tuple[int, int]]
+    dirty: bool = False
+
+
+_user_state_cache: typing.Dict[Path, _CachedUserState] = {}
+_user_state_cache_lock = threading.RLock()
+_flush_timer: typing.Optional[threading.Timer] = None
+
+
+def _file_version(path: Path) -> typing.Optional[typing.Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _get_cached_user_state(user_file: Path) -> typing.Optional[User]:
+    """Return a copy of the cached state if it is dirty or still matches the file on disk."""
+    with _user_state_cache_lock:
+        entry = _user_state_cache.get(user_file)
+        if entry is None:
+            return None
+        if not entry.dirty and entry.file_version != _file_version(user_file):
+            # Someone else rewrote the file; drop the stale entry and reparse
+            del _user_state_cache[user_file]
+            return None
+        return copy.deepcopy(entry.state)
+
+
+def _cache_user_state(store: UserStore, user_id: str, user_state: User, dirty: bool):
+    with _user_state_cache_lock:
+        previous = _user_state_cache.get(store.user_file)
+        if dirty and previous is not None:
+            # Not written yet: the file is still at the version we last synced with
+            file_version = previous.file_version
+        else:
+            file_version = _file_version(store.user_file)
+        _user_state_cache[store.user_file] = _CachedUserState(
+            user_id=user_id,
+            state=copy.deepcopy(user_state),
+            store=store,
+            file_version=file_version,
+            dirty=dirty,
+        )
+
+
+def _state_version(user_state: typing.Optional[User]) -> int:
+    if not isinstance(user_state, dict):
+        return 0
+    return user_state.get("state_version") or 0
+
+
+def _current_state_version(user_id: str, store: UserStore) -> int:
+    """Latest committed state_version of a user (cache if valid, otherwise disk)."""
+    with _user_state_cache_lock:
+        entry = _user_state_cache.get(store.user_file)
+        if entry is not None and (entry.dirty or entry.file_version == _file_version(store.user_file)):
+            return _state_version(entry.state)
+    if not store.user_file.exists():
+        return 0
+    return _state_version(load_user_state(user_id, store))
+
+
+def _invalidate_cached_user_state(user_file: Path):
+    with _user_state_cache_lock:
+        _user_state_cache.pop(user_file, None)
+
+
+def _flush_entry(user_file: Path, entry: _CachedUserState):
+    # Commits also take the user lock, so the entry cannot change underneath us
+    with entry.store.lock():
+        if _user_state_cache.get(user_file) is not entry or not entry.dirty:
+            return
+        disk_version = _file_version(user_file)
+        if disk_version is not None and disk_version != entry.file_version:
+            # Another process wrote this user since we last synced; never
+            # overwrite a state that is at least as new as ours
+            on_disk = _state_version(load_user_from_file(str(user_file)))
+            if on_disk >= _state_version(entry.state):
+                print(Fore.YELLOW + f"Discarding buffered state v{_state_version(entry.state)} for "
+                      f"{entry.user_id}: file already at v{on_disk}", Fore.RESET)
+                _invalidate_cached_user_state(user_file)
+                return
+        _write_user_state(entry.user_id, entry.state, entry.store)
+        entry.dirty = False
+        entry.file_version = _file_version(user_file)
+
+
+def flush_user_states():
+    """Write every dirty cached user state to disk (write-behind flush)."""
+    global _flush_timer
+    with _user_state_cache_lock:
+        _flush_timer = None
+        dirty_entries = [(f, e) for f, e in _user_state_cache.items() if e.dirty]
+    for user_file, entry in dirty_entries:
+        try:
+            _flush_entry(user_file, entry)
+        except Exception as e:
+            print(Fore.RED + f"Failed to flush user state for {entry.user_id}: {e}", Fore.RESET)
+
+
+def _schedule_flush():
+    """Flush dirty states after USER_STATE_FLUSH_DELAY seconds, coalescing bursts of updates."""
+    global _flush_timer
+    if USER_STATE_FLUSH_DELAY <= 0:
+        flush_user_states()
+        return
+    with _user_state_cache_lock:
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(USER_STATE_FLUSH_DELAY, flush_user_states)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+
+# Never lose buffered updates on a normal interpreter shutdown
+atexit.register(flush_user_states)
+
+
 async def update_and_save_user_state(user_id: str, save_to: str, update_fn: typing.Callable[[User], User]) -> User:
     """Load user state, apply updates via callback, and save back to disk.
     
+    The updated state is kept in the in-process cache and written to disk by a
+    write-behind flush (see USER_STATE_FLUSH_DELAY and flush_user_states), so
+    interactive handlers don't pay for serialization on every update.
+    
+    Updates are optimistic: update_fn runs without holding any lock and the
+    result is committed only if the user's `state_version` is unchanged.
+    On a conflict update_fn is re-run against the fresh state, so it should
+    not have side effects beyond building the new state.
+    
     Args:
         user_id: The user identifier
         save_to: Base directory where user data is stored
@@ -377,6 +633,10 @@ async def update_and_save_user_state(user_id: str, save_to: str, update_fn: typi
     Returns:
         The updated User state
         
+    Raises:
+        ValueError: If the user does not exist
+        UserStateConflictError: If every attempt lost to a concurrent writer
+        
     Example:
         async def my_updates(user_state):
             # Access curriculum (stored as List[Curriculum] per User TypedDict)
@@ -399,77 +659,169 @@ async def update_and_save_user_state(user_id: str, save_to: str, update_fn: typi
         
         updated = await update_and_save_user_state("babe", "/workspace/mnt/", my_updates)
     """
-    # Initialize storage paths for this user
-    init_user_storage(save_to, user_id)
-    
-    # Load existing user state
-    user_state = load_user_state(user_id)
+    # Resolve storage paths for this user (no process-global state involved)
+    store = resolve_user_store(user_id, save_to)
     
-    if not user_state:
-        raise ValueError(f"User {user_id} not found in storage at {save_to}/{user_id}")
-    
-    print(f"Loaded user state for {user_id}")
-    
-    # Apply updates via callback (handle both sync and async callbacks)
     import inspect
-    if inspect.iscoroutinefunction(update_fn):
-        updated_state = await update_fn(user_state)
+    for attempt in range(1, USER_STATE_MAX_RETRIES + 1):
+        # Load existing user state
+        user_state = load_user_state(user_id, store)
+        
+        if not user_state:
+            raise ValueError(f"User {user_id} not found in storage at {save_to}/{user_id}")
+        
+        base_version = _state_version(user_state)
+        print(f"Loaded user state for {user_id} (v{base_version})")
+        
+        # Apply updates via callback (handle both sync and async callbacks)
+        if inspect.iscoroutinefunction(update_fn):
+            updated_state = await update_fn(user_state)
+        else:
+            updated_state = update_fn(user_state)
+        
+        # Commit only if nobody else committed since we loaded
+        with store.lock():
+            if _current_state_version(user_id, store) == base_version:
+                updated_state["state_version"] = base_version + 1
+                # Keep the update in the cache and write it out in the background
+                _cache_user_state(store, user_id, updated_state, dirty=True)
+                break
+        print(Fore.YELLOW + f"Concurrent update of {user_id} detected, retrying ({attempt}/{USER_STATE_MAX_RETRIES})", Fore.RESET)
     else:
-        updated_state = update_fn(user_state)
+        raise UserStateConflictError(
+            f"Could not update user {user_id}: state kept changing during {USER_STATE_MAX_RETRIES} attempts",
+            user_id=user_id,
+            attempts=USER_STATE_MAX_RETRIES,
+        )
     
-    # Save back to disk
-    save_user_state(user_id, updated_state)
-    print(f"Saved updated state for {user_id} to {USER_STORE_DIR / f'{user_id}.json'}")
+    _schedule_flush()
+    print(f"Updated cached state for {user_id} to v{updated_state['state_version']}, queued write to {store.user_file}")
     
     return updated_state
 
 
-async def move_to_next_chapter(user_id: str, save_to: str) -> User:
+def _first_curriculum(user_state: User) -> typing.Optional[Curriculum]:
+    """The user's curriculum (stored as List[Curriculum] per User TypedDict definition), or None."""
+    curriculum_list = user_state.get("curriculum")
+    if not curriculum_list or not isinstance(curriculum_list, list):
+        print("Warning: No curriculum found for user")
+        return None
+    
+    # Get the first (and typically only) curriculum
+    curriculum = curriculum_list[0]
+    
+    if not curriculum or not isinstance(curriculum, dict):
+        print("Warning: Invalid curriculum format")
+        return None
+    return curriculum
+
+
+async def move_to_next_chapter(user_id: str, save_to: str,
+                               checkpoint: typing.Optional[dict] = None,
+                               on_progress: typing.Optional[ProgressCallback] = None) -> User:
     """Convenience function to move user to the next chapter in their curriculum.
     
     Args:
         user_id: The user identifier
         save_to: Base directory where user data is stored
+        checkpoint, on_progress: Passed to build_next_chapter_content; used by
+            the "next_chapter" job (see submit_next_chapter_job) to resume builds
         
     Returns:
         The updated User state
         
     This function:
+    - Builds the next chapter's study material from the state as loaded
     - Marks current active chapter as COMPLETED
     - Moves to next chapter (sets it as active with status STARTED)
     - Updates the study plan accordingly
     """
     
-    async def _move_to_next(user_state: User) -> User:
-        curriculum_list = user_state.get("curriculum")
-        user_id = user_state.get("user_id")
-        # curriculum is stored as List[Curriculum] per User TypedDict definition
-        if not curriculum_list or not isinstance(curriculum_list, list):
-            print("Warning: No curriculum found for user")
+    store = resolve_user_store(user_id, save_to)
+    user_state = load_user_state(user_id, store)
+    if not user_state:
+        raise ValueError(f"User {user_id} not found in storage at {save_to}/{user_id}")
+    curriculum = _first_curriculum(user_state)
+    if curriculum is None:
+        return user_state
+    
+    # The build takes minutes; running it outside the optimistic update keeps
+    # concurrent writes (quiz bank, sub-topic toggles) from restarting it
+    chapter = await build_next_chapter_content(user_id, curriculum, checkpoint=checkpoint, on_progress=on_progress)
+    
+    def _move_to_next(user_state: User) -> User:
+        curriculum = _first_curriculum(user_state)
+        if curriculum is None:
             return user_state
-        
-        if len(curriculum_list) == 0:
-            print("Warning: Curriculum list is empty")
+        active_chapter = curriculum["active_chapter"]
+        current_index = active_chapter["number"] if isinstance(active_chapter, dict) else active_chapter.number
+        if current_index + 1 != chapter.number:
+            print(Fore.YELLOW + f"{user_id} moved on to chapter {current_index} meanwhile; not replacing it with chapter {chapter.number}", Fore.RESET)
             return user_state
+        user_state["curriculum"] = [convert_to_json_safe(advance_curriculum(curriculum, chapter))]
+        return user_state
+    
+    return await update_and_save_user_state(user_id, save_to, _move_to_next)
+
+
+async def patch_active_chapter(user_id: str, save_to: str, ops) -> User:
+    """Apply JSON Patch operations to the active chapter without a full state round-trip.
+
+    Only the curriculum index and the active chapter's shard are read and
+    rewritten (see states.patch_sharded_chapter); the study plan and every
+    other chapter stay on disk untouched. The write happens under the user's
+    lock and bumps `state_version`, so concurrent optimistic updates retry.
+    A pending write-behind update of this user is flushed first, so the patch
+    always applies on top of the latest state.
+    
+    Args:
+        user_id: The user identifier
+        save_to: Base directory where user data is stored
+        ops: JSON Patch operations with paths relative to the chapter
+            (e.g. "/sub_topics/0/status"), or a callable that receives the
+            current chapter as a JSON dict and returns the operations
         
-        # Get the first (and typically only) curriculum
-        curriculum = curriculum_list[0]
+    Returns:
+        The updated User state
         
-        if not curriculum or not isinstance(curriculum, dict):
-            print("Warning: Invalid curriculum format")
-            return user_state
+    Raises:
+        ValueError: If the user does not exist
+        UserStatePatchError: If there is no active chapter or an operation fails
+    """
+    store = resolve_user_store(user_id, save_to)
+    with store.lock():
+        with _user_state_cache_lock:
+            entry = _user_state_cache.get(store.user_file)
+        if entry is not None and entry.dirty:
+            _flush_entry(store.user_file, entry)
         
-        new_curr = await build_next_chapter(user_id, curriculum)
-        user_state["curriculum"] = [convert_to_json_safe(new_curr)]
-        return user_state
+        if not store.user_file.exists():
+            raise ValueError(f"User {user_id} not found in storage at {save_to}/{user_id}")
+        index = read_sharded_index(str(store.user_file))
+        if index is None:
+            # Single-file state from an older version: rewrite it sharded once
+            _write_user_state(user_id, load_user_state(user_id, store), store)
+            index = read_sharded_index(str(store.user_file))
+        
+        index["state_version"] = _state_version(index) + 1
+        try:
+            chapter = patch_sharded_chapter(str(store.user_file), index, "active_chapter", ops)
+        except UserStatePatchError as e:
+            e.user_id = user_id
+            raise
+        if chapter is not None:
+            _invalidate_cached_user_state(store.user_file)
+            print(f"Patched active chapter of {user_id} (v{index['state_version']})")
     
-    return await update_and_save_user_state(user_id, save_to, _move_to_next)
+    return load_user_state(user_id, store)
 
 
 async def update_subtopic_status(user_id: str, save_to: str, subtopic_number: int, 
                            new_status: Status, feedback: typing.Optional[typing.List[str]] = None) -> User:
     """Update a subtopic's status and optionally add feedback in the active chapter.
     
+    Only the active chapter's shard is rewritten (see patch_active_chapter).
+    
     Args:
         user_id: The user identifier
         save_to: Base directory where user data is stored
@@ -480,106 +832,124 @@ async def update_subtopic_status(user_id: str, save_to: str, subtopic_number: in
     Returns:
         The updated User state
     """
-    def _update_subtopic(user_state: User) -> User:
-        curriculum_list = user_state.get("curriculum")
-        
-        # curriculum is stored as List[Curriculum] per User TypedDict definition
-        if not curriculum_list or not isinstance(curriculum_list, list):
-            print("Warning: No curriculum found")
-            return user_state
-        
-        if len(curriculum_list) == 0:
-            print("Warning: Curriculum list is empty")
-            return user_state
-        
-        # Get the first (and typically only) curriculum
-        curriculum = curriculum_list[0]
-        
-        if not curriculum or not isinstance(curriculum, dict):
-            print("Warning: Invalid curriculum format")
-            return user_state
-        
-        active_ch = curriculum.get("active_chapter")
-        
-        if not active_ch or not isinstance(active_ch, dict):
-            print("Warning: No active chapter found")
-            return user_state
-        
-        sub_topics = active_ch.get("sub_topics", [])
-        if not sub_topics or subtopic_number >= len(sub_topics):
+    def _subtopic_ops(chapter: dict) -> list:
+        sub_topics = chapter.get("sub_topics") or []
+        index = subtopic_number if subtopic_number >= 0 else len(sub_topics) + subtopic_number
+        if not 0 <= index < len(sub_topics) or not isinstance(sub_topics[index], dict):
             print(f"Warning: Subtopic {subtopic_number} not found")
-            return user_state
+            return []
         
-        subtopic = sub_topics[subtopic_number]
+        subtopic = sub_topics[index]
+        base = f"/sub_topics/{index}"
+        ops = [{"op": "add", "path": f"{base}/status",
+                "value": new_status.value if isinstance(new_status, Status) else new_status}]
+        print(f"✓ Updated subtopic '{subtopic.get('sub_topic', 'unknown')}' status to {new_status}")
         
-        if isinstance(subtopic, dict):
-            subtopic["status"] = new_status.value if isinstance(new_status, Status) else new_status
-            print(f"✓ Updated subtopic '{subtopic.get('sub_topic', 'unknown')}' status to {new_status}")
-            
-            if feedback:
-                if "feedback" not in subtopic or not subtopic["feedback"]:
-                    subtopic["feedback"] = []
-                subtopic["feedback"].extend(feedback)
-                print(f"✓ Added {len(feedback)} feedback item(s)")
+        if feedback:
+            if subtopic.get("feedback"):
+                ops += [{"op": "add", "path": f"{base}/feedback/-", "value": item} for item in feedback]
+            else:
+                ops.append({"op": "add", "path": f"{base}/feedback", "value": list(feedback)})
+            print(f"✓ Added {len(feedback)} feedback item(s)")
+        return ops
+    
+    try:
+        return await patch_active_chapter(user_id, save_to, _subtopic_ops)
+    except UserStatePatchError as e:
+        print(f"Warning: {e}")
+        return load_user_state(user_id, resolve_user_store(user_id, save_to))
+
+
+async def set_subtopic_status(user_id: str, save_to: str, chapter_number: int, subtopic_index: int,
+                              new_status: Status, quizzes: typing.Optional[typing.List[dict]] = None) -> User:
+    """Set a sub-topic's status, and optionally its quizzes, in the active chapter and the study plan.
+    
+    Unlike update_subtopic_status this keeps the chapter's copy in the study
+    plan in sync. The change is applied to the state passed to the optimistic
+    updater, so writes that land meanwhile (banked quizzes, other tabs) are kept.
+    
+    Args:
+        user_id: The user identifier
+        save_to: Base directory where user data is stored
+        chapter_number: Number of the chapter the sub-topic belongs to
+        subtopic_index: The subtopic index within the chapter (0-indexed)
+        new_status: New status for the subtopic
+        quizzes: If given, replaces the subtopic's quizzes
         
+    Returns:
+        The updated User state
+    """
+    def _set_status(user_state: User) -> User:
+        curriculum = (user_state.get("curriculum") or [None])[0]
+        if not curriculum:
+            print("Warning: No curriculum found for user")
+            return user_state
+        study_plan = curriculum.get("study_plan")
+        chapters = [curriculum.get("active_chapter")]
+        if isinstance(study_plan, dict):
+            chapters += study_plan.get("study_plan", [])
+        elif study_plan is not None:
+            chapters += study_plan.study_plan
+        for chapter in chapters:
+            number = chapter.get("number") if isinstance(chapter, dict) else getattr(chapter, "number", None)
+            if number != chapter_number:
+                continue
+            sub_topics = chapter.get("sub_topics") if isinstance(chapter, dict) else chapter.sub_topics
+            if sub_topics and 0 <= subtopic_index < len(sub_topics):
+                subtopic = sub_topics[subtopic_index]
+                if isinstance(subtopic, dict):
+                    subtopic["status"] = new_status.value
+                    if quizzes is not None:
+                        subtopic["quizzes"] = quizzes
+                else:
+                    subtopic.status = new_status
+                    if quizzes is not None:
+                        subtopic.quizzes = quizzes
         return user_state
     
-    return await update_and_save_user_state(user_id, save_to, _update_subtopic)
+    return await update_and_save_user_state(user_id, save_to, _set_status)
 
 
-async def add_quiz_to_subtopic(user_id: str, save_to: str, subtopic_number: int, quiz: dict) -> User:
-    """Add a quiz to a specific subtopic in the active chapter.
+async def add_quiz_to_subtopic(user_id: str, save_to: str, subtopic_number: int,
+                               quiz: typing.Union[dict, typing.List[dict]],
+                               chapter_number: typing.Optional[int] = None) -> User:
+    """Add a quiz (or a list of quizzes) to a specific subtopic in the active chapter.
+    
+    Only the active chapter's shard is rewritten (see patch_active_chapter).
     
     Args:
         user_id: The user identifier
         save_to: Base directory where user data is stored
         subtopic_number: The subtopic number to add quiz to (0-indexed)
-        quiz: Quiz dictionary with keys: question, choices, answer, explanation
+        quiz: Quiz dictionary with keys: question, choices, answer, explanation,
+            or a list of them
+        chapter_number: If given, only add the quiz while this chapter is still
+            the active one (background builders may finish after the user moved on)
         
     Returns:
         The updated User state
     """
-    def _add_quiz(user_state: User) -> User:
-        curriculum_list = user_state.get("curriculum")
-        
-        # curriculum is stored as List[Curriculum] per User TypedDict definition
-        if not curriculum_list or not isinstance(curriculum_list, list):
-            print("Warning: No curriculum found")
-            return user_state
-        
-        if len(curriculum_list) == 0:
-            print("Warning: Curriculum list is empty")
-            return user_state
-        
-        # Get the first (and typically only) curriculum
-        curriculum = curriculum_list[0]
-        
-        if not curriculum or not isinstance(curriculum, dict):
-            print("Warning: Invalid curriculum format")
-            return user_state
-        
-        active_ch = curriculum.get("active_chapter")
-        
-        if not active_ch or not isinstance(active_ch, dict):
-            print("Warning: No active chapter found")
-            return user_state
-        
-        sub_topics = active_ch.get("sub_topics", [])
-        if not sub_topics or subtopic_number >= len(sub_topics):
+    quizzes = list(quiz) if isinstance(quiz, list) else [quiz]
+    
+    def _quiz_ops(chapter: dict) -> list:
+        sub_topics = chapter.get("sub_topics") or []
+        index = subtopic_number if subtopic_number >= 0 else len(sub_topics) + subtopic_number
+        if not quizzes or not 0 <= index < len(sub_topics) or not isinstance(sub_topics[index], dict):
             print(f"Warning: Subtopic {subtopic_number} not found")
-            return user_state
+            return []
         
-        subtopic = sub_topics[subtopic_number]
-        
-        if isinstance(subtopic, dict):
-            if "quizzes" not in subtopic or not subtopic["quizzes"]:
-                subtopic["quizzes"] = []
-            subtopic["quizzes"].append(quiz)
-            print(f"✓ Added quiz to subtopic '{subtopic.get('sub_topic', 'unknown')}'")
-        
-        return user_state
+        subtopic = sub_topics[index]
+        ops = [] if chapter_number is None else [{"op": "test", "path": "/number", "value": chapter_number}]
+        print(f"✓ Added {len(quizzes)} quiz(zes) to subtopic '{subtopic.get('sub_topic', 'unknown')}'")
+        if subtopic.get("quizzes"):
+            return ops + [{"op": "add", "path": f"/sub_topics/{index}/quizzes/-", "value": q} for q in quizzes]
+        return ops + [{"op": "add", "path": f"/sub_topics/{index}/quizzes", "value": quizzes}]
     
-    return await update_and_save_user_state(user_id, save_to, _add_quiz)
+    try:
+        return await patch_active_chapter(user_id, save_to, _quiz_ops)
+    except UserStatePatchError as e:
+        print(f"Warning: {e}")
+        return load_user_state(user_id, resolve_user_store(user_id, save_to))
 
 
 def parallel_extract_study_materials(username, subject, sub_topics, pdf_file, num_docs):   
@@ -610,7 +980,38 @@ def parallel_extract_study_materials(username, subject, sub_topics, pdf_file, nu
                 #outputs.append
     print(Fore.BLUE +"#### extracted future_to_page_text >>>> ", len(outputs), type(outputs),outputs[-1], Fore.RESET)
     return outputs
-async def sub_topic_builder(username,pdf_loc, subject, pdf_f_name):
+
+
+async def _report_progress(on_progress: typing.Optional[ProgressCallback], progress: float, message: str):
+    if on_progress is not None:
+        await on_progress(progress, message)
+
+
+def _scaled_progress(on_progress: typing.Optional[ProgressCallback], start: float, span: float) -> typing.Optional[ProgressCallback]:
+    """Map a sub-step's 0..1 progress into [start, start + span] of the caller's progress."""
+    if on_progress is None:
+        return None
+
+    async def _scaled(progress: float, message: str):
+        await on_progress(start + span * progress, message)
+    return _scaled
+
+
+async def sub_topic_builder(username,pdf_loc, subject, pdf_f_name,
+                            checkpoint: typing.Optional[dict] = None,
+                            on_progress: typing.Optional[ProgressCallback] = None):
+    """Build the SubTopics (with study material) of one chapter PDF.
+    
+    Args:
+        checkpoint: Optional dict that records every finished sub-topic (keyed
+            by its position in the extracted outline). Sub-topics already in it
+            are reused instead of regenerated, so an interrupted build resumes
+            where it stopped. The caller is responsible for persisting it.
+        on_progress: Optional async callback (fraction, message), awaited after
+            every sub-topic once the checkpoint is updated
+    """
+    checkpoint = {} if checkpoint is None else checkpoint
+    done = checkpoint.setdefault("sub_topics", {})
     sub_topics = parallel_extract_pdf_page_and_text(pdf_loc)
     sub_topics_ordered = post_process_extract_sub_chapters(sub_topics)        
     print(Fore.LIGHTGREEN_EX + " creating studying materails for chapter :", Fore.RESET)
@@ -620,7 +1021,16 @@ async def sub_topic_builder(username,pdf_loc, subject, pdf_f_name):
     # pass the full pdf path (pdf_loc) into the extractor so it can locate the file                
     valid_sub_topics=[]
     j=0
-    for sub_topic in sub_topics_ordered:
+    total = len(sub_topics_ordered)
+    for position, sub_topic in enumerate(sub_topics_ordered):
+        key = str(position)
+        finished = done.get(key)
+        if finished is not None and finished.get("sub_topic") == sub_topic:
+            # Built before an interruption; "skipped" marks a sub-topic without usable documents
+            if not finished.get("skipped"):
+                valid_sub_topics.append(SubTopic(**{**finished, "number": j}))
+                j+=1
+            continue
         
         print(f" ======================== j = {str(j)} | pdf_f_name : {pdf_f_name} | sub_topic= {sub_topic} ===================") 
         num_docs=3
@@ -630,36 +1040,88 @@ async def sub_topic_builder(username,pdf_loc, subject, pdf_f_name):
             _sub_topic=sub_topic
         study_material_str, markdown_str = await study_material_gen(username,subject,_sub_topic, pdf_f_name, num_docs)
         if markdown_str == "":
-            pass
+            done[key] = {"sub_topic": sub_topic, "skipped": True}
             print(Fore.YELLOW + f"invalid subtopic {sub_topic} failed to fetch relevant documents\n ") 
         else:
+            # keep images out of the user JSON, reference them from the asset store
+            display_markdown = get_asset_store().externalize_markdown(markdown_str)
             sub_topic_temp=SubTopic(
                 number=j,        
                 sub_topic=sub_topic,
                 status=Status.NA,
                 study_material=study_material_str,
-                display_markdown = markdown_str,
+                display_markdown = display_markdown,
+                # scanned once here so chat turns do not re-scan the markdown
+                material_index = build_material_index(display_markdown),
                 reference=pdf_f_name,
                 quizzes = [],
                 feedback = []
             )
             j+=1
             valid_sub_topics.append(sub_topic_temp)
+            done[key] = convert_to_json_safe(sub_topic_temp)
             
             print(Fore.YELLOW + "markdown_pretty_print \n ") 
             print( study_material_str)                
             print("\n\n\n")
+        await _report_progress(on_progress, (position + 1) / total, f"Study material {position + 1}/{total}: {sub_topic}")
     return valid_sub_topics           
 
 
-async def build_next_chapter( username,curriculum : Curriculum ) -> Curriculum :
+async def build_next_chapter( username,curriculum : Curriculum,
+                              checkpoint: typing.Optional[dict] = None,
+                              on_progress: typing.Optional[ProgressCallback] = None) -> Curriculum :
     """Try to reuse the heuristics in helper.extract_summaries_and_chapters
     to create Chapter objects. We'll implement a small local parser here so
     the orchestrator is self-contained.
+    
+    `checkpoint` and `on_progress` are passed to sub_topic_builder, so an
+    interrupted build of the next chapter resumes per sub-topic.
+    """
+    chap = await build_next_chapter_content(username, curriculum, checkpoint=checkpoint, on_progress=on_progress)
+    return advance_curriculum(curriculum, chap)
+
+
+async def build_next_chapter_content(username, curriculum: Curriculum,
+                                     checkpoint: typing.Optional[dict] = None,
+                                     on_progress: typing.Optional[ProgressCallback] = None) -> Chapter:
+    """Build the chapter after the curriculum's active chapter, with its sub-topics and study material.
+    
+    This is the slow part of build_next_chapter (PDF extraction and LLM calls);
+    the curriculum itself is not modified, see advance_curriculum.
     """
-    study_plan = curriculum["study_plan"]
     next_chapter = curriculum["next_chapter"]
     active_chapter = curriculum["active_chapter"]
+    current_index = active_chapter["number"] if isinstance(active_chapter, dict) else active_chapter.number
+    
+    # Access next chapter properties - handle both dict and object access  
+    if isinstance(next_chapter, dict):
+        pdf_file_loc = next_chapter["pdf_loc"]
+        chapter_title = next_chapter["name"]
+    else:
+        pdf_file_loc = next_chapter.pdf_loc
+        chapter_title = next_chapter.name 
+
+    pdf_f_name=pdf_file_loc.split('/')[-1]
+    subject=pdf_f_name.split('.pdf')[0]
+    
+    subtopics_and_study_material = await sub_topic_builder(username,pdf_file_loc, subject, pdf_f_name,
+                                                           checkpoint=checkpoint, on_progress=on_progress)
+    return Chapter(
+    number=current_index + 1,
+    name=chapter_title,
+    status=Status.STARTED, 
+    sub_topics=subtopics_and_study_material,        
+    reference=pdf_f_name,
+    pdf_loc = pdf_file_loc,
+    quizzes=[],
+    feedback=[])
+
+
+def advance_curriculum(curriculum: Curriculum, chap: Chapter) -> Curriculum:
+    """Complete the active chapter and make `chap` (from build_next_chapter_content) the active one."""
+    study_plan = curriculum["study_plan"]
+    active_chapter = curriculum["active_chapter"]
     
     # Update active chapter status - handle both dict and object access
     if isinstance(active_chapter, dict):
@@ -682,28 +1144,6 @@ async def build_next_chapter( username,curriculum : Curriculum ) -> Curriculum :
         for i in range(n):
             active_chapter.sub_topics[i].status= Status.COMPLETED
     
-    # Access next chapter properties - handle both dict and object access  
-    if isinstance(next_chapter, dict):
-        pdf_file_loc = next_chapter["pdf_loc"]
-        chapter_title = next_chapter["name"]
-    else:
-        pdf_file_loc = next_chapter.pdf_loc
-        chapter_title = next_chapter.name 
-
-    pdf_f_name=pdf_file_loc.split('/')[-1]
-    subject=pdf_f_name.split('.pdf')[0]
-    
-    subtopics_and_study_material = await sub_topic_builder(username,pdf_file_loc, subject, pdf_f_name)
-    chap=Chapter(
-    number=current_index + 1,
-    name=chapter_title,
-    status=Status.STARTED, 
-    sub_topics=subtopics_and_study_material,        
-    reference=pdf_f_name,
-    pdf_loc = pdf_file_loc,
-    quizzes=[],
-    feedback=[])
-    
     # Convert Chapter to dict for consistency
     curriculum["active_chapter"] = convert_to_json_safe(chap)
     
@@ -729,29 +1169,42 @@ async def build_next_chapter( username,curriculum : Curriculum ) -> Curriculum :
     # Ensure the updated study_plan is saved back to curriculum
     curriculum["study_plan"] = convert_to_json_safe(study_plan) if not isinstance(study_plan, dict) else study_plan
     
-    print(Fore.LIGHTGREEN_EX + " Moving to next chapter: ", chapter_title, Fore.RESET)
+    print(Fore.LIGHTGREEN_EX + " Moving to next chapter: ", chap.name, Fore.RESET)
     return curriculum
 
 
-async def build_chapters(username, pdf_files_loc: str ) -> typing.List[Chapter]:
+async def build_chapters(username, pdf_files_loc: str,
+                         checkpoint: typing.Optional[dict] = None,
+                         on_progress: typing.Optional[ProgressCallback] = None) -> typing.List[Chapter]:
     """Try to reuse the heuristics in helper.extract_summaries_and_chapters
     to create Chapter objects. We'll implement a small local parser here so
     the orchestrator is self-contained.
-    """
     
-    chapter_titles_str = await chapter_gen_from_pdfs(pdf_files_loc)
-    chapter_output=parse_output_from_chapters(chapter_titles_str)
-    
-    # Filter out invalid items (non-dicts or empty lists) and validate structure
-    valid_chapter_output = [
-        item for item in chapter_output 
-        if isinstance(item, dict) and "file_loc" in item and "title" in item
-    ]
-    
-    if not valid_chapter_output:
-        print("Warning: No valid chapters found in chapter_output. Returning empty list.")
-        print(f"Raw chapter_output: {chapter_output}")
-        return []
+    Args:
+        checkpoint: Optional dict that keeps the chapter outline and the
+            finished sub-topics of the first chapter, so an interrupted build
+            resumes without repeating LLM calls. Persisted by the caller.
+        on_progress: Optional async callback (fraction, message), awaited
+            after the outline and after every chapter and sub-topic
+    """
+    checkpoint = {} if checkpoint is None else checkpoint
+    valid_chapter_output = checkpoint.get("outline")
+    if valid_chapter_output is None:
+        chapter_titles_str = await chapter_gen_from_pdfs(pdf_files_loc)
+        chapter_output=parse_output_from_chapters(chapter_titles_str)
+        
+        # Filter out invalid items (non-dicts or empty lists) and validate structure
+        valid_chapter_output = [
+            {"file_loc": item["file_loc"], "title": item["title"]} for item in chapter_output 
+            if isinstance(item, dict) and "file_loc" in item and "title" in item
+        ]
+        
+        if not valid_chapter_output:
+            print("Warning: No valid chapters found in chapter_output. Returning empty list.")
+            print(f"Raw chapter_output: {chapter_output}")
+            return []
+        checkpoint["outline"] = valid_chapter_output
+        await _report_progress(on_progress, 0.1, f"Outlined {len(valid_chapter_output)} chapters")
     
     pdf_files_ls = [os.path.join(pdf_files_loc, item["file_loc"]) for item in valid_chapter_output]
     chapter_titles_cleaned_ls=[ item["title"] for item in valid_chapter_output]
@@ -764,7 +1217,10 @@ async def build_chapters(username, pdf_files_loc: str ) -> typing.List[Chapter]:
         pdf_f_name=pdf_loc.split('/')[-1]
         subject=pdf_f_name.split('.pdf')[0]
         if i==0 :
-            valid_sub_topics = await sub_topic_builder(username,pdf_loc, subject, pdf_f_name)
+            # The first chapter gets its study material now; this is most of the build time
+            valid_sub_topics = await sub_topic_builder(username,pdf_loc, subject, pdf_f_name,
+                                                       checkpoint=checkpoint.setdefault("first_chapter", {}),
+                                                       on_progress=_scaled_progress(on_progress, 0.1, 0.8))
             chap=Chapter(
             number=i,
             name=chapter_title,
@@ -788,12 +1244,15 @@ async def build_chapters(username, pdf_files_loc: str ) -> typing.List[Chapter]:
         
         chapters.append(chap)
         i+=1
+        await _report_progress(on_progress, 0.9, f"Chapter {i}/{len(pdf_files_ls)}: {chapter_title}")
     
 
         print(Fore.LIGHTGREEN_EX + " how many chapters = \n", len(chapters), chapters, Fore.RESET)
     return chapters
 
-async def populate_states_for_user(user: User, pdf_files_loc: str, study_buddy_preference: str) -> GlobalState:
+async def populate_states_for_user(user: User, pdf_files_loc: str, study_buddy_preference: str, store: typing.Optional[UserStore] = None,
+                                   checkpoint: typing.Optional[dict] = None,
+                                   on_progress: typing.Optional[ProgressCallback] = None) -> GlobalState:
     """Given results from MCP clients, construct Chapter, StudyPlan, Curriculum, User and GlobalState
     and persist them in the store.
     
@@ -801,12 +1260,15 @@ async def populate_states_for_user(user: User, pdf_files_loc: str, study_buddy_p
         user: User TypedDict with basic user information
         pdf_files_loc: Path to directory containing PDF files
         study_buddy_preference: User's preference for study buddy persona
+        store: Storage handle; resolved from the user id when omitted
+        checkpoint, on_progress: Passed to build_chapters (see there)
         
     Returns:
         GlobalState TypedDict with populated user, curriculum, and study plan
     """
     username = user["user_id"]
-    chapters = await build_chapters(username,pdf_files_loc)
+    store = store or resolve_user_store(username)
+    chapters = await build_chapters(username,pdf_files_loc, checkpoint=checkpoint, on_progress=on_progress)
     print(Fore.LIGHTGREEN_EX + "len of chapter is = \n",len(chapters), chapters, '\n\n', Fore.RESET )
     
     # Handle case when no chapters are found
@@ -849,7 +1311,8 @@ async def populate_states_for_user(user: User, pdf_files_loc: str, study_buddy_p
     }
 
     # Save into store
-    save_user_state(user["user_id"], user_dict)
+    save_user_state(user["user_id"], user_dict, store)
+    await _report_progress(on_progress, 0.95, "Saved curriculum")
     processed_pdf_files=[os.path.join(pdf_files_loc, pdf_f) for pdf_f in os.listdir(pdf_files_loc) if pdf_f.endswith('.pdf')]
     # Build GlobalState TypedDict with all required fields
     gstate: GlobalState = {
@@ -864,15 +1327,18 @@ async def populate_states_for_user(user: User, pdf_files_loc: str, study_buddy_p
         "agent_final_output": None,
         "intermediate_steps": [],
     }
-    # persist top-level
-    store = _load_store()
-    store.setdefault("global_states", {})[user["user_id"]] = gstate
-    _save_store(store)
+    # persist top-level, without a second copy of the user state
+    with store.lock():
+        central = _load_store(store.store_path)
+        central.setdefault("global_states", {})[user["user_id"]] = {k: v for k, v in gstate.items() if k != "user"}
+        _save_store(central, store.store_path)
 
     return gstate
 
 
-async def run_for_first_time_user(user: User, uploaded_pdf_loc: str, save_to: str, study_buddy_preference: str , store_path : str = None, user_store_dir :str = None) -> GlobalState:
+async def run_for_first_time_user(user: User, uploaded_pdf_loc: str, save_to: str, study_buddy_preference: str , store_path : str = None, user_store_dir :str = None,
+                                  checkpoint: typing.Optional[dict] = None,
+                                  on_progress: typing.Optional[ProgressCallback] = None) -> GlobalState:
     """Main entrypoint: ensure user exists, call helper clients if necessary,
     populate states, and return the GlobalState.
     
@@ -884,6 +1350,10 @@ async def run_for_first_time_user(user: User, uploaded_pdf_loc: str, save_to: st
         uploaded_pdf_loc: Path to directory containing uploaded PDF files
         save_to: Base directory for storing user data and states
         study_buddy_preference: User's preference for study buddy persona
+        store_path, user_store_dir: Deprecated, ignored. Paths are derived from
+            save_to and user_id via UserStore.
+        checkpoint, on_progress: Passed to build_chapters; used by the
+            "curriculum" job (see submit_curriculum_job) to resume builds
         
     Returns:
         GlobalState TypedDict with fully populated user state and curriculum
@@ -892,37 +1362,100 @@ async def run_for_first_time_user(user: User, uploaded_pdf_loc: str, save_to: st
     
     # Initialize per-user storage paths
     print(f"Initializing storage for user {user_id} at {save_to}...")
-    if store_path is None and user_store_dir is None:
-        store_path, user_store_dir = init_user_storage(save_to, user_id)
-    print(f"  - Global state path: {store_path}")
-    print(f"  - User store directory: {user_store_dir}")
+    user_store = resolve_user_store(user_id, save_to)
+    print(f"  - Global state path: {user_store.store_path}")
+    print(f"  - User store directory: {user_store.user_store_dir}")
     
-    if not user_exists(user_id):
+    if not user_exists(user_id, user_store):
         print(f"User {user_id} not found. Creating minimal user record...")
-        create_user_minimal(user)
+        create_user_minimal(user, user_store)
 
     # check if we already have a global state
-    store = _load_store()
+    store = _load_store(user_store.store_path)
     if store.get("global_states", {}).get(user_id):
         print(f"Found existing GlobalState for user {user_id}; returning it.")
-        return store["global_states"][user_id]
+        gstate = store["global_states"][user_id]
+        # The index only keeps a reference; rehydrate the user from its per-user file
+        gstate["user"] = convert_to_json_safe(load_user_state(user_id, user_store))
+        return gstate
 
     # First-time population: call helper clients
     print("Populating application states ...")
-    gstate = await populate_states_for_user(user, uploaded_pdf_loc, study_buddy_preference)
+    gstate = await populate_states_for_user(user, uploaded_pdf_loc, study_buddy_preference, user_store,
+                                            checkpoint=checkpoint, on_progress=on_progress)
     
     # Update GlobalState with save_to path
     gstate["save_to"] = save_to
     
-    # Re-save the updated GlobalState
-    store = _load_store()
-    store.setdefault("global_states", {})[user_id] = gstate
-    _save_store(store)
+    # Re-save the updated GlobalState (the user itself lives only in its per-user file)
+    with user_store.lock():
+        store = _load_store(user_store.store_path)
+        store.setdefault("global_states", {})[user_id] = {k: v for k, v in gstate.items() if k != "user"}
+        _save_store(store, user_store.store_path)
     
     print("Done. GlobalState created and saved.")
     return gstate
 
 
+async def _curriculum_job(job: Job) -> dict:
+    """Job handler: build a first-time user's curriculum, checkpointing every sub-topic."""
+    params = job.params
+    await run_for_first_time_user(params["user"], params["pdf_loc"], params["save_to"], params["study_buddy_preference"],
+                                  checkpoint=job.checkpoint, on_progress=job.report)
+    _queue_quiz_bank(job.user_id, params["save_to"])
+    return {"user_id": job.user_id}
+
+
+async def _next_chapter_job(job: Job) -> dict:
+    """Job handler: complete the active chapter and build the next one."""
+    save_to, from_chapter = job.params["save_to"], job.params["from_chapter"]
+    active = load_active_chapter_info(job.user_id, resolve_user_store(job.user_id, save_to))
+    if active is None or active["number"] != from_chapter:
+        # An earlier attempt already committed the move before it was interrupted
+        print(Fore.YELLOW + f"{job.user_id} is no longer on chapter {from_chapter}; nothing to build", Fore.RESET)
+        return {"user_id": job.user_id, "chapter": active["number"] if active else None}
+    await move_to_next_chapter(job.user_id, save_to, checkpoint=job.checkpoint, on_progress=job.report)
+    _queue_quiz_bank(job.user_id, save_to)
+    return {"user_id": job.user_id, "chapter": from_chapter + 1}
+
+
+def _queue_quiz_bank(user_id: str, save_to: str):
+    """Queue quiz generation for the user's new active chapter; never fails the calling build."""
+    try:
+        # quiz_bank imports this module, so it can only be imported once nodes is loaded
+        from quiz_bank import submit_quiz_bank_job
+        active = load_active_chapter_info(user_id, resolve_user_store(user_id, save_to))
+        if active is not None:
+            submit_quiz_bank_job(user_id, save_to, active["number"])
+    except Exception as e:
+        print(Fore.RED + f"Could not queue quiz bank for {user_id}: {e}", Fore.RESET)
+
+
+register_job_handler("curriculum", _curriculum_job)
+register_job_handler("next_chapter", _next_chapter_job)
+
+
+def submit_curriculum_job(user: User, uploaded_pdf_loc: str, save_to: str, study_buddy_preference: str) -> str:
+    """Queue run_for_first_time_user on the job queue and return the job id.
+    
+    The build runs on the job queue's worker pool, not in the caller's
+    thread; poll it with get_job_queue().get(job_id) or wait(job_id). A
+    build that was interrupted (crash, restart, error) resumes from its
+    last finished sub-topic when it is submitted again or the app restarts.
+    """
+    return get_job_queue().submit("curriculum", user["user_id"], {
+        "user": convert_to_json_safe(user),
+        "pdf_loc": uploaded_pdf_loc,
+        "save_to": save_to,
+        "study_buddy_preference": study_buddy_preference,
+    })
+
+
+def submit_next_chapter_job(user_id: str, save_to: str, from_chapter: int) -> str:
+    """Queue move_to_next_chapter for a user currently on chapter `from_chapter`; returns the job id."""
+    return get_job_queue().submit("next_chapter", user_id, {"save_to": save_to, "from_chapter": from_chapter})
+
+
 if __name__ == "__main__":
     import argparse
 
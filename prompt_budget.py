@@ -0,0 +1,226 @@
+"""
+Token budgets for the sections of the study buddy prompt.
+
+`STUDY_BUDDY_SYS_PROMPT` used to interpolate the whole study material (often
+`display_markdown` with inline base64 images), the JSON of every quiz, the
+memory context and the chat history into each chat request, so long
+materials made every turn huge and slow. `PromptBudget` fits each section
+to its own token budget before the prompt is assembled:
+
+    study_material - base64 images replaced by a placeholder, then only the
+                     paragraphs most relevant to the query (BM25), in document order
+    quizzes        - the questions most relevant to the query
+    memory         - retrieved memories and the conversation summary, truncated
+    chat_history   - the most recent lines
+
+Sections that already fit are passed through unchanged. Budgets are read from
+the `prompt_budget` section of llm_config.yaml.
+
+Usage:
+    from prompt_budget import get_prompt_budget
+
+    budget = get_prompt_budget()
+    material = budget.fit_material(study_material, user_input)
+    quizzes = budget.fit_quizzes(list_of_quizzes, user_input)
+"""
+
+import json
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from colorama import Fore
+
+# No tokenizer ships with the app; ~4 characters per token is close enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# Used when llm_config.yaml has no prompt_budget section
+DEFAULT_BUDGETS = {
+    "study_material": 3000,
+    "quizzes": 800,
+    "memory": 600,
+    "chat_history": 500,
+}
+
+TRUNCATION_MARK = " …"
+
+_MD_DATA_IMAGE = re.compile(r'!\[([^\]]*)\]\(data:image/[^;]+;base64,[A-Za-z0-9+/=\s]+\)')
+_HTML_DATA_IMAGE = re.compile(r'<img\s+[^>]*src=["\']data:image/[^;]+;base64,[A-Za-z0-9+/=\s]+["\'][^>]*/?>')
+_DATA_URI = re.compile(r'data:image/[^;]+;base64,[A-Za-z0-9+/=]+')
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def strip_base64_images(text: str) -> str:
+    """Replace inline base64 images with a short `[image: alt]` placeholder."""
+    if not text or "base64," not in text:
+        return text or ""
+    text = _MD_DATA_IMAGE.sub(lambda m: f"[image: {m.group(1)}]" if m.group(1) else "[image]", text)
+    text = _HTML_DATA_IMAGE.sub("[image]", text)
+    return _DATA_URI.sub("[image]", text)
+
+
+def truncate_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """Cut text to about `max_tokens` on a word boundary, keeping its start ("head") or end ("tail")."""
+    text = text or ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARK))
+    if keep == "tail":
+        cut = text[len(text) - limit:]
+        cut = cut[cut.find(" ") + 1:] if " " in cut else cut
+        return TRUNCATION_MARK.lstrip() + " " + cut if cut else ""
+    cut = text[:limit]
+    cut = cut[:cut.rfind(" ")] if " " in cut else cut
+    return cut + TRUNCATION_MARK if cut else ""
+
+
+def _tokenize(text: str) -> List[str]:
+    return _WORD.findall((text or "").lower())
+
+
+def bm25_scores(query: str, documents: List[str], k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Okapi BM25 score of every document for the query."""
+    docs = [_tokenize(d) for d in documents]
+    terms = set(_tokenize(query))
+    if not docs or not terms:
+        return [0.0] * len(documents)
+    avg_len = sum(len(d) for d in docs) / len(docs) or 1.0
+    doc_freq = Counter(term for d in docs for term in set(d) if term in terms)
+    scores = []
+    for d in docs:
+        counts = Counter(d)
+        score = 0.0
+        for term in terms:
+            tf = counts.get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (len(docs) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(d) / avg_len))
+        scores.append(score)
+    return scores
+
+
+def _select(items: List[str], costs: List[int], query: str, max_tokens: int) -> List[int]:
+    """Indices of the highest-scoring items that fit the budget, in original order.
+
+    Ties (e.g. no query term anywhere) go to earlier items.
+    """
+    scores = bm25_scores(query, items)
+    ranked = sorted(range(len(items)), key=lambda i: (-scores[i], i))
+    chosen, used = [], 0
+    for i in ranked:
+        if used + costs[i] <= max_tokens:
+            chosen.append(i)
+            used += costs[i]
+    return sorted(chosen)
+
+
+def select_paragraphs(text: str, query: str, max_tokens: int,
+                      spans: Optional[List[List[int]]] = None) -> str:
+    """The paragraphs of `text` most relevant to `query` that fit `max_tokens`, in document order.
+
+    `spans` are precomputed [start, end] paragraph spans (see material_index)
+    covering the start of `text`; only the text after them is split here.
+    """
+    text = text or ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    spans = spans or []
+    paragraphs = [text[start:end] for start, end in spans]
+    rest = text[spans[-1][1]:] if spans else text
+    paragraphs += [p.strip() for p in _PARAGRAPH_BREAK.split(rest) if p.strip()]
+    # Paragraph separators cost tokens too
+    costs = [estimate_tokens(p) + 1 for p in paragraphs]
+    chosen = _select(paragraphs, costs, query, max_tokens)
+    if not chosen:
+        # Every paragraph is over the budget on its own: keep the start of the best one
+        best = _select(paragraphs, [0] * len(paragraphs), query, 0)
+        return truncate_tokens(paragraphs[best[0]], max_tokens) if best else ""
+    return "\n\n".join(paragraphs[i] for i in chosen)
+
+
+@dataclass
+class PromptBudget:
+    """Per-section token budgets of the study buddy prompt."""
+    study_material: int = DEFAULT_BUDGETS["study_material"]
+    quizzes: int = DEFAULT_BUDGETS["quizzes"]
+    memory: int = DEFAULT_BUDGETS["memory"]
+    chat_history: int = DEFAULT_BUDGETS["chat_history"]
+
+    def fit_material(self, study_material: str, query: str,
+                     spans: Optional[List[List[int]]] = None) -> str:
+        """Study material without base64 images, reduced to the paragraphs relevant to the query.
+
+        With `spans` (from a material index) the text is taken to be already
+        image-free and its leading paragraphs are not re-split.
+        """
+        if spans is None:
+            study_material = strip_base64_images(study_material)
+        return select_paragraphs(study_material, query, self.study_material, spans)
+
+    def fit_quizzes(self, quizzes: List[dict], query: str) -> List[dict]:
+        """The quiz questions most relevant to the query whose JSON fits the budget, in order."""
+        quizzes = list(quizzes or [])
+        if estimate_tokens(json.dumps(quizzes, ensure_ascii=False, indent=2)) <= self.quizzes:
+            return quizzes
+        texts = [q.get("question", "") if isinstance(q, dict) else str(q) for q in quizzes]
+        costs = [estimate_tokens(json.dumps(q, ensure_ascii=False, indent=2)) for q in quizzes]
+        return [quizzes[i] for i in _select(texts, costs, query, self.quizzes)]
+
+    def fit_memory(self, memory_context: str, history_summary: str) -> Tuple[str, str]:
+        """Truncate retrieved memories and the conversation summary to share the memory budget.
+
+        The summary gets at most half of the budget; memories get the rest.
+        """
+        history_summary = truncate_tokens(history_summary, self.memory // 2)
+        memory_context = truncate_tokens(memory_context, self.memory - estimate_tokens(history_summary))
+        return memory_context, history_summary
+
+    def fit_history(self, chat_history: str) -> str:
+        """The most recent lines of the chat history that fit the budget."""
+        chat_history = chat_history or ""
+        if estimate_tokens(chat_history) <= self.chat_history:
+            return chat_history
+        kept, used = [], 0
+        for line in reversed(chat_history.splitlines(keepends=True)):
+            cost = estimate_tokens(line)
+            if used + cost > self.chat_history:
+                if not kept:
+                    kept.append(truncate_tokens(line, self.chat_history, keep="tail"))
+                break
+            kept.append(line)
+            used += cost
+        return "".join(reversed(kept))
+
+    def log_sections(self, sections: Dict[str, str]) -> None:
+        """Print the estimated token count of every prompt section against its budget."""
+        parts = []
+        for name, text in sections.items():
+            limit = getattr(self, name, None)
+            parts.append(f"{name} {estimate_tokens(text)}" + (f"/{limit}" if limit else ""))
+        print(Fore.CYAN + "Prompt tokens: " + ", ".join(parts), Fore.RESET)
+
+
+_budget: Optional[PromptBudget] = None
+
+
+def get_prompt_budget() -> PromptBudget:
+    """The budgets of the `prompt_budget` section of llm_config.yaml (defaults if it is missing)."""
+    global _budget
+    if _budget is None:
+        budgets = dict(DEFAULT_BUDGETS)
+        try:
+            from llm.config import load_config
+            configured = load_config().get("prompt_budget") or {}
+            budgets.update({k: int(v) for k, v in configured.items() if k in DEFAULT_BUDGETS})
+        except Exception as e:
+            print(Fore.YELLOW + f"Could not read prompt budgets from llm_config.yaml ({e}), using defaults", Fore.RESET)
+        _budget = PromptBudget(**budgets)
+    return _budget
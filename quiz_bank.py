@@ -0,0 +1,143 @@
+"""
+Background quiz bank: multiple choice questions for every sub-topic of a chapter.
+
+Quizzes used to be generated on demand: when a sub-topic was checked off, the
+UI called `get_quiz` synchronously and the user waited for a full ASTRA
+generation, and the quiz tab only ever covered `sub_topics[0]`. The quiz bank
+is built on the job queue right after a chapter's study material exists
+(curriculum and next-chapter jobs queue it). It generates the quizzes of all
+sub-topics concurrently and stores them with `add_quiz_to_subtopic`, so opening
+a quiz is a plain state read. Each sub-topic is quizzed chunk by chunk
+(see quiz_fanout); one semaphore bounds the generations of the whole build.
+
+The build is idempotent: sub-topics that already have quizzes are skipped,
+so resubmitting or resuming a job only generates what is missing. Quizzes are
+only written while the chapter is still the user's active chapter.
+
+Usage:
+    from quiz_bank import submit_quiz_bank_job, get_banked_quizzes
+
+    submit_quiz_bank_job("babe", "/workspace/mnt/", chapter_number=1)
+    quizzes = get_banked_quizzes("babe", 0)   # waits briefly for a running build
+"""
+
+import asyncio
+import os
+import time
+import typing
+
+from colorama import Fore
+
+from job_queue import ACTIVE_STATES, Job, get_job_queue, register_job_handler
+from nodes import add_quiz_to_subtopic, load_user_state
+from quiz_fanout import generate_quizzes_async
+from user_store import resolve_user_store
+
+# Chunk quiz generations in flight per quiz bank build, across all sub-topics
+QUIZ_BANK_CONCURRENCY = int(os.environ.get("QUIZ_BANK_CONCURRENCY", "4"))
+# Seconds a quiz tab waits for a running quiz bank build before generating on demand
+QUIZ_BANK_WAIT_SECONDS = float(os.environ.get("QUIZ_BANK_WAIT_SECONDS", "10"))
+# Seconds between job status polls while waiting for the build
+QUIZ_BANK_POLL_INTERVAL = float(os.environ.get("QUIZ_BANK_POLL_INTERVAL", "0.5"))
+
+
+async def build_quiz_bank(user_id: str, save_to: str, chapter_number: int,
+                          concurrency: typing.Optional[int] = None,
+                          on_progress: typing.Optional[typing.Callable[[float, str], typing.Awaitable[None]]] = None) -> dict:
+    """Generate and store quizzes for every sub-topic of the user's active chapter.
+
+    Args:
+        user_id: The user identifier
+        save_to: Base directory where user data is stored
+        chapter_number: Chapter to build for; nothing is done if it is no longer active
+        concurrency: Generations in flight (default QUIZ_BANK_CONCURRENCY)
+        on_progress: Optional `async (fraction, message)` callback, e.g. Job.report
+
+    Returns:
+        {"chapter": ..., "sub_topics": number built, "questions": number stored}
+    """
+    state = load_user_state(user_id, resolve_user_store(user_id, save_to))
+    chapter = state["curriculum"][0]["active_chapter"] if state.get("curriculum") else None
+    if chapter is None or chapter.number != chapter_number:
+        print(Fore.YELLOW + f"Chapter {chapter_number} is not active for {user_id}, skipping quiz bank", Fore.RESET)
+        return {"chapter": chapter_number, "sub_topics": 0, "questions": 0}
+
+    todo = [(i, st) for i, st in enumerate(chapter.sub_topics or [])
+            if st.study_material and not st.quizzes]
+    semaphore = asyncio.Semaphore(max(1, concurrency or QUIZ_BANK_CONCURRENCY))
+    finished = 0
+
+    async def _bank(index: int, sub_topic) -> int:
+        nonlocal finished
+        quizzes = await generate_quizzes_async(chapter.name, sub_topic.sub_topic, sub_topic.study_material,
+                                               semaphore=semaphore)
+        if quizzes:
+            await add_quiz_to_subtopic(user_id, save_to, index, quizzes, chapter_number=chapter_number)
+        finished += 1
+        if on_progress is not None:
+            await on_progress(finished / len(todo), f"Quizzes ready for {finished}/{len(todo)} sub-topics")
+        return len(quizzes)
+
+    results = await asyncio.gather(*(_bank(i, st) for i, st in todo), return_exceptions=True)
+    questions = 0
+    for (index, _), result in zip(todo, results):
+        if isinstance(result, BaseException):
+            print(Fore.RED + f"Quiz generation failed for sub-topic {index} of chapter {chapter_number}: {result}", Fore.RESET)
+        else:
+            questions += result
+    print(Fore.GREEN + f"Quiz bank for {user_id} chapter {chapter_number}: {questions} questions over {len(todo)} sub-topics", Fore.RESET)
+    return {"chapter": chapter_number, "sub_topics": len(todo), "questions": questions}
+
+
+async def _quiz_bank_job(job: Job) -> dict:
+    """Job handler: build the quiz bank of a chapter."""
+    return await build_quiz_bank(job.user_id, job.params["save_to"], job.params["chapter"], on_progress=job.report)
+
+
+register_job_handler("quiz_bank", _quiz_bank_job)
+
+
+def submit_quiz_bank_job(user_id: str, save_to: str, chapter_number: int) -> str:
+    """Queue build_quiz_bank for a chapter and return the job id."""
+    return get_job_queue().submit("quiz_bank", user_id, {"save_to": save_to, "chapter": chapter_number})
+
+
+def _banked_quizzes(user_id: str, subtopic_index: int) -> typing.List[dict]:
+    state = load_user_state(user_id)
+    sub_topics = state["curriculum"][0]["active_chapter"].sub_topics if state.get("curriculum") else []
+    if 0 <= subtopic_index < len(sub_topics or []) and sub_topics[subtopic_index].quizzes:
+        return list(sub_topics[subtopic_index].quizzes)
+    return []
+
+
+def get_banked_quizzes(user_id: str, subtopic_index: int, timeout: typing.Optional[float] = None,
+                       poll_interval: typing.Optional[float] = None) -> typing.List[dict]:
+    """Quizzes of a sub-topic of the active chapter, waiting briefly for a running quiz bank build.
+
+    While waiting only the job row is polled; the user state is read again
+    when the build reports progress or finishes. Returns [] if no build is
+    queued or running, or it finishes or `timeout` (default
+    QUIZ_BANK_WAIT_SECONDS) passes without quizzes for this sub-topic, so
+    callers can fall back to generating on demand.
+    """
+    timeout = QUIZ_BANK_WAIT_SECONDS if timeout is None else timeout
+    poll_interval = QUIZ_BANK_POLL_INTERVAL if poll_interval is None else poll_interval
+    quizzes = _banked_quizzes(user_id, subtopic_index)
+    if quizzes:
+        return quizzes
+    queue = get_job_queue()
+    job = queue.latest(user_id, "quiz_bank")
+    deadline = time.monotonic() + timeout
+    while job is not None and job["status"] in ACTIVE_STATES:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(Fore.YELLOW + f"Quiz bank for {user_id} still building after {timeout:.0f}s, generating on demand", Fore.RESET)
+            return []
+        time.sleep(min(poll_interval, remaining))
+        seen = (job["progress"], job["message"])
+        job = queue.get(job["id"])
+        if job is not None and (job["status"] not in ACTIVE_STATES or (job["progress"], job["message"]) != seen):
+            quizzes = _banked_quizzes(user_id, subtopic_index)
+            if quizzes:
+                return quizzes
+    return []
@@ -0,0 +1,239 @@
+"""
+Chunk-level quiz generation: split study material, quiz every chunk, drop near-duplicates.
+
+`get_quiz` was called with a sub-topic's whole `study_material` as one
+`<text_chunk>`. The question generation prompt is written for a single chunk,
+so long materials made one slow call whose questions clustered around the
+start of the text. This module splits the material into token-bounded chunks
+on paragraph and sentence boundaries, runs `get_quiz` for the chunks
+concurrently, and removes questions that several chunks asked in nearly the
+same words, compared by embedding cosine similarity (lexical overlap when no
+embedding model is available). At most QUIZ_MAX_QUESTIONS questions are kept,
+taken round-robin across chunks so the whole material is covered.
+
+Usage:
+    from quiz_fanout import generate_quizzes, generate_quizzes_async
+
+    quizzes = generate_quizzes(chapter.name, sub_topic.sub_topic, sub_topic.study_material)
+    quizzes = await generate_quizzes_async(title, summary, material, semaphore=shared_semaphore)
+"""
+
+import asyncio
+import os
+import re
+import typing
+
+import numpy as np
+from colorama import Fore
+
+from prompt_budget import estimate_tokens
+from standalone_quizes_gen import get_quiz, quiz_output_parser
+
+# Token budget of one <text_chunk>
+QUIZ_CHUNK_TOKENS = int(os.environ.get("QUIZ_CHUNK_TOKENS", "1500"))
+# Chunks quizzed at the same time when no shared semaphore is passed
+QUIZ_CHUNK_CONCURRENCY = int(os.environ.get("QUIZ_CHUNK_CONCURRENCY", "4"))
+# Questions at least this similar to an earlier one are dropped
+QUIZ_DEDUP_THRESHOLD = float(os.environ.get("QUIZ_DEDUP_THRESHOLD", "0.9"))
+# Questions kept per sub-topic; the quiz UI has this many question slots
+QUIZ_MAX_QUESTIONS = int(os.environ.get("QUIZ_MAX_QUESTIONS", "10"))
+# self_refine.Embedder model used for deduplication ("miniLM", "bge-small", "openai", "none")
+QUIZ_DEDUP_EMBED_MODEL = os.environ.get("QUIZ_DEDUP_EMBED_MODEL", "miniLM")
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+")
+
+_embedder = None
+_embedder_failed = False
+
+Embed = typing.Callable[[typing.List[str]], typing.Sequence[typing.Sequence[float]]]
+
+
+def _split_oversized(text: str, max_tokens: int) -> typing.List[str]:
+    """Split a paragraph longer than the budget on sentences, then on words."""
+    pieces = []
+    for sentence in _SENTENCE_END.split(text):
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        words, current = sentence.split(), []
+        for word in words:
+            if current and estimate_tokens(" ".join(current + [word])) > max_tokens:
+                pieces.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            pieces.append(" ".join(current))
+    return pieces
+
+
+def split_material(text: str, max_tokens: typing.Optional[int] = None) -> typing.List[str]:
+    """Split study material into chunks of at most `max_tokens` estimated tokens.
+
+    Paragraphs are packed together while they fit; a paragraph over the budget
+    is split on sentence boundaries, and a sentence over the budget on words.
+    """
+    max_tokens = max(1, max_tokens or QUIZ_CHUNK_TOKENS)
+    pieces: typing.List[str] = []
+    for paragraph in _PARAGRAPH_BREAK.split(text or ""):
+        paragraph = paragraph.strip()
+        if paragraph:
+            pieces.extend([paragraph] if estimate_tokens(paragraph) <= max_tokens
+                          else _split_oversized(paragraph, max_tokens))
+
+    chunks: typing.List[str] = []
+    current = ""
+    for piece in pieces:
+        candidate = f"{current}\n\n{piece}" if current else piece
+        if current and estimate_tokens(candidate) > max_tokens:
+            chunks.append(current)
+            candidate = piece
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _default_embed() -> typing.Optional[Embed]:
+    """The shared self_refine Embedder, or None if no embedding model can be loaded."""
+    global _embedder, _embedder_failed
+    if _embedder is None and not _embedder_failed:
+        if QUIZ_DEDUP_EMBED_MODEL.lower() == "none":
+            _embedder_failed = True
+        else:
+            try:
+                from self_refine.embedder import Embedder
+                _embedder = Embedder(QUIZ_DEDUP_EMBED_MODEL)
+            except (ImportError, RuntimeError) as e:
+                print(Fore.YELLOW + f"No embedding model for quiz deduplication ({e}), using word overlap", Fore.RESET)
+                _embedder_failed = True
+    return _embedder.embed_batch if _embedder is not None else None
+
+
+def _question_text(quiz: dict) -> str:
+    return quiz.get("question", "")
+
+
+def _lexical_similarity(a: str, b: str) -> float:
+    words_a, words_b = set(_WORD.findall(a.lower())), set(_WORD.findall(b.lower()))
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def dedupe_quizzes(quizzes: typing.List[dict], threshold: typing.Optional[float] = None,
+                   embed: typing.Optional[Embed] = None) -> typing.List[dict]:
+    """Drop questions that are near-duplicates of an earlier question.
+
+    Args:
+        quizzes: Parsed questions, in generation order
+        threshold: Cosine similarity (or word-overlap ratio without embeddings)
+            at which a question counts as a duplicate; default QUIZ_DEDUP_THRESHOLD
+        embed: Batch embedding function; defaults to the shared self_refine Embedder
+
+    Returns:
+        The first question of every group of near-duplicates, in order
+    """
+    if len(quizzes) < 2:
+        return list(quizzes)
+    threshold = QUIZ_DEDUP_THRESHOLD if threshold is None else threshold
+    texts = [_question_text(q) for q in quizzes]
+    embed = embed or _default_embed()
+
+    similarity = None
+    if embed is not None:
+        try:
+            vectors = np.asarray(embed(texts), dtype=float)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1.0, norms)
+            similarity = vectors @ vectors.T
+        except Exception as e:
+            print(Fore.YELLOW + f"Embedding quiz questions failed ({e}), using word overlap", Fore.RESET)
+
+    kept: typing.List[int] = []
+    for i in range(len(quizzes)):
+        if similarity is not None:
+            duplicate = any(similarity[i, j] >= threshold for j in kept)
+        else:
+            duplicate = any(_lexical_similarity(texts[i], texts[j]) >= threshold for j in kept)
+        if not duplicate:
+            kept.append(i)
+    if len(kept) < len(quizzes):
+        print(Fore.CYAN + f"Dropped {len(quizzes) - len(kept)} near-duplicate quiz questions", Fore.RESET)
+    return [quizzes[i] for i in kept]
+
+
+def cap_quizzes(per_chunk: typing.List[typing.List[dict]],
+                max_questions: typing.Optional[int] = None) -> typing.List[dict]:
+    """Keep at most `max_questions` (default QUIZ_MAX_QUESTIONS) questions, round-robin across chunks.
+
+    The first question of every chunk is picked before any chunk's second one.
+
+    Returns:
+        The picked questions in chunk order
+    """
+    max_questions = QUIZ_MAX_QUESTIONS if max_questions is None else max_questions
+    picked = [0] * len(per_chunk)
+    remaining = max(0, max_questions)
+    while remaining:
+        progressed = False
+        for i, questions in enumerate(per_chunk):
+            if remaining and picked[i] < len(questions):
+                picked[i] += 1
+                remaining -= 1
+                progressed = True
+        if not progressed:
+            break
+    return [q for i, questions in enumerate(per_chunk) for q in questions[:picked[i]]]
+
+
+async def generate_quizzes_async(title: str, summary: str, study_material: str,
+                                 max_tokens: typing.Optional[int] = None,
+                                 semaphore: typing.Optional[asyncio.Semaphore] = None,
+                                 additional_instruction: str = "",
+                                 max_questions: typing.Optional[int] = None) -> typing.List[dict]:
+    """Quiz every chunk of the study material concurrently and return the deduplicated questions.
+
+    Args:
+        title: Chapter name
+        summary: Sub-topic, passed as the document summary
+        study_material: Text to quiz on
+        max_tokens: Token budget per chunk (default QUIZ_CHUNK_TOKENS)
+        semaphore: Bounds the get_quiz calls in flight; pass one semaphore to
+            share a budget across sub-topics (default QUIZ_CHUNK_CONCURRENCY)
+        additional_instruction: Passed to every get_quiz call
+        max_questions: Questions kept, see cap_quizzes (default QUIZ_MAX_QUESTIONS)
+
+    Returns:
+        Questions in chunk order; a chunk whose generation fails contributes none
+    """
+    chunks = split_material(study_material, max_tokens)
+    if not chunks:
+        return []
+    semaphore = semaphore or asyncio.Semaphore(max(1, QUIZ_CHUNK_CONCURRENCY))
+
+    async def _quiz_chunk(chunk: str) -> typing.List[dict]:
+        async with semaphore:
+            output = await asyncio.to_thread(get_quiz, title, summary, chunk, additional_instruction)
+        return quiz_output_parser(output)
+
+    results = await asyncio.gather(*(_quiz_chunk(c) for c in chunks), return_exceptions=True)
+    per_chunk: typing.List[typing.List[dict]] = []
+    for i, result in enumerate(results):
+        if isinstance(result, BaseException):
+            print(Fore.RED + f"Quiz generation failed for chunk {i + 1}/{len(chunks)} of '{summary}': {result}", Fore.RESET)
+        else:
+            per_chunk.append(result)
+    quizzes = [q for questions in per_chunk for q in questions]
+    print(Fore.GREEN + f"Generated {len(quizzes)} questions from {len(chunks)} chunks of '{summary}'", Fore.RESET)
+    if not quizzes:
+        return []
+    kept = {id(q) for q in await asyncio.to_thread(dedupe_quizzes, quizzes)}
+    return cap_quizzes([[q for q in questions if id(q) in kept] for questions in per_chunk], max_questions)
+
+
+def generate_quizzes(title: str, summary: str, study_material: str,
+                     max_tokens: typing.Optional[int] = None) -> typing.List[dict]:
+    """Synchronous generate_quizzes_async, for Gradio handlers and scripts."""
+    return asyncio.run(generate_quizzes_async(title, summary, study_material, max_tokens))
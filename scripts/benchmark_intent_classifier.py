@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmark study buddy intent routing: accuracy and latency per classifier.
+
+Runs a labelled set of chat messages (none of them taken from the routing
+prompt's examples, which the embedding classifier is trained on) through:
+
+    keyword - KeywordIntentClassifier rules only
+    local   - keyword rules + embedding nearest-centroid, with the confidence threshold
+    llm     - the few-shot LLM prompt (llm_query_routing), only with --llm
+    cascade - local, falling back to the LLM when it abstains, only with --llm
+
+For local classifiers, "coverage" is the share of messages answered without
+the LLM and "accuracy" is measured on those.
+
+Usage:
+    python scripts/benchmark_intent_classifier.py
+    python scripts/benchmark_intent_classifier.py --threshold 0.4 --llm
+    python scripts/benchmark_intent_classifier.py --queries my_queries.jsonl   # {"query": ..., "intent": ...} per line
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from intent_classifier import (  # noqa: E402
+    KeywordIntentClassifier, LocalIntentClassifier, ROUTES, _default_embedding_classifier,
+)
+
+CHAPTER = "Cell Biology"
+SUB_TOPIC = "Mitochondria and Cellular Respiration"
+
+LABELLED_QUERIES = [
+    ("haha that's funny, do you have a favourite food?", "chitchat"),
+    ("good morning! how's your day going", "chitchat"),
+    ("who won the football match last night", "chitchat"),
+    ("are you a robot?", "chitchat"),
+    ("I'm bored, say something fun", "chitchat"),
+    ("thanks, you're the best", "chitchat"),
+    ("what's your favourite movie", "chitchat"),
+    ("is there a youtube explainer on the krebs cycle", "supplement"),
+    ("any good videos that show how ATP synthase spins?", "supplement"),
+    ("send me a link to an animation of glycolysis", "supplement"),
+    ("I'd rather watch something than read, got anything?", "supplement"),
+    ("recommend a tutorial on the electron transport chain", "supplement"),
+    ("is there a short clip about mitochondrial DNA", "supplement"),
+    ("can I get a url for further reading", "supplement"),
+    ("put a 1 hour review session on my calendar for thursday", "book_calendar"),
+    ("remind me to revise this chapter on Sunday evening", "book_calendar"),
+    ("schedule 45 minutes tomorrow morning for flashcards", "book_calendar"),
+    ("book a slot next Tuesday at 4pm to practise the quiz", "book_calendar"),
+    ("reserve saturday 10-12 for the mock exam", "book_calendar"),
+    ("create an event for my biology exam on June 3rd", "book_calendar"),
+    ("block out friday afternoon for cellular respiration", "book_calendar"),
+    ("what does the inner membrane of the mitochondria do", "study_material"),
+    ("why is oxygen the final electron acceptor", "study_material"),
+    ("I got question 2 wrong, can you walk me through it", "study_material"),
+    ("summarize the main idea of this section", "study_material"),
+    ("how many ATP does one glucose molecule produce", "study_material"),
+    ("what's the difference between aerobic and anaerobic respiration", "study_material"),
+    ("explain cellular respiration like I'm five", "study_material"),
+    ("I'm confused about the proton gradient", "study_material"),
+    ("how do glycolysis and the krebs cycle link together", "study_material"),
+    # Study questions that contain calendar or supplement words
+    ("can you remind me what ATP stands for?", "study_material"),
+    ("what is a reinforcement schedule in operant conditioning?", "study_material"),
+    ("how are URLs resolved by DNS?", "study_material"),
+    ("explain the video codec chapter", "study_material"),
+    ("which enzymes are active in the morning after fasting?", "study_material"),
+    ("is there a link between diet and diabetes?", "study_material"),
+    ("give me some examples of URLs", "study_material"),
+    ("can you show me how to add fractions by tomorrow", "study_material"),
+    ("tell me a joke about cellular respiration", "chitchat"),
+]
+
+
+def load_queries(path):
+    queries = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                queries.append((item["query"], item["intent"]))
+    return queries
+
+
+def run(name, predict, queries):
+    """Return a result row; `predict` returns an intent or None to abstain."""
+    latencies, answered, correct = [], 0, 0
+    confusion = {}
+    for query, expected in queries:
+        start = time.perf_counter()
+        intent = predict(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if intent is None:
+            continue
+        answered += 1
+        correct += intent == expected
+        if intent != expected:
+            confusion[(expected, intent)] = confusion.get((expected, intent), 0) + 1
+    latencies.sort()
+    return {
+        "classifier": name,
+        "coverage": answered / len(queries),
+        "accuracy": correct / answered if answered else 0.0,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[max(0, int(len(latencies) * 0.95) - 1)],
+        "confusion": confusion,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", help="JSONL file of {\"query\", \"intent\"} objects")
+    parser.add_argument("--threshold", type=float, default=None, help="confidence threshold of the local classifier")
+    parser.add_argument("--llm", action="store_true", help="also benchmark the LLM routing prompt (network calls)")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else LABELLED_QUERIES
+    unknown = {intent for _, intent in queries} - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown intents in query set: {sorted(unknown)}")
+
+    start = time.perf_counter()
+    embedding = _default_embedding_classifier()
+    print(f"embedding classifier: {'ready' if embedding else 'unavailable'} ({time.perf_counter() - start:.2f}s)")
+    local_kwargs = {} if args.threshold is None else {"threshold": args.threshold}
+    keyword = LocalIntentClassifier(embedding=None, keyword=KeywordIntentClassifier(), **local_kwargs)
+    local = LocalIntentClassifier(embedding=embedding, **local_kwargs)
+
+    rows = [
+        run("keyword", lambda q: keyword.predict(q, CHAPTER, SUB_TOPIC).intent, queries),
+    ]
+    if embedding is not None:
+        rows.append(run("local", lambda q: local.predict(q, CHAPTER, SUB_TOPIC).intent, queries))
+    if args.llm:
+        from standalone_study_buddy_response import llm_query_routing
+
+        def _llm(q):
+            return llm_query_routing(q, "", CHAPTER, SUB_TOPIC)
+
+        def _cascade(q):
+            return local.predict(q, CHAPTER, SUB_TOPIC).intent or _llm(q)
+
+        rows.append(run("llm", _llm, queries))
+        rows.append(run("cascade", _cascade, queries))
+
+    print(f"\n{len(queries)} labelled queries\n")
+    print(f"{'classifier':<10} {'coverage':>9} {'accuracy':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for row in rows:
+        print(f"{row['classifier']:<10} {row['coverage']:>9.0%} {row['accuracy']:>9.0%} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f}")
+    for row in rows:
+        if row["confusion"]:
+            mistakes = ", ".join(f"{exp}->{got} x{n}" for (exp, got), n in sorted(row["confusion"].items()))
+            print(f"  {row['classifier']} mistakes: {mistakes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark user state serialization (save_user_to_file / load_user_from_file).
+
+Builds a synthetic user with a large curriculum (chapters x sub-topics, each
+with study material and a few quiz rounds) and times save and load for each
+on-disk format, plus the tolerant fallback loader for comparison.
+
+Usage:
+    python scripts/benchmark_user_state_io.py
+    python scripts/benchmark_user_state_io.py --chapters 60 --subtopics 8 --repeat 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import states  # noqa: E402
+from states import Chapter, StudyPlan, SubTopic, Status  # noqa: E402
+
+
+def build_user(chapters: int, subtopics: int, quizzes: int) -> dict:
+    material = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 40
+    quiz = {
+        "question": "Which statement is correct?",
+        "choices": ["A", "B", "C", "D"],
+        "answer": "B",
+        "explanation": "B is correct because " + "reasons " * 20,
+    }
+    plan = []
+    for c in range(1, chapters + 1):
+        sub_topics = [
+            SubTopic(
+                number=s,
+                sub_topic=f"Sub-topic {c}.{s}",
+                status=Status.STARTED if s == 1 else Status.NA,
+                study_material=material,
+                display_markdown=f"#### Sub-topic {c}.{s}\n\n{material}",
+                reference=f"chapter_{c}.pdf",
+                quizzes=[dict(quiz) for _ in range(quizzes)],
+                feedback=[],
+            )
+            for s in range(1, subtopics + 1)
+        ]
+        plan.append(Chapter(
+            number=c,
+            name=f"Chapter {c}",
+            status=Status.NA,
+            sub_topics=sub_topics,
+            reference=f"chapter_{c}.pdf",
+            pdf_loc=f"/workspace/mnt/pdfs/chapter_{c}.pdf",
+            quizzes=[],
+            feedback=[],
+        ))
+    return {
+        "user_id": "bench",
+        "study_buddy_preference": "patient",
+        "study_buddy_persona": None,
+        "study_buddy_name": "Bench",
+        "curriculum": [{
+            "active_chapter": plan[0],
+            "next_chapter": plan[1] if len(plan) > 1 else None,
+            "study_plan": StudyPlan(study_plan=plan),
+            "status": [Status.STARTED],
+        }],
+        "uploaded_files": [f"chapter_{c}.pdf" for c in range(1, chapters + 1)],
+        "state_version": 1,
+    }
+
+
+def _time(fn, repeat: int) -> float:
+    """Median wall time of `fn` in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=30)
+    parser.add_argument("--subtopics", type=int, default=5)
+    parser.add_argument("--quizzes", type=int, default=3, help="quiz rounds per sub-topic")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    user = build_user(args.chapters, args.subtopics, args.quizzes)
+    formats = ["json"] + (["orjson"] if states.orjson is not None else [])
+    if states.orjson is None:
+        print("orjson is not installed, only benchmarking the stdlib json format")
+
+    print(f"{'format':<10}{'size KB':>10}{'save ms':>10}{'load ms':>10}{'fallback load ms':>18}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in formats:
+            path = os.path.join(tmp, f"user.{fmt}.json")
+            save_ms = _time(lambda: states.save_user_to_file(user, path, fmt=fmt), args.repeat)
+            load_ms = _time(lambda: states.load_user_from_file(path), args.repeat)
+
+            def _fallback():
+                with open(path, "rb") as f:
+                    states._rebuild_user(json.loads(f.read()))
+
+            fallback_ms = _time(_fallback, args.repeat)
+            size_kb = os.path.getsize(path) / 1024
+            print(f"{fmt:<10}{size_kb:>10.1f}{save_ms:>10.2f}{load_ms:>10.2f}{fallback_ms:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ import requests
 from colorama import Fore
 import argparse
 import io
+import re
 import markdown
 from PIL import Image as PILImage
 from IPython.display import Image as IPythonImage, display, Markdown
@@ -17,7 +18,9 @@ from io import BytesIO
 from llm import LLMClient
 from errors import RAGConnectionError, LLMAPIError
 from logging_config import get_logger
-from vllm_client_multimodal_requests import query_qwen_vllm_served
+from vllm_client_multimodal_requests import query_qwen_vllm_served_images, VLM_MAX_IMAGES
+from asset_store import get_asset_store
+from image_normalize import normalize_image
 from PIL import Image as PILImage
 from IPython.display import Image as IPythonImage, display, Markdown
 import base64
@@ -94,7 +97,10 @@ async def print_streaming_response_and_citations(response_generator):
     if first_chunk_data and first_chunk_data.get("citations"):
         citations = first_chunk_data["citations"]
         markdown_str += "---\n\n## Citations\n\n"
-        img_str=None
+        img_str=""
+        # Image citations are described by one VLM request after the loop;
+        # their descriptions replace these placeholders
+        pending_images = []
         for idx, citation in enumerate(citations.get("results", [])):
             doc_type = citation.get("document_type", "text")
             content = citation.get("content", "")
@@ -106,26 +112,17 @@ async def print_streaming_response_and_citations(response_generator):
             # Handle different content types properly
             if doc_type in ["image", "chart", "table"]:
                 try:
-                    # Try to decode as base64 and display as image
+                    # Decode and normalise once; the VLM request below gets the cached result
                     image_bytes = base64.b64decode(content)
-                    image = PILImage.open(BytesIO(image_bytes))
-                    print(Fore.GREEN + "image in document type ", type(image), Fore.RESET)
+                    image = normalize_image(image_bytes)
+                    print(Fore.GREEN + f"image in document type {image.source_format} -> {image.format} {image.width}x{image.height}", Fore.RESET)
                     display(IPythonImage(data=image_bytes))
-                    query="this image is embedded in a page, describe this image take into consideration of other relevant parts in this pdf"
-                    image_file_loc=content
-                    audio_path = None
-                    sys_prompt=f"pdf title:{doc_name}, and retrieved relevant parts of this pdf page are:{markdown_str}. Be short and concise in your response"
+                    pending_images.append((content, doc_name))
+                    markdown_str += _image_placeholder(len(pending_images))
                     
-                    vlm_output=query_qwen_vllm_served(query,image_file_loc, sys_prompt, None)
-                    if vlm_output:
-                        markdown_str += f"\n{vlm_output}\n"                        
-                    print(Fore.BLUE + "VLM parsed image output =\n", vlm_output)
-                    
-                    # Determine image format
-                    image_format = image.format.lower() if image.format else "png"
-                    
-                    # Add base64 image to markdown string
-                    img_str += f"![{doc_name}](data:image/{image_format};base64,{content})\n\n"
+                    # Store the normalised image once on disk and reference it instead of inlining base64
+                    asset_path = get_asset_store().put_bytes(image.data, image.format)
+                    img_str += get_asset_store().image_tag(asset_path, doc_name) + "\n\n"
                     
                     
                 except Exception as e:
@@ -143,7 +140,60 @@ async def print_streaming_response_and_citations(response_generator):
                 display(Markdown(f"⚠️ Unknown content type '{doc_type}':\n```\n{content_preview}\n```"))
                 markdown_str += f"⚠️ Unknown content type '{doc_type}':\n```\n{content_preview}\n```\n\n"
     
-    return markdown_str, img_str  # Return the complete markdown string with embedded images
+        if pending_images:
+            markdown_str = await _describe_citation_images(pending_images, markdown_str)
+    
+    return markdown_str, img_str  # Return the complete markdown string and image references
+
+
+def _image_placeholder(number):
+    return f"\x00citation-image-{number}\x00"
+
+
+async def _describe_citation_images(images, markdown_str):
+    """Describe image citations with as few VLM requests as possible and put each description in place.
+
+    `images` are (base64 content, document name) pairs, `markdown_str` holds a
+    placeholder for each; VLM_MAX_IMAGES images go into one request.
+    """
+    context = markdown_str
+    for number in range(1, len(images) + 1):
+        context = context.replace(_image_placeholder(number), "")
+    descriptions = {}
+    for start in range(0, len(images), VLM_MAX_IMAGES):
+        batch = images[start:start + VLM_MAX_IMAGES]
+        names = ", ".join(sorted({name for _, name in batch}))
+        query = ("These images are embedded in pdf pages. Describe each image, taking into consideration the other "
+                 "relevant parts of the pdf. Start the description of the n-th image with 'Image n:'.")
+        sys_prompt = f"pdf title:{names}, and retrieved relevant parts of this pdf page are:{context}. Be short and concise in your response"
+        try:
+            vlm_output = await asyncio.to_thread(query_qwen_vllm_served_images, query, [content for content, _ in batch], sys_prompt)
+        except Exception as e:
+            print(Fore.RED + f"VLM description of {len(batch)} citation images failed: {e}" + Fore.RESET)
+            continue
+        print(Fore.BLUE + "VLM parsed image output =\n", vlm_output)
+        for offset, text in _split_image_descriptions(vlm_output or "", len(batch)).items():
+            descriptions[start + offset + 1] = text
+    for number in range(1, len(images) + 1):
+        text = descriptions.get(number)
+        markdown_str = markdown_str.replace(_image_placeholder(number), f"\n{text}\n" if text else "")
+    return markdown_str
+
+
+def _split_image_descriptions(output, count):
+    """Map 0-based image positions to their part of an 'Image 1: ... Image 2: ...' answer.
+
+    An answer without the markers is attached to the first image.
+    """
+    parts = re.split(r"(?im)^\W*image\s+(\d+)\s*[:.\-]", output)
+    if len(parts) < 3:
+        return {0: output.strip()} if output.strip() else {}
+    descriptions = {}
+    for number, text in zip(parts[1::2], parts[2::2]):
+        position = int(number) - 1
+        if 0 <= position < count and text.strip():
+            descriptions[position] = text.strip()
+    return descriptions
 
 
 async def generate_answer(payload):
@@ -0,0 +1,93 @@
+"""
+In-process store for per-browser-session UI state, with TTL eviction.
+
+Gradio handlers used to keep UI state (e.g. the quiz being taken) in module
+globals, so two users of the same process overwrote each other. A
+`gr.State` holds only a session id; the state itself lives here, keyed by
+that id. Sessions that have not been touched for `ttl` seconds are evicted,
+and the store never holds more than `max_sessions` (least recently used go
+first), so abandoned tabs do not accumulate.
+
+Usage:
+    from session_store import SessionStore
+
+    store = SessionStore(ttl=3600)
+    session_id = store.create({"current": 0})
+    state = store.get(session_id)        # None once expired
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "3600"))
+SESSION_MAX = int(os.environ.get("SESSION_MAX", "1000"))
+
+
+class SessionStore:
+    """Thread-safe map of session id -> value with idle expiry and an LRU bound."""
+
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = SESSION_MAX,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self._clock = clock
+        self._sessions: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, value: Any) -> str:
+        """Store a value under a new session id and return the id."""
+        session_id = uuid.uuid4().hex
+        self.put(session_id, value)
+        return session_id
+
+    def put(self, session_id: str, value: Any) -> None:
+        with self._lock:
+            self._evict_expired()
+            self._sessions[session_id] = (self._clock(), value)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def get(self, session_id: Optional[str]) -> Optional[Any]:
+        """Return the session's value and refresh its expiry, or None if unknown or expired."""
+        if not session_id:
+            return None
+        with self._lock:
+            self._evict_expired()
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (self._clock(), entry[1])
+            self._sessions.move_to_end(session_id)
+            return entry[1]
+
+    def pop(self, session_id: Optional[str]) -> Optional[Any]:
+        with self._lock:
+            entry = self._sessions.pop(session_id, None) if session_id else None
+            return entry[1] if entry is not None else None
+
+    def evict_expired(self) -> int:
+        """Drop expired sessions now and return how many were dropped."""
+        with self._lock:
+            return self._evict_expired()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict_expired()
+            return len(self._sessions)
+
+    def _evict_expired(self) -> int:
+        # Entries are ordered by last access, so expired ones are at the front
+        cutoff = self._clock() - self.ttl
+        evicted = 0
+        while self._sessions:
+            session_id, (touched, _) = next(iter(self._sessions.items()))
+            if touched > cutoff:
+                break
+            del self._sessions[session_id]
+            evicted += 1
+        return evicted
@@ -8,6 +8,9 @@ from nodes import init_user_storage,user_exists,load_user_state, update_and_save
 import asyncio
 from vault import get_secret
 import re
+from typing import List
+from pydantic import BaseModel, ValidationError, field_validator
+from json_stream_parser import JSONArrayStreamParser
 from dotenv import load_dotenv
 load_dotenv()
 # Initialize the new LLM client
@@ -16,7 +19,60 @@ load_dotenv()
 
 astra_api_key = get_secret('ASTRA_TOKEN')
 
-def inference_call(system_prompt, user_prompt):    
+# Constrained decoding for quiz generation, for endpoints that support it:
+#   "off"          - free text with <output_json> tags (default)
+#   "json_schema"  - OpenAI-style response_format={"type": "json_schema", ...}
+#   "guided_json"  - NIM / vLLM nvext.guided_json
+QUIZ_STRUCTURED_OUTPUT = os.environ.get("QUIZ_STRUCTURED_OUTPUT", "off").lower()
+
+
+class MultipleChoiceQuestion(BaseModel):
+    """One generated quiz question, as described in QUESTION_GENERATION_SYSTEM_PROMPT_OUTPUT_MULTI."""
+    thought_process: str = ""
+    question_type: str = "conceptual"
+    question: str
+    answer: str
+    choices: List[str]
+    estimated_difficulty: int = 5
+    citations: List[str] = []
+
+    @field_validator("answer")
+    @classmethod
+    def _answer_letter(cls, v: str) -> str:
+        # Models write "B", "(B)", "B)" or "(B) full choice text"
+        match = re.match(r"^\W*([A-Ea-e])\b", v.strip())
+        if not match:
+            raise ValueError(f"answer {v!r} is not one of A-E")
+        return match.group(1).upper()
+
+    @field_validator("choices")
+    @classmethod
+    def _enough_choices(cls, v: List[str]) -> List[str]:
+        if len(v) < 2:
+            raise ValueError("a multiple choice question needs at least two choices")
+        return v
+
+
+def quiz_json_schema() -> dict:
+    """JSON schema of a quiz response; the root is an object because json_schema mode requires one."""
+    return {
+        "type": "object",
+        "properties": {
+            "questions": {"type": "array", "items": MultipleChoiceQuestion.model_json_schema()},
+        },
+        "required": ["questions"],
+    }
+
+
+def _structured_output_params(mode: str) -> dict:
+    if mode == "json_schema":
+        return {"response_format": {"type": "json_schema", "json_schema": {"name": "quiz", "schema": quiz_json_schema()}}}
+    if mode == "guided_json":
+        return {"nvext": {"guided_json": quiz_json_schema()}}
+    return {}
+
+
+def inference_call(system_prompt, user_prompt, structured_output=None):    
     
     headers = {
         'Content-Type': 'application/json',
@@ -33,6 +89,7 @@ def inference_call(system_prompt, user_prompt):
     "top_p":0.95,
     "max_tokens":36000,
     'stream': False,
+    **_structured_output_params(structured_output or "off"),
     }
     
     response = requests.post(
@@ -44,8 +101,13 @@ def inference_call(system_prompt, user_prompt):
     return response 
 
 
-def get_quiz(title, document_summary, chunk_text, additional_instruction):
-        
+def get_quiz(title, document_summary, chunk_text, additional_instruction, structured_output=None):
+    """Generate multiple choice questions for a text chunk and return the raw model output.
+
+    Parse the result with `quiz_output_parser`. `structured_output` overrides
+    QUIZ_STRUCTURED_OUTPUT for this call.
+    """
+    structured_output = structured_output or QUIZ_STRUCTURED_OUTPUT
     user_prompt_str = QUESTION_GENERATION_USER_PROMPT.format(
                     title=title,
                     document_summary=document_summary,
@@ -54,7 +116,7 @@ def get_quiz(title, document_summary, chunk_text, additional_instruction):
                 )
     
     try:
-        response = inference_call(QUESTION_GENERATION_SYSTEM_PROMPT_MULTI, user_prompt_str)
+        response = inference_call(QUESTION_GENERATION_SYSTEM_PROMPT_MULTI, user_prompt_str, structured_output)
         output_d=response.json()
         output_str = output_d['choices'][0]["message"]["content"]
         print("### quiz raw string output =\n", output_str )
@@ -365,53 +427,37 @@ QUESTION_GENERATION_USER_PROMPT = """<title>
 </additional_instructions>"""
 
 
+def validate_quizzes(items: list) -> list[dict]:
+    """Keep the items that are valid MultipleChoiceQuestions, normalized to plain dicts."""
+    quizzes = []
+    for item in items:
+        try:
+            quizzes.append(MultipleChoiceQuestion.model_validate(item).model_dump())
+        except ValidationError as e:
+            print(Fore.YELLOW + f"Dropping invalid quiz item: {e.errors()[0].get('msg')}", Fore.RESET)
+    return quizzes
+
+
 def quiz_output_parser(output_str: str) -> list[dict]:
-    # Find the start of the JSON content
-    start_marker = '<output_json>'
-    if start_marker not in output_str:
-        print("No <output_json> marker found")
-        return []
-    
-    start_idx = output_str.index(start_marker) + len(start_marker)
-    json_str = output_str[start_idx:]
-    if "```json" in json_str :
-        json_quote_index=json_str.index("```json") + 7
-        json_str=json_str[json_quote_index:]
-    # Find the end of the JSON content if closing tag exists
-    end_marker = '</output_json>'
-    if end_marker in json_str:
-        print("Found closing tag")
-        end_idx = json_str.index(end_marker)
-        json_str = json_str[:end_idx]
-    else:
-        print("No closing tag found, using remaining string")
-    
-    # Clean up markdown code fences and whitespace
-    json_str = json_str.strip()
-    json_str = json_str.replace('```json', '').replace('```', '')
-    json_str = json_str.strip()
-    
-    # Remove inline notes that break JSON (e.g., *Note: ...)
-    # This regex removes text like: ] *Note: ...* or ] *Note: ...*
-    json_str = re.sub(r'\]\s*\*Note:.*?\*', ']', json_str)
-    
-    # Parse the JSON
-    try:
-        quizes_ls = json.loads(json_str)
-        if isinstance(quizes_ls, list):
-            return quizes_ls
-        else:
-            print("Parsed JSON is not a list")
-            return []
-    except json.JSONDecodeError as e:
-        print(f"Failed to parse JSON: {e}")
-        print(f"JSON string preview (first 500 chars):\n{json_str[:500]}")
-        print(f"\nJSON string preview (around error position):")
-        error_pos = e.pos if hasattr(e, 'pos') else 2364
-        start = max(0, error_pos - 100)
-        end = min(len(json_str), error_pos + 100)
-        print(f"{json_str[start:end]}")
+    """Extract the quiz questions from a `get_quiz` response.
+
+    Every complete question object is kept, even if the array was cut off by
+    max_tokens or followed by notes. Free-text responses are read from the
+    `<output_json>` section; JSON-schema responses ({"questions": [...]}) are
+    read as they are.
+    """
+    if not output_str:
         return []
+    parser = JSONArrayStreamParser(start_marker="<output_json>")
+    parser.feed(output_str)
+    items = parser.close()
+    if parser.truncated:
+        print(Fore.YELLOW + f"Quiz output was truncated, salvaged {len(items)} complete questions", Fore.RESET)
+    if parser.skipped:
+        print(Fore.YELLOW + f"Skipped {parser.skipped} malformed quiz objects", Fore.RESET)
+    if not items:
+        print(f"No quiz questions found in output, preview (first 500 chars):\n{output_str[:500]}")
+    return validate_quizzes([item for item in items if isinstance(item, dict)])
 
 
 
@@ -429,28 +475,17 @@ if __name__ == "__main__":
     active_chapter=c["active_chapter"]
     print(f"active_chapter = {active_chapter.number}:{active_chapter.name}")
 
-    print("\n Pick the 1st sub topic as a test ")
-    title=active_chapter.name
-    summary=active_chapter.sub_topics[0].sub_topic
-    text_chunk=active_chapter.sub_topics[0].study_material
-    quizes_ls= get_quiz(title, summary, text_chunk, "")
-    quizzes_d_ls=quiz_output_parser(quizes_ls)
-    print("\n"*3)
-    #print(type(quizes_ls),type(quizes_ls[0]), len(quizes_ls), quizes_ls)
-    #print(Fore.YELLOW + "\n Generated Quiz from SubTopics", '\n'.join([f"{subtopic.number}:{subtopic.sub_topic}" for subtopic in active_chapter.sub_topics]))
-    print("==="*10 , ">")
-    print(type(quizzes_d_ls),type(quizzes_d_ls[0]), len(quizzes_d_ls), quizzes_d_ls)
-
-    for quiz in quizzes_d_ls:
-        print("\n"+"--"*10)
-        print(f"Q: {quiz['question']}\nA: {quiz['answer']}\nType: {quiz['question_type']}\nDifficulty: {quiz['estimated_difficulty']}\nCitations: {quiz['citations']}\nThought Process: {quiz['thought_process']}")
+    print("\n Build the quiz bank for every sub topic of the active chapter ")
+    from quiz_bank import build_quiz_bank
+    summary = asyncio.run(build_quiz_bank(user_id, save_to, active_chapter.number))
+    print("==="*10 , ">", summary)
+
+    updated_user = load_user_state(user_id)
+    for subtopic in updated_user["curriculum"][0]["active_chapter"].sub_topics:
+        print(Fore.YELLOW + f"\n{subtopic.number}:{subtopic.sub_topic}", Fore.RESET)
+        for quiz in subtopic.quizzes or []:
+            print("\n"+"--"*10)
+            print(f"Q: {quiz['question']}\nA: {quiz['answer']}\nType: {quiz['question_type']}\nDifficulty: {quiz['estimated_difficulty']}\nCitations: {quiz['citations']}\nThought Process: {quiz['thought_process']}")
     print("\n"*3)
-    updated_user = asyncio.run(add_quiz_to_subtopic(
-        user_id=user_id,
-        save_to=save_to,
-        subtopic_number=0,
-        quiz=quizzes_d_ls
-    ))
-    print(type(updated_user))
 
     
\ No newline at end of file
@@ -3,13 +3,18 @@ from nodes import update_and_save_user_state
 from states import Chapter, StudyPlan, Curriculum, User, GlobalState, Status, SubTopic, printmd
 import requests
 import os, json
+import asyncio
 from colorama import Fore
 from dotenv import load_dotenv
 import argparse
 from vault import get_secret
 from llm import LLMClient  # This automatically loads dotenv
 import re
-from vllm_client_multimodal_requests import query_qwen_vllm_served
+from vllm_client_multimodal_requests import query_qwen_vllm_served, query_qwen_vllm_served_images, VLM_MAX_IMAGES
+from asset_store import get_asset_store
+from intent_classifier import ROUTES, classify_locally, normalize_route
+from prompt_budget import get_prompt_budget
+from material_index import load_index_images, select_relevant_images
 
 # Initialize the new LLM client
 
@@ -23,7 +28,8 @@ print(Fore.GREEN + f"Using ASTRA API Key ending with: {astra_api_key[-4:]}" , Fo
 
 def detect_images_in_markdown(markdown_content):
     """
-    Detect if markdown content contains images in base64 format or embedded image tags.
+    Detect if markdown content contains images in base64 format, embedded image tags
+    or asset store references.
     Returns a list of base64 image strings found in the content.
     """
     if not markdown_content or not isinstance(markdown_content, str):
@@ -49,6 +55,9 @@ def detect_images_in_markdown(markdown_content):
         base64_str = match.group(1)
         images.append(base64_str)
     
+    # Pattern 3: images stored in the asset store and referenced by path/URL
+    images.extend(get_asset_store().images_in_markdown(markdown_content))
+    
     print(Fore.CYAN + f"Detected {len(images)} images in markdown content" + Fore.RESET)
     return images
 
@@ -73,7 +82,7 @@ def extract_text_from_markdown(markdown_content):
     return text.strip()
 
 
-STUDY_BUDDY_SYS_PROMPT = """
+STUDY_BUDDY_SYS_PROMPT_BODY = """
 You are an AI study companion named {study_buddy_name}.
 
 Your communication style must reflect the user’s preferred study buddy personality: {user_preference}. 
@@ -117,7 +126,9 @@ Determine the nature of the user query and respond accordingly:
 - Directly start to respond to the user query and do not put any prefix nor suffix.
 - Do NOT make up quiz questions or respond by quizzing the user unless explicitly asked.
 - Append some interesting follow up questions to keep the conversation going.
+"""
 
+STUDY_BUDDY_SYS_PROMPT = STUDY_BUDDY_SYS_PROMPT_BODY + """
 Respond : 
 """
 
@@ -157,15 +168,14 @@ def inference_call(system_prompt, user_prompt , astra_api_key=astra_api_key):
     #)
     return response
 
-def query_routing(query, chat_history, chapter_name=None, sub_topic=None):
-    ROUTING_PROMPT = """Given the user input below, classify it as either 'chitchat', 'supplement', 'book_calendar', or 'study_material'.
-    Just use one of these words as your response.
-    
-    ### Current Study Context (DO NOT classify these as supplement):
-    - Current Chapter: {chapter_name}
-    - Current Sub-topic: {sub_topic}
-    
-    ### Classification Rules:
+# LLMClient use case of streamed study buddy answers
+STUDY_BUDDY_USE_CASE = "study_buddy_response"
+
+# "combined": one study buddy call classifies the query and answers it
+# "separate": a query_routing call first, then the handler's own call
+STUDY_BUDDY_ROUTING = os.environ.get("STUDY_BUDDY_ROUTING", "combined").lower()
+
+ROUTING_RULES = """    ### Classification Rules:
     
     'chitchat' - generic chitchat, joking, asking stuff outside of the current study sessions, topics, or materials. 
     Examples:
@@ -220,10 +230,69 @@ def query_routing(query, chat_history, chapter_name=None, sub_topic=None):
     - what is {chapter_name}
     
     <END OF EXAMPLES>
+"""
+
+ROUTED_RESPONSE_INSTRUCTIONS = """
+### Intent Routing
+Classify the user query as 'chitchat', 'supplement', 'book_calendar', or 'study_material'.
+""" + ROUTING_RULES + """
     <CHAT HISTORY>
     {chat_history}
     </CHAT HISTORY>
 
+### Output Format
+The first line of your output must be `ROUTE: <classification>` with exactly one of the four words.
+- For 'supplement' and 'book_calendar', stop after that line; another tool handles those requests.
+- For 'study_material' and 'chitchat', continue on the next line with your response to the user.
+"""
+
+_ROUTE_LINE = re.compile(r"^\s*[*`]*\s*ROUTE\s*:\s*[*`'\"]*\s*([A-Za-z_]+)[^\n]*(?:\n|$)", re.IGNORECASE)
+
+
+def parse_routed_response(text):
+    """Split a routed study buddy output into (route, answer).
+
+    Outputs without a valid `ROUTE:` line are treated as a study_material answer.
+    """
+    route, answer = _split_route_line(text)
+    return route, answer.strip()
+
+
+def _split_route_line(text):
+    # Like parse_routed_response, but keeps trailing whitespace so streamed deltas join up
+    text = text or ""
+    match = _ROUTE_LINE.match(text)
+    if not match or match.group(1).lower() not in ROUTES:
+        return "study_material", text.lstrip()
+    return match.group(1).lower(), text[match.end():].lstrip()
+
+
+def query_routing(query, chat_history, chapter_name=None, sub_topic=None, local=True):
+    """Classify a chat message as one of ROUTES.
+
+    The local intent classifier answers when it is confident; otherwise
+    (or with local=False) the LLM classifies with the few-shot prompt.
+    """
+    if local:
+        prediction = classify_locally(query, chapter_name, sub_topic)
+        if prediction.intent is not None:
+            print(Fore.CYAN + f"✓ Routed locally ({prediction.source}, {prediction.confidence:.2f}): {prediction.intent}" + Fore.RESET)
+            return prediction.intent
+    return llm_query_routing(query, chat_history, chapter_name, sub_topic)
+
+
+def llm_query_routing(query, chat_history, chapter_name=None, sub_topic=None):
+    ROUTING_PROMPT = """Given the user input below, classify it as either 'chitchat', 'supplement', 'book_calendar', or 'study_material'.
+    Just use one of these words as your response.
+    
+    ### Current Study Context (DO NOT classify these as supplement):
+    - Current Chapter: {chapter_name}
+    - Current Sub-topic: {sub_topic}
+    
+""" + ROUTING_RULES + """    <CHAT HISTORY>
+    {chat_history}
+    </CHAT HISTORY>
+
     Do not respond with more than one word.
         
     <input>
@@ -244,25 +313,93 @@ def query_routing(query, chat_history, chapter_name=None, sub_topic=None):
     except Exception as exc:    
         print('generated an exception: %s' % (exc))
         output="unsuccessful llm call"
-    return output
+    return normalize_route(output)
     
 
-def study_buddy_response(chapter_name, sub_topic , study_material, list_of_quizzes, user_input, study_buddy_name, user_preference ):
+def study_buddy_response(chapter_name, sub_topic , study_material, list_of_quizzes, user_input, study_buddy_name, user_preference,
+                         material_index=None, context=""):
     """
     Generate study buddy response. Uses VLM if images are detected in study material.
+
+    With a `material_index` (see material_index.py), `study_material` is its
+    plain text and images are read from its manifest instead of being
+    searched for in the markdown.
+
+    `context` (memories, conversation summary, extra instructions) is its own
+    prompt section: it is not ranked against the query with the material, so
+    the caller should fit it to its budget (see PromptBudget.fit_memory).
+    """
+    return _study_buddy_call(chapter_name, sub_topic, study_material, list_of_quizzes, user_input, study_buddy_name, user_preference,
+                             material_index=material_index, context=context)
+
+
+def routed_study_buddy_response(chapter_name, sub_topic, study_material, list_of_quizzes, user_input,
+                                study_buddy_name, user_preference, chat_history="", material_index=None, context=""):
+    """
+    Classify the user input and answer it in a single LLM call.
+
+    Replaces query_routing followed by study_buddy_response, which re-sent the
+    query and a long prompt in two round-trips. The model starts its output
+    with a `ROUTE:` line; for 'supplement' and 'book_calendar' the answer is
+    empty and the caller runs the matching tool.
+
+    Returns:
+        (route, answer): route is one of ROUTES
     """
-    stringified = json.dumps(list_of_quizzes, ensure_ascii=False, indent=2)    
+    routing_section = ROUTED_RESPONSE_INSTRUCTIONS.format(
+        chapter_name=chapter_name,
+        sub_topic=sub_topic,
+        chat_history=chat_history,
+    )
+    output = _study_buddy_call(chapter_name, sub_topic, study_material, list_of_quizzes, user_input,
+                               study_buddy_name, user_preference, routing_section, material_index, context)
+    route, answer = parse_routed_response(output)
+    print(Fore.CYAN + f"✓ Query classified as: {route} (single pass)" + Fore.RESET)
+    return route, answer
+
+
+def _study_buddy_call(chapter_name, sub_topic, study_material, list_of_quizzes, user_input,
+                      study_buddy_name, user_preference, routing_section="", material_index=None, context=""):
+    output = _vlm_study_buddy_call(chapter_name, sub_topic, study_material, list_of_quizzes, user_input,
+                                   study_buddy_name, user_preference, routing_section, material_index, context)
+    if output is not None:
+        return output
+    
+    user_prompt_str = _study_buddy_text_prompt(chapter_name, sub_topic, study_material, list_of_quizzes, user_input,
+                                               study_buddy_name, user_preference, routing_section, material_index, context)
+    response = inference_call(None, user_prompt_str)
+    try :
+        output_d=response.json()
+        output=output_d['choices'][0]["message"]["content"]
+    except Exception as exc:    
+        print('generated an exception: %s' % (exc))
+        output="unsuccessful llm call"
+    return output
+
+
+def _vlm_study_buddy_call(chapter_name, sub_topic, study_material, list_of_quizzes, user_input,
+                          study_buddy_name, user_preference, routing_section="", material_index=None, context=""):
+    """VLM answer if the study material contains images; None if it has none or the VLM fails."""
+    budget = get_prompt_budget()
+    stringified = json.dumps(budget.fit_quizzes(list_of_quizzes, user_input), ensure_ascii=False, indent=2)    
     study_buddy_name = study_buddy_name if study_buddy_name else "ollie"
     
-    # Check if study material contains images
-    images = detect_images_in_markdown(study_material)
+    # Check if study material contains images; an index lists them without re-scanning and
+    # lets us send the ones whose captions best match the query
+    if material_index is not None:
+        images = load_index_images(select_relevant_images(material_index, user_input, VLM_MAX_IMAGES))
+    else:
+        images = detect_images_in_markdown(study_material)[:VLM_MAX_IMAGES]
     
     if images and len(images) > 0:
         # Use VLM for multimodal response
-        print(Fore.YELLOW + f"📷 Detected {len(images)} images in study material. Using VLM for response..." + Fore.RESET)
+        print(Fore.YELLOW + f"📷 Sending {len(images)} images from the study material. Using VLM for response..." + Fore.RESET)
         
         # Extract clean text from markdown
-        text_content = extract_text_from_markdown(study_material)
+        if material_index is not None:
+            text_content = budget.fit_material(study_material, user_input, material_index.get("paragraphs") or [])
+        else:
+            text_content = budget.fit_material(extract_text_from_markdown(study_material), user_input)
         
         # Prepare the query for VLM
         vlm_query = f"""You are an AI study companion named {study_buddy_name}.
@@ -275,31 +412,26 @@ Speak naturally, as if having a friendly study conversation.
 - Current subtopic: {sub_topic}
 - Study material (text): {text_content}
 - Related quizzes: {stringified}
-
+{_context_section(context)}
 ### User Query
 {user_input}
 
 ### Instructions
 The user is asking about study material that contains images. Please:
-1. Analyze the image(s) provided along with the text content
+1. Analyze the image(s) provided along with the text content; images are given in the order they appear in the material
 2. Answer the user's question based on BOTH the image(s) and text content
 3. Be conversational and match the personality: {user_preference}
 4. Keep your response clear, concise, and engaging
 5. If the query relates to content visible in the image, describe and explain what you see
-
+{routing_section}
 Response:"""
         
-        # Use the first image for VLM query (you can extend this to use multiple images)
-        # The VLM function expects either a base64 string or a file path
-        first_image_base64 = images[0]
-        
         try:
-            # Call VLM with the image
-            output = query_qwen_vllm_served(
+            # One VLM request with all selected images, downscaled to the request's size budget
+            output = query_qwen_vllm_served_images(
                 query=vlm_query,
-                image_file_loc=first_image_base64,  # Pass base64 string directly
+                images=images,  # base64 strings
                 sys_prompt=f"You are {study_buddy_name}, a helpful study companion. Your style: {user_preference}",
-                audio_path=None
             )
             print(Fore.GREEN + "✓ VLM response generated successfully" + Fore.RESET)
             return output
@@ -309,8 +441,27 @@ Response:"""
             import traceback
             traceback.print_exc()
     
+    return None
+
+
+def _context_section(context):
+    """Prompt section for the caller's extra context; kept apart from the material so it is never trimmed with it."""
+    return f"\n### Additional Context\n{context}\n" if context else ""
+
+
+def _study_buddy_text_prompt(chapter_name, sub_topic, study_material, list_of_quizzes, user_input,
+                             study_buddy_name, user_preference, routing_section="", material_index=None, context=""):
+    # Fit material and quizzes to their token budgets; base64 images are useless to a text model
+    budget = get_prompt_budget()
+    spans = (material_index.get("paragraphs") or []) if material_index is not None else None
+    study_material = budget.fit_material(study_material, user_input, spans)
+    stringified = json.dumps(budget.fit_quizzes(list_of_quizzes, user_input), ensure_ascii=False, indent=2)    
+    budget.log_sections({"study_material": study_material, "quizzes": stringified, "memory": context,
+                         "routing": routing_section})
+    study_buddy_name = study_buddy_name if study_buddy_name else "ollie"
+    
     # Regular text-based response (no images or VLM failed)
-    user_prompt_str = STUDY_BUDDY_SYS_PROMPT.format(
+    user_prompt_str = STUDY_BUDDY_SYS_PROMPT_BODY.format(
                     study_buddy_name=study_buddy_name,
                     user_preference = user_preference,
                     chapter_name=chapter_name,
@@ -318,17 +469,79 @@ Response:"""
                     study_material=study_material,
                     list_of_quizzes=stringified,
                     user_input = user_input,
-                )
+                ) + _context_section(context) + routing_section + "\nRespond : \n"
+    return user_prompt_str
+
+
+async def stream_study_buddy_response(chapter_name, sub_topic, study_material, list_of_quizzes, user_input,
+                                      study_buddy_name, user_preference, routing_section="", material_index=None,
+                                      context=""):
+    """
+    Async generator of study buddy answer chunks, streamed with LLMClient.stream.
+
+    Same prompt and VLM handling as study_buddy_response; a VLM answer arrives
+    as a single chunk. If the stream fails before the first chunk, the answer
+    is fetched with a blocking call instead.
+    """
+    output = await asyncio.to_thread(_vlm_study_buddy_call, chapter_name, sub_topic, study_material, list_of_quizzes,
+                                     user_input, study_buddy_name, user_preference, routing_section, material_index,
+                                     context)
+    if output is not None:
+        yield output
+        return
     
-    response = inference_call(None, user_prompt_str)
-    try :
-        output_d=response.json()
-        output=output_d['choices'][0]["message"]["content"]
-    except Exception as exc:    
-        print('generated an exception: %s' % (exc))
-        output="unsuccessful llm call"
-    return output
+    user_prompt_str = _study_buddy_text_prompt(chapter_name, sub_topic, study_material, list_of_quizzes, user_input,
+                                               study_buddy_name, user_preference, routing_section, material_index, context)
+    streamed = False
+    try:
+        async for chunk in llm_client.stream(user_prompt_str, use_case=STUDY_BUDDY_USE_CASE):
+            streamed = True
+            yield chunk
+    except Exception as exc:
+        if streamed:
+            raise
+        print(Fore.YELLOW + f"Streaming failed before the first token ({exc}), using a blocking call" + Fore.RESET)
+        yield await asyncio.to_thread(_study_buddy_call, chapter_name, sub_topic, study_material, list_of_quizzes,
+                                      user_input, study_buddy_name, user_preference, routing_section, material_index,
+                                      context)
+
+
+def _may_be_route_line(text):
+    """True while `text` could still turn into a `ROUTE:` line."""
+    head = text.lstrip().lstrip("*`").lstrip().lower()
+    return "route".startswith(head[:5])
+
 
+async def stream_routed_study_buddy_response(chapter_name, sub_topic, study_material, list_of_quizzes, user_input,
+                                             study_buddy_name, user_preference, chat_history="", material_index=None,
+                                             context=""):
+    """
+    Streaming routed_study_buddy_response: an async generator of (route, text_delta).
+
+    The output is buffered only until the `ROUTE:` line is complete, so the
+    first delta arrives with the first answer tokens. For 'supplement' and
+    'book_calendar' the caller should stop iterating and run the tool.
+    """
+    routing_section = ROUTED_RESPONSE_INSTRUCTIONS.format(
+        chapter_name=chapter_name,
+        sub_topic=sub_topic,
+        chat_history=chat_history,
+    )
+    route, buffer = None, ""
+    async for chunk in stream_study_buddy_response(chapter_name, sub_topic, study_material, list_of_quizzes, user_input,
+                                                   study_buddy_name, user_preference, routing_section, material_index,
+                                                   context):
+        if route is not None:
+            yield route, chunk
+            continue
+        buffer += chunk
+        if "\n" in buffer.lstrip() or not _may_be_route_line(buffer):
+            route, answer = _split_route_line(buffer)
+            print(Fore.CYAN + f"✓ Query classified as: {route} (single pass, streaming)" + Fore.RESET)
+            yield route, answer
+    if route is None:
+        route, answer = _split_route_line(buffer)
+        yield route, answer
 
 
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+"""
+Minimal JSON Patch (RFC 6902) support for targeted user state updates.
+
+Used by `nodes.patch_active_chapter` to change one chapter shard (see the
+sharded layout in states.py) without loading, reconstructing and rewriting
+the whole user state.
+
+Supported operations: add, replace, remove, test. Paths are JSON Pointers
+(RFC 6901) relative to the patched document; "-" as the last token of an
+`add` path appends to a list.
+
+Usage:
+    from state_patch import apply_json_patch
+
+    chapter = apply_json_patch(chapter, [
+        {"op": "replace", "path": "/sub_topics/0/status", "value": "completed"},
+        {"op": "add", "path": "/sub_topics/0/quizzes/-", "value": quiz},
+    ])
+"""
+
+import copy
+from typing import Any, List
+
+from errors import UserStatePatchError
+
+
+def _pointer_tokens(path: str) -> List[str]:
+    if path == "":
+        return []
+    if not isinstance(path, str) or not path.startswith("/"):
+        raise UserStatePatchError(f"Invalid JSON Pointer {path!r}", path=path)
+    return [token.replace("~1", "/").replace("~0", "~") for token in path[1:].split("/")]
+
+
+def _list_index(container: list, token: str, path: str, allow_end: bool = False) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise UserStatePatchError(f"Invalid list index {token!r} in {path!r}", path=path)
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise UserStatePatchError(f"List index {index} out of range in {path!r}", path=path)
+    return index
+
+
+def _child(container: Any, token: str, path: str) -> Any:
+    if isinstance(container, list):
+        return container[_list_index(container, token, path)]
+    if isinstance(container, dict) and token in container:
+        return container[token]
+    raise UserStatePatchError(f"Path {path!r} does not exist", path=path)
+
+
+def apply_json_patch(doc: Any, ops: List[dict]) -> Any:
+    """Apply JSON Patch operations to a parsed JSON document.
+
+    The document is modified in place and also returned (an operation on the
+    root path replaces it). Operations are applied in order; if one fails,
+    UserStatePatchError is raised and earlier operations are not rolled back,
+    so callers should patch a fresh copy and only persist it on success.
+    """
+    for op in ops:
+        kind, path = op.get("op"), op.get("path")
+        tokens = _pointer_tokens(path)
+
+        if not tokens:
+            if kind in ("add", "replace"):
+                doc = copy.deepcopy(op["value"])
+            elif kind == "test":
+                if doc != op["value"]:
+                    raise UserStatePatchError(f"Test failed at {path!r}", path=path)
+            else:
+                raise UserStatePatchError(f"Cannot {kind} the document root", path=path)
+            continue
+
+        parent = doc
+        for token in tokens[:-1]:
+            parent = _child(parent, token, path)
+        last = tokens[-1]
+
+        if kind == "add":
+            if isinstance(parent, list):
+                parent.insert(_list_index(parent, last, path, allow_end=True), op["value"])
+            elif isinstance(parent, dict):
+                parent[last] = op["value"]
+            else:
+                raise UserStatePatchError(f"Cannot add to a {type(parent).__name__} at {path!r}", path=path)
+        elif kind == "replace":
+            _child(parent, last, path)
+            parent[int(last) if isinstance(parent, list) else last] = op["value"]
+        elif kind == "remove":
+            _child(parent, last, path)
+            del parent[int(last) if isinstance(parent, list) else last]
+        elif kind == "test":
+            if _child(parent, last, path) != op["value"]:
+                raise UserStatePatchError(f"Test failed at {path!r}", path=path)
+        else:
+            raise UserStatePatchError(f"Unsupported patch operation {kind!r}", path=path)
+    return doc
@@ -5,11 +5,33 @@ import operator
 
 from enum import Enum
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, ValidationError
 from IPython.display import Markdown, display
 import markdown  # Keep this for markdown.markdown() function, but don't import Markdown class
+import copy
+import hashlib
 import json
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
 from pydantic import parse_obj_as
+from typing_extensions import TypedDict as _ValidatedTypedDict
+from errors import UserStatePatchError
+from state_patch import apply_json_patch
+
+try:
+    import orjson
+except ImportError:  # optional, only needed for USER_STATE_FORMAT=orjson
+    orjson = None
+
+# On-disk format for user state files:
+#   "json"   - indented JSON via the stdlib (default, easy to read and diff)
+#   "orjson" - compact JSON via orjson, several times faster to write
+# Both are JSON, so files written in either format load with the same fast
+# path and switching formats migrates each file on its next save.
+USER_STATE_FORMAT = os.environ.get("USER_STATE_FORMAT", "json").lower()
 
 
 def printmd(markdown_str):
@@ -37,7 +59,8 @@ class SubTopic(BaseModel):
     sub_topic : str = Field(description="name of this sub-topic")    
     status: Optional[Status] = None    
     study_material: Optional[str] # each studying materails should be in markdown format
-    display_markdown: Optional[str] # ready to be displayed markdown string with image in base64 embedded
+    display_markdown: Optional[str] # ready to be displayed markdown string, images referenced from the asset store
+    material_index: Optional[dict] = None # text, image manifest and paragraph spans derived from display_markdown, see material_index.py
     reference: str = Field(description="name of the PDF document, from which this chapter is derived")    
     quizzes : Optional[List[dict]] # each quiz is a dictionary, user can generate several round of quizes
     feedback:Optional[List[str]]
@@ -70,6 +93,7 @@ class User(TypedDict):
     study_buddy_name: str = Field(description="name of the study_buddy")
     curriculum: Optional[List[Curriculum]]
     uploaded_files: Optional[List[str]]  # list of file names uploaded by the user
+    state_version: Optional[int]  # bumped on every committed update, used for optimistic concurrency
 
 class GlobalState(TypedDict):
     input: str
@@ -91,7 +115,9 @@ class GlobalState(TypedDict):
 
 def _to_json_safe(obj):
     """Recursively convert Pydantic models, Enums and other non-JSON types to JSON-serializable forms."""
-    # Pydantic BaseModel (V2 compatible)
+    # Pydantic BaseModel (V2): mode="json" already converts nested models and Enums
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
     if hasattr(obj, "model_dump"):
         return _to_json_safe(obj.model_dump())
     elif hasattr(obj, "dict") and callable(getattr(obj, "dict")):
@@ -110,11 +136,62 @@ def _to_json_safe(obj):
     return obj
 
 
-def save_user_to_file(user: User, path: str):
-    """Save a User TypedDict (which may include Pydantic models) to a JSON file."""
+def atomic_write_bytes(path: str, data: bytes):
+    """Write data to path atomically.
+
+    The bytes go to a temp file in the same directory, are fsynced, and the temp
+    file is renamed over the target. Readers and a crash mid-write therefore see
+    either the old file or the new one, never a truncated mix.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    # Persist the rename itself
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+
+
+def _orjson_default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dump_user_bytes(user: User, fmt: Optional[str] = None) -> bytes:
+    """Serialize a User TypedDict (which may include Pydantic models) in the given format."""
+    fmt = (fmt or USER_STATE_FORMAT).lower()
+    if fmt == "orjson" and orjson is not None:
+        return orjson.dumps(user, default=_orjson_default)
     safe = _to_json_safe(user)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(safe, f, ensure_ascii=False, indent=2)
+    return json.dumps(safe, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def save_user_to_file(user: User, path: str, fmt: Optional[str] = None, shard_dir: Optional[str] = None):
+    """Save a User TypedDict (which may include Pydantic models) to a JSON file atomically.
+
+    With `shard_dir`, the file becomes a small curriculum index and every
+    chapter is written to its own shard in that directory (see
+    save_user_sharded). load_user_from_file reads either layout.
+    """
+    if shard_dir is not None:
+        save_user_sharded(user, path, shard_dir, fmt)
+        return
+    atomic_write_bytes(path, dump_user_bytes(user, fmt))
 
 
 def convert_to_json_safe(obj):
@@ -131,6 +208,54 @@ def _construct_enum(enum_cls, value):
         return None
 
 
+class _CurriculumRecord(_ValidatedTypedDict, total=False):
+    """Validation schema for a stored Curriculum (see load_user_from_file)."""
+    __pydantic_config__ = ConfigDict(extra="ignore")
+    active_chapter: Optional[Chapter]
+    next_chapter: Optional[Chapter]
+    study_plan: Optional[StudyPlan]
+    # Older code paths store a single status string instead of a list
+    status: Optional[Union[List[Optional[Status]], str]]
+
+
+class _UserRecord(_ValidatedTypedDict, total=False):
+    """Validation schema for a stored User (see load_user_from_file)."""
+    __pydantic_config__ = ConfigDict(extra="allow")
+    user_id: str
+    study_buddy_preference: Optional[str]
+    study_buddy_persona: Any
+    study_buddy_name: Optional[str]
+    curriculum: Optional[List[_CurriculumRecord]]
+    uploaded_files: Optional[List[str]]
+    state_version: Optional[int]
+
+
+_user_record_adapter = TypeAdapter(_UserRecord)
+
+
+def load_user_bytes(raw: bytes, base_dir: Optional[str] = None) -> User:
+    """Parse and reconstruct a stored User from JSON bytes.
+
+    The fast path validates the whole tree in one `TypeAdapter.validate_json`
+    call (pydantic-core parses and builds the Chapter/SubTopic models directly).
+    Files it cannot validate strictly (legacy shapes, unknown status values)
+    fall back to the tolerant hand-written reconstruction.
+
+    Sharded index files are recognized by their leading "layout" key; their
+    chapter shards are resolved relative to `base_dir`.
+    """
+    if _is_sharded_index(raw):
+        return _load_sharded(json.loads(raw), base_dir)
+    try:
+        data = _user_record_adapter.validate_json(raw)
+    except ValidationError:
+        return _rebuild_user(json.loads(raw))
+    for curr in data.get("curriculum") or []:
+        for key in ("active_chapter", "next_chapter", "study_plan", "status"):
+            curr.setdefault(key, None)
+    return data
+
+
 def load_user_from_file(path: str) -> User:
     """Load the JSON file and reconstruct User, Chapter, StudyPlan and Curriculum structures.
 
@@ -140,48 +265,66 @@ def load_user_from_file(path: str) -> User:
     - StudyPlan as BaseModel containing Chapter list
     - Curriculum as TypedDict containing StudyPlan BaseModel
     - User curriculum as List[Curriculum]
+
+    For the sharded layout only the index and the active/next chapter shards
+    are read; `study_plan` is a LazyStudyPlan that reads the remaining
+    chapters on first access.
     """
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # Helper to rebuild SubTopic (BaseModel)
-    def rebuild_subtopic(st):
-        if not isinstance(st, dict):
-            return st
-        # Reconstruct Status enum
-        status = st.get("status")
-        if status is not None:
-            st["status"] = _construct_enum(Status, status)
-        return SubTopic(**st)
-
-    # Helper to rebuild Chapter (BaseModel)
-    def rebuild_chapter(ch):
-        if not isinstance(ch, dict):
-            return ch
-        # Reconstruct Status enum
-        status = ch.get("status")
-        if status is not None:
-            ch["status"] = _construct_enum(Status, status)
-        # Reconstruct SubTopic list
-        sub_topics = ch.get("sub_topics", [])
-        if sub_topics:
-            ch["sub_topics"] = [rebuild_subtopic(st) for st in sub_topics]
-        return Chapter(**ch)
-
-    # Helper to rebuild StudyPlan (BaseModel)
-    def rebuild_study_plan(sp):
-        if sp is None:
-            return None
-        if isinstance(sp, dict):
-            # StudyPlan has a 'study_plan' field containing list of Chapters
-            plan_list = sp.get("study_plan", [])
-            plan_objs = [rebuild_chapter(ch) for ch in plan_list]
-            return StudyPlan(study_plan=plan_objs)
-        elif isinstance(sp, list):
-            # Sometimes it might be directly a list of chapters
-            plan_objs = [rebuild_chapter(ch) for ch in sp]
-            return StudyPlan(study_plan=plan_objs)
-        return sp
+    with open(path, "rb") as f:
+        return load_user_bytes(f.read(), os.path.dirname(os.path.abspath(path)))
+
+
+def _rebuild_subtopic(st):
+    """Rebuild a SubTopic (BaseModel) from parsed JSON."""
+    if not isinstance(st, dict):
+        return st
+    # Reconstruct Status enum
+    status = st.get("status")
+    if status is not None:
+        st["status"] = _construct_enum(Status, status)
+    return SubTopic(**st)
+
+
+def _rebuild_chapter(ch):
+    """Rebuild a Chapter (BaseModel) and its SubTopics from parsed JSON."""
+    if not isinstance(ch, dict):
+        return ch
+    # Reconstruct Status enum
+    status = ch.get("status")
+    if status is not None:
+        ch["status"] = _construct_enum(Status, status)
+    # Reconstruct SubTopic list
+    sub_topics = ch.get("sub_topics", [])
+    if sub_topics:
+        ch["sub_topics"] = [_rebuild_subtopic(st) for st in sub_topics]
+    return Chapter(**ch)
+
+
+def _rebuild_study_plan(sp):
+    """Rebuild a StudyPlan (BaseModel) from parsed JSON."""
+    if sp is None:
+        return None
+    if isinstance(sp, dict):
+        # StudyPlan has a 'study_plan' field containing list of Chapters
+        plan_list = sp.get("study_plan", [])
+        plan_objs = [_rebuild_chapter(ch) for ch in plan_list]
+        return StudyPlan(study_plan=plan_objs)
+    elif isinstance(sp, list):
+        # Sometimes it might be directly a list of chapters
+        plan_objs = [_rebuild_chapter(ch) for ch in sp]
+        return StudyPlan(study_plan=plan_objs)
+    return sp
+
+
+def _rebuild_status(status_list):
+    """Reconstruct a curriculum status list with Enum values."""
+    if status_list and isinstance(status_list, list):
+        status_list = [_construct_enum(Status, s) if s else None for s in status_list]
+    return status_list
+
+
+def _rebuild_user(data: dict) -> User:
+    """Tolerant reconstruction of a User from already-parsed JSON data."""
 
     # Helper to rebuild Curriculum (TypedDict)
     def rebuild_curriculum(curr):
@@ -189,25 +332,20 @@ def load_user_from_file(path: str) -> User:
             return curr
         
         # Reconstruct StudyPlan as BaseModel
-        study_plan = rebuild_study_plan(curr.get("study_plan"))
+        study_plan = _rebuild_study_plan(curr.get("study_plan"))
         
         # Reconstruct active and next chapters as BaseModel
         active = curr.get("active_chapter")
         next_c = curr.get("next_chapter")
-        active_obj = rebuild_chapter(active) if active else None
-        next_obj = rebuild_chapter(next_c) if next_c else None
-        
-        # Reconstruct status list with Enum values
-        status_list = curr.get("status")
-        if status_list and isinstance(status_list, list):
-            status_list = [_construct_enum(Status, s) if s else None for s in status_list]
+        active_obj = _rebuild_chapter(active) if active else None
+        next_obj = _rebuild_chapter(next_c) if next_c else None
         
         # Return as TypedDict-compliant dict
         curriculum_obj: Curriculum = {
             "active_chapter": active_obj,
             "next_chapter": next_obj,
             "study_plan": study_plan,
-            "status": status_list,
+            "status": _rebuild_status(curr.get("status")),
         }
         return curriculum_obj
 
@@ -224,6 +362,390 @@ def load_user_from_file(path: str) -> User:
     return data
 
 
+# ---------------------------------------------------------------------------
+# Sharded layout
+#
+#   user_store/
+#       user_id.json            # index: profile + per-chapter metadata and shard ids
+#       chapters/
+#           <sha256>.json       # one Chapter per file, named by a hash of its content
+#           <sha256>.unreferenced   # marker: the index stopped referencing the shard
+#
+# Shards are content-addressed, so an unchanged chapter is never rewritten and
+# active_chapter shares its file with the matching study plan entry. A save
+# writes new shards first and the index last, so a crash leaves the previous
+# index pointing at shards that still exist.
+# ---------------------------------------------------------------------------
+
+# Shards the index no longer references are kept this long after the first save
+# that dropped them, so states loaded before that save can still lazily read
+# their chapters (0 deletes them on that save)
+SHARD_GC_GRACE_SECONDS = float(os.environ.get("USER_STATE_SHARD_GC_GRACE", "600"))
+
+_LAYOUT_KEY = "layout"
+_UNREFERENCED_SUFFIX = ".unreferenced"
+# "layout" as the first key of the top-level object, compact or indented; a legacy
+# single-file state may contain "layout" as a value (e.g. its user_id) near the start
+_SHARDED_HEAD = re.compile(rb'\A\s*\{\s*"layout"\s*:')
+
+
+class _ChapterRef:
+    """Placeholder for a chapter that has not been read from its shard yet."""
+
+    __slots__ = ("path", "meta")
+
+    def __init__(self, path: Path, meta: dict):
+        self.path = path
+        self.meta = meta
+
+    def load(self) -> Chapter:
+        raw = self.path.read_bytes()
+        try:
+            return Chapter.model_validate_json(raw)
+        except ValidationError:
+            return _rebuild_chapter(json.loads(raw))
+
+
+class _LazyChapterList(list):
+    """List of chapters whose items are read from their shards on first access."""
+
+    def _load(self, i: int):
+        item = list.__getitem__(self, i)
+        if isinstance(item, _ChapterRef):
+            item = item.load()
+            list.__setitem__(self, i, item)
+        return item
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._load(j) for j in range(*i.indices(len(self)))]
+        return self._load(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._load(i)
+
+    def __reversed__(self):
+        for i in reversed(range(len(self))):
+            yield self._load(i)
+
+    def materialize(self) -> "_LazyChapterList":
+        for i in range(len(self)):
+            self._load(i)
+        return self
+
+    def loaded_count(self) -> int:
+        return sum(1 for item in list.__iter__(self) if not isinstance(item, _ChapterRef))
+
+    def raw_items(self) -> list:
+        """Loaded chapters and placeholders as stored, without reading any shard."""
+        return list(list.__iter__(self))
+
+    def __contains__(self, item):
+        return list.__contains__(self.materialize(), item)
+
+    def __eq__(self, other):
+        return list.__eq__(self.materialize(), other.materialize() if isinstance(other, _LazyChapterList) else other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return list.__repr__(self.materialize())
+
+    def copy(self):
+        return list(self)
+
+    def __reduce_ex__(self, protocol):
+        # Copy placeholders as-is instead of iterating (which would load every shard)
+        return (type(self), (self.raw_items(),))
+
+
+class LazyStudyPlan(StudyPlan):
+    """StudyPlan whose chapters are read from their shard files on first access.
+
+    It passes isinstance checks for StudyPlan and supports indexing, slicing
+    and iteration of `.study_plan`; only the chapters a caller touches are
+    read from disk. Serializing it loads the rest.
+    """
+
+    @classmethod
+    def from_items(cls, items: list) -> "LazyStudyPlan":
+        return cls.model_construct(study_plan=_LazyChapterList(items))
+
+    def loaded_chapters(self) -> int:
+        return self.study_plan.loaded_count()
+
+    def materialize(self) -> StudyPlan:
+        """Read every chapter and return a plain StudyPlan."""
+        return StudyPlan(study_plan=list(self.study_plan))
+
+    def model_dump(self, **kwargs):
+        self.study_plan.materialize()
+        return super().model_dump(**kwargs)
+
+    def model_dump_json(self, **kwargs):
+        self.study_plan.materialize()
+        return super().model_dump_json(**kwargs)
+
+    def __eq__(self, other):
+        if isinstance(other, StudyPlan):
+            return list(self.study_plan) == list(other.study_plan)
+        return NotImplemented
+
+    __hash__ = None
+
+
+def chapter_summary(chapter) -> Optional[dict]:
+    """Number, name, status and sub-topic names of a Chapter (model or dict)."""
+    if chapter is None:
+        return None
+    if isinstance(chapter, dict):
+        get = chapter.get
+    else:
+        get = lambda key, default=None: getattr(chapter, key, default)
+    sub_topics = []
+    for st in get("sub_topics") or []:
+        sub_topics.append(st.get("sub_topic") if isinstance(st, dict) else getattr(st, "sub_topic", None))
+    status = get("status")
+    return {
+        "number": get("number"),
+        "name": get("name"),
+        "status": status.value if isinstance(status, Enum) else status,
+        "sub_topics": sub_topics,
+    }
+
+
+def _is_sharded_index(raw: bytes) -> bool:
+    # The layout key is always written first, so only the head needs checking
+    return _SHARDED_HEAD.match(raw[:64]) is not None
+
+
+def _study_plan_items(study_plan) -> Optional[list]:
+    if isinstance(study_plan, StudyPlan):
+        chapters = study_plan.study_plan
+    elif isinstance(study_plan, dict):
+        chapters = study_plan.get("study_plan", [])
+    else:
+        chapters = study_plan
+    if isinstance(chapters, _LazyChapterList):
+        return chapters.raw_items()
+    return list(chapters) if isinstance(chapters, list) else None
+
+
+def save_user_sharded(user: User, path: str, shard_dir: str, fmt: Optional[str] = None):
+    """Save a User as a curriculum index file plus one content-addressed shard per chapter.
+
+    Chapters of a LazyStudyPlan that were never read are referenced again
+    without being loaded or rewritten.
+    """
+    path, shard_dir = Path(path), Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    referenced = set()
+
+    def put(chapter) -> Optional[dict]:
+        if chapter is None:
+            return None
+        if isinstance(chapter, _ChapterRef):
+            if chapter.path.parent == shard_dir:
+                referenced.add(chapter.meta["shard"])
+                return dict(chapter.meta)
+            chapter = chapter.load()
+        data = _to_json_safe(chapter)
+        digest = _write_shard(shard_dir, data, fmt)
+        referenced.add(digest)
+        return {**chapter_summary(data), "shard": digest}
+
+    def index_curriculum(curr):
+        if not isinstance(curr, dict):
+            return _to_json_safe(curr)
+        study_plan = curr.get("study_plan")
+        items = _study_plan_items(study_plan)
+        if items is not None:
+            plan_entry = {"chapters": [put(ch) for ch in items]}
+        else:
+            plan_entry = _to_json_safe(study_plan)
+        return {
+            "active_chapter": put(curr.get("active_chapter")),
+            "next_chapter": put(curr.get("next_chapter")),
+            "study_plan": plan_entry,
+            "status": _to_json_safe(curr.get("status")),
+        }
+
+    index = {_LAYOUT_KEY: {"type": "sharded", "shard_dir": os.path.relpath(shard_dir, path.parent)}}
+    for key, value in user.items():
+        if key == _LAYOUT_KEY:
+            continue
+        if key == "curriculum" and value is not None:
+            curricula = value if isinstance(value, list) else [value]
+            index[key] = [index_curriculum(c) for c in curricula]
+        else:
+            index[key] = _to_json_safe(value)
+
+    atomic_write_bytes(str(path), dump_user_bytes(index, fmt))
+    _gc_shards(shard_dir, referenced)
+
+
+def _write_shard(shard_dir: Path, data, fmt: Optional[str] = None) -> str:
+    """Write a JSON-safe chapter to its content-addressed shard and return the shard id."""
+    raw = dump_user_bytes(data, fmt)
+    digest = hashlib.sha256(raw).hexdigest()
+    shard = shard_dir / f"{digest}.json"
+    if not shard.exists():
+        atomic_write_bytes(str(shard), raw)
+    return digest
+
+
+def _gc_shards(shard_dir: Path, referenced: set):
+    """Delete shards that have gone unreferenced for longer than the grace period.
+
+    A shard's mtime is when it was written, not when the index stopped
+    referencing it, so the first save that drops a shard leaves an empty
+    `<digest>.unreferenced` marker next to it; the grace period is measured
+    from the marker. A shard that is referenced again loses its marker.
+    """
+    now = time.time()
+    for marker in shard_dir.glob(f"*{_UNREFERENCED_SUFFIX}"):
+        digest = marker.name[:-len(_UNREFERENCED_SUFFIX)]
+        if digest in referenced or not (shard_dir / f"{digest}.json").exists():
+            marker.unlink(missing_ok=True)
+    for shard in shard_dir.glob("*.json"):
+        if shard.stem in referenced:
+            continue
+        marker = shard_dir / f"{shard.stem}{_UNREFERENCED_SUFFIX}"
+        try:
+            if SHARD_GC_GRACE_SECONDS > 0:
+                if not marker.exists():
+                    marker.touch()
+                    continue
+                if marker.stat().st_mtime > now - SHARD_GC_GRACE_SECONDS:
+                    continue
+            shard.unlink()
+            marker.unlink(missing_ok=True)
+        except FileNotFoundError:
+            pass
+
+
+def _load_sharded(index: dict, base_dir: Optional[str]) -> User:
+    layout = index.pop(_LAYOUT_KEY)
+    shard_dir = Path(base_dir or ".") / layout["shard_dir"]
+
+    def load_curriculum(entry):
+        if not isinstance(entry, dict):
+            return entry
+        loaded = {}
+
+        def load(meta):
+            if not meta:
+                return None
+            digest = meta["shard"]
+            if digest in loaded:
+                return copy.deepcopy(loaded[digest])
+            chapter = _ChapterRef(shard_dir / f"{digest}.json", meta).load()
+            loaded[digest] = chapter
+            return chapter
+
+        active = load(entry.get("active_chapter"))
+        next_c = load(entry.get("next_chapter"))
+
+        study_plan = entry.get("study_plan")
+        if isinstance(study_plan, dict) and "chapters" in study_plan:
+            items = []
+            for meta in study_plan["chapters"]:
+                if not meta:
+                    items.append(None)
+                elif meta["shard"] in loaded:
+                    # Already read for active/next chapter; share a copy instead of rereading
+                    items.append(copy.deepcopy(loaded[meta["shard"]]))
+                else:
+                    items.append(_ChapterRef(shard_dir / f"{meta['shard']}.json", meta))
+            study_plan = LazyStudyPlan.from_items(items)
+        else:
+            study_plan = _rebuild_study_plan(study_plan)
+
+        curriculum_obj: Curriculum = {
+            "active_chapter": active,
+            "next_chapter": next_c,
+            "study_plan": study_plan,
+            "status": _rebuild_status(entry.get("status")),
+        }
+        return curriculum_obj
+
+    curricula = index.get("curriculum")
+    if curricula is not None:
+        index["curriculum"] = [load_curriculum(c) for c in curricula]
+    return index
+
+
+def read_sharded_index(path: str) -> Optional[dict]:
+    """Parsed index of a sharded user state file, or None for single-file states."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    return json.loads(raw) if _is_sharded_index(raw) else None
+
+
+def patch_sharded_chapter(path: str, index: dict, key: str, ops, curriculum_index: int = 0,
+                          fmt: Optional[str] = None) -> Optional[dict]:
+    """Apply JSON Patch operations to one chapter shard of a sharded user state.
+
+    Only the patched chapter is read and written: the result goes to a new
+    shard, and `index` (as returned by read_sharded_index, possibly modified
+    by the caller) is rewritten to point at it. Other chapters are untouched.
+
+    Args:
+        path: Path of the index file
+        index: Parsed index to update and write back
+        key: Chapter slot of the curriculum, "active_chapter" or "next_chapter"
+        ops: List of JSON Patch operations relative to the chapter, or a
+            callable that receives the current chapter dict and returns them
+        curriculum_index: Which curriculum of the user to patch
+
+    Returns:
+        The patched chapter as a JSON dict, or None if there was nothing to
+        apply (nothing is written in that case)
+
+    Raises:
+        UserStatePatchError: If the chapter slot is empty or an operation fails
+    """
+    path = Path(path)
+    shard_dir = path.parent / index[_LAYOUT_KEY]["shard_dir"]
+    curricula = index.get("curriculum") or []
+    entry = curricula[curriculum_index] if 0 <= curriculum_index < len(curricula) else None
+    meta = entry.get(key) if isinstance(entry, dict) else None
+    if not meta:
+        raise UserStatePatchError(f"No {key} in curriculum {curriculum_index}", path=f"/{key}")
+
+    chapter = json.loads((shard_dir / f"{meta['shard']}.json").read_bytes())
+    if callable(ops):
+        ops = ops(chapter)
+    if not ops:
+        return None
+    ops = [{**op, "value": _to_json_safe(op["value"])} if "value" in op else op for op in ops]
+    chapter = apply_json_patch(chapter, ops)
+
+    entry[key] = {**chapter_summary(chapter), "shard": _write_shard(shard_dir, chapter, fmt)}
+    atomic_write_bytes(str(path), dump_user_bytes(index, fmt))
+    return chapter
+
+
+def load_active_chapter_summary(path: str) -> Optional[dict]:
+    """chapter_summary of the first curriculum's active chapter, read from the index only.
+
+    For a sharded file this parses just the index (a few KB); no chapter
+    shard is opened. Single-file states are fully loaded.
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    if _is_sharded_index(raw):
+        curricula = json.loads(raw).get("curriculum") or []
+        meta = curricula[0].get("active_chapter") if curricula and isinstance(curricula[0], dict) else None
+        return {k: v for k, v in meta.items() if k != "shard"} if meta else None
+    curricula = load_user_bytes(raw).get("curriculum") or []
+    return chapter_summary(curricula[0].get("active_chapter")) if curricula else None
+
+
 if __name__ == "__main__":
     # demo: save and load the example user
     
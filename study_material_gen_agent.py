@@ -24,6 +24,7 @@ from IPython.display import Markdown, display
 import markdown
 #from search_and_filter_documents import filter_documents_by_file_name
 from search_and_filter_docs_streaming import filter_documents_by_file_name
+from asset_store import get_asset_store
 
 def printmd(markdown_str):
     display(Markdown(markdown_str))
@@ -123,7 +124,9 @@ async def study_material_gen(username,subject,sub_topic,pdf_file_name, num_docs)
         #print("---"*10)
         study_material_str=strip_thinking_tag(llm_parsed_output)
         
-        reference_images_base64_str='\n'.join([f"""<br><p align='center'><img src='data:image/png;base64,{o["content"]}'/></p></br>""" for o in output if o["document_type"] in ["image", "table", "chart"] ])
+        asset_store = get_asset_store()
+        asset_paths = [asset_store.put_base64(o["content"]) for o in output if o["document_type"] in ["image", "table", "chart"]]
+        reference_images_base64_str='\n'.join([f"""<br>{asset_store.image_tag(p)}</br>""" for p in asset_paths if p])
         markdown_str = markdown.markdown(f'''                
             {study_material_str}
             
@@ -0,0 +1,54 @@
+"""
+Tests for the content-addressed study-material asset store.
+"""
+import base64
+import sys
+from pathlib import Path
+
+parent_dir = Path(__file__).parent.parent
+if str(parent_dir) not in sys.path:
+    sys.path.insert(0, str(parent_dir))
+
+from asset_store import AssetStore
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\nfake-image-payload"
+PNG_B64 = base64.b64encode(PNG_BYTES).decode()
+
+
+def test_put_bytes_deduplicates(tmp_path):
+    store = AssetStore(str(tmp_path))
+    first = store.put_bytes(PNG_BYTES, "png")
+    second = store.put_bytes(PNG_BYTES, "png")
+
+    assert first == second
+    assert first.read_bytes() == PNG_BYTES
+    assert len(list(tmp_path.rglob("*.png"))) == 1
+
+
+def test_externalize_markdown_replaces_data_uris(tmp_path):
+    store = AssetStore(str(tmp_path), url_prefix="/file=")
+    markdown_str = (
+        f"Intro<br><p align='center'><img src='data:image/png;base64,{PNG_B64}'/></p>\n"
+        f"![figure](data:image/png;base64,{PNG_B64})"
+    )
+
+    result = store.externalize_markdown(markdown_str)
+
+    assert "base64," not in result
+    assert result.count("loading='lazy'") == 2
+    assert "/file=" + str(tmp_path) in result
+    assert len(list(tmp_path.rglob("*.png"))) == 1
+
+
+def test_images_in_markdown_round_trip(tmp_path):
+    store = AssetStore(str(tmp_path))
+    result = store.externalize_markdown(f"![x](data:image/png;base64,{PNG_B64})")
+
+    assert store.images_in_markdown(result) == [PNG_B64]
+
+
+def test_invalid_base64_left_untouched(tmp_path):
+    store = AssetStore(str(tmp_path))
+    markdown_str = "![x](data:image/png;base64,not$valid)"
+
+    assert store.externalize_markdown(markdown_str) == markdown_str
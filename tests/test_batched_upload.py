@@ -0,0 +1,119 @@
+"""
+Tests for batched, bounded-concurrency document uploads.
+"""
+import asyncio
+
+import pytest
+
+import nemo_retriever_client_utils as client
+from errors import RAGConnectionError, RAGIngestionError
+from nemo_retriever_client_utils import batch_files, upload_documents_batched
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    paths = []
+    for i, size in enumerate([10, 10, 30, 10, 10]):
+        path = tmp_path / f"doc{i}.pdf"
+        path.write_bytes(b"x" * size)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(client, "UPLOAD_RETRY_BACKOFF", 0)
+
+
+def _names(paths):
+    return [p.rsplit("/", 1)[-1] for p in paths]
+
+
+def test_batch_files_respects_count_and_size_limits(pdfs):
+    assert [_names(b) for b in batch_files(pdfs, batch_size=2, max_batch_bytes=1000)] == [
+        ["doc0.pdf", "doc1.pdf"], ["doc2.pdf", "doc3.pdf"], ["doc4.pdf"]]
+    # doc2 is bigger than the byte budget on its own and still gets uploaded
+    assert [_names(b) for b in batch_files(pdfs, batch_size=10, max_batch_bytes=25)] == [
+        ["doc0.pdf", "doc1.pdf"], ["doc2.pdf"], ["doc3.pdf", "doc4.pdf"]]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded(pdfs, monkeypatch):
+    in_flight, peak = 0, 0
+
+    async def _send(session, collection_name, files_path_ls, custom_metadata, blocking=False, reingest=False):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"task_id": files_path_ls[0]}
+
+    monkeypatch.setattr(client, "_send_documents", _send)
+
+    uploaded, failed = await upload_documents_batched("alice", pdfs, batch_size=1, concurrency=2)
+
+    assert peak == 2
+    assert failed == []
+    assert sorted(_names(p for batch, _ in uploaded for p in batch)) == _names(pdfs)
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_then_split_per_file(pdfs, monkeypatch):
+    attempts = []
+
+    async def _send(session, collection_name, files_path_ls, custom_metadata, blocking=False, reingest=False):
+        names = _names(files_path_ls)
+        attempts.append(names)
+        if "doc1.pdf" in names:
+            if len(names) == 1:
+                raise RAGIngestionError("encrypted pdf")
+            raise RAGConnectionError("HTTP 502")
+        if names == ["doc0.pdf"] and attempts.count(["doc0.pdf"]) == 1:
+            raise RAGConnectionError("connection reset")
+        return {"task_id": "+".join(names)}
+
+    monkeypatch.setattr(client, "_send_documents", _send)
+
+    uploaded, failed = await upload_documents_batched("alice", pdfs[:2], batch_size=2, max_retries=2)
+
+    assert _names(failed) == ["doc1.pdf"]
+    assert [response["task_id"] for _, response in uploaded] == ["doc0.pdf"]
+    # two attempts of the batch, then doc0 twice (one transient error) and doc1 once (rejected)
+    assert sorted(map(tuple, attempts)) == sorted([
+        ("doc0.pdf", "doc1.pdf"), ("doc0.pdf", "doc1.pdf"), ("doc0.pdf",), ("doc0.pdf",), ("doc1.pdf",)])
+
+
+@pytest.mark.asyncio
+async def test_file_handles_are_closed(pdfs, monkeypatch):
+    opened = []
+    real_open = open
+
+    def _tracking_open(path, mode="r", *args, **kwargs):
+        f = real_open(path, mode, *args, **kwargs)
+        opened.append(f)
+        return f
+
+    class _Response:
+        status = 503
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def json(self, content_type=None):
+            return {"message": "overloaded"}
+
+    class _Session:
+        def post(self, url, data):
+            return _Response()
+
+    monkeypatch.setattr("builtins.open", _tracking_open)
+
+    with pytest.raises(RAGConnectionError):
+        await client._send_documents(_Session(), "alice", pdfs)
+
+    assert len(opened) == len(pdfs)
+    assert all(f.closed for f in opened)
@@ -0,0 +1,135 @@
+"""
+Tests for the async, cached collection manager used by the upload flow.
+"""
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import collection_manager
+import user_store
+from collection_manager import CollectionManager
+from ingestion_manifest import IngestionManifest
+
+
+@pytest.fixture
+async def ingestor():
+    """Minimal in-memory stand-in for the ingestor's collection endpoints."""
+    state = {"collections": {"existing"}, "calls": []}
+
+    async def _list(request):
+        state["calls"].append("list")
+        return web.json_response({"collections": [{"collection_name": n} for n in sorted(state["collections"])]})
+
+    async def _create(request):
+        body = await request.json()
+        state["calls"].append(("create", body["collection_name"]))
+        await asyncio.sleep(0.01)
+        state["collections"].add(body["collection_name"])
+        return web.json_response({"message": "Collection created successfully"})
+
+    async def _delete(request):
+        names = await request.json()
+        state["calls"].append(("delete", tuple(names)))
+        state["collections"].difference_update(names)
+        return web.json_response({"message": "deleted"})
+
+    app = web.Application()
+    app.router.add_get("/v1/collections", _list)
+    app.router.add_post("/v1/collection", _create)
+    app.router.add_delete("/v1/collections", _delete)
+    server = TestServer(app)
+    await server.start_server()
+    state["url"] = str(server.make_url("")).rstrip("/")
+    yield state
+    await server.close()
+
+
+@pytest.fixture
+async def manager(ingestor, tmp_path, monkeypatch):
+    monkeypatch.setattr(user_store, "DEFAULT_SAVE_TO", str(tmp_path))
+    m = CollectionManager(base_url=ingestor["url"])
+    yield m
+    await m.close()
+
+
+@pytest.mark.asyncio
+async def test_collection_list_is_cached(manager, ingestor):
+    assert await manager.list_collections() == {"existing"}
+    assert await manager.list_collections() == {"existing"}
+    assert ingestor["calls"] == ["list"]
+
+    await manager.list_collections(refresh=True)
+    assert ingestor["calls"] == ["list", "list"]
+
+
+@pytest.mark.asyncio
+async def test_ensure_collection_is_idempotent_under_concurrency(manager, ingestor):
+    created = await asyncio.gather(*(manager.ensure_collection("alice") for _ in range(5)))
+
+    assert created.count(True) == 1
+    assert [c for c in ingestor["calls"] if c != "list"] == [("create", "alice")]
+    assert await manager.ensure_collection("existing") is False
+
+
+@pytest.mark.asyncio
+async def test_delete_forgets_collection_and_manifest(manager, ingestor, tmp_path):
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF")
+    IngestionManifest.for_collection("existing").record([str(pdf)])
+
+    await manager.list_collections()
+    await manager.delete_collections(["existing"])
+
+    assert await manager.list_collections() == set()
+    assert IngestionManifest.for_collection("existing").documents() == {}
+
+
+@pytest.mark.asyncio
+async def test_prepare_and_upload_plans_against_the_new_collection(manager, ingestor, tmp_path, monkeypatch):
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF")
+    # A manifest left over from an older collection of the same name must not skip the upload
+    IngestionManifest.for_collection("alice").record([str(pdf)])
+    seen = {}
+
+    async def _upload(files_path_ls, username, CUSTOM_METADATA=[], on_progress=None, manifest=None, plan=None,
+                      session=None):
+        seen.update(username=username, new=plan.new, unchanged=plan.unchanged)
+        return {"uploaded": [p.rsplit("/", 1)[-1] for p in plan.new]}
+
+    monkeypatch.setattr(collection_manager.client, "upload_files_to_nemo_retriever", _upload)
+
+    summary = await manager.prepare_and_upload("alice", [str(pdf)])
+
+    assert summary == {"uploaded": ["a.pdf"]}
+    assert seen == {"username": "alice", "new": [str(pdf)], "unchanged": []}
+    assert ("create", "alice") in ingestor["calls"]
+
+
+@pytest.mark.asyncio
+async def test_uploads_and_status_polls_reuse_the_manager_session(manager, tmp_path, monkeypatch):
+    pdfs = []
+    for name in ("a.pdf", "b.pdf"):
+        pdfs.append(tmp_path / name)
+        pdfs[-1].write_bytes(b"%PDF " + name.encode())
+    sessions = []
+
+    async def _send(session, collection_name, files_path_ls, custom_metadata, blocking=False, reingest=False):
+        sessions.append(session)
+        return {"task_id": files_path_ls[0].rsplit("/", 1)[-1]}
+
+    async def _status(task_id, session=None):
+        sessions.append(session)
+        return {"state": "FINISHED", "result": {"documents": [{"document_name": task_id}]}}
+
+    monkeypatch.setattr(collection_manager.client, "UPLOAD_BATCH_SIZE", 1)
+    monkeypatch.setattr(collection_manager.client, "_send_documents", _send)
+    monkeypatch.setattr(collection_manager.client, "fetch_ingestion_status", _status)
+
+    summary = await manager.prepare_and_upload("alice", [str(p) for p in pdfs])
+
+    assert sorted(summary["uploaded"]) == ["a.pdf", "b.pdf"]
+    assert len(sessions) == 4
+    assert all(s is manager._get_session() for s in sessions)
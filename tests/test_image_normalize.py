@@ -0,0 +1,80 @@
+"""
+Tests for the image normalisation stage shared by the VLM and display paths.
+"""
+import base64
+import io
+import random
+
+import pytest
+from PIL import Image
+
+import image_normalize
+from asset_store import AssetStore
+from errors import ImageProcessingError
+from image_normalize import detect_base64_format, detect_format, normalize_image
+
+
+def _image_bytes(width, height, fmt="PNG", mode="RGB"):
+    rng = random.Random(width * height)
+    image = Image.frombytes(mode, (width, height), bytes(rng.getrandbits(8) for _ in range(width * height * len(mode))))
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("fmt, expected", [("PNG", "png"), ("JPEG", "jpeg"), ("GIF", "gif"), ("WEBP", "webp"), ("BMP", "bmp")])
+def test_detect_format_from_signature(fmt, expected):
+    data = _image_bytes(4, 4, fmt)
+
+    assert detect_format(data) == expected
+    assert detect_base64_format(base64.b64encode(data).decode()) == expected
+
+
+def test_large_image_is_downscaled_and_reencoded():
+    data = _image_bytes(1600, 800)
+
+    image = normalize_image(data, max_side=400, fmt="webp", quality=70)
+
+    assert (image.format, image.mime, image.source_format) == ("webp", "image/webp", "png")
+    assert (image.width, image.height) == (400, 200)
+    assert len(image.data) < len(data)
+    assert Image.open(io.BytesIO(image.data)).size == (400, 200)
+    assert image.data_url().startswith("data:image/webp;base64,")
+
+
+def test_small_image_passes_through():
+    data = _image_bytes(16, 16)
+
+    image = normalize_image(data, max_side=400)
+
+    assert image.data == data and image.format == "png"
+
+
+def test_results_are_cached_by_hash_and_settings(monkeypatch):
+    calls = []
+    real = image_normalize._normalize
+    monkeypatch.setattr(image_normalize, "_normalize", lambda *args: calls.append(args[1:]) or real(*args))
+    data = _image_bytes(900, 900)
+
+    first = normalize_image(data, max_side=300)
+    second = normalize_image(bytes(data), max_side=300)
+    normalize_image(data, max_side=200)
+
+    assert first is second
+    assert len(calls) == 2
+
+
+def test_undecodable_bytes_raise():
+    with pytest.raises(ImageProcessingError):
+        normalize_image(b"\x89PNG\r\n\x1a\nnot really a png")
+
+
+def test_asset_store_keeps_the_normalised_image(tmp_path):
+    store = AssetStore(str(tmp_path))
+    data = _image_bytes(2000, 1000)
+
+    path = store.put_base64(base64.b64encode(data).decode(), "png")
+
+    assert path.suffix == ".webp"
+    assert max(Image.open(path).size) == image_normalize.IMAGE_MAX_SIDE
+    assert path.read_bytes() == normalize_image(data).data
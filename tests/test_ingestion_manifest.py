@@ -0,0 +1,146 @@
+"""
+Tests for hash-based incremental ingestion into NeMo Retriever collections.
+"""
+import json
+
+import pytest
+
+import nemo_retriever_client_utils as client
+from ingestion_manifest import IngestionManifest
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    paths = {}
+    for name, content in (("a.pdf", b"%PDF a"), ("b.pdf", b"%PDF b")):
+        paths[name] = pdf_dir / name
+        paths[name].write_bytes(content)
+    return paths
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return IngestionManifest.for_collection("alice", save_to=str(tmp_path))
+
+
+@pytest.fixture
+def ingestor(monkeypatch):
+    """Record upload requests and report every uploaded document as ingested."""
+    requests = []
+
+    async def _upload(session, collection_name, files_path_ls, custom_metadata, blocking=False, reingest=False):
+        requests.append(("PATCH" if reingest else "POST", sorted(p.rsplit("/", 1)[-1] for p in files_path_ls)))
+        return {"task_id": f"t{len(requests)}", "names": [p.rsplit("/", 1)[-1] for p in files_path_ls]}
+
+    async def _status(task_id, session=None):
+        names = requests[int(task_id[1:]) - 1][1]
+        return {"state": "FINISHED", "result": {"documents": [{"document_name": n} for n in names]}}
+
+    monkeypatch.setattr(client, "_send_documents", _upload)
+    monkeypatch.setattr(client, "fetch_ingestion_status", _status)
+    return requests
+
+
+def test_plan_splits_new_changed_and_unchanged(pdfs, manifest, tmp_path):
+    manifest.record([str(pdfs["a.pdf"])])
+    pdfs["b.pdf"].write_bytes(b"%PDF b")
+    copy_of_a = tmp_path / "pdfs" / "a_copy.pdf"
+    copy_of_a.write_bytes(b"%PDF a")
+
+    plan = manifest.plan([str(pdfs["a.pdf"]), str(pdfs["b.pdf"]), str(copy_of_a)])
+    assert plan.new == [str(pdfs["b.pdf"])]
+    assert plan.unchanged == [str(pdfs["a.pdf"]), str(copy_of_a)]
+
+    pdfs["a.pdf"].write_bytes(b"%PDF a, second edition")
+    assert manifest.plan([str(pdfs["a.pdf"])]).changed == [str(pdfs["a.pdf"])]
+
+
+def test_manifest_survives_restart(pdfs, manifest, tmp_path):
+    manifest.record([str(pdfs["a.pdf"])])
+
+    reopened = IngestionManifest.for_collection("alice", save_to=str(tmp_path))
+    on_disk = json.loads((tmp_path / "ingestion" / "alice.json").read_text())
+
+    assert on_disk["collection"] == "alice"
+    assert reopened.plan([str(pdfs["a.pdf"])]).unchanged == [str(pdfs["a.pdf"])]
+    reopened.clear()
+    assert manifest.documents() == {}
+
+
+@pytest.mark.asyncio
+async def test_upload_skips_identical_and_patches_changed_documents(pdfs, manifest, ingestor):
+    files = [str(pdfs["a.pdf"]), str(pdfs["b.pdf"])]
+
+    first = await client.upload_files_to_nemo_retriever(files, "alice", manifest=manifest)
+    second = await client.upload_files_to_nemo_retriever(files, "alice", manifest=manifest)
+    pdfs["b.pdf"].write_bytes(b"%PDF b, fixed typo")
+    third = await client.upload_files_to_nemo_retriever(files, "alice", manifest=manifest)
+
+    assert ingestor == [("POST", ["a.pdf", "b.pdf"]), ("PATCH", ["b.pdf"])]
+    assert first["uploaded"] == ["a.pdf", "b.pdf"]
+    assert second["skipped"] == ["a.pdf", "b.pdf"]
+    assert third == {"uploaded": [], "reingested": ["b.pdf"], "skipped": ["a.pdf"], "failed": []}
+
+
+@pytest.mark.asyncio
+async def test_failed_documents_are_not_recorded(pdfs, manifest, monkeypatch):
+    async def _upload(session, collection_name, files_path_ls, custom_metadata, blocking=False, reingest=False):
+        return {"task_id": "t1"}
+
+    async def _status(task_id, session=None):
+        return {"state": "FINISHED", "result": {
+            "documents": [{"document_name": "a.pdf"}],
+            "failed_documents": [{"document_name": "b.pdf", "error_message": "encrypted"}],
+        }}
+
+    monkeypatch.setattr(client, "_send_documents", _upload)
+    monkeypatch.setattr(client, "fetch_ingestion_status", _status)
+
+    summary = await client.upload_files_to_nemo_retriever(
+        [str(pdfs["a.pdf"]), str(pdfs["b.pdf"])], "alice", manifest=manifest)
+
+    assert summary["failed"] == ["b.pdf"]
+    assert set(manifest.documents()) == {"a.pdf"}
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_does_not_abort_the_upload(pdfs, manifest, monkeypatch):
+    monkeypatch.setattr(client, "UPLOAD_BATCH_SIZE", 1)
+
+    async def _upload(session, collection_name, files_path_ls, custom_metadata, blocking=False, reingest=False):
+        return {"task_id": files_path_ls[0].rsplit("/", 1)[-1]}
+
+    async def _status(task_id, session=None):
+        if task_id == "b.pdf":
+            return {"state": "FAILED", "message": "extraction crashed"}
+        return {"state": "FINISHED", "result": {"documents": [{"document_name": task_id}]}}
+
+    monkeypatch.setattr(client, "_send_documents", _upload)
+    monkeypatch.setattr(client, "fetch_ingestion_status", _status)
+    files = [str(pdfs["a.pdf"]), str(pdfs["b.pdf"])]
+
+    summary = await client.upload_files_to_nemo_retriever(files, "alice", manifest=manifest)
+
+    assert summary["uploaded"] == ["a.pdf"] and summary["failed"] == ["b.pdf"]
+    assert set(manifest.documents()) == {"a.pdf"}
+    assert manifest.plan(files).new == [str(pdfs["b.pdf"])]
+
+
+@pytest.mark.asyncio
+async def test_upload_raises_when_nothing_was_ingested(pdfs, manifest, monkeypatch):
+    async def _upload(session, collection_name, files_path_ls, custom_metadata, blocking=False, reingest=False):
+        return {"task_id": "t1"}
+
+    async def _status(task_id, session=None):
+        return {"state": "FAILED", "message": "ingestor out of memory"}
+
+    monkeypatch.setattr(client, "_send_documents", _upload)
+    monkeypatch.setattr(client, "fetch_ingestion_status", _status)
+
+    with pytest.raises(client.RAGIngestionError) as excinfo:
+        await client.upload_files_to_nemo_retriever([str(pdfs["a.pdf"]), str(pdfs["b.pdf"])], "alice", manifest=manifest)
+
+    assert sorted(excinfo.value.failed_documents) == ["a.pdf", "b.pdf"]
+    assert manifest.documents() == {}
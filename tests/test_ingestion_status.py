@@ -0,0 +1,81 @@
+"""
+Tests for ingestion status tracking against the NeMo Retriever ingestor.
+"""
+import pytest
+
+import nemo_retriever_client_utils as client
+from errors import RAGConnectionError, RAGIngestionError
+from nemo_retriever_client_utils import ingestion_progress, wait_for_ingestion
+
+FILES = ["/mnt/pdfs/alice/a.pdf", "/mnt/pdfs/alice/b.pdf"]
+
+
+def _fake_status(monkeypatch, statuses):
+    calls = []
+
+    async def _fetch(task_id, session=None):
+        calls.append(task_id)
+        status = statuses[min(len(calls), len(statuses)) - 1]
+        if isinstance(status, Exception):
+            raise status
+        return status
+
+    monkeypatch.setattr(client, "fetch_ingestion_status", _fetch)
+    return calls
+
+
+def test_ingestion_progress_reads_pending_and_final_payloads():
+    pending = {"state": "PENDING", "nv_ingest_status": {"extraction_completed": 1}}
+    finished = {"state": "FINISHED", "result": {
+        "documents": [{"document_name": "a.pdf"}],
+        "failed_documents": [{"document_name": "b.pdf", "error_message": "bad pdf"}],
+    }}
+
+    assert ingestion_progress(pending, ["a.pdf", "b.pdf"])[0] == 0.5
+    assert ingestion_progress(finished, ["a.pdf", "b.pdf"]) == (1.0, ["a.pdf"], ["b.pdf"])
+    assert ingestion_progress({}, [])[0] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_wait_returns_as_soon_as_ingestion_finishes(monkeypatch):
+    calls = _fake_status(monkeypatch, [
+        {"state": "PENDING"},
+        RAGConnectionError("busy"),
+        {"state": "PENDING", "nv_ingest_status": {"extraction_completed": 1}},
+        {"state": "FINISHED", "result": {"documents": [{"document_name": "a.pdf"}, {"document_name": "b.pdf"}]}},
+    ])
+    reports = []
+
+    status = await wait_for_ingestion("t1", FILES, on_progress=lambda f, m: reports.append(f), poll_interval=0)
+
+    assert status["state"] == "FINISHED"
+    assert calls == ["t1"] * 4
+    assert reports == [0.0, 0.0, 0.5, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_wait_raises_when_task_fails(monkeypatch):
+    _fake_status(monkeypatch, [{"state": "FAILED", "result": {"message": "nv-ingest down"}}])
+
+    with pytest.raises(RAGIngestionError, match="nv-ingest down") as exc_info:
+        await wait_for_ingestion("t1", FILES, poll_interval=0)
+    assert exc_info.value.task_id == "t1"
+
+
+@pytest.mark.asyncio
+async def test_wait_raises_when_every_document_failed(monkeypatch):
+    _fake_status(monkeypatch, [{"state": "FINISHED", "result": {
+        "documents": [], "failed_documents": [{"document_name": "a.pdf"}, {"document_name": "b.pdf"}],
+    }}])
+
+    with pytest.raises(RAGIngestionError) as exc_info:
+        await wait_for_ingestion("t1", FILES, poll_interval=0)
+    assert exc_info.value.failed_documents == ["a.pdf", "b.pdf"]
+
+
+@pytest.mark.asyncio
+async def test_wait_times_out(monkeypatch):
+    _fake_status(monkeypatch, [{"state": "PENDING"}])
+
+    with pytest.raises(RAGIngestionError, match="did not finish"):
+        await wait_for_ingestion("t1", FILES, timeout=0.05, poll_interval=0.01)
@@ -0,0 +1,121 @@
+"""
+Tests for the local intent classifier used to route study buddy chat messages.
+"""
+import zlib
+
+import numpy as np
+import pytest
+
+import intent_classifier
+import standalone_study_buddy_response as sbr
+from intent_classifier import (
+    EmbeddingIntentClassifier, IntentPrediction, KeywordIntentClassifier, LocalIntentClassifier, normalize_route,
+)
+
+
+def _bag_of_words(texts):
+    """Deterministic stand-in for a sentence embedding model."""
+    vectors = np.zeros((len(texts), 256))
+    for i, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[i, zlib.crc32(word.encode()) % 256] += 1
+    return vectors
+
+
+@pytest.mark.parametrize("query, intent", [
+    ("any youtube videos on this?", "supplement"),
+    ("schedule a review tomorrow at 3pm", "book_calendar"),
+    ("create an event for the exam on June 3rd", "book_calendar"),
+    ("explain the mitochondria again", "study_material"),
+    ("how are you", None),
+])
+def test_keyword_rules(query, intent):
+    prediction = KeywordIntentClassifier().predict(query, chapter_name="Cell Biology", sub_topic="Mitochondria")
+
+    assert prediction.intent == intent
+
+
+@pytest.mark.parametrize("query", [
+    "Can you remind me what ATP stands for?",
+    "what is a reinforcement schedule in operant conditioning?",
+    "how are URLs resolved by DNS?",
+    "explain the video codec chapter",
+    "which enzymes are active in the morning after fasting?",
+    "is there a link between diet and diabetes?",
+    "give me some examples of URLs",
+    "can you show me how to add fractions by tomorrow",
+])
+def test_study_questions_with_tool_words_are_not_routed_to_tools(query):
+    prediction = LocalIntentClassifier(embedding=None).predict(query, chapter_name="Cell Biology", sub_topic="Mitochondria")
+
+    assert prediction.intent is None
+
+
+def test_naming_the_chapter_without_a_study_cue_only_hints():
+    keyword = KeywordIntentClassifier()
+
+    joke = keyword.predict("tell me a joke about Sweden", chapter_name="Sweden Facts")
+    question = keyword.predict("why is Sweden so cold?", chapter_name="Sweden Facts")
+
+    assert joke.intent == "study_material" and joke.confidence < 0.6
+    assert question.intent == "study_material" and question.confidence >= 0.6
+    assert LocalIntentClassifier(embedding=None).predict("tell me a joke about Sweden", chapter_name="Sweden Facts").intent is None
+
+
+def test_scheduling_verb_without_a_time_only_hints():
+    prediction = KeywordIntentClassifier().predict("add this to my calendar")
+
+    assert prediction.intent == "book_calendar" and prediction.confidence < 0.6
+
+
+def test_embedding_classifier_picks_nearest_centroid():
+    classifier = EmbeddingIntentClassifier(_bag_of_words)
+
+    prediction = classifier.predict("how are you doing today")
+
+    assert prediction.intent == "chitchat"
+    assert 0 < prediction.confidence <= 1
+
+
+def test_local_classifier_abstains_below_threshold():
+    # "link" only hints at a supplement request, and the embedding stage is unsure
+    class _Unsure(EmbeddingIntentClassifier):
+        def predict(self, query, chapter_name=None, sub_topic=None):
+            return IntentPrediction("study_material", 0.3, "embedding")
+
+    local = LocalIntentClassifier(embedding=_Unsure(_bag_of_words), threshold=0.6)
+
+    assert local.predict("how do these two steps link together").intent is None
+    assert local.predict("find a tutorial").intent == "supplement"
+
+
+@pytest.mark.parametrize("text, route", [
+    ("Supplement", "supplement"),
+    ("Classification: book_calendar.", "book_calendar"),
+    ("calendar", "book_calendar"),
+    ("unsuccessful llm call", "study_material"),
+])
+def test_normalize_route(text, route):
+    assert normalize_route(text) == route
+
+
+def test_query_routing_uses_llm_only_when_local_classifier_abstains(monkeypatch):
+    prompts = []
+
+    class _Response:
+        def json(self):
+            return {"choices": [{"message": {"content": " chitchat\n"}}]}
+
+    def _inference_call(system_prompt, user_prompt, astra_api_key=None):
+        prompts.append(user_prompt)
+        return _Response()
+
+    monkeypatch.setattr(sbr, "inference_call", _inference_call)
+    monkeypatch.setattr(intent_classifier, "_classifier", LocalIntentClassifier(embedding=None))
+    monkeypatch.setattr(intent_classifier, "_classifier_ready", True)
+
+    assert sbr.query_routing("show me a video on ATP", "") == "supplement"
+    assert prompts == []
+    assert sbr.query_routing("what's up", "") == "chitchat"
+    assert len(prompts) == 1
+    assert sbr.query_routing("show me a video on ATP", "", local=False) == "chitchat"
@@ -0,0 +1,166 @@
+"""
+Tests for the SQLite-backed job queue and checkpointed chapter builds.
+"""
+import asyncio
+import time
+
+import pytest
+
+import job_queue
+import nodes
+from job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, register_job_handler
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = JobQueue(str(tmp_path / "jobs.sqlite3"), workers=2)
+    yield q
+    q.shutdown()
+
+
+def _register(kind, handler):
+    register_job_handler(kind, handler)
+    return kind
+
+
+def test_job_reports_progress_and_result(queue):
+    async def _steps(job):
+        for i in range(3):
+            job.checkpoint.setdefault("done", []).append(i)
+            await job.report((i + 1) / 3, f"step {i}")
+        return {"steps": len(job.checkpoint["done"])}
+
+    kind = _register("test_steps", _steps)
+    seen = []
+    job = queue.wait(queue.submit(kind, "u1", {"n": 3}), timeout=10, poll_interval=0.01,
+                     on_progress=lambda j: seen.append(j["status"]))
+
+    assert job["status"] == SUCCEEDED
+    assert job["progress"] == 1.0
+    assert job["result"] == {"steps": 3}
+    assert job["checkpoint"] == {"done": [0, 1, 2]}
+    assert seen[-1] == SUCCEEDED
+    assert queue.latest("u1", kind)["id"] == job["id"]
+
+
+def test_unfinished_job_is_not_submitted_twice(queue):
+    release = asyncio.Event()
+    runs = []
+
+    async def _blocking(job):
+        runs.append(job.id)
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return None
+
+    kind = _register("test_blocking", _blocking)
+    first = queue.submit(kind, "u1", {"x": 1})
+    second = queue.submit(kind, "u1", {"x": 1})
+    other_user = queue.submit(kind, "u2", {"x": 1})
+
+    assert first == second != other_user
+    queue._loop.call_soon_threadsafe(release.set)
+    assert queue.wait(first, timeout=10, poll_interval=0.01)["status"] == SUCCEEDED
+    assert queue.wait(other_user, timeout=10, poll_interval=0.01)["status"] == SUCCEEDED
+    assert sorted(runs) == sorted([first, other_user])
+
+
+def test_failed_job_resumes_from_checkpoint(queue):
+    attempts = []
+
+    async def _flaky(job):
+        attempts.append(dict(job.checkpoint))
+        job.checkpoint["first_half"] = True
+        await job.report(0.5, "half way")
+        if len(attempts) == 1:
+            raise RuntimeError("LLM endpoint down")
+        return "ok"
+
+    kind = _register("test_flaky", _flaky)
+    job_id = queue.submit(kind, "u1")
+    failed = queue.wait(job_id, timeout=10, poll_interval=0.01)
+    assert failed["status"] == FAILED
+    assert "LLM endpoint down" in failed["error"]
+
+    assert queue.submit(kind, "u1") == job_id
+    done = queue.wait(job_id, timeout=10, poll_interval=0.01)
+    assert done["status"] == SUCCEEDED
+    assert attempts == [{}, {"first_half": True}]
+
+
+def test_interrupted_jobs_resume_after_restart(tmp_path):
+    db = str(tmp_path / "jobs.sqlite3")
+    resumed = []
+
+    async def _resumable(job):
+        resumed.append(job.checkpoint)
+        return None
+
+    kind = _register("test_resumable", _resumable)
+    # Simulate a process that died while the job was running
+    crashed = JobQueue(db)
+    crashed._execute(
+        "INSERT INTO jobs (id, kind, user_id, params, status, checkpoint, attempts, created_at, updated_at) "
+        "VALUES ('j1', ?, 'u1', '{}', ?, '{\"outline\": [1, 2]}', 1, ?, ?)",
+        (kind, RUNNING, time.time(), time.time()),
+    )
+
+    restarted = JobQueue(db).start()
+    try:
+        job = restarted.wait("j1", timeout=10, poll_interval=0.01)
+    finally:
+        restarted.shutdown()
+
+    assert job["status"] == SUCCEEDED
+    assert job["attempts"] == 2
+    assert resumed == [{"outline": [1, 2]}]
+
+
+def test_job_that_keeps_crashing_is_given_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 2)
+    kind = _register("test_crashing", lambda job: None)
+    q = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    q._execute(
+        "INSERT INTO jobs (id, kind, user_id, params, status, attempts, created_at, updated_at) "
+        "VALUES ('j1', ?, 'u1', '{}', ?, 2, ?, ?)",
+        (kind, QUEUED, time.time(), time.time()),
+    )
+    q.start()
+    try:
+        job = q.wait("j1", timeout=10, poll_interval=0.01)
+    finally:
+        q.shutdown()
+
+    assert job["status"] == FAILED
+
+
+@pytest.mark.asyncio
+async def test_sub_topic_builder_resumes_from_checkpoint(monkeypatch):
+    outline = ["1: Intro", "2: Empty", "3: Rules"]
+    monkeypatch.setattr(nodes, "parallel_extract_pdf_page_and_text", lambda pdf_loc: outline)
+    monkeypatch.setattr(nodes, "post_process_extract_sub_chapters", lambda sub_topics: sub_topics)
+    generated = []
+
+    async def _gen(username, subject, sub_topic, pdf_f_name, num_docs):
+        generated.append(sub_topic.strip())
+        if sub_topic.strip() == "Rules" and len(generated) == 3:
+            raise RuntimeError("interrupted")
+        if sub_topic.strip() == "Empty":
+            return "", ""
+        return f"material for {sub_topic}", f"#### {sub_topic}"
+
+    monkeypatch.setattr(nodes, "study_material_gen", _gen)
+    checkpoint, reports = {}, []
+
+    async def _report(progress, message):
+        reports.append(progress)
+
+    with pytest.raises(RuntimeError):
+        await nodes.sub_topic_builder("u1", "/tmp/a.pdf", "a", "a.pdf", checkpoint, _report)
+    assert set(checkpoint["sub_topics"]) == {"0", "1"}
+
+    sub_topics = await nodes.sub_topic_builder("u1", "/tmp/a.pdf", "a", "a.pdf", checkpoint, _report)
+
+    assert generated == ["Intro", "Empty", "Rules", "Rules"]
+    assert [(st.number, st.sub_topic) for st in sub_topics] == [(0, "1: Intro"), (1, "3: Rules")]
+    assert reports[-1] == 1.0
@@ -0,0 +1,77 @@
+"""
+Tests for the per-key ordered thread pool used for chat memory processing.
+"""
+import threading
+import time
+
+from keyed_executor import KeyedExecutor
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_tasks_of_one_key_run_in_order_and_keys_run_in_parallel():
+    executor = KeyedExecutor(max_workers=2, max_pending=10)
+    gate = threading.Event()
+    runs, active = [], set()
+
+    def _task(key, i):
+        active.add(key)
+        gate.wait(5)
+        runs.append((key, i))
+
+    try:
+        for i in range(3):
+            executor.submit("alice", _task, "alice", i)
+        executor.submit("bob", _task, "bob", 0)
+        # Bob does not wait behind alice's backlog
+        assert _wait_until(lambda: active == {"alice", "bob"})
+        gate.set()
+        assert _wait_until(lambda: len(runs) == 4)
+    finally:
+        executor.shutdown()
+
+    assert [i for key, i in runs if key == "alice"] == [0, 1, 2]
+
+
+def test_oldest_waiting_task_is_dropped_beyond_max_pending():
+    executor = KeyedExecutor(max_workers=1, max_pending=2)
+    gate = threading.Event()
+    runs = []
+
+    def _task(i):
+        if i == 0:
+            gate.wait(5)
+        runs.append(i)
+
+    try:
+        executor.submit("alice", _task, 0)
+        assert _wait_until(lambda: executor.pending("alice") == 0)
+        for i in range(1, 5):
+            executor.submit("alice", _task, i)
+        assert executor.pending("alice") == 2 and executor.dropped == 2
+        gate.set()
+        assert _wait_until(lambda: len(runs) == 3)
+    finally:
+        executor.shutdown()
+
+    assert runs == [0, 3, 4]
+
+
+def test_failing_task_does_not_stop_the_key():
+    executor = KeyedExecutor(max_workers=1)
+    runs = []
+
+    def _fail():
+        raise RuntimeError("rate limited")
+
+    try:
+        executor.submit("alice", _fail)
+        executor.submit("alice", runs.append, "after")
+        assert _wait_until(lambda: runs == ["after"])
+    finally:
+        executor.shutdown()
@@ -0,0 +1,91 @@
+"""
+Tests for the precomputed text, image manifest and paragraph spans of study material.
+"""
+import base64
+
+import pytest
+
+import material_index
+import standalone_study_buddy_response as sbr
+from asset_store import AssetStore
+from material_index import build_material_index, get_material_index
+from states import Status, SubTopic
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\nfake-image-payload"
+PNG_B64 = base64.b64encode(PNG_BYTES).decode()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = AssetStore(str(tmp_path), url_prefix="/file=")
+    monkeypatch.setattr(material_index, "get_asset_store", lambda: store)
+    return store
+
+
+def test_index_of_externalized_markdown(store):
+    display = store.externalize_markdown(
+        "Intro paragraph.<br>Second line.\n\n"
+        f"<p align='center'><img src='data:image/png;base64,{PNG_B64}'/></p>\n\n"
+        f"Outro with a figure ![cell](data:image/png;base64,{PNG_B64})"
+    )
+
+    index = build_material_index(display)
+
+    assert index["text"] == "Intro paragraph.\nSecond line.\n\n[image]\n\nOutro with a figure [image: cell]"
+    assert [index["text"][s:e] for s, e in index["paragraphs"]] == [
+        "Intro paragraph.\nSecond line.", "[image]", "Outro with a figure [image: cell]",
+    ]
+    assert len(index["images"]) == 2
+    first, second = index["images"]
+    assert first["sha256"] == second["sha256"] and first["bytes"] == len(PNG_BYTES)
+    assert index["text"][first["offset"]:].startswith("[image]")
+    assert index["text"][second["offset"]:].startswith("[image: cell]")
+
+
+def test_inline_base64_is_stored_as_asset(store, tmp_path):
+    index = build_material_index(f"Text ![x](data:image/png;base64,{PNG_B64})")
+
+    assert index["text"] == "Text [image: x]"
+    assert len(list(tmp_path.rglob("*.png"))) == 1
+    assert material_index.load_index_images(index) == [PNG_B64]
+
+
+def test_stored_index_is_used_and_legacy_subtopics_are_indexed_once(store, monkeypatch):
+    stored = build_material_index("Stored text.")
+    sub_topic = SubTopic(number=0, sub_topic="T", status=Status.NA, study_material="raw", display_markdown="Display text.",
+                         material_index=stored, reference="a.pdf", quizzes=[], feedback=[])
+    assert get_material_index(sub_topic) == stored
+
+    calls = []
+    real_build = material_index.build_material_index
+    monkeypatch.setattr(material_index, "build_material_index", lambda md: calls.append(md) or real_build(md))
+    legacy = {"display_markdown": "Legacy display text.", "study_material": "raw"}
+
+    assert get_material_index(legacy)["text"] == "Legacy display text."
+    assert get_material_index(legacy)["text"] == "Legacy display text."
+    assert calls == ["Legacy display text."]
+
+
+def test_chat_turn_reads_manifest_instead_of_scanning(store, monkeypatch):
+    display = store.externalize_markdown(f"Mitochondria make ATP.\n\n![cell](data:image/png;base64,{PNG_B64})")
+    index = build_material_index(display)
+    seen = {}
+
+    def _no_scan(_):
+        raise AssertionError("markdown was re-scanned")
+
+    def _vlm(query, images, sys_prompt):
+        seen["images"], seen["query"] = images, query
+        return "They make ATP."
+
+    monkeypatch.setattr(sbr, "detect_images_in_markdown", _no_scan)
+    monkeypatch.setattr(sbr, "extract_text_from_markdown", _no_scan)
+    monkeypatch.setattr(sbr, "query_qwen_vllm_served_images", _vlm)
+    monkeypatch.setattr(material_index, "get_asset_store", lambda: store)
+
+    answer = sbr.study_buddy_response("Cell Biology", "Mitochondria", index["text"], [], "what do they make?",
+                                      "Ollie", "patient", material_index=index)
+
+    assert answer == "They make ATP."
+    assert seen["images"] == [PNG_B64]
+    assert "Mitochondria make ATP." in seen["query"]
@@ -0,0 +1,97 @@
+"""
+Tests for fitting study buddy prompt sections to their token budgets.
+"""
+import json
+
+import standalone_study_buddy_response as sbr
+from prompt_budget import PromptBudget, estimate_tokens, select_paragraphs, strip_base64_images, truncate_tokens
+
+IMAGE = "data:image/png;base64," + "iVBORw0KGgo" * 200
+
+
+def test_strip_base64_images_keeps_alt_text():
+    text = f"Before ![ATP synthase]({IMAGE}) middle <img src='{IMAGE}' width='10'/> after {IMAGE}"
+
+    stripped = strip_base64_images(text)
+
+    assert stripped == "Before [image: ATP synthase] middle [image] after [image]"
+    assert strip_base64_images("no images here") == "no images here"
+
+
+def test_select_paragraphs_keeps_relevant_ones_in_order():
+    filler = [f"Paragraph {i} about unrelated things like weather and sports. " * 3 for i in range(20)]
+    filler[4] = "The Krebs cycle runs in the mitochondrial matrix and produces NADH."
+    filler[15] = "Oxidative phosphorylation uses the proton gradient made by the Krebs cycle."
+    text = "\n\n".join(filler)
+
+    selected = select_paragraphs(text, "where does the krebs cycle happen?", max_tokens=120)
+
+    assert estimate_tokens(selected) <= 120
+    paragraphs = selected.split("\n\n")
+    assert filler[4] in paragraphs and filler[15] in paragraphs
+    assert paragraphs.index(filler[4]) < paragraphs.index(filler[15])
+    assert select_paragraphs("short", "anything", max_tokens=120) == "short"
+
+
+def test_select_paragraphs_truncates_single_oversized_paragraph():
+    text = "word " * 1000
+
+    selected = select_paragraphs(text, "word", max_tokens=50)
+
+    assert 0 < estimate_tokens(selected) <= 50
+
+
+def test_fit_quizzes_prefers_relevant_questions():
+    quizzes = [{"question": f"Filler question {i} on an unrelated topic?", "answer": "A",
+                "choices": ["(A) one", "(B) two"]} for i in range(20)]
+    quizzes[7]["question"] = "Which molecule is the final electron acceptor?"
+    budget = PromptBudget(quizzes=60)
+
+    kept = budget.fit_quizzes(quizzes, "why is oxygen the final electron acceptor")
+
+    assert quizzes[7] in kept
+    assert estimate_tokens(json.dumps(kept, ensure_ascii=False, indent=2)) <= 60 + len(kept)
+    assert budget.fit_quizzes(quizzes[:1], "anything") == quizzes[:1]
+
+
+def test_fit_history_keeps_latest_lines():
+    history = "".join(f"user: message number {i}\n" for i in range(100))
+
+    fitted = PromptBudget(chat_history=30).fit_history(history)
+
+    assert fitted.endswith("user: message number 99\n")
+    assert "message number 0\n" not in fitted
+    assert estimate_tokens(fitted) <= 30
+
+
+def test_fit_memory_shares_budget():
+    memory, summary = PromptBudget(memory=100).fit_memory("fact " * 200, "summary " * 200)
+
+    assert estimate_tokens(summary) <= 50
+    assert estimate_tokens(memory) + estimate_tokens(summary) <= 100
+    assert truncate_tokens("fits", 10) == "fits"
+
+
+def test_text_prompt_is_trimmed_to_budget(monkeypatch):
+    monkeypatch.setattr(sbr, "get_prompt_budget", lambda: PromptBudget(study_material=200, quizzes=100))
+    material = "\n\n".join([f"![diagram]({IMAGE})"] + [f"Unrelated paragraph {i}. " * 10 for i in range(50)]
+                           + ["Mitochondria produce ATP through cellular respiration."])
+
+    prompt = sbr._study_buddy_text_prompt("Cell Biology", "Mitochondria", material, [], "how do mitochondria produce ATP?",
+                                          "Ollie", "patient")
+
+    assert "base64" not in prompt
+    assert "Mitochondria produce ATP through cellular respiration." in prompt
+    assert "Unrelated paragraph 49." not in prompt
+
+
+def test_context_is_not_trimmed_with_the_material(monkeypatch):
+    monkeypatch.setattr(sbr, "get_prompt_budget", lambda: PromptBudget(study_material=200, quizzes=100))
+    material = "\n\n".join(f"Paragraph {i} about the Krebs cycle. " * 10 for i in range(60))
+    context = "The learner prefers analogies with cooking."
+
+    prompt = sbr._study_buddy_text_prompt("Cell Biology", "Krebs cycle", material, [], "explain the krebs cycle",
+                                          "Ollie", "patient", context=context)
+
+    assert "Paragraph 59 about" not in prompt
+    assert prompt.count(context) == 1
@@ -0,0 +1,148 @@
+"""
+Tests for the background quiz bank builder.
+"""
+import asyncio
+
+import pytest
+
+import nodes
+import quiz_bank
+from job_queue import JobQueue
+from nodes import add_quiz_to_subtopic, init_user_storage, load_user_state, save_user_state
+from states import Chapter, StudyPlan, SubTopic, Status
+from user_store import resolve_user_store
+
+
+def _chapter(number):
+    return Chapter(
+        number=number,
+        name=f"Chapter {number}",
+        status=Status.STARTED if number == 1 else Status.NA,
+        sub_topics=[
+            SubTopic(number=i, sub_topic=f"Topic {number}.{i}", status=Status.NA,
+                     study_material=f"material {number}.{i}" if i < 3 else "", display_markdown="md",
+                     reference="doc.pdf", quizzes=[{"question": "already banked"}] if i == 1 else None, feedback=None)
+            for i in range(4)
+        ],
+        reference="doc.pdf",
+        pdf_loc="/tmp/doc.pdf",
+        quizzes=None,
+        feedback=None,
+    )
+
+
+@pytest.fixture
+def store(temp_mnt_dir):
+    plan = [_chapter(1), _chapter(2)]
+    init_user_storage(str(temp_mnt_dir), "quizzer")
+    save_user_state("quizzer", {
+        "user_id": "quizzer",
+        "study_buddy_preference": "patient",
+        "study_buddy_persona": None,
+        "study_buddy_name": "Buddy",
+        "curriculum": [{
+            "active_chapter": plan[0].model_copy(deep=True),
+            "next_chapter": plan[1].model_copy(deep=True),
+            "study_plan": StudyPlan(study_plan=plan),
+            "status": [Status.STARTED],
+        }],
+    })
+    yield resolve_user_store("quizzer")
+    nodes._user_state_cache.clear()
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    calls, in_flight, peak = [], [0], [0]
+
+    async def _generate(title, sub_topic, study_material, semaphore=None):
+        async with semaphore:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            calls.append(sub_topic)
+            await asyncio.sleep(0.02)
+            in_flight[0] -= 1
+        return [{"question": f"Q about {sub_topic}", "answer": "A"}]
+
+    monkeypatch.setattr(quiz_bank, "generate_quizzes_async", _generate)
+    return calls, peak
+
+
+def _quizzes(user_id="quizzer"):
+    nodes._user_state_cache.clear()
+    return [st.quizzes for st in load_user_state(user_id)["curriculum"][0]["active_chapter"].sub_topics]
+
+
+@pytest.mark.asyncio
+async def test_builds_missing_quizzes_concurrently(store, generated):
+    calls, peak = generated
+
+    summary = await quiz_bank.build_quiz_bank("quizzer", str(store.save_to), 1, concurrency=2)
+
+    assert summary == {"chapter": 1, "sub_topics": 2, "questions": 2}
+    assert sorted(calls) == ["Topic 1.0", "Topic 1.2"]
+    assert peak[0] == 2
+    assert _quizzes() == [
+        [{"question": "Q about Topic 1.0", "answer": "A"}],
+        [{"question": "already banked"}],
+        [{"question": "Q about Topic 1.2", "answer": "A"}],
+        None,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_chapter_that_is_no_longer_active_is_skipped(store, generated):
+    calls, _ = generated
+
+    summary = await quiz_bank.build_quiz_bank("quizzer", str(store.save_to), 2)
+
+    assert summary["sub_topics"] == 0 and calls == []
+
+
+@pytest.mark.asyncio
+async def test_add_quiz_list_only_while_chapter_is_active(store):
+    quizzes = [{"question": "q1"}, {"question": "q2"}]
+
+    await add_quiz_to_subtopic("quizzer", str(store.save_to), 0, quizzes, chapter_number=1)
+    await add_quiz_to_subtopic("quizzer", str(store.save_to), 0, [{"question": "late"}], chapter_number=2)
+    await add_quiz_to_subtopic("quizzer", str(store.save_to), 1, quizzes)
+
+    banked = _quizzes()
+    assert banked[0] == quizzes
+    assert banked[1] == [{"question": "already banked"}] + quizzes
+
+
+def test_get_banked_quizzes_waits_for_running_build(store, monkeypatch, tmp_path, generated):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3")).start()
+    monkeypatch.setattr(quiz_bank, "get_job_queue", lambda: queue)
+    try:
+        assert quiz_bank.get_banked_quizzes("quizzer", 0, poll_interval=0.01) == []
+
+        queue.submit("quiz_bank", "quizzer", {"save_to": str(store.save_to), "chapter": 1})
+        quizzes = quiz_bank.get_banked_quizzes("quizzer", 2, timeout=10, poll_interval=0.01)
+    finally:
+        queue.shutdown()
+
+    assert quizzes == [{"question": "Q about Topic 1.2", "answer": "A"}]
+
+
+def test_get_banked_quizzes_polls_the_job_row_and_gives_up_after_timeout(store, monkeypatch):
+    polls, state_reads = [], []
+    job = {"id": "j1", "status": "running", "progress": 0.0, "message": ""}
+
+    class _Queue:
+        def latest(self, user_id, kind):
+            return dict(job)
+
+        def get(self, job_id):
+            polls.append(job_id)
+            return dict(job)
+
+    real_load = quiz_bank.load_user_state
+    monkeypatch.setattr(quiz_bank, "load_user_state", lambda user_id: state_reads.append(user_id) or real_load(user_id))
+    monkeypatch.setattr(quiz_bank, "get_job_queue", lambda: _Queue())
+
+    assert quiz_bank.get_banked_quizzes("quizzer", 0, timeout=0.1, poll_interval=0.01) == []
+    assert len(polls) > 1
+    # The build made no progress, so the state was only read once up front
+    assert state_reads == ["quizzer"]
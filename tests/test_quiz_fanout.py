@@ -0,0 +1,114 @@
+"""
+Tests for chunk-level quiz generation and near-duplicate removal.
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+import quiz_fanout
+from quiz_fanout import dedupe_quizzes, estimate_tokens, generate_quizzes_async, split_material
+
+
+def _q(text):
+    return {"question": text, "answer": "A", "choices": ["(A) yes", "(B) no"]}
+
+
+def test_split_material_respects_budget_and_keeps_text():
+    paragraphs = [f"Paragraph {i} " + "word " * 30 for i in range(10)]
+    text = "\n\n".join(paragraphs)
+
+    chunks = split_material(text, max_tokens=100)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c) <= 100 for c in chunks)
+    assert " ".join(" ".join(chunks).split()) == " ".join(text.split())
+
+
+def test_split_material_breaks_oversized_paragraph_on_sentences():
+    paragraph = " ".join(f"Sentence number {i} is here." for i in range(40))
+
+    chunks = split_material(paragraph, max_tokens=50)
+
+    assert all(estimate_tokens(c) <= 50 for c in chunks)
+    assert all(c.endswith(".") for c in chunks)
+    assert split_material("", max_tokens=50) == []
+
+
+def test_dedupe_by_embedding_similarity():
+    vectors = {"a": [1.0, 0.0], "a2": [0.99, 0.05], "b": [0.0, 1.0]}
+    quizzes = [_q("a"), _q("b"), _q("a2")]
+
+    kept = dedupe_quizzes(quizzes, threshold=0.95, embed=lambda texts: [vectors[t] for t in texts])
+
+    assert [q["question"] for q in kept] == ["a", "b"]
+
+
+def test_dedupe_falls_back_to_word_overlap(monkeypatch):
+    monkeypatch.setattr(quiz_fanout, "_default_embed", lambda: None)
+    quizzes = [_q("What is the role of the GPU scheduler?"),
+               _q("What is the role of the GPU scheduler ?"),
+               _q("Which memory tier is fastest?")]
+
+    kept = dedupe_quizzes(quizzes, threshold=0.9)
+
+    assert [q["question"] for q in kept] == [quizzes[0]["question"], quizzes[2]["question"]]
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_quizzed_concurrently_and_merged(monkeypatch):
+    monkeypatch.setattr(quiz_fanout, "_default_embed", lambda: None)
+    in_flight, peak, seen = [0], [0], []
+
+    def _get_quiz(title, summary, chunk, additional_instruction):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        in_flight[0] -= 1
+        seen.append(chunk)
+        if chunk.startswith("Part 2"):
+            raise RuntimeError("endpoint down")
+        first = chunk.split()[1]
+        return "<output_json>" + json.dumps([_q(f"Question about part {first}"), _q("Shared question?")]) + "</output_json>"
+
+    monkeypatch.setattr(quiz_fanout, "get_quiz", _get_quiz)
+    material = "\n\n".join(f"Part {i} " + "text " * 40 for i in range(4))
+
+    quizzes = await generate_quizzes_async("Title", "Topic", material, max_tokens=60,
+                                           semaphore=asyncio.Semaphore(2))
+
+    assert len(seen) == 4
+    assert peak[0] == 2
+    assert [q["question"] for q in quizzes] == [
+        "Question about part 0", "Shared question?", "Question about part 1", "Question about part 3",
+    ]
+
+
+def test_cap_quizzes_takes_questions_round_robin_across_chunks():
+    per_chunk = [[_q(f"c{c} q{i}") for i in range(n)] for c, n in enumerate([5, 1, 3])]
+
+    kept = quiz_fanout.cap_quizzes(per_chunk, max_questions=6)
+
+    assert [q["question"] for q in kept] == ["c0 q0", "c0 q1", "c0 q2", "c1 q0", "c2 q0", "c2 q1"]
+    assert len(quiz_fanout.cap_quizzes(per_chunk, max_questions=20)) == 9
+
+
+@pytest.mark.asyncio
+async def test_generated_quizzes_are_capped(monkeypatch):
+    monkeypatch.setattr(quiz_fanout, "_default_embed", lambda: None)
+    monkeypatch.setattr(quiz_fanout, "QUIZ_MAX_QUESTIONS", 10)
+
+    def _get_quiz(title, summary, chunk, additional_instruction):
+        part = chunk.split()[1]
+        topics = ["mitosis", "osmosis", "enzymes", "photosynthesis", "respiration"]
+        return "<output_json>" + json.dumps([_q(f"Part {part}: explain {t}") for t in topics]) + "</output_json>"
+
+    monkeypatch.setattr(quiz_fanout, "get_quiz", _get_quiz)
+    material = "\n\n".join(f"Part {i} " + "text " * 40 for i in range(4))
+
+    quizzes = await generate_quizzes_async("Title", "Topic", material, max_tokens=60)
+
+    assert len(quizzes) == 10
+    # Every chunk is represented before any chunk gets a third question
+    assert {q["question"].split(":")[0] for q in quizzes} == {f"Part {i}" for i in range(4)}
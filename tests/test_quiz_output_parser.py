@@ -0,0 +1,98 @@
+"""
+Tests for tolerant quiz output parsing and the incremental JSON array parser.
+"""
+import json
+
+import pytest
+
+from json_stream_parser import JSONArrayStreamParser, salvage_json_array
+from standalone_quizes_gen import _structured_output_params, quiz_json_schema, quiz_output_parser
+
+
+def _question(i, answer="B"):
+    return {
+        "thought_process": f"Why question {i} [matters] {{really}}",
+        "question_type": "conceptual",
+        "question": f"Question {i} with a \"quote\"?",
+        "choices": ["(A) one", "(B) two", "(C) three", "(D) four"],
+        "answer": answer,
+        "estimated_difficulty": 6,
+        "citations": [f"citation {i}"],
+    }
+
+
+def _tagged(questions, tail="\n]\n</output_json>"):
+    body = ",\n".join(json.dumps(q, indent=2) for q in questions)
+    return "<document_analysis>\n- Key concept: [lists] here\n</document_analysis>\n\n<output_json>\n```json\n[\n" + body + tail
+
+
+def test_complete_output_is_parsed():
+    quizzes = quiz_output_parser(_tagged([_question(1), _question(2)]) + "\n*Note: two questions*")
+
+    assert [q["question"] for q in quizzes] == ['Question 1 with a "quote"?', 'Question 2 with a "quote"?']
+    assert quizzes[0]["thought_process"] == "Why question 1 [matters] {really}"
+
+
+def test_truncated_array_keeps_complete_questions():
+    text = _tagged([_question(1), _question(2), _question(3)], tail="")
+    cut = text[:text.rindex('"citations"')]
+
+    quizzes = quiz_output_parser(cut)
+
+    assert [q["question"] for q in quizzes] == ['Question 1 with a "quote"?', 'Question 2 with a "quote"?']
+
+
+def test_invalid_and_malformed_items_are_dropped():
+    bad_answer = _question(2, answer="maybe")
+    text = _tagged([_question(1, answer="(C) three"), bad_answer])
+    text = text.replace('"estimated_difficulty": 6,\n  "citations": [\n    "citation 1"\n  ]',
+                        '"estimated_difficulty": 6,\n  "citations": ["citation 1"],')
+    assert '"citations": ["citation 1"],' in text  # trailing comma before the closing brace
+
+    quizzes = quiz_output_parser(text)
+
+    assert [(q["question"], q["answer"]) for q in quizzes] == [('Question 1 with a "quote"?', "C")]
+
+
+def test_json_schema_response_without_tags():
+    quizzes = quiz_output_parser(json.dumps({"questions": [_question(1)]}))
+
+    assert len(quizzes) == 1
+    assert quizzes[0]["choices"][1] == "(B) two"
+
+
+def test_no_questions():
+    assert quiz_output_parser("") == []
+    assert quiz_output_parser("<output_json>\n</output_json>") == []
+    assert quiz_output_parser("an error happened during inference call") == []
+
+
+def test_stream_parser_yields_items_as_chunks_arrive():
+    text = _tagged([_question(1), _question(2)])
+    parser = JSONArrayStreamParser(start_marker="<output_json>")
+    completed_at = []
+
+    for i in range(0, len(text), 7):
+        for item in parser.feed(text[i:i + 7]):
+            completed_at.append((item["question"], i))
+
+    assert [q for q, _ in completed_at] == ['Question 1 with a "quote"?', 'Question 2 with a "quote"?']
+    assert completed_at[0][1] < completed_at[1][1]
+    assert not parser.truncated
+    # Consumed text is released while streaming
+    assert len(parser._buffer) < len(text)
+
+
+def test_salvage_json_array_without_marker():
+    assert salvage_json_array('noise [ {"a": 1}, {"b": [2, 3],}, {"c"') == [{"a": 1}, {"b": [2, 3]}]
+
+
+@pytest.mark.parametrize("mode, key", [("json_schema", "response_format"), ("guided_json", "nvext"), ("off", None)])
+def test_structured_output_params(mode, key):
+    params = _structured_output_params(mode)
+
+    if key is None:
+        assert params == {}
+    else:
+        assert key in params
+    assert quiz_json_schema()["properties"]["questions"]["items"]["required"] == ["question", "answer", "choices"]
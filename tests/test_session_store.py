@@ -0,0 +1,75 @@
+"""
+Tests for the TTL session store behind per-session UI state.
+"""
+import threading
+
+from session_store import SessionStore
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sessions_are_isolated():
+    store = SessionStore(ttl=60)
+    alice = store.create({"current": 0})
+    bob = store.create({"current": 0})
+
+    store.get(alice)["current"] = 3
+
+    assert alice != bob
+    assert store.get(bob) == {"current": 0}
+    assert store.get(alice) == {"current": 3}
+    assert store.get("") is None and store.get("unknown") is None
+
+
+def test_idle_sessions_expire_and_access_refreshes():
+    clock = _Clock()
+    store = SessionStore(ttl=10, clock=clock)
+    active = store.create("active")
+    idle = store.create("idle")
+
+    clock.now = 8
+    assert store.get(active) == "active"
+    clock.now = 12
+
+    assert store.get(idle) is None
+    assert store.get(active) == "active"
+    assert len(store) == 1
+
+
+def test_least_recently_used_session_is_dropped_at_capacity():
+    store = SessionStore(ttl=60, max_sessions=2)
+    first = store.create(1)
+    second = store.create(2)
+    store.get(first)
+
+    third = store.create(3)
+
+    assert store.get(second) is None
+    assert store.get(first) == 1 and store.get(third) == 3
+    assert store.pop(first) == 1 and store.get(first) is None
+
+
+def test_concurrent_sessions():
+    store = SessionStore(ttl=60)
+    ids = []
+
+    def _take_quiz(n):
+        session_id = store.create({"answers": []})
+        for i in range(100):
+            store.get(session_id)["answers"].append(n)
+        ids.append((n, session_id))
+
+    threads = [threading.Thread(target=_take_quiz, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for n, session_id in ids:
+        assert store.get(session_id)["answers"] == [n] * 100
@@ -0,0 +1,81 @@
+"""
+Tests for single-pass routing and answering in the study buddy chat.
+"""
+import pytest
+
+import standalone_study_buddy_response as sbr
+from standalone_study_buddy_response import parse_routed_response, routed_study_buddy_response
+
+
+class _Response:
+    def __init__(self, content):
+        self._content = content
+
+    def json(self):
+        return {"choices": [{"message": {"content": self._content}}]}
+
+
+class _LLM:
+    """Records the prompts sent to inference_call and answers with `reply`."""
+
+    def __init__(self):
+        self.prompts = []
+        self.reply = ""
+
+    def __call__(self, system_prompt, user_prompt, astra_api_key=None):
+        self.prompts.append(user_prompt)
+        return _Response(self.reply)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = _LLM()
+    monkeypatch.setattr(sbr, "inference_call", fake)
+    return fake
+
+
+def _context(**overrides):
+    context = dict(chapter_name="Cell Biology", sub_topic="Mitochondria", study_material="The mitochondria {is} the powerhouse.",
+                   list_of_quizzes=[], user_input="what does it do?", study_buddy_name="Ollie", user_preference="patient")
+    context.update(overrides)
+    return context
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("ROUTE: study_material\nIt makes ATP.", ("study_material", "It makes ATP.")),
+    ("**ROUTE:** chitchat\n\nHi there!", ("chitchat", "Hi there!")),
+    ("  route: 'book_calendar'", ("book_calendar", "")),
+    ("ROUTE: supplement", ("supplement", "")),
+    ("ROUTE: weather\nSunny", ("study_material", "ROUTE: weather\nSunny")),
+    ("It makes ATP.", ("study_material", "It makes ATP.")),
+    (None, ("study_material", "")),
+])
+def test_parse_routed_response(text, expected):
+    assert parse_routed_response(text) == expected
+
+
+def test_single_call_classifies_and_answers(llm):
+    llm.reply = "ROUTE: study_material\nThey produce ATP for the cell."
+
+    route, answer = routed_study_buddy_response(**_context(), chat_history="user: hi {there}\n")
+
+    assert (route, answer) == ("study_material", "They produce ATP for the cell.")
+    assert len(llm.prompts) == 1
+    prompt = llm.prompts[0]
+    assert "### Intent Routing" in prompt and "ROUTE: <classification>" in prompt
+    assert "user: hi {there}" in prompt and "The mitochondria {is} the powerhouse." in prompt
+    assert prompt.rstrip().endswith("Respond :")
+
+
+def test_tool_routes_return_no_answer(llm):
+    llm.reply = "ROUTE: supplement"
+
+    assert routed_study_buddy_response(**_context(user_input="find me a video")) == ("supplement", "")
+
+
+def test_plain_response_prompt_is_unchanged(llm):
+    llm.reply = "It makes ATP."
+
+    assert sbr.study_buddy_response(**_context()) == "It makes ATP."
+    assert "### Intent Routing" not in llm.prompts[0]
+    assert llm.prompts[0] == sbr.STUDY_BUDDY_SYS_PROMPT.format(**{**_context(), "list_of_quizzes": "[]"})
@@ -0,0 +1,124 @@
+"""
+Tests for token streaming of study buddy answers, from the ASTRA provider to the routed stream.
+"""
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import standalone_study_buddy_response as sbr
+from llm.providers.astra import AstraProvider
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_post("/chat/completions", handler)
+    server = TestServer(app)
+    await server.start_server()
+    provider = AstraProvider({"endpoint": str(server.make_url("/chat/completions")), "models": {"default": "m"}})
+    return server, provider
+
+
+async def _collect(agen):
+    return [chunk async for chunk in agen]
+
+
+@pytest.mark.asyncio
+async def test_astra_streams_server_sent_events(mock_env_vars):
+    payloads = []
+
+    async def _chat(request):
+        payloads.append(await request.json())
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for content in ["Mito", "chondria ", None, "make ATP."]:
+            delta = {"content": content} if content is not None else {"role": "assistant"}
+            await resp.write(f"data: {json.dumps({'choices': [{'delta': delta}]})}\n\n".encode())
+        await resp.write(b"data: [DONE]\n\n")
+        return resp
+
+    server, provider = await _serve(_chat)
+    try:
+        chunks = await _collect(provider.stream([{"role": "user", "content": "hi"}], 100, 0.5))
+    finally:
+        await server.close()
+
+    assert chunks == ["Mito", "chondria ", "make ATP."]
+    assert payloads[0]["stream"] is True
+
+
+@pytest.mark.asyncio
+async def test_astra_stream_accepts_a_plain_json_answer(mock_env_vars):
+    async def _chat(request):
+        return web.json_response({"choices": [{"message": {"content": "all at once"}}]})
+
+    server, provider = await _serve(_chat)
+    try:
+        chunks = await _collect(provider.stream([{"role": "user", "content": "hi"}], 100, 0.5))
+    finally:
+        await server.close()
+
+    assert chunks == ["all at once"]
+
+
+class _StreamingLLM:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.use_cases = []
+
+    async def stream(self, prompt, use_case=None):
+        self.use_cases.append(use_case)
+        if self.error:
+            raise self.error
+        for chunk in self.chunks:
+            yield chunk
+
+
+def _context(**overrides):
+    context = dict(chapter_name="Cell Biology", sub_topic="Mitochondria", study_material="The mitochondria is the powerhouse.",
+                   list_of_quizzes=[], user_input="what does it do?", study_buddy_name="Ollie", user_preference="patient")
+    context.update(overrides)
+    return context
+
+
+@pytest.mark.asyncio
+async def test_routed_stream_strips_route_line_and_keeps_deltas(monkeypatch):
+    fake = _StreamingLLM(["ROU", "TE: chit", "chat\nHel", "lo ", "there!"])
+    monkeypatch.setattr(sbr, "llm_client", fake)
+
+    pieces = await _collect(sbr.stream_routed_study_buddy_response(**_context()))
+
+    assert pieces == [("chitchat", "Hel"), ("chitchat", "lo "), ("chitchat", "there!")]
+    assert fake.use_cases == [sbr.STUDY_BUDDY_USE_CASE]
+
+
+@pytest.mark.asyncio
+async def test_routed_stream_without_route_line_is_not_held_back(monkeypatch):
+    monkeypatch.setattr(sbr, "llm_client", _StreamingLLM(["They ", "make ATP."]))
+
+    pieces = await _collect(sbr.stream_routed_study_buddy_response(**_context()))
+
+    assert pieces == [("study_material", "They "), ("study_material", "make ATP.")]
+
+
+@pytest.mark.asyncio
+async def test_routed_stream_reports_tool_routes(monkeypatch):
+    monkeypatch.setattr(sbr, "llm_client", _StreamingLLM(["ROUTE: supplement"]))
+
+    pieces = await _collect(sbr.stream_routed_study_buddy_response(**_context(user_input="find me a video")))
+
+    assert pieces == [("supplement", "")]
+
+
+@pytest.mark.asyncio
+async def test_failed_stream_falls_back_to_blocking_call(monkeypatch):
+    class _Response:
+        def json(self):
+            return {"choices": [{"message": {"content": "Blocking answer."}}]}
+
+    monkeypatch.setattr(sbr, "llm_client", _StreamingLLM([], error=RuntimeError("no streaming")))
+    monkeypatch.setattr(sbr, "inference_call", lambda system_prompt, user_prompt, astra_api_key=None: _Response())
+
+    assert await _collect(sbr.stream_study_buddy_response(**_context())) == ["Blocking answer."]
@@ -0,0 +1,87 @@
+"""
+Tests for the in-process user state cache and write-behind flushing in nodes.py.
+"""
+import json
+import os
+import time
+
+import pytest
+
+import nodes
+from user_store import resolve_user_store
+from nodes import (
+    init_user_storage,
+    save_user_state,
+    load_user_state,
+    update_and_save_user_state,
+    flush_user_states,
+)
+
+
+def _user(user_id, name="Buddy"):
+    return {
+        "user_id": user_id,
+        "study_buddy_preference": "patient",
+        "study_buddy_persona": None,
+        "study_buddy_name": name,
+        "curriculum": None,
+    }
+
+
+@pytest.fixture
+def storage(temp_mnt_dir):
+    init_user_storage(str(temp_mnt_dir), "cache_user")
+    save_user_state("cache_user", _user("cache_user"))
+    yield temp_mnt_dir
+    nodes._user_state_cache.clear()
+
+
+def test_repeated_loads_skip_parsing(storage, monkeypatch):
+    load_user_state("cache_user")
+
+    def _fail(path):
+        raise AssertionError("load_user_from_file should not be called for a cached state")
+
+    monkeypatch.setattr(nodes, "load_user_from_file", _fail)
+    assert load_user_state("cache_user")["study_buddy_name"] == "Buddy"
+
+
+def test_loads_return_independent_copies(storage):
+    first = load_user_state("cache_user")
+    first["study_buddy_name"] = "mutated"
+
+    assert load_user_state("cache_user")["study_buddy_name"] == "Buddy"
+
+
+def test_external_write_invalidates_cache(storage):
+    load_user_state("cache_user")
+    user_file = resolve_user_store("cache_user").user_file
+    data = json.loads(user_file.read_text())
+    data["study_buddy_name"] = "Edited"
+    user_file.write_text(json.dumps(data, indent=4))
+    # Make sure the mtime moves even on coarse-grained filesystems
+    st = user_file.stat()
+    os.utime(user_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+    assert load_user_state("cache_user")["study_buddy_name"] == "Edited"
+
+
+@pytest.mark.asyncio
+async def test_update_is_write_behind(storage, monkeypatch):
+    monkeypatch.setattr(nodes, "USER_STATE_FLUSH_DELAY", 60.0)
+
+    def _rename(user_state):
+        user_state["study_buddy_name"] = "Updated"
+        return user_state
+
+    await update_and_save_user_state("cache_user", str(storage), _rename)
+    user_file = resolve_user_store("cache_user").user_file
+
+    # The cache serves the update before it reaches disk
+    assert load_user_state("cache_user")["study_buddy_name"] == "Updated"
+    assert json.loads(user_file.read_text())["study_buddy_name"] == "Buddy"
+
+    if nodes._flush_timer is not None:
+        nodes._flush_timer.cancel()
+    flush_user_states()
+    assert json.loads(user_file.read_text())["study_buddy_name"] == "Updated"
@@ -0,0 +1,105 @@
+"""
+Tests for atomic user state writes, per-user locks and optimistic updates.
+"""
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+
+import nodes
+import states
+from errors import UserStateConflictError
+from nodes import init_user_storage, load_user_state, save_user_state, update_and_save_user_state, flush_user_states
+from user_store import resolve_user_store
+
+
+def _user(user_id):
+    return {
+        "user_id": user_id,
+        "study_buddy_preference": "patient",
+        "study_buddy_persona": None,
+        "study_buddy_name": "Buddy",
+        "curriculum": None,
+        "uploaded_files": [],
+    }
+
+
+@pytest.fixture
+def store(temp_mnt_dir, monkeypatch):
+    monkeypatch.setattr(nodes, "USER_STATE_FLUSH_DELAY", 0)
+    init_user_storage(str(temp_mnt_dir), "racer")
+    save_user_state("racer", _user("racer"))
+    yield resolve_user_store("racer")
+    nodes._user_state_cache.clear()
+
+
+def test_failed_write_keeps_previous_file(store, monkeypatch):
+    before = store.user_file.read_bytes()
+
+    def _boom(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(states.os, "replace", _boom)
+    with pytest.raises(OSError):
+        states.save_user_to_file({**_user("racer"), "study_buddy_name": "half"}, str(store.user_file))
+
+    assert store.user_file.read_bytes() == before
+    assert [p.name for p in store.user_store_dir.iterdir() if p.is_file()] == ["racer.json"]
+
+
+def test_save_bumps_state_version(store):
+    first = load_user_state("racer")["state_version"]
+    save_user_state("racer", _user("racer"))
+
+    assert json.loads(store.user_file.read_text())["state_version"] == first + 1
+
+
+@pytest.mark.asyncio
+async def test_interleaved_async_updates_are_not_lost(store, temp_mnt_dir):
+    async def _append(tag):
+        async def _update(user_state):
+            # Yield so the other updates load the same base version
+            await asyncio.sleep(0)
+            user_state["uploaded_files"].append(tag)
+            return user_state
+        return await update_and_save_user_state("racer", str(temp_mnt_dir), _update)
+
+    await asyncio.gather(*[_append(f"f{i}") for i in range(4)])
+
+    nodes._user_state_cache.clear()
+    final = load_user_state("racer")
+    assert sorted(final["uploaded_files"]) == ["f0", "f1", "f2", "f3"]
+
+
+def test_threaded_updates_are_not_lost(store, temp_mnt_dir):
+    def _worker(tag):
+        def _update(user_state):
+            user_state["uploaded_files"].append(tag)
+            return user_state
+        asyncio.run(update_and_save_user_state("racer", str(temp_mnt_dir), _update))
+
+    threads = [threading.Thread(target=_worker, args=(f"t{i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    flush_user_states()
+    nodes._user_state_cache.clear()
+    assert sorted(load_user_state("racer")["uploaded_files"]) == sorted(f"t{i}" for i in range(8))
+
+
+@pytest.mark.asyncio
+async def test_conflict_error_after_max_retries(store, temp_mnt_dir, monkeypatch):
+    monkeypatch.setattr(nodes, "USER_STATE_MAX_RETRIES", 2)
+
+    def _always_loses(user_state):
+        # A concurrent writer commits while this update is in flight
+        save_user_state("racer", _user("racer"))
+        return user_state
+
+    with pytest.raises(UserStateConflictError) as exc:
+        await update_and_save_user_state("racer", str(temp_mnt_dir), _always_loses)
+    assert exc.value.user_id == "racer"
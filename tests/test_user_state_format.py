@@ -0,0 +1,109 @@
+"""
+Tests for user state serialization formats and the fast load path in states.py.
+"""
+import json
+
+import pytest
+
+import states
+from states import Chapter, StudyPlan, SubTopic, Status, save_user_to_file, load_user_from_file
+
+
+def _chapter(number, status=Status.NA):
+    return Chapter(
+        number=number,
+        name=f"Chapter {number}",
+        status=status,
+        sub_topics=[
+            SubTopic(
+                number=1,
+                sub_topic=f"Intro {number}",
+                status=Status.STARTED,
+                study_material="material",
+                display_markdown="#### Intro",
+                reference="doc.pdf",
+                quizzes=[{"question": "q?", "answer": "a"}],
+                feedback=["good"],
+            )
+        ],
+        reference="doc.pdf",
+        pdf_loc="/tmp/doc.pdf",
+        quizzes=None,
+        feedback=None,
+    )
+
+
+def _user():
+    plan = [_chapter(1, Status.STARTED), _chapter(2)]
+    return {
+        "user_id": "fmt_user",
+        "study_buddy_preference": "patient",
+        "study_buddy_persona": None,
+        "study_buddy_name": "Buddy",
+        "curriculum": [{
+            "active_chapter": plan[0],
+            "next_chapter": plan[1],
+            "study_plan": StudyPlan(study_plan=plan),
+            "status": [Status.STARTED, None],
+        }],
+        "uploaded_files": ["doc.pdf"],
+        "state_version": 3,
+    }
+
+
+@pytest.mark.parametrize("fmt", ["json", "orjson"])
+def test_round_trip_is_equivalent(tmp_path, fmt):
+    if fmt == "orjson" and states.orjson is None:
+        pytest.skip("orjson not installed")
+    path = tmp_path / "user.json"
+    save_user_to_file(_user(), str(path), fmt=fmt)
+
+    loaded = load_user_from_file(str(path))
+
+    assert loaded == _user()
+    curr = loaded["curriculum"][0]
+    assert isinstance(curr["study_plan"], StudyPlan)
+    assert isinstance(curr["active_chapter"].sub_topics[0], SubTopic)
+    assert curr["study_plan"].study_plan[0].status is Status.STARTED
+
+
+def test_formats_produce_same_data(tmp_path):
+    if states.orjson is None:
+        pytest.skip("orjson not installed")
+    json_path, orjson_path = tmp_path / "a.json", tmp_path / "b.json"
+    save_user_to_file(_user(), str(json_path), fmt="json")
+    save_user_to_file(_user(), str(orjson_path), fmt="orjson")
+
+    assert json.loads(json_path.read_bytes()) == json.loads(orjson_path.read_bytes())
+
+
+def test_fast_path_matches_fallback(tmp_path):
+    path = tmp_path / "user.json"
+    save_user_to_file(_user(), str(path))
+    raw = path.read_bytes()
+
+    assert states.load_user_bytes(raw) == states._rebuild_user(json.loads(raw))
+
+
+def test_legacy_shapes_fall_back_to_tolerant_loader(tmp_path):
+    data = json.loads(states.dump_user_bytes(_user()))
+    curr = data["curriculum"][0]
+    # Single curriculum object and an unknown status value, as written by older code
+    curr["status"] = ["started", "paused"]
+    data["curriculum"] = curr
+    path = tmp_path / "legacy.json"
+    path.write_text(json.dumps(data, indent=4))
+
+    loaded = load_user_from_file(str(path))
+
+    assert isinstance(loaded["curriculum"], list)
+    assert loaded["curriculum"][0]["status"] == [Status.STARTED, None]
+    assert isinstance(loaded["curriculum"][0]["study_plan"], StudyPlan)
+
+
+def test_corrupt_file_raises_decode_error(tmp_path):
+    path = tmp_path / "broken.json"
+    path.write_text('{"user_id": "x", ')
+
+    with pytest.raises(json.JSONDecodeError):
+        load_user_from_file(str(path))
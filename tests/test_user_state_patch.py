@@ -0,0 +1,223 @@
+"""
+Tests for JSON Patch based partial updates of the active chapter.
+"""
+import asyncio
+import json
+import threading
+
+import pytest
+
+import nodes
+from errors import UserStatePatchError
+from nodes import (
+    add_quiz_to_subtopic,
+    init_user_storage,
+    load_user_state,
+    patch_active_chapter,
+    save_user_state,
+    set_subtopic_status,
+    update_and_save_user_state,
+    update_subtopic_status,
+)
+from state_patch import apply_json_patch
+from states import Chapter, StudyPlan, SubTopic, Status
+from user_store import resolve_user_store
+
+
+def _chapter(number):
+    return Chapter(
+        number=number,
+        name=f"Chapter {number}",
+        status=Status.STARTED if number == 1 else Status.NA,
+        sub_topics=[
+            SubTopic(number=i, sub_topic=f"Topic {number}.{i}", status=Status.NA, study_material="text",
+                     display_markdown="md", reference="doc.pdf", quizzes=None, feedback=None)
+            for i in (1, 2)
+        ],
+        reference="doc.pdf",
+        pdf_loc="/tmp/doc.pdf",
+        quizzes=None,
+        feedback=None,
+    )
+
+
+def _user(user_id):
+    plan = [_chapter(n) for n in (1, 2, 3)]
+    return {
+        "user_id": user_id,
+        "study_buddy_preference": "patient",
+        "study_buddy_persona": None,
+        "study_buddy_name": "Buddy",
+        "curriculum": [{
+            "active_chapter": plan[0].model_copy(deep=True),
+            "next_chapter": plan[1].model_copy(deep=True),
+            "study_plan": StudyPlan(study_plan=plan),
+            "status": [Status.STARTED],
+        }],
+    }
+
+
+@pytest.fixture
+def store(temp_mnt_dir):
+    init_user_storage(str(temp_mnt_dir), "patcher")
+    save_user_state("patcher", _user("patcher"))
+    yield resolve_user_store("patcher")
+    nodes._user_state_cache.clear()
+
+
+def test_apply_json_patch_operations():
+    doc = {"a": [1, 2], "b/c": {"~d": 1}}
+
+    apply_json_patch(doc, [
+        {"op": "add", "path": "/a/-", "value": 3},
+        {"op": "add", "path": "/a/0", "value": 0},
+        {"op": "replace", "path": "/b~1c/~0d", "value": 2},
+        {"op": "remove", "path": "/a/1"},
+        {"op": "test", "path": "/a", "value": [0, 2, 3]},
+    ])
+
+    assert doc == {"a": [0, 2, 3], "b/c": {"~d": 2}}
+
+
+@pytest.mark.parametrize("op", [
+    {"op": "replace", "path": "/missing", "value": 1},
+    {"op": "remove", "path": "/a/5"},
+    {"op": "test", "path": "/a/0", "value": 9},
+    {"op": "add", "path": "a", "value": 1},
+    {"op": "move", "path": "/a", "from": "/b"},
+])
+def test_apply_json_patch_rejects_invalid_ops(op):
+    with pytest.raises(UserStatePatchError):
+        apply_json_patch({"a": [1]}, [op])
+
+
+@pytest.mark.asyncio
+async def test_update_subtopic_status_and_feedback(store):
+    await update_subtopic_status("patcher", str(store.save_to), 1, Status.COMPLETED, ["nice"])
+    await update_subtopic_status("patcher", str(store.save_to), 1, Status.COMPLETED, ["again"])
+
+    nodes._user_state_cache.clear()
+    subtopic = load_user_state("patcher")["curriculum"][0]["active_chapter"].sub_topics[1]
+    assert subtopic.status is Status.COMPLETED
+    assert subtopic.feedback == ["nice", "again"]
+
+
+@pytest.mark.asyncio
+async def test_add_quiz_to_subtopic_appends(store):
+    quiz = {"question": "q?", "choices": ["a", "b"], "answer": "a", "explanation": "because"}
+    await add_quiz_to_subtopic("patcher", str(store.save_to), 0, quiz)
+    updated = await add_quiz_to_subtopic("patcher", str(store.save_to), 0, {**quiz, "question": "q2?"})
+
+    assert [q["question"] for q in updated["curriculum"][0]["active_chapter"].sub_topics[0].quizzes] == ["q?", "q2?"]
+    # The study plan copy of the chapter is a separate record and is not touched
+    assert updated["curriculum"][0]["study_plan"].study_plan[0].sub_topics[0].quizzes is None
+
+
+@pytest.mark.asyncio
+async def test_patch_rewrites_only_the_active_chapter(store):
+    shards_before = {p.name: p.stat().st_mtime_ns for p in store.chapters_dir.glob("*.json")}
+    version = json.loads(store.user_file.read_text())["state_version"]
+
+    await update_subtopic_status("patcher", str(store.save_to), 0, Status.PROGRESSING)
+
+    index = json.loads(store.user_file.read_text())
+    assert index["state_version"] == version + 1
+    new_shards = {p.name for p in store.chapters_dir.glob("*.json")} - set(shards_before)
+    assert new_shards == {index["curriculum"][0]["active_chapter"]["shard"] + ".json"}
+    for name, mtime in shards_before.items():
+        assert (store.chapters_dir / name).stat().st_mtime_ns == mtime
+
+
+@pytest.mark.asyncio
+async def test_pending_write_behind_is_flushed_before_patch(store, monkeypatch):
+    monkeypatch.setattr(nodes, "USER_STATE_FLUSH_DELAY", 60.0)
+
+    def _rename(user_state):
+        user_state["study_buddy_name"] = "Renamed"
+        return user_state
+
+    await update_and_save_user_state("patcher", str(store.save_to), _rename)
+    if nodes._flush_timer is not None:
+        nodes._flush_timer.cancel()
+        nodes._flush_timer = None
+    updated = await update_subtopic_status("patcher", str(store.save_to), 0, Status.COMPLETED)
+
+    assert updated["study_buddy_name"] == "Renamed"
+    assert updated["curriculum"][0]["active_chapter"].sub_topics[0].status is Status.COMPLETED
+
+
+@pytest.mark.asyncio
+async def test_missing_subtopic_leaves_state_unchanged(store):
+    before = store.user_file.read_bytes()
+
+    updated = await update_subtopic_status("patcher", str(store.save_to), 7, Status.COMPLETED)
+
+    assert store.user_file.read_bytes() == before
+    assert updated["curriculum"][0]["active_chapter"].sub_topics[0].status is Status.NA
+
+
+@pytest.mark.asyncio
+async def test_failed_patch_writes_nothing(store):
+    before = store.user_file.read_bytes()
+
+    with pytest.raises(UserStatePatchError) as exc_info:
+        await patch_active_chapter("patcher", str(store.save_to), [
+            {"op": "replace", "path": "/name", "value": "Renamed"},
+            {"op": "test", "path": "/number", "value": 99},
+        ])
+
+    assert exc_info.value.user_id == "patcher"
+    assert store.user_file.read_bytes() == before
+
+
+@pytest.mark.asyncio
+async def test_unmark_keeps_a_quiz_added_concurrently(store, monkeypatch):
+    save_to = str(store.save_to)
+    await set_subtopic_status("patcher", save_to, 1, 0, Status.COMPLETED, [{"question": "q1?"}])
+    real_load = nodes.load_user_state
+    raced = []
+
+    def _load_then_race(*args, **kwargs):
+        state = real_load(*args, **kwargs)
+        if not raced:
+            # Another writer (e.g. the quiz bank) commits after the unmark loaded its state
+            raced.append(True)
+            writer = threading.Thread(target=asyncio.run, args=(
+                add_quiz_to_subtopic("patcher", save_to, 0, {"question": "q2?"}),))
+            writer.start()
+            writer.join()
+        return state
+
+    monkeypatch.setattr(nodes, "load_user_state", _load_then_race)
+    await set_subtopic_status("patcher", save_to, 1, 0, Status.NA)
+
+    nodes.flush_user_states()
+    nodes._user_state_cache.clear()
+    curriculum = real_load("patcher")["curriculum"][0]
+    subtopic = curriculum["active_chapter"].sub_topics[0]
+    assert subtopic.status is Status.NA
+    assert [q["question"] for q in subtopic.quizzes] == ["q1?", "q2?"]
+    assert curriculum["study_plan"].study_plan[0].sub_topics[0].status is Status.NA
+
+
+async def test_next_chapter_build_is_not_restarted_by_concurrent_writes(store, monkeypatch):
+    builds = []
+
+    async def _build(username, pdf_file_loc, subject, pdf_f_name, checkpoint=None, on_progress=None):
+        builds.append(pdf_f_name)
+        # Another writer lands while the (slow) build is running
+        await patch_active_chapter("patcher", str(store.save_to),
+                                   [{"op": "replace", "path": "/sub_topics/0/status", "value": Status.STARTED.value}])
+        return [SubTopic(number=1, sub_topic="Built topic", status=Status.NA, study_material="new text",
+                         display_markdown="md", reference="doc.pdf", quizzes=None, feedback=None)]
+
+    monkeypatch.setattr(nodes, "sub_topic_builder", _build)
+
+    await nodes.move_to_next_chapter("patcher", str(store.save_to))
+
+    assert builds == ["doc.pdf"]
+    nodes.flush_user_states()
+    nodes._user_state_cache.clear()
+    curriculum = load_user_state("patcher")["curriculum"][0]
+    assert curriculum["active_chapter"].number == 2
+    assert [st.sub_topic for st in curriculum["active_chapter"].sub_topics] == ["Built topic"]
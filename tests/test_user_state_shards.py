@@ -0,0 +1,197 @@
+"""
+Tests for the sharded user state layout (curriculum index + one file per chapter).
+"""
+import copy
+import json
+import os
+import time
+
+import pytest
+
+import nodes
+import states
+from nodes import init_user_storage, load_active_chapter_info, load_user_state, save_user_state
+from states import Chapter, LazyStudyPlan, StudyPlan, SubTopic, Status, load_user_from_file, save_user_to_file
+from user_store import resolve_user_store
+
+
+def _chapter(number, status=Status.NA):
+    return Chapter(
+        number=number,
+        name=f"Chapter {number}",
+        status=status,
+        sub_topics=[
+            SubTopic(
+                number=1,
+                sub_topic=f"Topic {number}.1",
+                status=Status.NA,
+                study_material="material " * 200,
+                display_markdown="#### Topic",
+                reference="doc.pdf",
+                quizzes=[{"question": "q?", "answer": "a"}],
+                feedback=[],
+            )
+        ],
+        reference="doc.pdf",
+        pdf_loc="/tmp/doc.pdf",
+        quizzes=None,
+        feedback=None,
+    )
+
+
+def _user(user_id="shard_user", chapters=5):
+    plan = [_chapter(1, Status.STARTED)] + [_chapter(n) for n in range(2, chapters + 1)]
+    return {
+        "user_id": user_id,
+        "study_buddy_preference": "patient",
+        "study_buddy_persona": None,
+        "study_buddy_name": "Buddy",
+        "curriculum": [{
+            "active_chapter": plan[0].model_copy(deep=True),
+            "next_chapter": plan[1].model_copy(deep=True),
+            "study_plan": StudyPlan(study_plan=plan),
+            "status": [Status.STARTED],
+        }],
+    }
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return tmp_path / "user.json", tmp_path / "chapters"
+
+
+def test_round_trip_and_lazy_chapters(paths):
+    path, shard_dir = paths
+    save_user_to_file(_user(), str(path), shard_dir=str(shard_dir))
+
+    # Equal chapters share one content-addressed shard
+    assert len(list(shard_dir.glob("*.json"))) == 5
+    single_file = path.with_name("single.json")
+    save_user_to_file(_user(), str(single_file))
+    assert path.stat().st_size * 5 < single_file.stat().st_size
+
+    loaded = load_user_from_file(str(path))
+    curr = loaded["curriculum"][0]
+    plan = curr["study_plan"]
+    assert isinstance(plan, StudyPlan) and isinstance(plan, LazyStudyPlan)
+    # Only the chapters shared with active_chapter and next_chapter are in memory so far
+    assert plan.loaded_chapters() == 2
+
+    assert plan.study_plan[3].name == "Chapter 4"
+    assert plan.loaded_chapters() == 3
+    assert plan == _user()["curriculum"][0]["study_plan"]
+    assert curr["active_chapter"] == _chapter(1, Status.STARTED)
+    assert curr["status"] == [Status.STARTED]
+
+
+def test_unchanged_chapters_are_not_rewritten(paths):
+    path, shard_dir = paths
+    save_user_to_file(_user(), str(path), shard_dir=str(shard_dir))
+    mtimes = {p.name: p.stat().st_mtime_ns for p in shard_dir.glob("*.json")}
+
+    loaded = load_user_from_file(str(path))
+    loaded["curriculum"][0]["study_plan"].study_plan[4].status = Status.COMPLETED
+    save_user_to_file(loaded, str(path), shard_dir=str(shard_dir))
+
+    reloaded = load_user_from_file(str(path))
+    plan = reloaded["curriculum"][0]["study_plan"]
+    assert plan.study_plan[4].status is Status.COMPLETED
+    assert plan.study_plan[2].status is Status.NA
+    for p in shard_dir.glob("*.json"):
+        if p.name in mtimes:
+            assert p.stat().st_mtime_ns == mtimes[p.name]
+
+
+def test_deepcopy_keeps_chapters_unloaded(paths):
+    path, shard_dir = paths
+    save_user_to_file(_user(), str(path), shard_dir=str(shard_dir))
+    plan = load_user_from_file(str(path))["curriculum"][0]["study_plan"]
+
+    copied = copy.deepcopy(plan)
+
+    assert copied.loaded_chapters() == 2
+    assert [ch.number for ch in copied.study_plan] == [1, 2, 3, 4, 5]
+
+
+def test_unreferenced_shards_are_collected(paths, monkeypatch):
+    path, shard_dir = paths
+    monkeypatch.setattr(states, "SHARD_GC_GRACE_SECONDS", 0)
+    user = _user()
+    save_user_to_file(user, str(path), shard_dir=str(shard_dir))
+
+    user["curriculum"][0]["study_plan"].study_plan[4].name = "Renamed"
+    save_user_to_file(user, str(path), shard_dir=str(shard_dir))
+
+    index = json.loads(path.read_text())
+    referenced = {m["shard"] for m in index["curriculum"][0]["study_plan"]["chapters"]}
+    assert {p.stem for p in shard_dir.glob("*.json")} == referenced
+
+
+def test_grace_period_counts_from_when_a_shard_became_unreferenced(paths, monkeypatch):
+    path, shard_dir = paths
+    monkeypatch.setattr(states, "SHARD_GC_GRACE_SECONDS", 600)
+    user = _user()
+    save_user_to_file(user, str(path), shard_dir=str(shard_dir))
+    stale = load_user_from_file(str(path))["curriculum"][0]["study_plan"]
+    hour_ago = time.time() - 3600
+    for shard in shard_dir.glob("*.json"):
+        os.utime(shard, (hour_ago, hour_ago))
+
+    user["curriculum"][0]["study_plan"].study_plan[2].name = "Renamed"
+    save_user_to_file(user, str(path), shard_dir=str(shard_dir))
+
+    # The old chapter 3 shard is an hour old but was only just dropped
+    assert stale.study_plan[2].name == "Chapter 3"
+    markers = list(shard_dir.glob("*.unreferenced"))
+    assert len(markers) == 1
+
+    for marker in markers:
+        os.utime(marker, (hour_ago, hour_ago))
+    save_user_to_file(user, str(path), shard_dir=str(shard_dir))
+
+    index = json.loads(path.read_text())
+    referenced = {m["shard"] for m in index["curriculum"][0]["study_plan"]["chapters"]}
+    assert {p.stem for p in shard_dir.glob("*.json")} == referenced
+    assert not list(shard_dir.glob("*.unreferenced"))
+
+
+def test_single_file_state_is_migrated_on_save(temp_mnt_dir):
+    init_user_storage(str(temp_mnt_dir), "legacy_user")
+    store = resolve_user_store("legacy_user")
+    save_user_to_file(_user("legacy_user"), str(store.user_file))
+    assert "layout" not in json.loads(store.user_file.read_text())
+
+    try:
+        state = load_user_state("legacy_user")
+        save_user_state("legacy_user", state)
+
+        assert "layout" in json.loads(store.user_file.read_text())
+        nodes._user_state_cache.clear()
+        assert load_user_state("legacy_user")["curriculum"][0]["study_plan"].study_plan[4].number == 5
+    finally:
+        nodes._user_state_cache.clear()
+
+
+@pytest.mark.parametrize("fmt", ["json", "orjson"])
+def test_legacy_state_mentioning_layout_is_not_taken_for_an_index(tmp_path, fmt):
+    path = tmp_path / "user.json"
+    save_user_to_file(_user("layout"), str(path), fmt=fmt)
+
+    assert states.read_sharded_index(str(path)) is None
+    user = load_user_from_file(str(path))
+    assert user["user_id"] == "layout"
+    assert user["curriculum"][0]["study_plan"].study_plan[4].number == 5
+
+
+def test_active_chapter_info_reads_only_the_index(temp_mnt_dir, monkeypatch):
+    init_user_storage(str(temp_mnt_dir), "meta_user")
+    save_user_state("meta_user", _user("meta_user"))
+    nodes._user_state_cache.clear()
+
+    def _fail(self):
+        raise AssertionError("no chapter shard should be read")
+
+    monkeypatch.setattr(states._ChapterRef, "load", _fail)
+
+    info = load_active_chapter_info("meta_user")
+    assert info == {"number": 1, "name": "Chapter 1", "status": "started", "sub_topics": ["Topic 1.1"]}
@@ -0,0 +1,115 @@
+"""
+Tests for per-user storage handles (no shared process-global paths).
+"""
+import asyncio
+import json
+
+import pytest
+
+import nodes
+from nodes import init_user_storage, load_user_state, save_user_state, update_and_save_user_state
+from user_store import UserStore, resolve_user_store
+
+
+def _user(user_id):
+    return {
+        "user_id": user_id,
+        "study_buddy_preference": "patient",
+        "study_buddy_persona": None,
+        "study_buddy_name": f"buddy_{user_id}",
+        "curriculum": None,
+    }
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    yield
+    nodes._user_state_cache.clear()
+
+
+def test_layout_matches_init_user_storage(temp_mnt_dir):
+    store_path, user_store_dir = init_user_storage(str(temp_mnt_dir), "alice")
+    store = resolve_user_store("alice")
+
+    assert store.store_path == store_path == temp_mnt_dir / "alice" / "global_state.json"
+    assert store.user_store_dir == user_store_dir == temp_mnt_dir / "alice" / "user_store"
+    assert store.user_file == user_store_dir / "alice.json"
+    assert user_store_dir.is_dir()
+
+
+def test_interleaved_users_do_not_cross_paths(temp_mnt_dir):
+    init_user_storage(str(temp_mnt_dir), "alice")
+    init_user_storage(str(temp_mnt_dir), "bob")
+
+    # alice is saved *after* bob's storage was initialized; with the old
+    # globals this landed in bob's directory
+    save_user_state("alice", _user("alice"))
+    save_user_state("bob", _user("bob"))
+
+    assert (temp_mnt_dir / "alice" / "user_store" / "alice.json").exists()
+    assert not (temp_mnt_dir / "bob" / "user_store" / "alice.json").exists()
+    assert load_user_state("alice")["study_buddy_name"] == "buddy_alice"
+    assert load_user_state("bob")["study_buddy_name"] == "buddy_bob"
+
+
+def test_explicit_store_overrides_registry(temp_mnt_dir, tmp_path):
+    other_root = tmp_path / "other"
+    explicit = UserStore(other_root, "carol").ensure_dirs()
+    init_user_storage(str(temp_mnt_dir), "carol")
+
+    save_user_state("carol", _user("carol"), explicit)
+
+    assert explicit.user_file.exists()
+    assert not (temp_mnt_dir / "carol" / "user_store" / "carol.json").exists()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_updates_for_different_users(temp_mnt_dir, monkeypatch):
+    monkeypatch.setattr(nodes, "USER_STATE_FLUSH_DELAY", 0)
+    for uid in ("u1", "u2", "u3"):
+        init_user_storage(str(temp_mnt_dir), uid)
+        save_user_state(uid, _user(uid))
+
+    def _rename(user_state):
+        user_state["study_buddy_name"] = f"updated_{user_state['user_id']}"
+        return user_state
+
+    await asyncio.gather(*[
+        update_and_save_user_state(uid, str(temp_mnt_dir), _rename) for uid in ("u1", "u2", "u3")
+    ])
+
+    nodes._user_state_cache.clear()
+    for uid in ("u1", "u2", "u3"):
+        assert load_user_state(uid)["study_buddy_name"] == f"updated_{uid}"
+
+
+def test_central_index_holds_no_user_state(temp_mnt_dir):
+    init_user_storage(str(temp_mnt_dir), "dave")
+    store = resolve_user_store("dave")
+    save_user_state("dave", _user("dave"))
+    index_bytes = store.store_path.read_bytes()
+
+    save_user_state("dave", {**_user("dave"), "study_buddy_name": "renamed"})
+
+    index = json.loads(store.store_path.read_text())
+    assert index["users"]["dave"] == {"user_file": "user_store/dave.json"}
+    # A save of an already-registered user does not rewrite the index
+    assert store.store_path.read_bytes() == index_bytes
+
+
+def test_legacy_central_store_is_migrated(temp_mnt_dir):
+    init_user_storage(str(temp_mnt_dir), "erin")
+    store = resolve_user_store("erin")
+    legacy = {
+        "users": {"erin": _user("erin")},
+        "global_states": {"erin": {"user_id": "erin", "user": _user("erin")}},
+    }
+    store.store_path.write_text(json.dumps(legacy))
+
+    assert nodes.user_exists("erin")
+    assert load_user_state("erin")["study_buddy_name"] == "buddy_erin"
+
+    index = json.loads(store.store_path.read_text())
+    assert index["users"]["erin"] == {"user_file": "user_store/erin.json"}
+    assert "user" not in index["global_states"]["erin"]
+    assert store.user_file.exists()
@@ -0,0 +1,93 @@
+"""
+Tests for multi-image VLM requests: downscaling to a size budget, image selection and batched captions.
+"""
+import base64
+import io
+import random
+
+import pytest
+from PIL import Image
+
+import search_and_filter_docs_streaming as rag_stream
+from material_index import select_relevant_images
+from vllm_client_multimodal_requests import build_vlm_payload, fit_image, prepare_images
+
+
+def _noisy_png(width, height, mode="RGB"):
+    rng = random.Random(width * height)
+    image = Image.frombytes(mode, (width, height), bytes(rng.getrandbits(8) for _ in range(width * height * len(mode))))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _decode(b64):
+    return Image.open(io.BytesIO(base64.b64decode(b64)))
+
+
+def test_fit_image_downscales_and_reencodes():
+    data = _noisy_png(1200, 600, "RGBA")
+
+    webp = _decode(fit_image(data, max_side=300, fmt="webp"))
+    jpeg = _decode(fit_image(data, max_side=300, fmt="jpeg"))
+
+    assert webp.format == "WEBP" and jpeg.format == "JPEG" and jpeg.mode == "RGB"
+    assert max(webp.size) == 300 and webp.size[0] == 2 * webp.size[1]
+
+
+def test_prepare_images_shares_the_size_budget():
+    images = [base64.b64encode(_noisy_png(800, 800)).decode() for _ in range(3)] + ["not an image"]
+
+    prepared = prepare_images(images, max_images=4, max_side=800, budget_kb=150)
+
+    assert len(prepared) == 3
+    assert all(len(p) <= 150 * 1024 // 4 for p in prepared)
+
+
+def test_payload_carries_every_image():
+    payload = build_vlm_payload("what is shown?", ["aaa", "bbb"], "system")
+
+    content = payload["messages"][1]["content"]
+    assert content[0] == {"type": "text", "text": "what is shown?"}
+    assert [c["image_url"]["url"] for c in content[1:]] == ["data:image/jpeg;base64,aaa", "data:image/jpeg;base64,bbb"]
+
+
+def test_payload_labels_the_real_format():
+    png = base64.b64encode(_noisy_png(8, 8)).decode()
+
+    payload = build_vlm_payload("what is shown?", [png], "system")
+
+    assert payload["messages"][1]["content"][1]["image_url"]["url"].startswith("data:image/png;base64,")
+
+
+def test_select_relevant_images_by_caption():
+    index = {"images": [
+        {"path": "a", "caption": "Figure 1 the structure of a plant cell wall"},
+        {"path": "b", "caption": "Figure 2 electron transport chain in the mitochondria"},
+        {"path": "c", "caption": "Figure 3 table of contents"},
+        {"path": "d", "caption": "Figure 4 ATP synthase in the inner mitochondrial membrane"},
+    ]}
+
+    chosen = select_relevant_images(index, "how does the electron transport chain make ATP?", k=2)
+
+    assert [image["path"] for image in chosen] == ["b", "d"]
+    assert len(select_relevant_images(index, "anything", k=10)) == 4
+
+
+@pytest.mark.asyncio
+async def test_citation_images_are_described_in_one_request(monkeypatch):
+    calls = []
+
+    def _vlm(query, images, sys_prompt):
+        calls.append(images)
+        return "Image 1: a cell diagram\nImage 2: a bar chart"
+
+    monkeypatch.setattr(rag_stream, "query_qwen_vllm_served_images", _vlm)
+    markdown = ("answer\n\n### source: 1\n\n" + rag_stream._image_placeholder(1)
+                + "### source: 2\n\n" + rag_stream._image_placeholder(2))
+
+    result = await rag_stream._describe_citation_images([("img1", "a.pdf"), ("img2", "a.pdf")], markdown)
+
+    assert calls == [["img1", "img2"]]
+    assert "### source: 1\n\n\na cell diagram\n### source: 2\n\n\na bar chart\n" in result
+    assert "\x00" not in result
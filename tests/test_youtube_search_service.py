@@ -0,0 +1,142 @@
+"""
+Tests for the async, cached YouTube search on a persistent yt-dlp worker.
+"""
+import threading
+
+import youtube_search_service
+from tool_youtube import pick_most_relevant_video
+from youtube_search_service import YouTubeSearchService, normalize_query
+
+FLAT_ENTRIES = [
+    {"id": "aaa", "url": "https://www.youtube.com/watch?v=aaa", "title": "Cooking pasta at home",
+     "channel": "Chef", "duration": 300, "view_count": 1000, "description": None},
+    {"id": "bbb", "url": "https://www.youtube.com/watch?v=bbb", "title": "The Krebs cycle explained",
+     "channel": "Bio Lab", "duration": 3725, "view_count": 250000, "description": "citric acid cycle",
+     "thumbnails": [{"url": "small.jpg"}, {"url": "large.jpg"}]},
+]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _FakeYoutubeDL:
+    def __init__(self, entries=FLAT_ENTRIES, gate=None):
+        self.entries = entries
+        self.gate = gate
+        self.queries = []
+        self.threads = set()
+
+    def extract_info(self, url, download=True):
+        assert download is False
+        self.queries.append(url)
+        self.threads.add(threading.current_thread().name)
+        if self.gate is not None:
+            self.gate.wait(5)
+        return {"entries": [dict(e) for e in self.entries]}
+
+
+def _service(ydl, **kwargs):
+    created = []
+
+    def _factory(options):
+        assert options["extract_flat"] == "in_playlist"
+        created.append(options)
+        return ydl
+
+    service = YouTubeSearchService(ydl_factory=_factory, **kwargs)
+    return service, created
+
+
+def test_normalize_query():
+    assert normalize_query("  Krebs   Cycle?! ") == normalize_query("krebs cycle") == "krebs cycle"
+
+
+def test_results_are_cached_per_normalized_query_and_expire():
+    clock = _Clock()
+    ydl = _FakeYoutubeDL()
+    service, created = _service(ydl, ttl=60, clock=clock)
+
+    assert len(service.search("Krebs cycle", 5)) == 2
+    service.search("krebs   CYCLE", 5)
+    assert ydl.queries == ["ytsearch5:Krebs cycle"]
+
+    clock.now = 61
+    service.search("krebs cycle", 5)
+    assert len(ydl.queries) == 2
+    assert len(created) == 1
+    assert ydl.threads == {"yt-dlp_0"}
+
+
+def test_empty_results_are_not_cached():
+    ydl = _FakeYoutubeDL(entries=[])
+    service, _ = _service(ydl)
+
+    assert service.search("nothing") == []
+    assert service.search("nothing") == []
+    assert len(ydl.queries) == 2
+
+
+def test_concurrent_requests_share_one_search():
+    gate = threading.Event()
+    ydl = _FakeYoutubeDL(gate=gate)
+    service, _ = _service(ydl)
+
+    first = service.submit("krebs cycle")
+    second = service.submit("Krebs cycle")
+    gate.set()
+
+    assert first is second
+    assert first.result(5) == second.result(5)
+    assert len(ydl.queries) == 1
+
+
+async def test_fetch_most_relevant_ranks_flat_entries():
+    service, _ = _service(_FakeYoutubeDL())
+
+    video = await service.fetch_most_relevant("krebs cycle")
+
+    assert video["video_id"] == "bbb" and video["url"] == "https://www.youtube.com/watch?v=bbb"
+    assert video["channel"] == "Bio Lab" and video["duration"] == "1:02:05"
+    assert video["thumbnail"] == "large.jpg" and video["views_text"] == "250,000 views"
+
+
+async def test_timeout_returns_nothing_and_late_result_fills_cache():
+    gate = threading.Event()
+    ydl = _FakeYoutubeDL(gate=gate)
+    service, _ = _service(ydl, timeout=0.05)
+
+    assert await service.fetch_most_relevant("krebs cycle") is None
+    gate.set()
+    service.submit("krebs cycle").result(5)
+
+    assert (await service.fetch_most_relevant("krebs cycle"))["video_id"] == "bbb"
+    assert len(ydl.queries) == 1
+
+
+def test_falls_back_to_subprocess_without_yt_dlp(monkeypatch):
+    calls = []
+
+    def _no_yt_dlp(options):
+        raise ImportError("No module named 'yt_dlp'")
+
+    monkeypatch.setattr(youtube_search_service, "search_youtube_videos",
+                        lambda query, limit: calls.append((query, limit)) or FLAT_ENTRIES)
+    service = YouTubeSearchService(ydl_factory=_no_yt_dlp)
+
+    assert service.search("krebs cycle", 3) == FLAT_ENTRIES
+    service.search("photosynthesis", 3)
+    assert calls == [("krebs cycle", 3), ("photosynthesis", 3)]
+
+
+def test_ranking_does_not_modify_cached_entries():
+    entries = [dict(e) for e in FLAT_ENTRIES]
+
+    pick_most_relevant_video(entries, "krebs cycle")
+
+    assert all("relevance_score" not in e for e in entries)
+    assert pick_most_relevant_video([], "anything") is None
@@ -206,10 +206,66 @@ def calculate_relevance_score(video, query):
     
     return total_score
 
+def _format_duration(seconds):
+    if not seconds:
+        return 'N/A'
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+def format_video_result(video):
+    """
+    Map a yt-dlp video entry to the dictionary returned to the UI
+
+    Works for full entries (`--dump-json`) and for the flat entries of an
+    in-process search, which have `channel` instead of `uploader`, a
+    `duration` in seconds and a list of `thumbnails`.
+    """
+    video_id = video.get('id') or 'N/A'
+    url = video.get('webpage_url') or video.get('url')
+    if not url:
+        url = f"https://www.youtube.com/watch?v={video_id}" if video.get('id') else 'N/A'
+    thumbnail = video.get('thumbnail')
+    if not thumbnail and video.get('thumbnails'):
+        thumbnail = video['thumbnails'][-1].get('url')
+    view_count = video.get('view_count') or 0
+    description = video.get('description') or ''
+    
+    return {
+        'title': video.get('title') or 'N/A',
+        'url': url,
+        'video_id': video_id,
+        'duration': video.get('duration_string') or _format_duration(video.get('duration')),
+        'views_text': f"{view_count:,} views",
+        'views_count': view_count,
+        'published': video.get('upload_date') or 'N/A',
+        'channel': video.get('uploader') or video.get('channel') or 'N/A',
+        'thumbnail': thumbnail or 'N/A',
+        'description': description[:500],
+        'relevance_score': video.get('relevance_score', 0)
+    }
+
+def pick_most_relevant_video(videos, query):
+    """
+    Score videos against the query and return the best one formatted, or None
+
+    The input entries are not modified, so cached search results can be ranked
+    again for another query.
+    """
+    if not videos:
+        return None
+    scored = [dict(video, relevance_score=calculate_relevance_score(video, query)) for video in videos]
+    # Sort by relevance score (descending) and return top 1
+    most_relevant = sorted(scored, key=lambda x: x['relevance_score'], reverse=True)[0]
+    return format_video_result(most_relevant)
+
 def fetch_most_relevant_youtube_video(query, search_limit=15):
     """
     Search YouTube and return the most RELEVANT video based on query
     
+    Blocks for the whole yt-dlp run; the chat UI uses
+    youtube_search_service.fetch_most_relevant_youtube_video_async instead.
+    
     Args:
         query: Search query string
         search_limit: Number of results to fetch before scoring (default 15)
@@ -220,33 +276,7 @@ def fetch_most_relevant_youtube_video(query, search_limit=15):
     try:
         # Search for videos using yt-dlp
         videos = search_youtube_videos(query, search_limit)
-        
-        if not videos:
-            return None
-        
-        # Calculate relevance scores
-        for video in videos:
-            video['relevance_score'] = calculate_relevance_score(video, query)
-        
-        # Sort by relevance score (descending) and return top 1
-        most_relevant = sorted(videos, key=lambda x: x['relevance_score'], reverse=True)[0]
-        
-        # Format the output to match expected interface
-        result = {
-            'title': most_relevant.get('title', 'N/A'),
-            'url': most_relevant.get('webpage_url', most_relevant.get('url', 'N/A')),
-            'video_id': most_relevant.get('id', 'N/A'),
-            'duration': most_relevant.get('duration_string', 'N/A'),
-            'views_text': f"{most_relevant.get('view_count', 0):,} views",
-            'views_count': most_relevant.get('view_count', 0),
-            'published': most_relevant.get('upload_date', 'N/A'),
-            'channel': most_relevant.get('uploader', 'N/A'),
-            'thumbnail': most_relevant.get('thumbnail', 'N/A'),
-            'description': most_relevant.get('description', '')[:500] if most_relevant.get('description') else '',
-            'relevance_score': most_relevant.get('relevance_score', 0)
-        }
-        
-        return result
+        return pick_most_relevant_video(videos, query)
     
     except Exception as e:
         print(f"Error fetching YouTube videos: {e}")
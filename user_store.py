@@ -0,0 +1,164 @@
+"""
+Per-user storage handles.
+
+A `UserStore` describes where one user's state lives on disk. It replaces the
+process-wide `STORE_PATH` / `USER_STORE_DIR` globals that `nodes.init_user_storage`
+used to mutate, which let two concurrent sessions read or write each other's
+files. Every load/save now works against an explicit handle, so many users can
+be served from one process with threads or asyncio.
+
+On-disk layout:
+    save_to/
+    └── user_id/
+        ├── global_state.json      # store_path
+        └── user_store/            # user_store_dir
+            ├── user_id.json       # user_file (curriculum index)
+            └── chapters/          # chapters_dir, one shard per chapter
+
+Usage:
+    from user_store import UserStore, resolve_user_store
+
+    store = UserStore.open("/workspace/mnt/", "babe")   # create dirs, register
+    store = resolve_user_store("babe")                   # look up per request
+
+    with store.lock():                                   # serialize writers of this user
+        ...
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX platforms only get the in-process lock
+    fcntl = None
+
+# Root used when a request only knows the user id and the user has not been
+# registered in this process yet (e.g. right after a server restart)
+DEFAULT_SAVE_TO = os.environ.get("AGENTICTA_SAVE_TO", "/workspace/mnt/")
+
+_user_stores: Dict[str, "UserStore"] = {}
+_user_stores_lock = threading.Lock()
+
+
+class _UserLock:
+    """Re-entrant per-user lock: a thread lock in-process plus flock across processes.
+
+    flock is taken only by the outermost holder, since a second flock on a new
+    file descriptor from the same process would block on itself.
+    """
+
+    def __init__(self, lock_path: Path):
+        self.lock_path = lock_path
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._rlock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._rlock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._rlock.release()
+
+
+_user_locks: Dict[Path, _UserLock] = {}
+
+
+@dataclass(frozen=True)
+class UserStore:
+    """Immutable handle to one user's storage directory."""
+
+    save_to: Path
+    user_id: str
+
+    @property
+    def base_dir(self) -> Path:
+        return Path(self.save_to) / self.user_id
+
+    @property
+    def store_path(self) -> Path:
+        return self.base_dir / "global_state.json"
+
+    @property
+    def user_store_dir(self) -> Path:
+        return self.base_dir / "user_store"
+
+    @property
+    def user_file(self) -> Path:
+        return self.user_store_dir / f"{self.user_id}.json"
+
+    @property
+    def chapters_dir(self) -> Path:
+        return self.user_store_dir / "chapters"
+
+    @property
+    def lock_path(self) -> Path:
+        return self.base_dir / ".lock"
+
+    def ensure_dirs(self) -> "UserStore":
+        self.user_store_dir.mkdir(parents=True, exist_ok=True)
+        return self
+
+    @contextmanager
+    def lock(self):
+        """Exclusive lock on this user's files. Other users are never blocked."""
+        with _user_stores_lock:
+            user_lock = _user_locks.get(self.lock_path)
+            if user_lock is None:
+                user_lock = _user_locks[self.lock_path] = _UserLock(self.lock_path)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        user_lock.acquire()
+        try:
+            yield self
+        finally:
+            user_lock.release()
+
+    @classmethod
+    def open(cls, save_to: str, user_id: str) -> "UserStore":
+        """Create the user's directories and register the handle for later lookups."""
+        store = cls(Path(save_to), user_id).ensure_dirs()
+        with _user_stores_lock:
+            _user_stores[user_id] = store
+        return store
+
+
+def set_default_save_to(save_to: str):
+    """Set the root used by `resolve_user_store` for users not opened in this process."""
+    global DEFAULT_SAVE_TO
+    DEFAULT_SAVE_TO = save_to
+
+
+def resolve_user_store(user_id: str, save_to: Optional[str] = None) -> UserStore:
+    """Return the storage handle for a user.
+
+    With `save_to`, the handle is opened (and registered) at that root. Without
+    it, the handle registered for this user is reused, falling back to
+    DEFAULT_SAVE_TO.
+    """
+    if save_to is not None:
+        return UserStore.open(save_to, user_id)
+    with _user_stores_lock:
+        store = _user_stores.get(user_id)
+    if store is None:
+        store = UserStore.open(DEFAULT_SAVE_TO, user_id)
+    return store
@@ -2,6 +2,20 @@ import requests
 import base64
 import argparse
 import os, re
+import io
+from typing import List, Optional
+from colorama import Fore
+from image_normalize import IMAGE_MAX_SIDE, IMAGE_QUALITY, MIME_TYPES, detect_base64_format, normalize_image
+
+# Images sent in one VLM request at most
+VLM_MAX_IMAGES = int(os.environ.get("VLM_MAX_IMAGES", "4"))
+# Longest side of an image after downscaling, in pixels; the display default
+# lets the VLM reuse images already normalised for display
+VLM_IMAGE_MAX_SIDE = int(os.environ.get("VLM_IMAGE_MAX_SIDE", str(IMAGE_MAX_SIDE)))
+# Base64 size budget of all images of one request, in KB
+VLM_IMAGE_BUDGET_KB = int(os.environ.get("VLM_IMAGE_BUDGET_KB", "1536"))
+
+VLM_URL = "http://vllm:8901/v1/chat/completions"
 
 def is_base64(s):
     if not s or not isinstance(s, str):
@@ -35,8 +49,112 @@ def audio2base64_str(audio_path):
     return base64_audio
 
 
+def _image_bytes(image):
+    """Raw bytes of an image given as a base64 string or a file path."""
+    if os.path.exists(image):
+        with open(image, "rb") as f:
+            return f.read()
+    return base64.b64decode("".join(image.split()), validate=True)
+
+
+def fit_image(data: bytes, max_side: int = VLM_IMAGE_MAX_SIDE, max_b64_bytes: Optional[int] = None,
+              fmt: Optional[str] = None) -> str:
+    """Normalise an image (see image_normalize) and return it as base64 within `max_b64_bytes`.
+
+    The first attempt uses the shared normalisation settings, so images already
+    normalised for display come from the cache. After that quality is lowered,
+    then the image is shrunk further, until it fits or reaches 256 px at quality 40.
+    """
+    side, quality = max_side, IMAGE_QUALITY
+    while True:
+        encoded = normalize_image(data, max_side=side, fmt=fmt, quality=quality).base64
+        if max_b64_bytes is None or len(encoded) <= max_b64_bytes or (side <= 256 and quality <= 40):
+            return encoded
+        if quality > 40:
+            quality = max(40, quality - 15)
+        else:
+            side = max(256, int(side * 0.75))
+
+
+def prepare_images(images: List[str], max_images: int = VLM_MAX_IMAGES, max_side: int = VLM_IMAGE_MAX_SIDE,
+                   budget_kb: int = VLM_IMAGE_BUDGET_KB) -> List[str]:
+    """Downscale and re-encode up to `max_images` images to share the request's size budget.
+
+    Images are base64 strings or file paths; unreadable ones are skipped.
+    """
+    images = [image for image in images if image][:max(1, max_images)]
+    if not images:
+        return []
+    per_image = budget_kb * 1024 // len(images)
+    prepared = []
+    for image in images:
+        try:
+            prepared.append(fit_image(_image_bytes(image), max_side, per_image))
+        except Exception as e:
+            print(Fore.YELLOW + f"Skipping image that could not be prepared for the VLM: {e}" + Fore.RESET)
+    return prepared
+
+
+def image_data_url(image_base64):
+    """Data URL of a base64 image, labelled with its real format (JPEG if it cannot be told)."""
+    mime = MIME_TYPES.get(detect_base64_format(image_base64), "image/jpeg")
+    return f"data:{mime};base64,{image_base64}"
+
+
+def _normalized_or_raw(image_base64):
+    try:
+        return prepare_images([image_base64])[0]
+    except IndexError:
+        return image_base64
+
+
+def build_vlm_payload(query, images_base64, sys_prompt, audio_base64=None):
+    """Chat completion payload with a text query, any number of base64 images and optional audio."""
+    content = [{"type": "text", "text": query}]
+    for image_base64 in images_base64:
+        # Use base64 for local media (server must accept it)
+        content.append({"type": "image_url", "image_url": {"url": image_data_url(image_base64)}})
+    if audio_base64:
+        content.append({"type": "input_audio", "input_audio": {"data": f"{audio_base64}", "format": "wav"}})
+    return {
+        "messages": [
+            {
+                "role": "system",
+                "content": [
+                    {"type": "text", "text": sys_prompt}
+                ]
+            },
+            {
+                "role": "user",
+                "content": content
+            }
+        ]
+    }
+
+
+def query_qwen_vllm_served_images(query, images, sys_prompt, audio_path=None):
+    """Ask the VLM about several images in one request.
+
+    Args:
+        query: User query text
+        images: Base64 strings or file paths; at most VLM_MAX_IMAGES are sent,
+            normalised and re-encoded to fit VLM_IMAGE_BUDGET_KB together
+        sys_prompt: System prompt
+        audio_path: Optional wav file sent along
+
+    Returns:
+        The VLM's answer
+    """
+    images_base64 = prepare_images(images)
+    audio_base64 = audio2base64_str(audio_path) if audio_path and os.path.exists(audio_path) else None
+    print(Fore.CYAN + f"VLM request with {len(images_base64)} image(s), "
+          f"{sum(len(i) for i in images_base64) // 1024} KB" + Fore.RESET)
+    response = requests.post(VLM_URL, json=build_vlm_payload(query, images_base64, sys_prompt, audio_base64))
+    return response.json()["choices"][0]["message"]["content"]
+
+
 def query_qwen_vllm_served(query, image_file_loc, sys_prompt, audio_path):
-    url = "http://vllm:8901/v1/chat/completions"    
+    url = VLM_URL
     print(is_base64_regex(image_file_loc),is_base64(image_file_loc)) 
     if is_base64_regex(image_file_loc) or is_base64(image_file_loc):        
         base64_img_str=image_file_loc 
@@ -57,6 +175,7 @@ def query_qwen_vllm_served(query, image_file_loc, sys_prompt, audio_path):
             image_base64=base64_img_str
         else:
             image_base64=img2base64_str(image_file_loc)
+        image_base64=_normalized_or_raw(image_base64)
         audio_base64_str=audio2base64_str(audio_path)
         payload = {    
             "messages": [
@@ -71,7 +190,7 @@ def query_qwen_vllm_served(query, image_file_loc, sys_prompt, audio_path):
                     "content": [
                         {"type": "text", "text": query},
                         # Use base64 for local media (server must accept it)
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}},
+                        {"type": "image_url", "image_url": {"url": image_data_url(image_base64)}},
                         {"type": "input_audio", "input_audio": {"data": f"{audio_base64_str}", "format": "wav"}},
 
                     ]
@@ -83,6 +202,7 @@ def query_qwen_vllm_served(query, image_file_loc, sys_prompt, audio_path):
             image_base64=base64_img_str
         else:
             image_base64=img2base64_str(image_file_loc)
+        image_base64=_normalized_or_raw(image_base64)
         payload = {    
             "messages": [
                 {
@@ -96,7 +216,7 @@ def query_qwen_vllm_served(query, image_file_loc, sys_prompt, audio_path):
                     "content": [
                         {"type": "text", "text": query},
                         # Use base64 for local media (server must accept it)
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}},                        
+                        {"type": "image_url", "image_url": {"url": image_data_url(image_base64)}},                        
 
                     ]
                 }
@@ -0,0 +1,190 @@
+"""
+Async YouTube search with a result cache and a persistent yt-dlp worker.
+
+`tool_youtube.search_youtube_videos` starts a `yt-dlp ytsearch15:` process
+per supplement request: interpreter start-up, extractor loading and full
+metadata extraction of every result, for up to 30 seconds while the chat
+handler waits. `YouTubeSearchService` instead:
+
+    - keeps one `yt_dlp.YoutubeDL` instance on a dedicated worker thread,
+      created on first use and reused for every search; flat extraction
+      reads the search page only, not each video's page
+    - caches results per normalised query for YOUTUBE_CACHE_TTL seconds,
+      so asking for "a video on photosynthesis" twice does not search twice
+    - shares one search between concurrent requests for the same query
+    - exposes an async API with a timeout, so callers can show progress
+      instead of blocking on the search
+
+If yt_dlp cannot be imported the worker falls back to the subprocess search.
+
+Usage:
+    from youtube_search_service import fetch_most_relevant_youtube_video_async
+
+    video = await fetch_most_relevant_youtube_video_async("krebs cycle")
+"""
+
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from colorama import Fore
+
+from tool_youtube import pick_most_relevant_video, search_youtube_videos
+
+# Seconds a query's results are reused
+YOUTUBE_CACHE_TTL = float(os.environ.get("YOUTUBE_CACHE_TTL", "3600"))
+# Queries kept in the cache; least recently used go first
+YOUTUBE_CACHE_MAX = int(os.environ.get("YOUTUBE_CACHE_MAX", "256"))
+# Results fetched per search before ranking
+YOUTUBE_SEARCH_LIMIT = int(os.environ.get("YOUTUBE_SEARCH_LIMIT", "15"))
+# Seconds a caller waits for a search; a late search still fills the cache
+YOUTUBE_SEARCH_TIMEOUT = float(os.environ.get("YOUTUBE_SEARCH_TIMEOUT", "20"))
+
+YDL_OPTIONS = {
+    "quiet": True,
+    "no_warnings": True,
+    "skip_download": True,
+    "noplaylist": True,
+    "extract_flat": "in_playlist",
+    "socket_timeout": 10,
+}
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize_query(query: str) -> str:
+    """Cache key of a query: lower-case words separated by single spaces."""
+    return " ".join(_WORD.findall((query or "").lower()))
+
+
+def _default_ydl_factory(options: Dict[str, Any]):
+    import yt_dlp
+    return yt_dlp.YoutubeDL(options)
+
+
+class YouTubeSearchService:
+    """YouTube search on a single worker thread that owns a reusable YoutubeDL, with a TTL cache."""
+
+    def __init__(self, ttl: float = YOUTUBE_CACHE_TTL, max_entries: int = YOUTUBE_CACHE_MAX,
+                 timeout: float = YOUTUBE_SEARCH_TIMEOUT,
+                 ydl_factory: Callable[[Dict[str, Any]], Any] = _default_ydl_factory,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.timeout = timeout
+        self._ydl_factory = ydl_factory
+        self._clock = clock
+        # YoutubeDL is not thread-safe; only the worker thread touches it
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yt-dlp")
+        self._ydl = None
+        self._use_subprocess = False
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[float, List[dict]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, int], Future] = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key: Tuple[str, int]) -> Optional[List[dict]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if self._clock() - entry[0] > self.ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[1]
+
+    def _extract(self, query: str, search_limit: int) -> List[dict]:
+        """Run one search on the worker thread."""
+        if not self._use_subprocess and self._ydl is None:
+            try:
+                self._ydl = self._ydl_factory(dict(YDL_OPTIONS))
+            except ImportError:
+                print(Fore.YELLOW + "yt_dlp is not importable, searching YouTube with the yt-dlp command", Fore.RESET)
+                self._use_subprocess = True
+        if self._use_subprocess:
+            return search_youtube_videos(query, search_limit)
+        try:
+            info = self._ydl.extract_info(f"ytsearch{search_limit}:{query}", download=False)
+        except Exception as e:
+            print(Fore.RED + f"Error searching YouTube: {e}", Fore.RESET)
+            return []
+        return [entry for entry in (info or {}).get("entries") or [] if entry]
+
+    def _search(self, key: Tuple[str, int], query: str, search_limit: int) -> List[dict]:
+        videos: List[dict] = []
+        try:
+            videos = self._extract(query, search_limit)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                # Failed or empty searches are retried next time
+                if videos:
+                    self._cache[key] = (self._clock(), videos)
+                    self._cache.move_to_end(key)
+                    while len(self._cache) > self.max_entries:
+                        self._cache.popitem(last=False)
+        return videos
+
+    def submit(self, query: str, search_limit: int = YOUTUBE_SEARCH_LIMIT) -> Future:
+        """Future of the search results for a query: cached, already running, or newly queued."""
+        key = (normalize_query(query), search_limit)
+        with self._lock:
+            cached = self._cached(key)
+            if cached is not None:
+                future: Future = Future()
+                future.set_result(cached)
+                return future
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._search, key, query, search_limit)
+                self._inflight[key] = future
+            return future
+
+    def search(self, query: str, search_limit: int = YOUTUBE_SEARCH_LIMIT) -> List[dict]:
+        """Search results for a query, blocking for at most `timeout` seconds ([] on timeout)."""
+        try:
+            return self.submit(query, search_limit).result(timeout=self.timeout)
+        except FutureTimeoutError:
+            print(Fore.YELLOW + f"YouTube search for '{query}' timed out after {self.timeout:.0f}s", Fore.RESET)
+            return []
+
+    async def search_async(self, query: str, search_limit: int = YOUTUBE_SEARCH_LIMIT) -> List[dict]:
+        """Search results for a query without blocking the event loop ([] on timeout)."""
+        future = asyncio.wrap_future(self.submit(query, search_limit))
+        try:
+            # Shielded so a timed-out caller does not cancel a search others share
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            print(Fore.YELLOW + f"YouTube search for '{query}' timed out after {self.timeout:.0f}s", Fore.RESET)
+            return []
+
+    async def fetch_most_relevant(self, query: str, search_limit: int = YOUTUBE_SEARCH_LIMIT) -> Optional[dict]:
+        """The search result most relevant to the query, formatted as by tool_youtube, or None."""
+        return pick_most_relevant_video(await self.search_async(query, search_limit), query)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+_service: Optional[YouTubeSearchService] = None
+_service_lock = threading.Lock()
+
+
+def get_youtube_search_service() -> YouTubeSearchService:
+    """Return the process-wide YouTubeSearchService."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = YouTubeSearchService()
+        return _service
+
+
+async def fetch_most_relevant_youtube_video_async(query: str, search_limit: int = YOUTUBE_SEARCH_LIMIT) -> Optional[dict]:
+    """Async, cached counterpart of tool_youtube.fetch_most_relevant_youtube_video."""
+    return await get_youtube_search_service().fetch_most_relevant(query, search_limit)